@@ -9,23 +9,33 @@ on disk. It never decodes an image and never scales one.
 gestures expressed as ``video-zoom`` / ``video-pan-x`` / ``video-pan-y``,
 so nothing touches Python per frame. The measurements behind that, and the
 cost (one temporary file per page, because mpv cannot read inside an
-archive), are ``docs/readers.md`` §5.
+archive — or a loopback URL, with ``comic_pages_in_memory``), are
+``docs/readers.md`` §5.
 
 **Zip and tar only**, and **reading order is a natural sort of the
 filenames** — digits compared as numbers, which a plain sort gets exactly
 backwards and which is the single most visible way to get a comic wrong.
 See ``docs/readers.md`` §5.1.
+
+**A page is one positioned read.** The listing records where each page's
+bytes sit in the file, so a page is an ``open``, a ``pread`` and a
+``close`` — plus an inflate for a deflated zip entry — rather than a
+central-directory parse (zip) or a walk over every header before it (tar).
+See ``docs/readers.md`` §5.7.
 """
 
 import logging
 import os
 import posixpath
 import re
+import secrets
 import shutil
+import struct
 import tarfile
 import tempfile
 import threading
 import zipfile
+import zlib
 
 log = logging.getLogger("comic")
 
@@ -52,12 +62,26 @@ MAX_PAGE_BYTES = 64 * 1024 * 1024
 #: **Above the browser's pool width**, which is what makes it a cache and
 #: not a hazard: extractions run on that pool, so with a narrower cache a
 #: burst of page turns has one worker trimming a file another worker has
-#: just written and handed to mpv. Eight is generous for a few hundred KB
-#: each and leaves room for paging back and forth across a boundary.
-PAGE_CACHE = 8
+#: just written and handed to mpv. **And above the reader's prefetch
+#: window on top of that** (``pages/comic.py``: the page, three ahead and
+#: one behind), so the pages extracted ahead are never the ones trimmed to
+#: make room for each other. Twelve is a few MB at a few hundred KB each.
+PAGE_CACHE = 12
 
 _DIGITS = re.compile(r"(\d+)")
 
+#: A zip local file header: the signature, then the name and extra-field
+#: lengths at offsets 26 and 28 that say where the entry's data begins
+#: (APPNOTE 4.3.7). The extra field here need not match the central
+#: directory's, which is why it is read rather than assumed.
+_ZIP_LOCAL_HEADER = 30
+_ZIP_LOCAL_SIGNATURE = b"PK\x03\x04"
+
+#: What a compressed tar starts with. ``tarfile.open`` sees through these,
+#: and then a member's offset is into the decompressed stream rather than
+#: the file, so such a comic is read by name.
+_COMPRESSED_MAGIC = (b"\x1f\x8b", b"BZh", b"\xfd7zXZ\x00")
+
 
 class ComicError(Exception):
     """This file cannot be read as a comic, with a reason for the user."""
@@ -103,16 +127,31 @@ class ComicArchive:
     ``epub.archive`` and ``docs/readers.md`` §4.5.
     """
 
-    def __init__(self, path, cache_dir=None):
+    def __init__(self, path, cache_dir=None, memory=None):
         self.path = path
         if not os.path.exists(path):
             raise ComicError("no such file: %s" % path)
         self.kind = "tar" if comic_format(path) == "cbt" else "zip"
+        #: Per page, ``(offset, length, method, crc)`` of its bytes in the
+        #: file, or None for a page that has to be read by name: an
+        #: encrypted or oddly-compressed zip entry, a sparse tar member, a
+        #: compressed tar. Filled by _list, parallel to ``pages``.
+        self._spans = []
+        #: (size, mtime_ns) of the file the spans were taken from. A file
+        #: that no longer matches is read by name: the offsets describe a
+        #: file that is not there any more.
+        self._identity = None
         self.pages = self._list()
         if not self.pages:
             raise ComicError("there are no pages in this file")
         self._dir = cache_dir
         self._own_dir = cache_dir is None
+        #: A ``page_server.PageServer`` to hold pages in instead of files
+        #: (``comic_pages_in_memory``), or None. Its names are prefixed
+        #: per archive, so two opens of one comic never share an entry and
+        #: close() drops exactly this one's.
+        self._memory = memory
+        self._prefix = "%s/" % secrets.token_hex(6)
         #: index -> extracted path, most recent last.
         self._extracted = {}
         #: Extraction runs on the browser's worker pool, several jobs deep
@@ -138,19 +177,66 @@ class ComicArchive:
     def _list(self):
         with self._open() as archive:
             if self.kind == "tar":
-                names = [m.name for m in archive.getmembers() if m.isfile()]
+                members = {m.name: m for m in archive.getmembers()
+                           if m.isfile()}
             else:
-                names = [i.filename for i in archive.infolist()
-                         if not i.is_dir()]
+                members = {i.filename: i for i in archive.infolist()
+                           if not i.is_dir()}
         # "__MACOSX/" entries and "._" siblings are resource forks, not
         # pages, and every archive built on a Mac has one per real file.
-        pages = [n for n in names
+        pages = [n for n in members
                  if os.path.splitext(n)[1].lower() in PAGE_SUFFIXES
                  and not n.startswith("__MACOSX/")
                  and not posixpath.basename(n).startswith("._")]
         pages.sort(key=natural_key)
+        self._spans = self._index([members[n] for n in pages])
         return pages
 
+    def _index(self, members):
+        """Where each page's bytes are, read once at open.
+
+        A tar member's data offset is already in its header. A zip entry's
+        is not: the central directory gives the local header's offset, and
+        the data starts after that header's own name and extra field — one
+        30-byte read per page, here, rather than a directory parse per
+        turn. Anything that cannot be indexed is None and read by name.
+        """
+        spans = [None] * len(members)
+        try:
+            with open(self.path, "rb") as raw:
+                st = os.fstat(raw.fileno())
+                if self.kind == "tar":
+                    if raw.read(6).startswith(_COMPRESSED_MAGIC):
+                        return spans
+                    for n, m in enumerate(members):
+                        if not m.issparse():
+                            spans[n] = (m.offset_data, m.size, None, None)
+                else:
+                    for n, info in enumerate(members):
+                        spans[n] = self._zip_span(raw, info)
+        except OSError:
+            log.debug("comic not indexed; reading pages by name",
+                      exc_info=True)
+            return [None] * len(members)
+        self._identity = (st.st_size, st.st_mtime_ns)
+        return spans
+
+    @staticmethod
+    def _zip_span(raw, info):
+        if (info.flag_bits & 0x1 or info.compress_type
+                not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)):
+            # Encrypted, or bzip2/lzma: zipfile's reader has the password
+            # error and the decompressors; this path has neither.
+            return None
+        head = _pread(raw, _ZIP_LOCAL_HEADER, info.header_offset)
+        if (len(head) != _ZIP_LOCAL_HEADER
+                or head[:4] != _ZIP_LOCAL_SIGNATURE):
+            return None
+        name_len, extra_len = struct.unpack_from("<HH", head, 26)
+        return (info.header_offset + _ZIP_LOCAL_HEADER + name_len
+                + extra_len, info.compress_size, info.compress_type,
+                info.CRC)
+
     def __len__(self):
         return len(self.pages)
 
@@ -172,6 +258,47 @@ class ComicArchive:
                 self._dir = tempfile.mkdtemp(prefix="jmpvs-comic-")
             return self._dir
 
+    def page_source(self, index):
+        """``(location, data)`` for page ``index``: what to hand mpv, and
+        the bytes when they are in memory (None when it is a file).
+
+        From memory when this archive was given a page server and the page
+        fits ``page_server.MEMORY_PAGE_MAX``; otherwise :meth:`page_path`,
+        so a page too big to hold, or a server that cannot listen, is the
+        file it always was.
+        """
+        if not 0 <= index < len(self.pages):
+            raise ComicError("no page %d" % index)
+        memory = self._memory
+        if memory is None:
+            return self.page_path(index), None
+        from .page_server import MEMORY_PAGE_MAX
+
+        name = self.pages[index]
+        key = "%s%05d%s" % (self._prefix, index,
+                            os.path.splitext(name)[1].lower() or ".img")
+        data = memory.get(key)
+        if data is None:
+            with self._lock:
+                if self._closed:
+                    raise ComicError("this comic has been closed")
+                on_disk = index in self._extracted
+            if on_disk:
+                # Too big to hold, the last time it was asked for.
+                return self._extract(index), None
+            data = self._read(index, name)
+            if len(data) > MEMORY_PAGE_MAX:
+                return self._extract(index, data), None
+        url = memory.put(key, data)
+        if url is None:
+            return self._extract(index, data), None
+        if self._closed:
+            # close() ran while this was reading; what it dropped, this
+            # just put back.
+            memory.discard(self._prefix)
+            raise ComicError("this comic has been closed")
+        return url, data
+
     def page_path(self, index):
         """Page ``index`` as a file on disk, extracted if it is not already.
 
@@ -181,9 +308,17 @@ class ComicArchive:
         """
         if not 0 <= index < len(self.pages):
             raise ComicError("no page %d" % index)
+        return self._extract(index)
+
+    def _extract(self, index, data=None):
+        """page_path's work, taking the bytes when the caller has read
+        them already."""
         with self._lock:
             hit = self._extracted.get(index)
             if hit and os.path.exists(hit):
+                # Most recent last: a page asked for again (shown after it
+                # was prefetched) is the last one the trim should take.
+                self._extracted[index] = self._extracted.pop(index)
                 return hit
         name = self.pages[index]
         suffix = os.path.splitext(name)[1].lower() or ".img"
@@ -197,7 +332,8 @@ class ComicArchive:
         # the pool for no benefit. Only the bookkeeping is guarded, and two
         # workers extracting the same page write the same bytes to the same
         # path, which os.replace makes atomic.
-        data = self._read(index, name)
+        if data is None:
+            data = self._read(index, name)
         tmp = "%s.%d.part" % (dest, threading.get_ident())
         try:
             with open(tmp, "wb") as handle:
@@ -222,6 +358,47 @@ class ComicArchive:
         return dest
 
     def _read(self, index, name):
+        span = self._spans[index] if index < len(self._spans) else None
+        if span is not None:
+            data = self._read_span(index, span)
+            if data is not None:
+                return data
+        return self._read_named(index, name)
+
+    def _read_span(self, index, span):
+        """Page ``index`` from its recorded place in the file, or None when
+        the file is no longer the one that was indexed."""
+        offset, length, method, crc = span
+        # Capped before the read, not after: the length is from a header,
+        # and a page over the cap is refused whatever it says.
+        want = min(length, MAX_PAGE_BYTES + 1)
+        try:
+            with open(self.path, "rb") as raw:
+                st = os.fstat(raw.fileno())
+                if (st.st_size, st.st_mtime_ns) != self._identity:
+                    return None
+                data = _pread(raw, want, offset)
+        except OSError as exc:
+            raise ComicError("cannot read page %d: %s" % (index, exc)) from exc
+        if len(data) != want:
+            raise ComicError("page %d is cut short" % index)
+        if method == zipfile.ZIP_DEFLATED:
+            inflate = zlib.decompressobj(-zlib.MAX_WBITS)
+            try:
+                data = inflate.decompress(data, MAX_PAGE_BYTES + 1)
+            except zlib.error as exc:
+                raise ComicError("cannot read page %d: %s"
+                                 % (index, exc)) from exc
+        if len(data) > MAX_PAGE_BYTES:
+            raise ComicError("page %d is larger than %d bytes"
+                             % (index, MAX_PAGE_BYTES))
+        if crc is not None and zlib.crc32(data) != crc:
+            # zipfile checks this on the way out; so does this path, so a
+            # damaged page says so rather than reaching mpv as garbage.
+            raise ComicError("page %d is damaged" % index)
+        return data
+
+    def _read_named(self, index, name):
         try:
             with self._open() as archive:
                 if self.kind == "tar":
@@ -283,5 +460,29 @@ class ComicArchive:
             for index in list(self._extracted):
                 self._remove(index)
             directory, self._dir = self._dir, None
+        if self._memory is not None:
+            self._memory.discard(self._prefix)
         if self._own_dir and directory:
             shutil.rmtree(directory, ignore_errors=True)
+
+
+def _pread(handle, length, offset):
+    """``length`` bytes at ``offset``, fewer only at the end of the file.
+
+    ``os.pread`` where there is one, so the read does not move a file
+    position anybody shares; a seek and a read on Windows, where there is
+    not and the handle is this call's own anyway.
+    """
+    if not hasattr(os, "pread"):
+        handle.seek(offset)
+        return handle.read(length)
+    chunks = []
+    fd = handle.fileno()
+    while length > 0:
+        chunk = os.pread(fd, length, offset)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        length -= len(chunk)
+        offset += len(chunk)
+    return b"".join(chunks)
@@ -104,6 +104,17 @@ class Settings(SettingsBase):
     pre_media_cmd: Optional[str] = None
     stop_cmd: Optional[str] = None
     auto_play: bool = True
+    # Seconds before the end of an item to resolve the next one (item,
+    # PlaybackInfo, segments) so the advance starts without those round
+    # trips. 0 resolves at the advance, as it always did.
+    preresolve_next_secs: int = 30
+    # Music: hand mpv the next track ahead (playlist append + prefetch) so
+    # an album plays without a gap. Needs preresolve_next_secs.
+    gapless_music: bool = True
+    # Longest gap between progress reports to the server during steady
+    # playback; pauses, seeks and track changes report at once. 5 reports
+    # on every tick, as before.
+    progress_report_max_secs: int = 60
     # Persisted playback volume (0-100), kept separately for music and video —
     # the loudness gap between the two means users want different levels.
     # Applied when a track starts and reconciled back on the timeline tick.
@@ -298,6 +309,37 @@ class Settings(SettingsBase):
     sync_path: Optional[str] = None
     work_offline: bool = False
     prefer_downloaded: bool = True
+    #: Offline downloads in flight at once, and how many of those may be
+    #: against any one server. A season queued in one go used to arrive a
+    #: file at a time; the per-server cap is what keeps a second transfer
+    #: from turning into a tenth against someone's home server. Read by the
+    #: sync worker each time it starts a transfer, so both apply live.
+    download_concurrency: int = 3
+    download_per_server: int = 2
+    #: Ceiling on the download rate in KiB/s, summed over every transfer.
+    #: 0 is unlimited.
+    download_max_kbps: int = 0
+    #: Hours when downloads wait, as "HH:MM-HH:MM" (local time; several
+    #: separated by commas; a window may wrap midnight). A transfer running
+    #: when one begins stops at its next chunk and resumes when it ends.
+    #: Empty is none.
+    download_quiet_hours: str = ""
+    #: Slow the downloads while a network stream playing beside them is
+    #: running short of buffered media, and let them back up as it
+    #: recovers. See sync.manager._Pacer.
+    download_adaptive: bool = True
+    #: Fetch one large file as this many byte ranges at once, for links
+    #: that throttle each connection. 1 is the single stream it always was,
+    #: and is the default: it multiplies the connections one download opens
+    #: against the server, which is not a choice to make for someone else's
+    #: server. Only files of at least download_segment_min_mb are split.
+    download_segments: int = 1
+    download_segment_min_mb: int = 512
+    #: Read every downloaded file back and check it against the hash taken
+    #: as it arrived, once per this many days, in the background and at low
+    #: priority. A file that no longer matches is downloaded again. 0 never
+    #: checks.
+    download_verify_days: int = 30
     # Auto-download: keep upcoming episodes on disk without being asked.
     # Off by default — it is the only feature that writes to the user's disk
     # unattended, so it is opt-in rather than something to discover after the
@@ -592,12 +634,36 @@ class Settings(SettingsBase):
     # typeset expecting. Off gives a ragged right edge, which some people
     # find easier and which avoids the rivers a narrow window can open up.
     reader_justify: bool = True
+    # Break each paragraph's lines as a whole (Knuth-Plass) rather than one
+    # line at a time, which evens out the spacing a justified page shows.
+    # Off by default: it costs a few tens of milliseconds more per chapter
+    # the first time it is laid out, and the greedy breaker is what every
+    # book has been read with so far.
+    reader_optimal_line_breaks: bool = False
+    # Lay out the whole book in the background once it is open, so the
+    # reader can number pages across the book ("page 140 of 312") and show
+    # a scrubber with the chapters on it. The work runs on separate worker
+    # processes and is remembered per book and layout; off leaves page
+    # numbers per chapter, and never starts them.
+    reader_book_page_numbers: bool = True
     # The comic reader's reading mode: "width" (the page as wide as the
     # window, scrolled down) or "page" (a whole page at once). Sticky
     # because it is a preference about how somebody reads comics, not
     # about one comic -- a reader who wants whole pages wants them for
     # every book, and picking it again per volume is the annoyance.
     comic_fit: str = "width"
+    # Queue the comic's next page in mpv's playlist behind the one on
+    # screen, so mpv has opened it before the turn. Off by default: it is
+    # a second file open in mpv for every page, and the turn it saves is
+    # the demuxer probe, which the page already extracted ahead of the
+    # reader makes small.
+    comic_preload_next: bool = False
+    # Keep comic pages in memory and hand them to mpv over a loopback URL
+    # instead of writing each one to a temporary file. Off by default: the
+    # files are what every mpv has always been able to open, and the
+    # write they cost is small on most disks -- it is the SD-card machine
+    # that wants this.
+    comic_pages_in_memory: bool = False
     # While a video plays with the HUD hidden, grab UP/DOWN/LEFT/RIGHT
     # (and ENTER) to summon/drive the HUD. Off by default: mpv's own
     # seek keys keep working and only hud_wake_key is taken over.
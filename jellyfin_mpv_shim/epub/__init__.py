@@ -21,6 +21,10 @@ of them imports the UI:
 ``fonts``       real faces for bold/italic/mono, with script fallback.
 ``layout``      blocks -> pages. Line breaking, justification, images.
 ``paint``       a page -> one Pillow bitmap.
+``cache``       the index, the parsed sections and the page breaks, kept
+                on disk so a second open reads them back.
+``pagination``  every section laid out at once on worker processes, for
+                a page number across the whole book.
 ``book``        an open book that knows where it is.
 
 Optional-dependency rule (CONTRIBUTING.md): Pillow, which the browser
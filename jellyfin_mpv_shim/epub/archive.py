@@ -132,6 +132,30 @@ class EpubArchive:
             raise TooLarge("%r is larger than %d bytes" % (name, limit))
         return data
 
+    def declared_sizes(self, names):
+        """``{name: uncompressed size}`` from the zip's headers, one open.
+
+        **The size an entry claims, never checked** — fine for what this is
+        for, which is an estimate (``EpubDocument.estimate_position``) that
+        is replaced by a counted answer moments later, and never for
+        deciding how much to read. Unresolvable names are left out.
+        """
+        wanted = {}
+        for name in names:
+            entry = self._resolve(name)
+            if entry is not None:
+                wanted[entry] = name
+        out = {}
+        try:
+            with self._open() as zf:
+                for info in zf.infolist():
+                    name = wanted.get(info.filename)
+                    if name is not None:
+                        out[name] = max(0, min(info.file_size, MAX_DOC_BYTES))
+        except EpubError:
+            pass
+        return out
+
     def read_text(self, name, limit=MAX_DOC_BYTES):
         return xmlish.decode(self.read(name, limit))
 
@@ -14,12 +14,22 @@ nothing survives a change that would move a line).
 Thread safety is one lock around the mutable state, because the UI calls
 into this from the loop thread (what page am I on) and from a worker (open
 the book, build the index, paginate the next section).
+
+Given a ``cache_dir``, the index, the parsed sections and where each page
+starts are also kept on disk (``cache.py``), and a section paginated in an
+earlier session comes back as its breaks alone — each page laid out the
+first time it is asked for. See ``docs/readers.md`` §4.10.
+
+:meth:`EpubDocument.paginate_book` lays out every section at once, on
+worker processes (``pagination.py``), and what it finds is what answers
+"page 4 of 312" — see ``docs/readers.md`` §4.15.
 """
 
 import logging
 import threading
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, wait
 
-from . import archive, content, layout, locations, paint
+from . import archive, cache, content, layout, locations, paint, pagination
 
 log = logging.getLogger("epub.book")
 
@@ -31,6 +41,17 @@ SECTION_CACHE = 3
 #: page holds a handful and the LANCZOS-resized copies are what get drawn.
 IMAGE_CACHE = 24
 
+#: Sections :meth:`EpubDocument.paginate_book` collects before writing them
+#: to the layout's file. Every write rewrites the whole file, so one per
+#: section would write a long book's breaks over and over; this many at a
+#: time is still little to lose to a crash.
+BREAKS_PER_WRITE = 8
+
+#: Seconds :meth:`EpubDocument.paginate_book` waits on its workers before
+#: looking up to see whether it is still wanted. A long section can take a
+#: worker seconds; a reader who left should not wait for it to find out.
+STOP_POLL = 0.25
+
 
 class Chapter:
     """A TOC entry the UI can put in a menu."""
@@ -47,9 +68,12 @@ class Chapter:
 class EpubDocument:
     """One open epub, positioned somewhere in itself."""
 
-    def __init__(self, path, style=None, script="latin"):
+    def __init__(self, path, style=None, script="latin", cache_dir=None):
         self.path = path
         self.package = archive.open_epub(path)
+        #: The book's on-disk cache entry, or None for none at all.
+        self._disk = (cache.BookCache(cache_dir, path)
+                      if cache_dir else None)
         self.style = style or layout.ReaderStyle()
         self.measurer = layout.Measurer(self.style, script)
         self._lock = threading.RLock()
@@ -60,11 +84,23 @@ class EpubDocument:
         self._css_cache = {}
         self._index = None
         self._viewport = (600, 800)
+        #: ``{spine_index: breaks}`` for every section laid out or read back
+        #: at ``_counted_key``, the layout they were made at. Kept through
+        #: :meth:`close` and across :data:`SECTION_CACHE`: a book's worth is
+        #: a few thousand tuples, and it is what the book-wide page number
+        #: is counted from.
+        self._counted = {}
+        self._counted_key = None
         #: Current position. The page number is a cache of "which page of
         #: this section contains ``offset``", refreshed on every move.
         self._spine = self._first_readable_spine()
         self._offset = 0
         self._page = 0
+        #: ``(fraction, spine, offset)`` while the position is an estimate
+        #: made without the index (:meth:`goto_fraction`): the fraction to
+        #: resolve properly once the index lands, and where the estimate
+        #: put the reader, so a reader who has since moved is left alone.
+        self._estimate = None
 
     # -- identity ---------------------------------------------------------
 
@@ -147,6 +183,14 @@ class EpubDocument:
     def _layout_key(self):
         return (self.style.key(), self._viewport)
 
+    def _disk_layout_key(self):
+        """The layout key for a break that outlives this process: the
+        in-memory one, plus the two things it can leave out because they
+        cannot change under a live document — the script, and what the
+        faces measure (:meth:`~.layout.Measurer.fingerprint`)."""
+        return (self._layout_key(), self.measurer.script,
+                self.measurer.fingerprint())
+
     # -- sections ---------------------------------------------------------
 
     def _section(self, spine_index):
@@ -154,31 +198,102 @@ class EpubDocument:
         hit = self._sections.get(spine_index)
         if hit is not None:
             return hit
-        try:
-            blocks, chars = content.parse_spine_item(
-                self.package, spine_index, self._css_cache)
-        except archive.EpubError:
-            log.info("spine %d unreadable", spine_index, exc_info=True)
-            blocks, chars = [], 0
+        hit = (self._disk.load_section(spine_index)
+               if self._disk is not None else None)
+        if hit is not None:
+            blocks, chars = hit
+        else:
+            try:
+                blocks, chars = content.parse_spine_item(
+                    self.package, spine_index, self._css_cache)
+            except archive.EpubError:
+                log.info("spine %d unreadable", spine_index, exc_info=True)
+                blocks, chars = [], 0
+            else:
+                if self._disk is not None:
+                    self._disk.store_section(spine_index, blocks, chars)
         self._sections[spine_index] = (blocks, chars)
         self._trim(self._sections, SECTION_CACHE, spine_index)
         return blocks, chars
 
     def pages(self, spine_index):
-        """Laid-out pages of a spine document, cached per layout."""
+        """Laid-out pages of a spine document, cached per layout.
+
+        A :class:`Pages`, which indexes like the list it used to be. From
+        the disk cache it holds only where each page starts, and lays a
+        page out when it is first asked for.
+        """
         with self._lock:
             key = (spine_index, self._layout_key())
             hit = self._paginated.get(key)
             if hit is not None:
                 return hit
-            blocks, _chars = self._section(spine_index)
-            width, height = self._viewport
-            pages = layout.paginate(blocks, width, height, self.measurer,
-                                    self._image_size, spine_index)
+            breaks = None
+            if self._disk is not None:
+                breaks = self._disk.load_breaks(self._disk_layout_key(),
+                                                spine_index)
+            if not breaks:
+                breaks = self._known_breaks(spine_index)
+            if breaks:
+                self._remember_breaks(spine_index, breaks)
+                pages = Pages(breaks, self._page_builder(spine_index))
+            else:
+                pages = Pages.of(self._paginate(spine_index))
             self._paginated[key] = pages
             self._trim(self._paginated, SECTION_CACHE * 2, key)
             return pages
 
+    def _paginate(self, spine_index):
+        """Lay out a whole section, and keep its breaks on disk."""
+        blocks, _chars = self._section(spine_index)
+        width, height = self._viewport
+        pages = layout.paginate(blocks, width, height, self.measurer,
+                                self._image_size, spine_index)
+        breaks = [(p.start_offset, p.end_offset, p.cursor) for p in pages]
+        self._remember_breaks(spine_index, breaks)
+        if self._disk is not None:
+            self._disk.store_breaks(self._disk_layout_key(), spine_index,
+                                    breaks)
+        return pages
+
+    def _remember_breaks(self, spine_index, breaks):
+        """Note a section's breaks at the current layout. Under the lock."""
+        key = self._layout_key()
+        if key != self._counted_key:
+            self._counted, self._counted_key = {}, key
+        self._counted[spine_index] = breaks
+
+    def _known_breaks(self, spine_index):
+        """A section's breaks at the current layout, if they are known
+        here; None otherwise. Under the lock."""
+        if self._counted_key != self._layout_key():
+            return None
+        return self._counted.get(spine_index)
+
+    def _page_builder(self, spine_index):
+        """Lay out page ``number`` of a section from its cached break.
+
+        A page that does not come back where the break says it starts
+        means the break was not made by this code at this layout — the
+        fingerprint missed something. The whole section is paginated again
+        and the fresh answer replaces both copies of the stale one.
+        """
+        def build(pages, number):
+            start, _end, cursor = pages.breaks[number]
+            blocks, _chars = self._section(spine_index)
+            width, height = self._viewport
+            page = layout.paginate_page(
+                blocks, width, height, self.measurer, self._image_size,
+                spine_index, number, cursor)
+            if page.start_offset == start and page.cursor == cursor:
+                return page
+            log.info("cached page breaks for spine %d are stale",
+                     spine_index)
+            fresh = self._paginate(spine_index)
+            pages.adopt(fresh)
+            return fresh[min(number, len(fresh) - 1)]
+        return build
+
     @staticmethod
     def _trim(cache, limit, keep):
         """Drop oldest entries. Insertion-ordered dicts make this an LRU
@@ -230,16 +345,53 @@ class EpubDocument:
         Until this has run, :meth:`fraction` answers None and the reader
         shows a page position without a book position — which is the right
         degradation, because the alternative is either blocking the open or
-        reporting a number that is wrong.
+        reporting a number that is wrong. From the disk cache it is one
+        small read, and ``progress`` is not called.
+
+        Runs without the lock, so the reader can page through the book
+        while a long one is counted; see :meth:`set_index` for what landing
+        does to a position that was only estimated.
         """
-        index = locations.build(self.package, progress)
-        with self._lock:
-            self._index = index
+        index = self.cached_index()
+        if index is None:
+            index = locations.build(self.package, progress)
+            if self._disk is not None:
+                self._disk.store_index(index)
+            self.set_index(index)
+        return index
+
+    def cached_index(self):
+        """Adopt the index from the disk cache if it is there. Returns it,
+        or None — a read of one small file, so cheap enough to try before
+        the first page rather than after it."""
+        if self._index is not None:
+            return self._index
+        index = self._disk.load_index() if self._disk is not None else None
+        if index is not None:
+            self.set_index(index)
         return index
 
     def set_index(self, index):
+        """Install the index. Returns True if that moved the reader.
+
+        It does when the position is still the estimate
+        :meth:`goto_fraction` made without one: the stored fraction is
+        resolved properly and the reader is put there. A reader who has
+        turned a page since is somewhere they chose, and is left there.
+        """
         with self._lock:
             self._index = index
+            estimate, self._estimate = self._estimate, None
+            if estimate is None or index is None:
+                return False
+            fraction, spine, offset = estimate
+            if (self._spine, self._offset) != (spine, offset):
+                return False
+            target = index.position_of(fraction)
+            if target == (spine, offset):
+                return False
+            self.goto(*target)
+            return True
 
     # -- position ---------------------------------------------------------
 
@@ -256,8 +408,8 @@ class EpubDocument:
         return self._page
 
     def page_count(self):
-        """Pages in the current section. Not in the book — see the module
-        docstring in ``layout.py``."""
+        """Pages in the current section. For the book, see
+        :meth:`book_page`."""
         return len(self.pages(self._spine))
 
     def fraction(self):
@@ -288,10 +440,11 @@ class EpubDocument:
         """
         pages = self.pages(self._spine)
         self._page = 0
-        for i, page in enumerate(pages):
-            if page.start_offset > self._offset:
+        for i in range(len(pages)):
+            start = pages.start_offset(i)
+            if start > self._offset:
                 break
-            if i and page.start_offset == pages[self._page].start_offset:
+            if i and start == pages.start_offset(self._page):
                 continue        # same offset: keep the earlier page
             self._page = i
 
@@ -303,19 +456,63 @@ class EpubDocument:
             self._resync_page()
 
     def goto_fraction(self, fraction):
-        """Resume from a stored position. No-op without an index."""
+        """Resume from a stored position.
+
+        Without an index yet, goes to :meth:`estimate_position` instead and
+        remembers the fraction, so :meth:`set_index` can put the reader
+        where it really is once the index lands. That is the two-phase
+        open: the first page needs one section parsed, the index needs all
+        of them, and a long book should not wait for the second to show
+        the first.
+        """
         with self._lock:
-            if self._index is None or fraction is None:
+            if fraction is None:
                 return False
-            spine, offset = self._index.position_of(fraction)
-            self.goto(spine, offset)
+            if self._index is not None:
+                self.goto(*self._index.position_of(fraction))
+                return True
+            self.goto(*self.estimate_position(fraction))
+            self._estimate = (fraction, self._spine, self._offset)
             return True
 
+    def estimate_position(self, fraction):
+        """``(spine_index, char_offset)`` for a stored fraction, by size.
+
+        The linear documents' sizes from the zip's headers stand in for
+        their location counts, and the offset inside the one it lands in is
+        the same proportion of its counted characters. Markup per word is
+        roughly constant through a book, so this is usually within a page
+        or two — and it only has to be near: it is what is on screen for
+        the moment the index takes, and the index replaces it.
+        """
+        with self._lock:
+            linear = [i for i, item in enumerate(self.package.spine)
+                      if item.linear]
+            if not linear or fraction is None:
+                return self._spine, 0
+            hrefs = [self.package.spine[i].href for i in linear]
+            sizes = self.package.archive.declared_sizes(hrefs)
+            weights = [sizes.get(href, 0) for href in hrefs]
+            total = sum(weights)
+            if not total:
+                return linear[0], 0
+            target = max(0.0, min(float(fraction), 1.0)) * total
+            for spine, weight in zip(linear, weights):
+                if weight and target < weight:
+                    break
+                target -= weight
+            else:
+                spine, weight = linear[-1], weights[-1]
+                target = weight
+            _blocks, chars = self._section(spine)
+            local = target / float(weight) if weight else 0.0
+            return spine, int(max(0.0, min(local, 1.0)) * chars)
+
     def goto_page(self, number):
         with self._lock:
             pages = self.pages(self._spine)
             self._page = max(0, min(int(number), len(pages) - 1))
-            self._offset = pages[self._page].start_offset
+            self._offset = pages.start_offset(self._page)
 
     def next_page(self):
         """Forward one page, crossing into the next section at the end.
@@ -342,7 +539,7 @@ class EpubDocument:
             self._spine -= 1
             pages = self.pages(self._spine)
             self._page = len(pages) - 1
-            self._offset = pages[self._page].start_offset
+            self._offset = pages.start_offset(self._page)
             return True
 
     def next_section(self):
@@ -359,6 +556,158 @@ class EpubDocument:
             self.goto(self._spine - 1, 0)
             return True
 
+    # -- the whole book -------------------------------------------------------
+
+    def paginate_book(self, on_section=None, wanted=None, executor=None):
+        """Lay out every section at the current layout. Call it off the UI
+        thread; returns True once the whole book is counted.
+
+        The sections nobody has laid out yet go to ``executor`` — the
+        shared :func:`pagination.pool` unless a caller brings its own — and
+        come back as their breaks, in whatever order they finish. Each is
+        kept (the reader turning into that chapter later lays out only the
+        page it lands on) and written to the disk cache under the layout it
+        was made at, and ``on_section(spine_index, page_count)`` is told. A
+        book counted in an earlier session is read back in one go and
+        starts nothing.
+
+        Stops, returning False, once the layout is not the one it started
+        at (a resize, a type size) or ``wanted()`` answers False — looked at
+        every :data:`STOP_POLL` seconds, not only when a section lands: what
+        was finished is kept, and what is still queued is cancelled. A
+        section a worker could not lay out, or laid out with faces that
+        measure differently from this process's, is laid out here instead.
+        """
+        with self._lock:
+            key = self._disk_layout_key()
+            if self._disk is not None:
+                for spine, breaks in self._disk.load_layout(key).items():
+                    if spine < self.spine_count:
+                        self._remember_breaks(spine, breaks)
+            todo = [spine for spine in range(self.spine_count)
+                    if self._known_breaks(spine) is None]
+            # Everything a worker needs, taken together under the lock so
+            # it all describes the one layout ``key`` names.
+            job = (self.style, self.measurer.script, self._viewport,
+                   self._disk.dir if self._disk is not None else None)
+        if not todo:
+            return True
+
+        def current():
+            return (self._disk_layout_key() == key
+                    and (wanted is None or wanted()))
+
+        if executor is None:
+            executor = pagination.pool()
+        unsaved = {}
+        futures = {}
+        try:
+            try:
+                for spine in todo:
+                    futures[executor.submit(pagination.paginate_section,
+                                            self.path, spine, *job)] = spine
+            except BrokenExecutor:
+                pagination.discard(executor)
+                raise
+            pending = set(futures)
+            while pending:
+                finished, pending = wait(pending, timeout=STOP_POLL,
+                                         return_when=FIRST_COMPLETED)
+                with self._lock:
+                    if not current():
+                        return False
+                for future in finished:
+                    if future.cancelled():
+                        return False            # the pool was shut down
+                    spine = futures[future]
+                    breaks = None
+                    try:
+                        _spine, breaks, fingerprint = future.result()
+                    except Exception as exc:
+                        log.warning("spine %d could not be laid out in a "
+                                    "worker", spine, exc_info=True)
+                        if isinstance(exc, BrokenExecutor):
+                            pagination.discard(executor)
+                    else:
+                        if fingerprint != key[2]:
+                            log.info("spine %d was laid out with other "
+                                     "faces", spine)
+                            breaks = None
+                    with self._lock:
+                        if not current():
+                            return False
+                        if breaks is None:
+                            # Written to disk by _paginate itself.
+                            breaks = [(p.start_offset, p.end_offset,
+                                       p.cursor)
+                                      for p in self._paginate(spine)]
+                        else:
+                            self._remember_breaks(spine, breaks)
+                            unsaved[spine] = breaks
+                        if self._disk is not None and \
+                                len(unsaved) >= BREAKS_PER_WRITE:
+                            self._disk.store_layout(key, unsaved)
+                            unsaved = {}
+                    if on_section is not None:
+                        on_section(spine, len(breaks))
+            return True
+        finally:
+            # The pool outlives this job; what it has not started is
+            # dropped rather than left ahead of the next book's sections.
+            for future in futures:
+                future.cancel()
+            if unsaved and self._disk is not None:
+                # Under the key they were made at, whatever it is now.
+                with self._lock:
+                    self._disk.store_layout(key, unsaved)
+
+    def page_counts(self):
+        """Pages in each section at the current layout: a list by spine
+        index, None for a section not laid out yet."""
+        with self._lock:
+            out = []
+            for spine in range(self.spine_count):
+                breaks = self._known_breaks(spine)
+                out.append(len(breaks) if breaks else None)
+            return out
+
+    def section_starts(self):
+        """The book page each section starts on (zero-based), or None
+        until every section is counted (:meth:`paginate_book`)."""
+        counts = self.page_counts()
+        if None in counts:
+            return None
+        starts, total = [], 0
+        for count in counts:
+            starts.append(total)
+            total += count
+        return starts
+
+    def book_page(self):
+        """``(page, pages)`` across the whole book — the page zero-based,
+        as :attr:`page_number` is — or None until every section is
+        counted."""
+        with self._lock:
+            counts = self.page_counts()
+            if None in counts:
+                return None
+            return sum(counts[:self._spine]) + self._page, sum(counts)
+
+    def goto_book_page(self, number):
+        """Go to a page of the whole book. False while it is not counted."""
+        with self._lock:
+            starts = self.section_starts()
+            if starts is None:
+                return False
+            number = max(0, int(number))
+            spine = 0
+            for i, start in enumerate(starts):
+                if start <= number:
+                    spine = i
+            self._spine, self._offset = spine, 0
+            self.goto_page(number - starts[spine])
+            return True
+
     # -- text ---------------------------------------------------------------
 
     def page_text(self):
@@ -452,8 +801,110 @@ class EpubDocument:
         because the caller is the thing that knows the theme.
         """
         with self._lock:
-            return (self.path, self._spine, self._page, self._layout_key())
+            return self.key_at(self._spine, self._page)
+
+    def key_at(self, spine_index, number):
+        """:meth:`page_key` for another page, so a render-ahead can ask
+        whether it already has one before drawing it."""
+        return (self.path, spine_index, number, self._layout_key())
+
+    # -- looking ahead ------------------------------------------------------
+
+    def neighbours(self):
+        """``[(spine_index, page_number), ...]`` a reader may turn to next,
+        most likely first: the next page, the previous one, and the first
+        page of the next section.
+
+        The last is there because the next page is often the *end* of a
+        section, and the turn after it is into a chapter that has not been
+        parsed or paginated yet — the slowest turn there is. Asking for it
+        here is what paginates it, on whichever thread asks.
+        """
+        with self._lock:
+            out = []
+            pages = self.pages(self._spine)
+            last = len(self.package.spine) - 1
+            if self._page + 1 < len(pages):
+                out.append((self._spine, self._page + 1))
+            elif self._spine < last:
+                out.append((self._spine + 1, 0))
+            if self._page > 0:
+                out.append((self._spine, self._page - 1))
+            elif self._spine > 0:
+                out.append((self._spine - 1,
+                            len(self.pages(self._spine - 1)) - 1))
+            if self._spine < last and (self._spine + 1, 0) not in out:
+                out.append((self._spine + 1, 0))
+            return out
+
+    def render_at(self, spine_index, number, size, colors, origin=None):
+        """``(page_key, image)`` for a page other than the current one,
+        without moving there — what a render-ahead draws.
+
+        Under the lock like :meth:`render_keyed`, and for the same reason:
+        the measurer and the image cache are shared with the page the
+        reader is on. Position is not touched, so the key is exact however
+        the reader moves meanwhile.
+        """
+        with self._lock:
+            pages = self.pages(spine_index)
+            number = max(0, min(int(number), len(pages) - 1))
+            image = paint.render_page(pages[number], size, self.style,
+                                      self.measurer, colors,
+                                      self._load_image, origin)
+            return self.key_at(spine_index, number), image
+
+
+class Pages:
+    """A section's pages at one layout, laid out as they are asked for.
+
+    ``breaks`` is ``[(start_offset, end_offset, cursor), ...]``, one per
+    page, and is all that position needs: :meth:`start_offset` answers from
+    it without laying anything out, which is what lets a reopened book find
+    its page without paginating the chapter. ``build(pages, number)`` makes
+    a missing page; a section paginated here in full arrives with every
+    page already made (:meth:`of`).
+    """
+
+    def __init__(self, breaks, build=None):
+        self.breaks = breaks
+        self._build = build
+        self._made = {}
+
+    @classmethod
+    def of(cls, pages):
+        out = cls([(p.start_offset, p.end_offset, p.cursor) for p in pages])
+        out._made = dict(enumerate(pages))
+        return out
 
+    def adopt(self, pages):
+        """Replace the breaks and pages wholesale with a fresh pagination."""
+        self.breaks = [(p.start_offset, p.end_offset, p.cursor)
+                       for p in pages]
+        self._made = dict(enumerate(pages))
+
+    def start_offset(self, number):
+        return self.breaks[number][0]
+
+    def __len__(self):
+        return len(self.breaks)
+
+    def __getitem__(self, number):
+        if number < 0:
+            number += len(self.breaks)
+        if not 0 <= number < len(self.breaks):
+            raise IndexError(number)
+        page = self._made.get(number)
+        if page is None:
+            page = self._build(self, number)
+            # setdefault: a stale break makes build adopt a whole fresh
+            # pagination, this page included.
+            page = self._made.setdefault(number, page)
+        return page
+
+    def __iter__(self):
+        for number in range(len(self.breaks)):
+            yield self[number]
 
 
 def _block_text(block):
@@ -0,0 +1,244 @@
+"""What opening a book works out, kept on disk for the next time.
+
+Opening a book the second time used to cost what the first did: the
+locations index reads and parses every linear spine document (the one part
+of an open that has to read all of it), and the section being read is
+parsed and paginated from scratch. None of that changes between opens of
+the same file, so this keeps it, per book:
+
+``index.json``          the locations index (``LocationIndex.to_json``).
+``section-<n>.json``    spine document ``n`` parsed into blocks
+                        (``content.section_to_json``) — layout-free, so it
+                        is shared by every type size and window.
+``pages-<layout>.json`` where each page of each section paginated so far
+                        starts, per layout: the cursor
+                        ``layout.paginate_page`` resumes from and the
+                        offsets position is resolved against.
+
+**A book is its file's identity, not its item id**: path, size and
+modification time, so a re-download is a different book and a cache never
+describes a file it was not built from. **A layout is what it measures**,
+not just what it is called: ``ReaderStyle.key()``, the column, the script
+and :meth:`~.layout.Measurer.fingerprint`, because a font installed or
+updated moves every break without changing a setting.
+
+Everything here is a cache in the ``conffile.cachedir`` sense: any file may
+be missing, stale, truncated or from another version, and each of those is a
+miss that costs the work it would have saved and nothing more. Nothing
+raises out of this module. Writes go to a temporary name and are renamed
+into place, so a reader in another thread (or a crash mid-write) never sees
+half a file. See ``docs/readers.md`` §4.10.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+log = logging.getLogger("epub.cache")
+
+#: Bump when anything written here, or the code that produces it, changes
+#: shape: the block model, the walk, the break cursor. Mixed into every key
+#: with the client version, so an upgrade starts from a clean cache rather
+#: than from one the new code would misread.
+FORMAT = 1
+
+#: Books to keep. Counted rather than sized: a book's entry is its text,
+#: parsed — hundreds of kilobytes for a novel — and the books anybody
+#: reopens are the few they are reading.
+BOOKS_KEPT = 40
+
+
+def _digest(value):
+    return hashlib.sha1(repr(value).encode("utf-8")).hexdigest()[:20]
+
+
+def _version():
+    from ..constants import CLIENT_VERSION
+
+    return (FORMAT, CLIENT_VERSION)
+
+
+class BookCache:
+    """The on-disk entry for one epub file."""
+
+    def __init__(self, root, path):
+        #: The book's own directory, or None when the file cannot be
+        #: stat'ed — in which case every load misses and every store is a
+        #: no-op, which is the same book without the cache.
+        self.dir = None
+        try:
+            st = os.stat(path)
+        except OSError:
+            log.debug("cannot stat %s; not caching it", path, exc_info=True)
+            return
+        self.dir = os.path.join(root, _digest(
+            (_version(), os.path.abspath(path), st.st_size, st.st_mtime_ns)))
+        try:
+            fresh = not os.path.isdir(self.dir)
+            os.makedirs(self.dir, exist_ok=True)
+            # Touched on every open: the directory's mtime is the LRU order
+            # prune() reads.
+            os.utime(self.dir)
+        except OSError:
+            log.debug("book cache unavailable", exc_info=True)
+            self.dir = None
+            return
+        if fresh:
+            prune(root)
+
+    @classmethod
+    def at(cls, directory):
+        """The entry already at ``directory`` (another instance's ``dir``),
+        without stat'ing the book or touching the entry again — for a
+        worker process handed the entry its parent opened
+        (``pagination.py``)."""
+        entry = cls.__new__(cls)
+        entry.dir = directory
+        return entry
+
+    # -- files ------------------------------------------------------------
+
+    def _load(self, name):
+        if self.dir is None:
+            return None
+        try:
+            with open(os.path.join(self.dir, name), "rb") as handle:
+                return json.loads(handle.read().decode("utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            log.debug("book cache %s unreadable", name, exc_info=True)
+            return None
+
+    def _store(self, name, data):
+        if self.dir is None:
+            return
+        try:
+            handle, temp = tempfile.mkstemp(dir=self.dir, suffix=".tmp")
+            try:
+                with os.fdopen(handle, "wb") as out:
+                    out.write(json.dumps(data, separators=(",", ":"))
+                              .encode("utf-8"))
+                os.replace(temp, os.path.join(self.dir, name))
+            except BaseException:
+                try:
+                    os.unlink(temp)
+                except OSError:
+                    pass
+                raise
+        except (OSError, TypeError, ValueError):
+            log.debug("book cache %s not written", name, exc_info=True)
+
+    # -- the locations index ----------------------------------------------
+
+    def load_index(self):
+        from .locations import LocationIndex
+
+        data = self._load("index.json")
+        if data is None:
+            return None
+        try:
+            return LocationIndex.from_json(data)
+        except (KeyError, TypeError, ValueError):
+            log.debug("cached locations index rejected", exc_info=True)
+            return None
+
+    def store_index(self, index):
+        self._store("index.json", index.to_json())
+
+    # -- parsed sections --------------------------------------------------
+
+    def load_section(self, spine_index):
+        from .content import section_from_json
+
+        data = self._load("section-%d.json" % spine_index)
+        if data is None:
+            return None
+        try:
+            return section_from_json(data)
+        except ValueError:
+            log.debug("cached section %d rejected", spine_index,
+                      exc_info=True)
+            return None
+
+    def store_section(self, spine_index, blocks, chars):
+        from .content import section_to_json
+
+        self._store("section-%d.json" % spine_index,
+                    section_to_json(blocks, chars))
+
+    # -- page breaks ------------------------------------------------------
+
+    @staticmethod
+    def layout_name(layout_key):
+        return "pages-%s.json" % _digest(layout_key)
+
+    def load_breaks(self, layout_key, spine_index):
+        """``[(start_offset, end_offset, cursor), ...]`` for one section at
+        one layout, or None."""
+        data = self._load(self.layout_name(layout_key))
+        if not isinstance(data, dict):
+            return None
+        return self._breaks(data.get(str(spine_index)))
+
+    def load_layout(self, layout_key):
+        """``{spine_index: breaks}`` for every section stored at one
+        layout — one read, for a caller that wants them all (the book-wide
+        page count, ``pagination.py``). A section that does not read back
+        is left out."""
+        data = self._load(self.layout_name(layout_key))
+        if not isinstance(data, dict):
+            return {}
+        out = {}
+        for spine, entry in data.items():
+            breaks = self._breaks(entry)
+            if breaks and spine.isdigit():
+                out[int(spine)] = breaks
+        return out
+
+    @staticmethod
+    def _breaks(entry):
+        try:
+            return [(int(start), int(end), (int(block), int(line)))
+                    for start, end, block, line in entry]
+        except (TypeError, ValueError):
+            return None
+
+    def store_breaks(self, layout_key, spine_index, breaks):
+        """Add one section's breaks to its layout's file.
+
+        One file per layout rather than per section: a reader walks a book
+        at one layout, so the sections land in the same file one after
+        another, and a change of type size is one new file rather than one
+        per chapter.
+        """
+        self.store_layout(layout_key, {spine_index: breaks})
+
+    def store_layout(self, layout_key, sections):
+        """:meth:`store_breaks` for several sections, ``{spine_index:
+        breaks}``, in one rewrite of the file."""
+        name = self.layout_name(layout_key)
+        data = self._load(name)
+        if not isinstance(data, dict):
+            data = {}
+        for spine_index, breaks in sections.items():
+            data[str(spine_index)] = [
+                [start, end, cursor[0], cursor[1]]
+                for start, end, cursor in breaks]
+        self._store(name, data)
+
+
+def prune(root, keep=BOOKS_KEPT):
+    """Drop all but the ``keep`` most recently opened books."""
+    try:
+        entries = [os.path.join(root, name) for name in os.listdir(root)]
+        entries = [e for e in entries if os.path.isdir(e)]
+        entries.sort(key=os.path.getmtime, reverse=True)
+    except OSError:
+        log.debug("book cache not pruned", exc_info=True)
+        return
+    for stale in entries[keep:]:
+        shutil.rmtree(stale, ignore_errors=True)
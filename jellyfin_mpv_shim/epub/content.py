@@ -252,6 +252,10 @@ class _Walker:
         self.counted = 0
         self._block = None
         self._pending_anchors = []
+        #: What an element's declarations make of the style it inherits,
+        #: by (:meth:`_styled` key, tag, inherited style). See
+        #: :meth:`_derive`.
+        self._derived = {}
 
     # -- block plumbing ---------------------------------------------------
 
@@ -362,11 +366,64 @@ class _Walker:
         ``!important``, and ``!important`` is not implemented (see
         ``css.py``).
         """
-        decls = {}
+        return self._styled(node)[0]
+
+    def _styled(self, node):
+        """``(decls, key)``: :meth:`_decls_for`, and a key equal for any two
+        elements that got the same declarations for the same reasons — or
+        None when they depend on more than the element (an inline style, a
+        rule looking at ancestors). ``decls`` may be shared; read only."""
         if self.sheet is not None:
-            decls.update(self.sheet.match(node))
-        decls.update(_decls(node.get("style")))
-        return decls
+            decls, key = self.sheet.matched(node)
+        else:
+            decls, key = {}, ()
+        inline = node.get("style")
+        if inline:
+            decls = dict(decls)
+            decls.update(_decls(inline))
+            key = None
+        return decls, key
+
+    def _derive(self, tag, style, decls, key):
+        """``(style, box, margin_left, margin_right)`` for an element:
+        the style its text is set in, and its block properties.
+
+        Remembered by ``key`` and the inherited style: a chapter is
+        thousands of elements in a few dozen distinct (class, context)
+        pairs, and folding the same declarations into the same style for
+        each was a large share of a parse once matching stopped being.
+        """
+        if key is not None:
+            memo = (key, tag, style.bold, style.italic, style.underline,
+                    style.strike, style.mono, style.scale, style.rise,
+                    style.smallcaps)
+            hit = self._derived.get(memo)
+            if hit is not None:
+                return hit
+        inner_style = style
+        flag = _STYLE_TAGS.get(tag)
+        if flag:
+            inner_style = inner_style.with_(**{flag: True})
+        if tag in ("small", "sub", "sup"):
+            inner_style = inner_style.with_(
+                scale=inner_style.scale * (0.8 if tag == "small"
+                                           else _SMALL_SCALE))
+        if tag == "sup":
+            inner_style = inner_style.with_(rise=SUPERSCRIPT_RISE)
+        elif tag == "sub":
+            inner_style = inner_style.with_(rise=SUBSCRIPT_RISE)
+        elif tag == "dt":
+            # A definition list's term is bold in every browser and in
+            # every book that sets one (readers.md §4.8).
+            inner_style = inner_style.with_(bold=True)
+        inner_style = _apply_decls(inner_style, decls)
+        # The stylesheet's own inset, on top of the structural one — verse,
+        # and a letter quoted mid-chapter (readers.md §4.8).
+        out = (inner_style, _box(decls), _margin_em(decls, "margin-left"),
+               _margin_em(decls, "margin-right"))
+        if key is not None:
+            self._derived[memo] = out
+        return out
 
     def _element(self, node, style, align, indent, pre, drawn,
                  right=0.0):
@@ -377,7 +434,7 @@ class _Walker:
             return
         if node.get("id"):
             self._pending_anchors.append(node.get("id"))
-        decls = self._decls_for(node)
+        decls, key = self._styled(node)
         if (node.get("hidden") is not None
                 or decls.get("display") == "none"
                 or decls.get("visibility") == "hidden"):
@@ -420,23 +477,8 @@ class _Walker:
             self.walk(node, style, align, indent, pre, drawn=False)
             return
 
-        inner_style = style
-        flag = _STYLE_TAGS.get(tag)
-        if flag:
-            inner_style = inner_style.with_(**{flag: True})
-        if tag in ("small", "sub", "sup"):
-            inner_style = inner_style.with_(
-                scale=inner_style.scale * (0.8 if tag == "small"
-                                           else _SMALL_SCALE))
-        if tag == "sup":
-            inner_style = inner_style.with_(rise=SUPERSCRIPT_RISE)
-        elif tag == "sub":
-            inner_style = inner_style.with_(rise=SUBSCRIPT_RISE)
-        elif tag == "dt":
-            # A definition list's term is bold in every browser and in
-            # every book that sets one (readers.md §4.8).
-            inner_style = inner_style.with_(bold=True)
-        inner_style = _apply_decls(inner_style, decls)
+        inner_style, box, margin_left, margin_right = self._derive(
+            tag, style, decls, key)
 
         inner_align = align
         if tag == "center":
@@ -458,12 +500,9 @@ class _Walker:
             inner_indent += INDENT_EM
         elif tag in ("ul", "ol", "dl") and self._list_depth(node) > 0:
             inner_indent += INDENT_EM
-        # The stylesheet's own inset, on top of the structural one — verse,
-        # and a letter quoted mid-chapter (readers.md §4.8).
-        inner_indent += _margin_em(decls, "margin-left")
-        inner_right += _margin_em(decls, "margin-right")
+        inner_indent += margin_left
+        inner_right += margin_right
 
-        box = _box(decls)
         if tag in _HEADINGS:
             level = _HEADINGS[tag]
             # The tag's own size is a *default*: a stylesheet that sizes its
@@ -907,3 +946,70 @@ def parse_spine_item(package, index, css_cache=None):
     walker.walk(body, Style(), "", 0, False)
     walker._flush()
     return walker.blocks, walker.counted
+
+
+# -- serialization ---------------------------------------------------------
+
+#: Block attributes written out, beyond ``kind`` and ``spans``. Only those
+#: that differ from a fresh ``Block(kind)`` are, which is most of them most
+#: of the time: a novel is thousands of paragraphs that said nothing.
+_BLOCK_FIELDS = tuple(name for name in Block.__slots__
+                      if name not in ("kind", "spans"))
+
+
+def section_to_json(blocks, chars):
+    """A parsed spine document as plain data, for the disk cache.
+
+    Styles go into a table and spans name them by index: a chapter has
+    thousands of spans and a handful of distinct styles. The inverse is
+    :func:`section_from_json`; ``epub/cache.py`` is the only caller.
+    """
+    styles = []
+    style_ids = {}
+    out = []
+    for block in blocks:
+        default = Block(block.kind)
+        record = {"k": block.kind}
+        for name in _BLOCK_FIELDS:
+            value = getattr(block, name)
+            if value != getattr(default, name):
+                record[name] = value
+        spans = []
+        for span in block.spans:
+            style = span.style
+            fields = (style.bold, style.italic, style.underline,
+                      style.strike, style.mono, style.scale, style.rise,
+                      style.smallcaps)
+            index = style_ids.get(fields)
+            if index is None:
+                index = style_ids[fields] = len(styles)
+                styles.append(list(fields))
+            spans.append([span.text, index, span.char_offset])
+        if spans:
+            record["s"] = spans
+        out.append(record)
+    return {"v": 1, "chars": chars, "styles": styles, "blocks": out}
+
+
+def section_from_json(data):
+    """``(blocks, counted_chars)`` back from :func:`section_to_json`.
+
+    Raises ValueError for anything it did not write, so a cache file from
+    another version is a miss rather than a half-built chapter.
+    """
+    if not isinstance(data, dict) or data.get("v") != 1:
+        raise ValueError("unknown section format")
+    try:
+        styles = [Style(*fields) for fields in data["styles"]]
+        blocks = []
+        for record in data["blocks"]:
+            block = Block(record["k"])
+            for name in _BLOCK_FIELDS:
+                if name in record:
+                    setattr(block, name, record[name])
+            block.spans = [Span(text, styles[index], offset)
+                           for text, index, offset in record.get("s", ())]
+            blocks.append(block)
+        return blocks, int(data["chars"])
+    except (KeyError, IndexError, TypeError) as exc:
+        raise ValueError("malformed section: %s" % exc)
@@ -122,9 +122,25 @@ class Rule:
         else:
             self.key = ("*", "")
 
+    def numbered(self, order):
+        """This rule at another place in source order. Shares everything
+        else, so one parse can serve every sheet that links the file."""
+        out = Rule.__new__(Rule)
+        out.parts, out.decls, out.spec, out.key = (
+            self.parts, self.decls, self.spec, self.key)
+        out.order = order
+        return out
+
     def matches(self, node):
-        if not self.parts[-1][1].matches(node):
-            return False
+        return self.parts[-1][1].matches(node) and self.matches_above(node)
+
+    def matches_above(self, node):
+        """Whether the ancestors fit, given that ``node`` itself does.
+
+        Always true for a one-compound rule — which is most of them, and
+        why :meth:`Stylesheet.matched` can remember what applies to an
+        element from the element alone.
+        """
         # Walk leftwards through the ancestors. A descendant combinator may
         # skip generations and so needs backtracking in general; this does
         # the greedy walk instead, which is exact for child combinators and
@@ -144,6 +160,14 @@ class Rule:
         return True
 
 
+#: Distinct elements remembered per stylesheet by :meth:`Stylesheet.matched`.
+#: An element is its tag, its class attribute and (only when some rule names
+#: it) its id, so a Calibre book of 400 classes is a few hundred of these and
+#: a hand-made one a few dozen; the cap is for the book that generates a
+#: class per paragraph, where remembering would cost more than it saves.
+MEMO_ENTRIES = 4096
+
+
 class Stylesheet:
     """Parsed rules, indexed, with one method that matters: :meth:`match`."""
 
@@ -153,23 +177,32 @@ class Stylesheet:
         self._by_tag = {}
         self._universal = []
         self._count = 0
+        #: (tag, id, class attribute) -> (rules, decls). See :meth:`matched`.
+        self._memo = {}
 
     def add(self, text):
         """Parse and append a stylesheet's text. Never raises."""
-        try:
-            for rule in _parse(text, self._count):
-                self._count += 1
-                kind, name = rule.key
-                if kind == "#":
-                    self._by_id.setdefault(name, []).append(rule)
-                elif kind == ".":
-                    self._by_class.setdefault(name, []).append(rule)
-                elif kind == "e":
-                    self._by_tag.setdefault(name, []).append(rule)
-                else:
-                    self._universal.append(rule)
-        except Exception:
-            log.debug("stylesheet ignored", exc_info=True)
+        self.extend(parse(text))
+
+    def extend(self, rules):
+        """Append rules from :func:`parse`, after those already here.
+
+        The rules themselves are left as they are, so one parse of a
+        linked file serves every chapter's sheet.
+        """
+        for rule in rules:
+            rule = rule.numbered(self._count)
+            self._count += 1
+            kind, name = rule.key
+            if kind == "#":
+                self._by_id.setdefault(name, []).append(rule)
+            elif kind == ".":
+                self._by_class.setdefault(name, []).append(rule)
+            elif kind == "e":
+                self._by_tag.setdefault(name, []).append(rule)
+            else:
+                self._universal.append(rule)
+        self._memo.clear()
 
     def match(self, node):
         """Merged declarations for ``node``, weakest first.
@@ -178,27 +211,79 @@ class Stylesheet:
         merged here — the content walker applies that afterwards, which is
         the right order and keeps this function about the sheet.
         """
-        candidates = []
+        return dict(self.matched(node)[0])
+
+    def matched(self, node):
+        """``(decls, key)``: :meth:`match` without the copy, and what it
+        depended on.
+
+        ``decls`` may be shared with other elements and must not be
+        modified. ``key`` is hashable and equal for any two elements given
+        the same declarations *by the element alone* — None when a rule
+        that applies looks at the ancestors, because then two elements
+        with the same tag and classes can still differ.
+
+        Which rules could apply is worked out once per distinct element
+        (tag, class attribute, and the id only when a rule names it) and
+        remembered, in cascade order: a chapter is thousands of elements
+        and a handful of distinct ones, and sorting the same candidates for
+        each is most of what matching used to cost. See ``docs/readers.md``
+        §4.13.
+        """
         node_id = node.get("id")
+        if node_id and node_id not in self._by_id:
+            node_id = None
+        key = (node.tag, node_id, node.get("class") or "")
+        entry = self._memo.get(key)
+        if entry is None:
+            entry = self._candidates(node, node_id)
+            if len(self._memo) < MEMO_ENTRIES:
+                self._memo[key] = entry
+        rules, decls = entry
+        if decls is not None:
+            return decls, key
+        out = {}
+        for rule in rules:
+            if len(rule.parts) == 1 or rule.matches_above(node):
+                out.update(rule.decls)
+        return out, None
+
+    def _candidates(self, node, node_id):
+        """``(rules, decls)`` for :meth:`matched`: the rules whose rightmost
+        compound fits ``node``, weakest first, and their merged
+        declarations when none of them has ancestors to check (else
+        None)."""
+        candidates = []
         if node_id:
             candidates += self._by_id.get(node_id, ())
-        classes = (node.get("class") or "").split()
-        for cls in classes:
+        for cls in set((node.get("class") or "").split()):
             candidates += self._by_class.get(cls, ())
         candidates += self._by_tag.get(node.tag, ())
         candidates += self._universal
-        if not candidates:
-            return {}
-        out = {}
-        for rule in sorted(candidates, key=lambda r: (r.spec, r.order)):
-            if rule.matches(node):
-                out.update(rule.decls)
-        return out
+        rules = tuple(rule for rule in sorted(
+            candidates, key=lambda r: (r.spec, r.order))
+            if rule.parts[-1][1].matches(node))
+        if any(len(rule.parts) > 1 for rule in rules):
+            return rules, None
+        decls = {}
+        for rule in rules:
+            decls.update(rule.decls)
+        return rules, decls
 
     def __len__(self):
         return self._count
 
 
+def parse(text):
+    """A stylesheet's text as a list of :class:`Rule`, in source order.
+    Never raises: a sheet this cannot read is a sheet with no rules."""
+    try:
+        return _parse(text, 0)
+    except Exception:
+        log.debug("stylesheet ignored", exc_info=True)
+        return []
+
+
 def _parse(text, order_base):
     text = _COMMENT.sub(" ", text)
     # At-rules: drop the prelude, and for a block at-rule drop its whole
@@ -357,13 +442,17 @@ def _compound(token):
 def sheet_for(package, doc_href, root, cache):
     """The stylesheet applying to one spine document.
 
-    ``cache`` is a dict owned by the caller, keyed by stylesheet path: a
-    book has two or three sheets shared by every chapter, and re-parsing
-    them per document is most of the cost of opening one.
+    ``cache`` is a dict owned by the caller, kept for the book. It holds
+    each linked stylesheet's parsed rules by path, and each *built* sheet by
+    what went into it: a book's chapters link the same two or three sheets,
+    so they share one :class:`Stylesheet` — with one memory of what matched
+    (:meth:`Stylesheet.matched`) — and a chapter with a ``<style>`` of its
+    own still parses only that. Re-parsing the same text per chapter was
+    most of the cost of opening a book.
     """
     from .archive import EpubError
 
-    sheet = Stylesheet()
+    sources = []
     for link in root.find_all("link"):
         rel = (link.get("rel") or "").lower()
         media_type = (link.get("type") or "").lower()
@@ -374,13 +463,25 @@ def sheet_for(package, doc_href, root, cache):
             continue
         if href not in cache:
             try:
-                cache[href] = package.archive.read_text(href, MAX_CSS_BYTES)
+                text = package.archive.read_text(href, MAX_CSS_BYTES)
             except EpubError:
                 log.debug("stylesheet %s unreadable", href, exc_info=True)
-                cache[href] = ""
-        sheet.add(cache[href])
+                text = ""
+            cache[href] = parse(text)
+        sources.append(("link", href))
     for style in root.find_all("style"):
-        sheet.add(style.text()[:MAX_CSS_BYTES])
+        sources.append(("style", style.text()[:MAX_CSS_BYTES]))
+    # Tuple keys cannot collide with the paths above, which are strings.
+    key = ("sheet",) + tuple(sources)
+    sheet = cache.get(key)
+    if sheet is None:
+        sheet = Stylesheet()
+        for kind, source in sources:
+            if kind == "link":
+                sheet.extend(cache[source])
+            else:
+                sheet.add(source)
+        cache[key] = sheet
     return sheet
 
 
@@ -15,6 +15,8 @@ offset is the state. Both, and what they cost, are ``docs/readers.md`` §4.4.
 """
 
 import logging
+import threading
+from collections import OrderedDict
 
 from .content import HEADING, IMAGE, PARA, RULE
 
@@ -34,6 +36,26 @@ DEFAULT_HEADING_SPACE = 1.1
 #: its own) trips it.
 MAX_JUSTIFY_STRETCH = 5.0
 
+#: Paragraphs whose optimal breaks (:func:`_optimal_breaks`) are kept, across
+#: every book and layout. Keyed by what the breaks depend on — the text and
+#: its styles, the type size and face, the line widths — so a window resize
+#: inside the measure cap, or a toggle that moves no widths (justification,
+#: the page colour), re-breaks nothing, and a change that does re-breaks
+#: only the paragraphs it reached. A novel chapter is a few hundred.
+PARAGRAPH_CACHE = 2048
+
+#: Knuth and Plass's own constants, in their units: the cost of a line
+#: simply existing (what makes fewer lines win between two equally even
+#: settings), and of ending one at a hyphen the author wrote.
+_LINE_PENALTY = 10
+_HYPHEN_PENALTY = 50
+
+#: Most line starts the optimal breaker keeps open at once. A start falls
+#: out on its own when the text from it no longer fits a line, so this is
+#: a bound for CJK, where every character is a break and a line is forty
+#: of them; the cheapest are kept.
+OPTIMAL_WINDOW = 48
+
 #: Characters after which a line may break even with no space — CJK, and the
 #: punctuation that must not start a line is handled by never breaking
 #: *before* it.
@@ -57,7 +79,7 @@ class ReaderStyle:
 
     def __init__(self, font_px=21, font_kind="serif", line_spacing=1.5,
                  margin_x=64, margin_y=48, max_measure=34.0, justify=True,
-                 paragraph_indent=True):
+                 paragraph_indent=True, optimal_breaks=False):
         self.font_px = font_px
         self.font_kind = font_kind
         self.line_spacing = line_spacing
@@ -73,6 +95,11 @@ class ReaderStyle:
         #: (the book convention) or a blank line (the web convention). A
         #: book that states either in its CSS keeps what it stated.
         self.paragraph_indent = paragraph_indent
+        #: Break each paragraph's lines as a whole (Knuth–Plass) rather than
+        #: one line at a time: the spacing evens out across the paragraph
+        #: instead of piling up on the line before a long word. See
+        #: ``docs/readers.md`` §4.14.
+        self.optimal_breaks = optimal_breaks
 
     def column(self, width):
         """``(column width, left offset)`` for ``width`` px of drawable area.
@@ -89,7 +116,7 @@ class ReaderStyle:
     def key(self):
         return (self.font_px, self.font_kind, round(self.line_spacing, 3),
                 self.margin_x, self.margin_y, round(self.max_measure, 3),
-                self.justify, self.paragraph_indent)
+                self.justify, self.paragraph_indent, self.optimal_breaks)
 
 
 class Measurer:
@@ -106,6 +133,7 @@ class Measurer:
         self.script = script
         self._widths = {}
         self._fonts = {}
+        self._fingerprint = None
 
     def size_for(self, span_style):
         return max(8, int(round(self.style.font_px * span_style.scale)))
@@ -157,6 +185,27 @@ class Measurer:
 
         return fonts.metrics(self.font(span_style))[0]
 
+    def fingerprint(self):
+        """What the faces this measurer resolved actually measure.
+
+        For a layout key that outlives the process (``epub/cache.py``): the
+        style names a face, and which file answers to that name is up to
+        the system — install a font and every page break moves while
+        :meth:`ReaderStyle.key` stays the same. Measuring beats naming the
+        files, because it also catches a face that was updated in place.
+        """
+        if self._fingerprint is None:
+            from .content import Style
+
+            sample = "Hamburgefonstiv 0123"
+            out = []
+            for style in (Style(), Style(bold=True), Style(italic=True),
+                          Style(mono=True)):
+                out.append(round(self.width(sample, style), 2))
+                out.append(self.line_height(style))
+            self._fingerprint = tuple(out)
+        return self._fingerprint
+
 
 class Piece:
     """A run of text placed on a line, ready to draw."""
@@ -231,9 +280,10 @@ class Page:
     """One screenful of a spine document."""
 
     __slots__ = ("spine_index", "number", "items", "start_offset",
-                 "end_offset")
+                 "end_offset", "cursor")
 
-    def __init__(self, spine_index, number, items, start_offset, end_offset):
+    def __init__(self, spine_index, number, items, start_offset, end_offset,
+                 cursor=(0, 0)):
         self.spine_index = spine_index
         #: Zero-based page number *within this document*.
         self.number = number
@@ -243,6 +293,11 @@ class Page:
         #: reports ``locations.start.cfi`` — the start of the visible page.
         self.start_offset = start_offset
         self.end_offset = end_offset
+        #: ``(block index, line index)`` of the first thing on the page —
+        #: where :func:`paginate_page` picks the flow up to lay this page out
+        #: again on its own. Not an offset: two lines can share one (an
+        #: image and the line under it), and a break has to be exact.
+        self.cursor = cursor
 
     def __repr__(self):
         return "<Page %d.%d %d items @%d>" % (self.spine_index, self.number,
@@ -253,15 +308,25 @@ class Page:
 class _Flow:
     """Fills pages with items, and knows when to start a new one."""
 
-    def __init__(self, spine_index, width, height):
+    def __init__(self, spine_index, width, height, first_number=0,
+                 limit=0):
         self.spine_index = spine_index
         self.width = width
         self.height = height
         self.pages = []
+        #: Number of the first page this flow emits, and how many it may
+        #: emit before :class:`_PageFull` stops it (0: no limit). Both are
+        #: for :func:`paginate_page`, which lays out one page mid-document.
+        self.first_number = first_number
+        self.limit = limit
+        #: ``(block, line)`` of the item about to be placed, kept current
+        #: by :func:`_flow_blocks`; the first one on a page is its cursor.
+        self.cursor = (0, 0)
         self._items = []
         self._y = 0
         self._start = 0
         self._end = 0
+        self._first = (0, 0)
         self._pending_space = 0
 
     def space(self, amount):
@@ -280,7 +345,7 @@ class _Flow:
         fit. Returns the y to place at."""
         gap = self._pending_space if self._items else 0
         if self._items and self._y + gap + height > self.height:
-            self.flush()
+            self._break()
             gap = 0
         self._pending_space = 0
         y = self._y + gap
@@ -315,19 +380,27 @@ class _Flow:
     def _place(self, item, char_offset):
         if not self._items:
             self._start = char_offset
+            self._first = self.cursor
         self._items.append(item)
         self._end = max(self._end, char_offset)
 
     def break_page(self):
         """Force a page break (``page-break-before``)."""
         if self._items:
-            self.flush()
+            self._break()
+
+    def _break(self):
+        self.flush()
+        if self.limit and len(self.pages) >= self.limit:
+            raise _PageFull()
 
     def flush(self):
         if not self._items:
             return
-        self.pages.append(Page(self.spine_index, len(self.pages),
-                               self._items, self._start, self._end))
+        self.pages.append(Page(self.spine_index,
+                               self.first_number + len(self.pages),
+                               self._items, self._start, self._end,
+                               self._first))
         self._items = []
         self._y = 0
         self._pending_space = 0
@@ -338,7 +411,8 @@ class _Flow:
             # A document with nothing drawable still needs a page, or the
             # reader has nowhere to be while it is on this spine item and
             # paging forward walks off the end of an empty list.
-            self.pages.append(Page(self.spine_index, 0, [], 0, 0))
+            self.pages.append(Page(self.spine_index, self.first_number,
+                                   [], 0, 0, self.cursor))
         return self.pages
 
 
@@ -351,15 +425,52 @@ def paginate(blocks, width, height, measurer, image_size=None,
     than guessed at, because a guess that is wrong pushes every page
     boundary after it.
     """
+    flow = _Flow(spine_index, width, height)
+    _flow_blocks(flow, blocks, measurer, image_size)
+    return flow.finish()
+
+
+def paginate_page(blocks, width, height, measurer, image_size=None,
+                  spine_index=0, number=0, cursor=(0, 0)):
+    """Lay out the one page that starts at ``cursor``, on its own.
+
+    ``cursor`` is a :attr:`Page.cursor` from an earlier :func:`paginate` at
+    the same layout, and the page that comes back is the page that call
+    made — the flow is picked up at that block and line and stopped at the
+    next break. What makes that exact is that nothing carries across a page
+    break: the space pending above the first item is dropped there either
+    way, and every line is wrapped from its own block alone. It is what
+    lets a book reopened from the disk cache (``epub/cache.py``) draw page
+    40 of a chapter without laying out the 39 before it.
+    """
+    flow = _Flow(spine_index, width, height, first_number=number, limit=1)
+    try:
+        _flow_blocks(flow, blocks, measurer, image_size, cursor)
+    except _PageFull:
+        pass
+    pages = flow.finish()
+    return pages[0]
+
+
+class _PageFull(Exception):
+    """A limited :class:`_Flow` has emitted all the pages it may."""
+
+
+def _flow_blocks(flow, blocks, measurer, image_size, start=(0, 0)):
+    """Place ``blocks`` into ``flow`` from ``start``, a ``(block, line)``
+    cursor; the lines of that block before it are wrapped and skipped."""
     style = measurer.style
     em = style.font_px
-    flow = _Flow(spine_index, width, height)
+    first_block, first_line = start
     previous_after = 0.0
-    for block in blocks:
+    for number in range(max(0, first_block), len(blocks)):
+        block = blocks[number]
+        skip = first_line if number == first_block else 0
+        flow.cursor = (number, 0)
         if block.page_break:
             flow.break_page()
         indent = int(block.indent * em)
-        avail = max(em, width - indent - int(block.indent_right * em))
+        avail = max(em, flow.width - indent - int(block.indent_right * em))
         before, after = _block_space(block, style)
         flow.space(int(max(before, previous_after) * em))
         previous_after = after
@@ -370,20 +481,22 @@ def paginate(blocks, width, height, measurer, image_size=None,
                           max(2, em // 6) * 2)
             continue
         if block.kind == IMAGE:
-            _place_image(flow, block, indent, avail, height, em,
+            _place_image(flow, block, indent, avail, flow.height, em,
                          image_size)
             continue
         lines = _wrap(block, avail, measurer, indent)
+        first = 0
         if block.dropcap:
             # The capital is drawn on the first line but sits on the
             # baseline of the last one it spans, so those lines cannot be
             # split across a page break — the letter would go with the
             # first and its baseline would point off the bottom.
-            flow.add_lines(lines[:_dropcap_lines(block, measurer)])
-            lines = lines[_dropcap_lines(block, measurer):]
-        for line in lines:
-            flow.add_line(line)
-    return flow.finish()
+            first = _dropcap_lines(block, measurer)
+            if skip < first:
+                flow.add_lines(lines[:first])
+        for index in range(max(first, skip), len(lines)):
+            flow.cursor = (number, index)
+            flow.add_line(lines[index])
 
 
 def _block_space(block, style):
@@ -639,21 +752,6 @@ def _wrap(block, avail, measurer, indent):
     style = measurer.style
     em = style.font_px
     cap = block.dropcap_span()
-    tokens = _tokenize(block, measurer,
-                       block.spans[1:] if cap is not None else None)
-    if cap is not None and not tokens:
-        # The capital was the whole paragraph. `_add_dropcap` only fires
-        # when there are lines to hang it on, so this used to emit nothing
-        # at all — a chapter number set at 2.6em on its own line, or an
-        # ornament divider, vanished silently with no gap where it was.
-        # Set it as ordinary (large) text instead.
-        cap = None
-        tokens = _tokenize(block, measurer)
-    if not tokens:
-        return []
-    align = block.align or ("justify" if style.justify else "left")
-    if block.kind == HEADING and not block.align:
-        align = "left"
     first_indent = block.first_indent
     if first_indent is None:
         first_indent = (0.0 if block.kind == HEADING or block.marker
@@ -665,17 +763,97 @@ def _wrap(block, avail, measurer, indent):
     # `cap_lines` lines start after it, the rest are full measure.
     gutter, cap_lines = 0, 0
     if cap is not None:
-        first_indent = 0.0
         gutter = int(measurer.width(cap.text.strip(), cap.style) + em * 0.14)
         cap_lines = _dropcap_lines(block, measurer)
 
+    key = None
+    if style.optimal_breaks:
+        key = (_paragraph_key(block), avail, int(first_indent * em), gutter,
+               cap_lines, style.font_px, style.font_kind, measurer.script)
+        with _paragraphs_lock:
+            hit = _paragraphs.get(key)
+            if hit is not None:
+                _paragraphs.move_to_end(key)
+    else:
+        hit = None
+    if hit is not None:
+        tokens, cap_used, breaks = hit
+        if not cap_used:
+            cap = None
+    else:
+        tokens = _tokenize(block, measurer,
+                           block.spans[1:] if cap is not None else None)
+        if cap is not None and not tokens:
+            # The capital was the whole paragraph. `_add_dropcap` only
+            # fires when there are lines to hang it on, so this used to
+            # emit nothing at all — a chapter number set at 2.6em on its
+            # own line, or an ornament divider, vanished silently with no
+            # gap where it was. Set it as ordinary (large) text instead.
+            cap = None
+            tokens = _tokenize(block, measurer)
+        breaks = None
+    if not tokens:
+        return []
+    align = block.align or ("justify" if style.justify else "left")
+    if block.kind == HEADING and not block.align:
+        align = "left"
+    if cap is not None:
+        first_indent = 0.0
+    else:
+        gutter, cap_lines = 0, 0
+
     def start_of(index):
         return gutter if index < cap_lines else 0
 
+    first_start = int(first_indent * em) + start_of(0)
+    if key is not None and hit is None:
+        breaks = _optimal_breaks(tokens, avail, first_start, start_of, em)
+        with _paragraphs_lock:
+            _paragraphs[key] = (tokens, cap is not None, breaks)
+            while len(_paragraphs) > PARAGRAPH_CACHE:
+                _paragraphs.popitem(last=False)
+    if breaks is not None:
+        lines = [(tokens[start:end], sum(t.width for t in tokens[start:end]),
+                  line_start, last)
+                 for start, end, line_start, last in breaks]
+    else:
+        lines = _greedy_lines(tokens, avail, first_start, start_of)
+
+    out = []
+    for tokens_on_line, used, start_x, last in lines:
+        while tokens_on_line and tokens_on_line[-1].space:
+            used -= tokens_on_line[-1].width
+            tokens_on_line.pop()
+        if not tokens_on_line:
+            # An empty line still occupies its height: it is a `<br>` on its
+            # own, which is how books space out scene changes.
+            blank = block.spans[0].style if block.spans else None
+            if blank is not None:
+                out.append(Line(0, measurer.line_height(blank),
+                                measurer.ascent(blank), [],
+                                block.char_offset, block))
+            continue
+        out.append(_place_line(tokens_on_line, used, start_x + indent,
+                               indent + avail, align, last, measurer, block))
+    if out and cap is not None:
+        _add_dropcap(out[0], cap, indent, measurer)
+    if out and block.marker and marker_style is not None:
+        _add_marker(out[0], block.marker, indent, measurer, marker_style)
+    return out
+
+
+def _greedy_lines(tokens, avail, first_start, start_of):
+    """One line at a time: each line takes every token that fits.
+
+    ``[(tokens, width, line_start, last), ...]``, ``line_start`` the indent
+    of the line from the block's left edge (``first_start`` for the first,
+    ``start_of(n)`` after), and ``last`` whether the line ends a paragraph
+    or a hard break — which is set unjustified.
+    """
     lines = []
     current = []
     width_used = 0.0
-    line_start = int(first_indent * em) + start_of(0)
+    line_start = first_start
     for token in tokens:
         if token.hard:
             lines.append((current, width_used, line_start, True))
@@ -694,30 +872,175 @@ def _wrap(block, avail, measurer, indent):
         width_used += token.width
     if current:
         lines.append((current, width_used, line_start, True))
+    return lines
+
+
+#: Optimal breaks by paragraph, most recently used last. See
+#: PARAGRAPH_CACHE; a lock because the pages around the one being read are
+#: laid out on the pool (readers.md §4.12) while the reader lays out its own.
+_paragraphs = OrderedDict()
+_paragraphs_lock = threading.Lock()
+
+
+def _paragraph_key(block):
+    """What a block's breaks depend on, of the block itself: its text, the
+    styles it is set in, where it counts from, and whether it is
+    preformatted."""
+    return (block.pre, block.char_offset, block.dropcap,
+            tuple((span.text, span.style, span.char_offset)
+                  for span in block.spans))
+
 
+def _optimal_breaks(tokens, avail, first_start, start_of, em):
+    """Break a paragraph's tokens where the whole paragraph is set most
+    evenly (Knuth and Plass), or None to leave it to :func:`_greedy_lines`.
+
+    ``[(start, end, line_start, last), ...]`` as token indexes. Each
+    stretch between hard breaks is a paragraph of its own, numbered on
+    from the lines before it so a drop capital's gutter and the first-line
+    indent land where the greedy breaker puts them. A line with no room
+    for even its one word is something no choice of breaks mends; that
+    paragraph goes back to the greedy breaker, which sets it as it always
+    has.
+    """
     out = []
-    for tokens_on_line, used, start_x, last in lines:
-        while tokens_on_line and tokens_on_line[-1].space:
-            used -= tokens_on_line[-1].width
-            tokens_on_line.pop()
-        if not tokens_on_line:
-            # An empty line still occupies its height: it is a `<br>` on its
-            # own, which is how books space out scene changes.
-            blank = block.spans[0].style if block.spans else None
-            if blank is not None:
-                out.append(Line(0, measurer.line_height(blank),
-                                measurer.ascent(blank), [],
-                                block.char_offset, block))
-            continue
-        out.append(_place_line(tokens_on_line, used, start_x + indent,
-                               indent + avail, align, last, measurer, block))
-    if out and cap is not None:
-        _add_dropcap(out[0], cap, indent, measurer)
-    if out and block.marker and marker_style is not None:
-        _add_marker(out[0], block.marker, indent, measurer, marker_style)
+    start = 0
+    count = len(tokens)
+    while start <= count:
+        end = start
+        while end < count and not tokens[end].hard:
+            end += 1
+        hard = end < count
+        first = start
+        while first < end and tokens[first].space:
+            first += 1
+        if first == end:
+            if hard:
+                line = len(out)
+                out.append((first, first,
+                            first_start if line == 0 else start_of(line),
+                            True))
+        else:
+            lines = None
+            for tolerance in (100 * MAX_JUSTIFY_STRETCH ** 3, float("inf")):
+                lines = _knuth_plass(tokens, first, end, len(out), avail,
+                                     first_start, start_of, em, tolerance)
+                if lines is not None:
+                    break
+            if lines is None:
+                return None
+            out += lines
+        if not hard:
+            break
+        start = end + 1
     return out
 
 
+def _knuth_plass(tokens, first, end, base, avail, first_start, start_of, em,
+                 tolerance):
+    """The breaks of ``tokens[first:end]``, set as lines ``base`` onwards.
+
+    Boxes are the words, glue the spaces, which stretch (never shrink: the
+    justifier only widens). A line's badness is ``100 r³``, r how far its
+    spaces stretch in multiples of their own width — the measure
+    ``MAX_JUSTIFY_STRETCH`` is in, which is what ``tolerance`` is made of —
+    and the last line is free. Demerits are Knuth's. None when no line
+    within ``tolerance`` reaches the end.
+    """
+    # Prefix sums from token 0, so a line's width and its stretch are two
+    # subtractions by token index.
+    width = [0.0] * (end + 1)
+    stretch = [0.0] * (end + 1)
+    for index in range(first, end):
+        token = tokens[index]
+        width[index + 1] = width[index] + token.width
+        stretch[index + 1] = stretch[index] + (token.width if token.space
+                                               else 0.0)
+
+    # Where a line may end: at the first space of a run (the run is
+    # dropped, the next line starts after it), after a hyphen the author
+    # wrote, and around a CJK character — the breaks the greedy breaker
+    # takes, less the ones only an overfull line forces on it.
+    candidates = []
+    index = first + 1
+    while index < end:
+        token = tokens[index]
+        before = tokens[index - 1]
+        if token.space and not before.space:
+            after = index
+            while after < end and tokens[after].space:
+                after += 1
+            if after < end and tokens[after].text[:1] not in _NO_LINE_START:
+                candidates.append((index, after, 0))
+            index = after
+            continue
+        if (not token.space and not before.space and token.text
+                and token.text[0] not in _NO_LINE_START
+                and before.text
+                and (before.text[-1] in _BREAK_AFTER or _is_cjk(before.text[-1])
+                     or _is_cjk(token.text[0]))):
+            candidates.append((index, index,
+                               _HYPHEN_PENALTY
+                               if before.text[-1] in _BREAK_AFTER else 0))
+        index += 1
+    candidates.append((end, end, 0))
+
+    # A line's measure depends on its number only up to the drop capital's
+    # last line; past that every line is alike, so nodes past it share one.
+    plain = base
+    while start_of(plain) or plain == 0:
+        plain += 1
+
+    def measure(line):
+        return avail - (first_start if line == 0 else start_of(line))
+
+    # Active nodes: (demerits, start token, line number, chain). The chain
+    # is the breaks so far, newest first, as nested pairs.
+    active = [(0.0, first, base, None)]
+    for stop, resume, penalty in candidates:
+        last = stop == end
+        found = {}
+        keep = []
+        for node in active:
+            demerits, start, line, chain = node
+            natural = width[stop] - width[start]
+            room = measure(line)
+            if natural > room:
+                continue                 # and will not fit any later stop
+            keep.append(node)
+            if last:
+                badness = 0.0
+            else:
+                give = stretch[stop] - stretch[start] or em / 3.0
+                badness = 100.0 * ((room - natural) / give) ** 3
+                if badness > tolerance:
+                    continue
+            total = demerits + (_LINE_PENALTY + badness) ** 2 + penalty ** 2
+            key = (resume, min(line + 1, plain))
+            if key not in found or total < found[key][0]:
+                found[key] = (total, resume, line + 1,
+                              ((start, stop, line, last), chain))
+        if last:
+            if not found:
+                return None
+            best = min(found.values(), key=lambda n: n[0])
+            lines = []
+            chain = best[3]
+            while chain is not None:
+                (start, stop, line, is_last), chain = chain
+                lines.append((start, stop,
+                              first_start if line == 0 else start_of(line),
+                              is_last))
+            lines.reverse()
+            return lines
+        active = keep + list(found.values())
+        if not active:
+            return None
+        if len(active) > OPTIMAL_WINDOW:
+            active = sorted(active, key=lambda n: n[0])[:OPTIMAL_WINDOW]
+    return None
+
+
 def _add_dropcap(line, cap, indent, measurer):
     """Hang the capital in the gutter the lines were set around.
 
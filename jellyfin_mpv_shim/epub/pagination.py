@@ -0,0 +1,153 @@
+"""Every section of a book laid out at once, for "page 4 of 312".
+
+Pagination is per spine document (``layout.py``), so the reader knows the
+page it is on within a chapter and nothing about the book — a book-wide
+page number needs every section laid out at the current layout, and doing
+that on one thread is a whole book's worth of layout. This is the job that
+does it in parallel instead:
+
+* **On processes, not threads.** Layout is pure Python and holds the GIL
+  the whole time; a thread pool would count the book no faster and would
+  take the loop thread's time while doing it. ``layout`` and ``content``
+  import nothing from the toolkit, so a worker is a clean interpreter with
+  this package and Pillow in it — started with ``spawn``, for the reasons
+  ``mpv_shim._use_spawn_start_method`` gives for the tray child.
+* **Each worker opens the book itself.** Only the path, the spine index
+  and the layout cross the process boundary; what comes back is the
+  section's breaks (``cache.BookCache.load_breaks``' shape), which is all a
+  page count and a later page needs. A section already parsed on disk is
+  read back rather than parsed again, and one that was not is written for
+  the reader to find.
+* **One pool per process, kept.** Its workers start on the first book
+  counted and stay for the next one: a spawned interpreter is most of a
+  second before it lays out anything, and a reader who opens three books
+  should not pay that three times. A job that stops cancels what it had
+  queued, so the next book does not wait behind the last one's sections.
+* **The parent writes the breaks.** One file per layout is read, changed
+  and written per section (``BookCache.store_breaks``); two processes doing
+  that at once would lose sections, so the workers never do.
+
+:meth:`.EpubDocument.paginate_book` is the caller; see
+``docs/readers.md`` §4.15.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from . import archive, cache, content, layout, paint
+
+log = logging.getLogger("epub.pagination")
+
+#: Most worker processes a book is counted on. Each is an interpreter with
+#: the book's faces loaded, and past four the sections a novel has finish
+#: before more workers pay for their start-up.
+MAX_WORKERS = 4
+
+#: Books a worker keeps open. A pool counts one book; this only spares a
+#: worker re-reading the package and re-parsing the stylesheet for every
+#: section it is handed.
+_OPEN_BOOKS = 2
+
+#: path -> (package, css cache, {src: image size}), per worker process.
+_books = {}
+
+#: The process's pool, made by the first :func:`pool` call.
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def workers():
+    """How many processes to count on: a core is left for the reader."""
+    return max(1, min(MAX_WORKERS, (os.cpu_count() or 1) - 1))
+
+
+def pool():
+    """The process pool to hand :func:`paginate_section` to.
+
+    One for the process, made on first use and shared by every book after
+    it. Its workers are started as work arrives rather than up front, so a
+    book of two sections starts two.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers(),
+                mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def discard(executor):
+    """Stop handing out ``executor`` if it is the shared pool: one of its
+    workers died, and a broken pool takes no more work. The next
+    :func:`pool` call makes a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is executor:
+            _pool = None
+
+
+def shutdown():
+    """Cancel what the shared pool has queued and let its workers go; for
+    quitting. Sections already being laid out are not waited for."""
+    global _pool
+    with _pool_lock:
+        executor, _pool = _pool, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _open(path):
+    hit = _books.get(path)
+    if hit is None:
+        while len(_books) >= _OPEN_BOOKS:
+            _books.pop(next(iter(_books)))
+        hit = _books[path] = (archive.open_epub(path), {}, {})
+    return hit
+
+
+def paginate_section(path, spine_index, style, script, viewport,
+                     book_dir=None):
+    """Lay out one section of the book at ``path``; the worker's job.
+
+    Returns ``(spine_index, breaks, fingerprint)``: the breaks as
+    :meth:`.Pages.of` would record them, and what this process's faces
+    measure (:meth:`.layout.Measurer.fingerprint`), so the caller can refuse
+    breaks made with faces other than its own. ``book_dir`` is the book's
+    cache entry (``BookCache.dir``), for the parsed section.
+    """
+    package, css_cache, sizes = _open(path)
+    disk = cache.BookCache.at(book_dir) if book_dir else None
+    hit = disk.load_section(spine_index) if disk is not None else None
+    if hit is not None:
+        blocks, _chars = hit
+    else:
+        try:
+            blocks, chars = content.parse_spine_item(package, spine_index,
+                                                     css_cache)
+        except archive.EpubError:
+            log.info("spine %d unreadable", spine_index, exc_info=True)
+            blocks = []
+        else:
+            if disk is not None:
+                disk.store_section(spine_index, blocks, chars)
+
+    def image_size(src):
+        if src not in sizes:
+            try:
+                sizes[src] = paint.image_size(
+                    package.archive.read(src, archive.MAX_IMAGE_BYTES))
+            except archive.EpubError:
+                sizes[src] = None
+        return sizes[src]
+
+    measurer = layout.Measurer(style, script)
+    width, height = viewport
+    pages = layout.paginate(blocks, width, height, measurer, image_size,
+                            spine_index)
+    return (spine_index,
+            [(p.start_offset, p.end_offset, p.cursor) for p in pages],
+            measurer.fingerprint())
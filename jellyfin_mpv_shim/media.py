@@ -220,6 +220,11 @@ def segment_labels(segment_type):
 
 
 class Video(object):
+    #: (auth_via_header, url) resolved ahead of the advance to this item by
+    #: the player's AdvanceMixin, and taken by the first get_playback_url
+    #: that asks for the same thing. None otherwise.
+    _preresolved = None
+
     def __init__(
         self,
         item_id: str,
@@ -449,6 +454,35 @@ class Video(object):
         else:
             return settings.remote_kbps
 
+    def is_live(self):
+        """Whether this item is a live stream: a channel, or a source the
+        server says never ends. PlaybackInfo OPENS these (a tuner), so they
+        are never resolved before the user actually starts one."""
+        if self.item.get("Type") in ("TvChannel", "LiveTvChannel",
+                                     "LiveTvProgram", "Program"):
+            return True
+        return any(source.get("IsInfiniteStream")
+                   or source.get("RequiresOpening")
+                   for source in self.item.get("MediaSources") or [])
+
+    def preresolve(self, auth_via_header: bool):
+        """Resolve the playback url now, for a start that comes later.
+
+        The player calls this on its own thread near the end of the previous
+        item (see player_advance). ``auth_via_header`` is its prediction of
+        what play() will set; get_playback_url uses the stored url only if
+        that prediction held and nothing was asked of it that the url was not
+        built for. Returns whether a url is now held.
+        """
+        if self.is_photo or self.is_live():
+            return False
+        self.auth_via_header = bool(auth_via_header)
+        url = self.get_playback_url()
+        if not url:
+            return False
+        self._preresolved = (self.auth_via_header, url)
+        return True
+
     def terminate_transcode(self):
         # Closing the live stream is deliberately NOT gated on is_transcode:
         # a live source that direct-streams (the usual HDHomeRun path) still
@@ -783,6 +817,13 @@ class Video(object):
         """
         Returns the URL to use for the transcoded file.
         """
+        ahead, self._preresolved = self._preresolved, None
+        if (ahead is not None and video_bitrate is None and not force_transcode
+                and self.trs_ovr is None
+                and ahead[0] == bool(self.auth_via_header)):
+            # Resolved while the previous item played (preresolve); nothing
+            # to terminate, since nothing has been opened from it yet.
+            return ahead[1]
         self.terminate_transcode()
 
         if self.is_photo:
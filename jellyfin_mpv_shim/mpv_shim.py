@@ -321,7 +321,10 @@ def main():
         # bandwidth. is_playing() is False when idle or paused-at-idle, which
         # is exactly when fetching ahead is free.
         get_clients=lambda: clientManager.clients,
-        is_busy=lambda: playerManager.is_playing())
+        is_busy=lambda: playerManager.is_playing(),
+        # Downloads keep running during playback; this is what slows them
+        # when the stream playing beside them runs short.
+        stream_health=lambda: playerManager.stream_health())
     user_interface.start()
     single.on_activate = getattr(user_interface, "activate", lambda: None)
     user_interface.login_servers()
@@ -40,6 +40,7 @@ section 3.
 """
 
 import logging
+import sys
 import threading
 import time
 from types import SimpleNamespace
@@ -251,6 +252,8 @@ class MpvtkBrowser(DialogsMixin, LiveTvDialogsMixin, AuthMixin, SettingsMixin,
         self._log_thread = None
         # Debounce slot for UserDataChanged — see refresh_home.
         self._userdata_thread = None
+        # Debounce slot for the search box — see ViewsMixin._search_typed.
+        self._search_thread = None
         # Long job (currently only the download-folder move) — see _run_long.
         self._long_thread = None
         # Global download progress for the status bar, and its poller.
@@ -2489,6 +2492,18 @@ class MpvtkBrowser(DialogsMixin, LiveTvDialogsMixin, AuthMixin, SettingsMixin,
             return
 
         def work():
+            # Offline, the library IS the catalog, so the source has to
+            # catch up with it too. Cheap enough to do on every push: the
+            # offline source reads only what the catalog journalled since its
+            # last look, and a push that journalled nothing (progress) is a
+            # single query (OfflineLibrarySource.reload). The live source
+            # has no reload and is skipped.
+            reload = getattr(self.source, "reload", None)
+            if reload is not None:
+                try:
+                    reload()
+                except Exception:
+                    log.debug("offline catalog reload failed", exc_info=True)
             try:
                 # The unpack stays inside the guard: a controller that cannot
                 # answer (no sync db, or a stub) returns None, and that must
@@ -2986,6 +3001,13 @@ class MpvtkBrowser(DialogsMixin, LiveTvDialogsMixin, AuthMixin, SettingsMixin,
                 log.debug("page close on shutdown failed", exc_info=True)
         self._shutdown_evt.set()   # also stops the downloads poller
         self._async.shutdown(wait=False, cancel_futures=True)
+        # The whole-book page count's worker processes (docs/readers.md
+        # §4.15), kept for the process: a quit mid-count would otherwise
+        # wait for the book's queued sections. Loaded by the first book
+        # opened, and not imported here for the sake of stopping it.
+        book_pool = sys.modules.get("jellyfin_mpv_shim.epub.pagination")
+        if book_pool is not None:
+            book_pool.shutdown()
         # Relocating the download store copies the whole thing and has no
         # cancellation check, so a quit mid-move would kill it partway
         # through. Give it a bounded chance to finish rather than yanking
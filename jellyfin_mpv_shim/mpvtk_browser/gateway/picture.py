@@ -43,6 +43,14 @@ class PictureMixin(GatewayCore):
         self._act(lambda pm: pm.show_picture(path))
         return True
 
+    def preload_picture(self, path):
+        """Have mpv open ``path`` behind the picture on screen, so a
+        :meth:`show_picture` of it is a move rather than a load."""
+        if not path:
+            return False
+        self._act(lambda pm: pm.preload_picture(path))
+        return True
+
     def clear_picture(self):
         """Take the picture down and put the browse window back."""
         self._act(lambda pm: pm.clear_picture())
@@ -11,53 +11,73 @@ consulted first, which is exactly the silent-winner hazard
 ``test_mpvtk_browser_mixins.py`` was written for.
 """
 
+import importlib
+from collections.abc import Mapping
+
 from .base import Page, PageContext
-from .books import AudiobookPage, BookPage, BooksPage
-from .byname import ByNamePage
-from .comic import ComicPage
-from .detail import DetailPage
-from .favorites import FavoritesPage
-from .genres import GenresPage
-from .grid import GridPage, ListPage, PersonPage
-from .music import MusicLibraryPage
-from .music_detail import AlbumPage, ArtistPage, MusicGenrePage
-from .playlist import PlaylistPage
-from .queue_edit import PlaylistEditPage, QueuePage
-from .reader import ReaderPage
-from .home import HomePage
-from .livetv import ChannelPage, LiveTvPage, ProgramPage
-from .search import SearchPage
-from .season import SeasonPage
-from .series import SeriesPage
-
-#: kind -> Page subclass.
-PAGES = {
-    AudiobookPage.kind: AudiobookPage,
-    BookPage.kind: BookPage,
-    BooksPage.kind: BooksPage,
-    ByNamePage.kind: ByNamePage,
-    ComicPage.kind: ComicPage,
-    DetailPage.kind: DetailPage,
-    FavoritesPage.kind: FavoritesPage,
-    GenresPage.kind: GenresPage,
-    AlbumPage.kind: AlbumPage,
-    ArtistPage.kind: ArtistPage,
-    GridPage.kind: GridPage,
-    ListPage.kind: ListPage,
-    MusicGenrePage.kind: MusicGenrePage,
-    MusicLibraryPage.kind: MusicLibraryPage,
-    PlaylistEditPage.kind: PlaylistEditPage,
-    PlaylistPage.kind: PlaylistPage,
-    QueuePage.kind: QueuePage,
-    ReaderPage.kind: ReaderPage,
-    PersonPage.kind: PersonPage,
-    HomePage.kind: HomePage,
-    LiveTvPage.kind: LiveTvPage,
-    ChannelPage.kind: ChannelPage,
-    ProgramPage.kind: ProgramPage,
-    SearchPage.kind: SearchPage,
-    SeasonPage.kind: SeasonPage,
-    SeriesPage.kind: SeriesPage,
-}
+
+
+class _Registry(Mapping):
+    """kind -> Page subclass, each page's module imported on first lookup.
+
+    Nothing in this package is needed to put the first window up, and
+    importing every page up front used to cost a launch the reader, the
+    comic viewer (and through it ``tarfile``) and the live TV guide before
+    the home screen could draw — the largest share of the browser's import
+    time on the slow ARM boxes (``tools/importtime.py``;
+    ``docs/architecture.md`` §9). A kind is listed as where its class
+    lives, so iterating the registry imports nothing and looking a kind up
+    imports its module once.
+    """
+
+    def __init__(self, where):
+        self._where = where
+        self._classes = {}
+
+    def __getitem__(self, kind):
+        cls = self._classes.get(kind)
+        if cls is None:
+            module, name = self._where[kind]
+            cls = getattr(importlib.import_module(module, __name__), name)
+            self._classes[kind] = cls
+        return cls
+
+    def __iter__(self):
+        return iter(self._where)
+
+    def __len__(self):
+        return len(self._where)
+
+
+#: kind -> Page subclass. ``tests/test_page_contract.py`` checks each entry
+#: names a class whose ``kind`` is the key.
+PAGES = _Registry({
+    "audiobook": (".books", "AudiobookPage"),
+    "book": (".books", "BookPage"),
+    "books": (".books", "BooksPage"),
+    "byname": (".byname", "ByNamePage"),
+    "comic": (".comic", "ComicPage"),
+    "detail": (".detail", "DetailPage"),
+    "favorites": (".favorites", "FavoritesPage"),
+    "genres": (".genres", "GenresPage"),
+    "album": (".music_detail", "AlbumPage"),
+    "artist": (".music_detail", "ArtistPage"),
+    "grid": (".grid", "GridPage"),
+    "list": (".grid", "ListPage"),
+    "music_genre": (".music_detail", "MusicGenrePage"),
+    "music": (".music", "MusicLibraryPage"),
+    "playlist_edit": (".queue_edit", "PlaylistEditPage"),
+    "playlist": (".playlist", "PlaylistPage"),
+    "queue": (".queue_edit", "QueuePage"),
+    "reader": (".reader", "ReaderPage"),
+    "person": (".grid", "PersonPage"),
+    "home": (".home", "HomePage"),
+    "livetv": (".livetv", "LiveTvPage"),
+    "channel": (".livetv", "ChannelPage"),
+    "program": (".livetv", "ProgramPage"),
+    "search": (".search", "SearchPage"),
+    "season": (".season", "SeasonPage"),
+    "series": (".series", "SeriesPage"),
+})
 
 __all__ = ["PAGES", "Page", "PageContext"]
@@ -12,6 +12,7 @@ breath as the picture; asking mpv is a poll loop in the render path. See
 ``docs/readers.md`` §5.
 """
 
+import io
 import logging
 
 from ...books import page_count as stored_page_count, progress_of, \
@@ -42,6 +43,14 @@ WHEEL_STEP = 120
 #: window, scrolled down — and "page" shows a whole page at once.
 FIT_WIDTH, FIT_PAGE = "width", "page"
 
+#: Pages kept extracted ahead of the reader in the direction they are
+#: turning, and behind them (:meth:`ComicPage._prefetch`). Three ahead
+#: covers a held turn key for as long as one extraction takes to catch up;
+#: one behind is the page just left. Together with the page on screen they
+#: must fit ``comic.PAGE_CACHE`` with the pool's width to spare.
+PREFETCH_AHEAD = 3
+PREFETCH_BEHIND = 1
+
 
 class ComicPage(Page):
     """One comic, one page at a time, shown through mpv."""
@@ -115,7 +124,16 @@ class ComicPage(Page):
         route["_opening"] = True
 
         def work():
-            return ComicArchive(path)
+            from ...conf import settings
+
+            memory = None
+            if getattr(settings, "comic_pages_in_memory", False):
+                # Pages as bytes behind a loopback URL rather than files
+                # written and unlinked per turn (docs/readers.md §5.9).
+                from ... import page_server
+
+                memory = page_server.shared()
+            return ComicArchive(path, memory=memory)
 
         def done(archive):
             route["_comic"] = archive
@@ -186,10 +204,15 @@ class ComicPage(Page):
         self.route["_page"] = index
         self._save_position(index)
         route = self.route
+        # Retires the prefetch for the page being left, now rather than
+        # when this one lands: a jump should stop it extracting pages
+        # around somewhere the reader no longer is.
+        route["_prefetch_gen"] = route.get("_prefetch_gen", 0) + 1
 
         def work():
-            path = archive.page_path(index)
-            return path, _picture_size(path)
+            path, data = archive.page_source(index)
+            return path, _picture_size(
+                path if data is None else io.BytesIO(data))
 
         def done(result):
             path, size = result
@@ -213,6 +236,7 @@ class ComicPage(Page):
             self.ctx.actions.clear_downloading_toast(
                 (route.get("_data") or {}).get("item") or {})
             self._place(to_bottom=to_bottom)
+            self._prefetch(archive, index)
             self.ctx.invalidate()
 
         def failed(exc):
@@ -229,6 +253,58 @@ class ComicPage(Page):
 
         self.ctx.run.run(work, done, self.ctx.run.epoch, on_error=failed)
 
+    def _prefetch(self, archive, index):
+        """Extract the pages around ``index`` before they are turned to.
+
+        In the order they are likely to be wanted — ahead in the direction
+        the reader is turning, then behind — and in **one job**, one page
+        after another, so a page needed next is never queued behind three
+        that are not. Each page asked for retires the last window's job
+        at its next page (``_prefetch_gen``, bumped by :meth:`_show_page`):
+        a jump, a turn, or leaving the comic leaves at most one extraction
+        running for a window nobody is reading any more.
+
+        With ``comic_preload_next`` on, the first of them is also queued in
+        mpv's playlist behind the page on screen, so the turn onto it does
+        not wait for mpv to open the file either (``docs/readers.md``
+        §5.8).
+        """
+        from ...conf import settings
+
+        route = self.route
+        gen = route.get("_prefetch_gen", 0)
+        step = route.get("_direction", 1)
+        order = [index + step * n for n in range(1, PREFETCH_AHEAD + 1)]
+        order += [index - step * n for n in range(1, PREFETCH_BEHIND + 1)]
+        order = [n for n in order if 0 <= n < archive.page_count]
+        preload = bool(getattr(settings, "comic_preload_next", False))
+        player = self.ctx.player
+
+        def current():
+            return (route.get("_prefetch_gen") == gen
+                    and route.get("_comic") is archive)
+
+        def work():
+            for page in order:
+                if not current():
+                    return
+                try:
+                    path, _data = archive.page_source(page)
+                except ComicError:
+                    # A bad page says so when it is turned to; a closed
+                    # comic has nothing left to prefetch for.
+                    log.debug("prefetching page %d failed", page,
+                              exc_info=True)
+                    if route.get("_comic") is not archive:
+                        return
+                    continue
+                if page == index + step and preload and current():
+                    preloader = getattr(player, "preload_picture", None)
+                    if preloader is not None:
+                        preloader(path)
+
+        self.ctx.run.submit(work)
+
     def _resume_page(self, archive):
         """Where the server says this reader had got to.
 
@@ -290,6 +366,9 @@ class ComicPage(Page):
         index = self.page_index() + delta
         if not 0 <= index < archive.page_count:
             return
+        # Which way the prefetch looks. A reader paging back through a
+        # comic wants the pages before this one ready, not after.
+        self.route["_direction"] = 1 if delta > 0 else -1
         # Entering a page backwards lands at its *bottom*: paging back and
         # arriving at the top means scrolling down to see what you went
         # back for, on every page you walk back through.
@@ -299,6 +378,8 @@ class ComicPage(Page):
     def _goto(self, index):
         if self.archive is None:
             return
+        # A jump is a fresh start, and a comic is read forwards from it.
+        self.route["_direction"] = 1
         self._show_page(index)
         self.ctx.invalidate()
 
@@ -566,7 +647,8 @@ class ComicPage(Page):
 
 
 def _picture_size(path):
-    """``(w, h)`` from an image file's header, or None.
+    """``(w, h)`` from an image file's header, or None. ``path`` may be a
+    file object instead: a page held in memory (§5.9).
 
     ``Image.open`` parses the header and stops; nothing is decoded. The
     EXIF orientation is applied here because mpv applies it too, and a
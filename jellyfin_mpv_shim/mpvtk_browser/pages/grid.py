@@ -19,7 +19,7 @@ from ...i18n import _
 from ...mpvtk.widgets import (
     Box, Column, Dropdown, Row, Spacer, Text, VScroll,
 )
-from .. import dialogs, pagination, theme, view_prefs
+from .. import dialogs, pagination, projections, theme, view_prefs
 from ..components import chrome, controls
 from ..tile_renderer import GRID_GAP
 from .base import Page
@@ -141,6 +141,18 @@ class GridPage(Page):
 
     # -- load --------------------------------------------------------------
 
+    def _project(self, res):
+        """An ``(items, total)`` answer with each item trimmed to what this
+        route keeps -- see :mod:`..projections`. Applied where a fetch
+        returns rather than where it lands, because a grid lands items in
+        four places (first load, windows, pages, the Random cap) and all of
+        them go through a fetch first."""
+        items, total = res
+        projection = projections.for_route(self.route)
+        if projection is not None:
+            items = projection.trim_all(items)
+        return items, total
+
     def load(self, epoch):
         route = self.route
         source = self.ctx.source
@@ -176,14 +188,14 @@ class GridPage(Page):
                 # Collections are server-wide and recursive (a BoxSet
                 # can gather items from several libraries), so this is a
                 # different query, not a filter on the library.
-                items, total = source.get_movie_collections(
+                items, total = self._project(source.get_movie_collections(
                     srv, sort_by=sort_by, sort_order=sort_order,
-                    filters=filters, image_type=image_type)
+                    filters=filters, image_type=image_type))
             else:
-                items, total = source.get_library_items(
+                items, total = self._project(source.get_library_items(
                     srv, parent, sort_by=sort_by, sort_order=sort_order,
                     filters=filters, image_type=image_type,
-                    collection_type=ctype)
+                    collection_type=ctype))
             # Paint the tiles BEFORE asking for the filter pickers. Nothing
             # on the first frame needs them and they are the slow half of
             # this load: Items/Filters scans the library server-side, 3.7s
@@ -569,14 +581,14 @@ class GridPage(Page):
             # honoured the dropdown and every page after it silently reverted
             # to SortName — duplicates and skips as the two orderings
             # interleave.
-            return source.get_person_items(
+            return self._project(source.get_person_items(
                 srv, person, start_index=start,
-                sort_by=sort_by, sort_order=sort_order, **kw)
+                sort_by=sort_by, sort_order=sort_order, **kw))
         if collections:
-            return source.get_movie_collections(
+            return self._project(source.get_movie_collections(
                 srv, start_index=start, sort_by=sort_by,
                 sort_order=sort_order, filters=filters,
-                image_type=image_type, **kw)
+                image_type=image_type, **kw))
         # collection_type, like every other member of the bound tuple: it
         # is what makes the query typed and Recursive, and page one is the
         # only place it used to be passed. Every page after it therefore
@@ -585,10 +597,10 @@ class GridPage(Page):
         # the server can only evaluate recursively (AudioLanguages) came
         # back unapplied, and the total that arrived with it replaced the
         # filtered one. See docs/browser-shell.md section 13.
-        return source.get_library_items(
+        return self._project(source.get_library_items(
             srv, self.route["parent_id"], start_index=start,
             sort_by=sort_by, sort_order=sort_order, filters=filters,
-            image_type=image_type, collection_type=ctype, **kw)
+            image_type=image_type, collection_type=ctype, **kw))
 
     def _window(self, first, last):
         """Fetch the items in ``[first, last)`` that are not loaded yet.
@@ -1227,8 +1239,8 @@ class ListPage(GridPage):
         sort_by, sort_order = self._sort_args()
 
         def work():
-            return source.get_list(srv, spec, sort_by=sort_by,
-                                   sort_order=sort_order)
+            return self._project(source.get_list(
+                srv, spec, sort_by=sort_by, sort_order=sort_order))
 
         def done(res):
             items, total = res
@@ -1266,9 +1278,9 @@ class ListPage(GridPage):
         sort_by, sort_order, filters, _person, srv, _itype, _coll, _ct = (
             bound or self._bound_query())
         kw = {} if limit is None else {"limit": limit}
-        return self.ctx.source.get_list(
+        return self._project(self.ctx.source.get_list(
             srv, self._spec(), sort_by=sort_by, sort_order=sort_order,
-            start_index=start, filters=filters, **kw)
+            start_index=start, filters=filters, **kw))
 
     #: A spec may name its own shape where the artwork cannot be trusted to
     #: say it. Studios are the case: their tiles are wide logos, web forces
@@ -1319,9 +1331,9 @@ class PersonPage(GridPage):
         _label, sort_by, sort_order = self._sorts()[route.get("_sort", 0)]
 
         def work():
-            return source.get_person_items(
+            return self._project(source.get_person_items(
                 srv, route["person_id"],
-                sort_by=sort_by, sort_order=sort_order)
+                sort_by=sort_by, sort_order=sort_order))
 
         def done(res):
             items, total = res
@@ -10,19 +10,24 @@ typography is expressed as toolkit nodes (``docs/readers.md`` §4.6).
 once the file is on disk and it fetches it when it is not (§1). **Position
 is written back on every turn**, as the same number jellyfin-web writes,
 which is what changed the old "epub progress is not settable" rule (§4.3).
+Once the whole book is laid out (§4.15), the page number is the book's and
+the bar grows a scrubber with the chapters marked on it.
 
 Everything expensive happens on the pool: opening the archive, building the
 locations index, paginating a chapter, rasterizing a page. The loop thread
-only ever reads what those left behind.
+only ever reads what those left behind. **The index is built after the first
+page is on screen**, not before it (§4.11): a resume lands on an estimate,
+and is corrected when the index does.
 """
 
 import hashlib
 import logging
+import threading
 
 from ...books import fraction_of, ticks_for_fraction
 from ...i18n import _
 from ...mpvtk.widgets import (Button, Column, Dropdown, ImageMap, Menu,
-                              Row, Spacer, Text)
+                              Row, Slider, Spacer, Text)
 from .. import theme
 from ..components import chrome
 from .base import Page
@@ -51,6 +56,13 @@ MIN_FONT, MAX_FONT = 10, 72
 #: the first press should move somewhere, not confirm where you are.
 PALETTE_ORDER = ("dark", "sepia", "light")
 
+#: Bytes of page bitmap the render-ahead may hold: the pages drawn before
+#: they are turned to (``docs/readers.md`` §4.12). Three 1080p pages are
+#: ~20 MiB; at 4K the budget holds the next page and the previous, and the
+#: chapter after waits for its turn. Capped again at a quarter of the strip
+#: store's own budget, which is what a machine short of RAM lowers.
+AHEAD_BYTES = 48 * 1024 * 1024
+
 
 class ReaderPage(Page):
     """An open book, one page at a time."""
@@ -123,13 +135,20 @@ class ReaderPage(Page):
         self.ctx.actions.download_book(item, server)
 
     def _open_book(self, path):
-        """Open the archive and build the index, off the loop thread."""
+        """Open the archive and paint the resume page, off the loop thread.
+
+        The first of two phases: only the section the reader resumes in is
+        parsed and paginated here. The locations index follows in
+        :meth:`_build_index`, once the page is up.
+        """
         route = self.route
         if route.get("_opening"):
             return
         route["_opening"] = True
 
         def work():
+            from ...conffile import get_cache_dir
+            from ...constants import APP_NAME
             from ...epub import EpubDocument
             from ...mpvtk import pilfont
 
@@ -138,8 +157,13 @@ class ReaderPage(Page):
             # which is as good an answer as one face per book allows and is
             # what pilfont already does for tile captions.
             script = pilfont.script_of(item.get("Name") or "")
-            doc = EpubDocument(path, self._reader_style(), script)
-            doc.build_index()
+            # None (no writable cache directory) is a book without the disk
+            # cache, which is how every book opened before there was one.
+            doc = EpubDocument(path, self._reader_style(), script,
+                               cache_dir=get_cache_dir(APP_NAME, "books"))
+            # A book opened before answers from the disk cache, and resumes
+            # exactly; otherwise goto_fraction estimates from sizes.
+            doc.cached_index()
             # Resume before the first paint, so the book never shows page
             # one of chapter one and then jumps.
             doc.goto_fraction(fraction_of(item))
@@ -148,6 +172,7 @@ class ReaderPage(Page):
         def done(doc):
             route["_doc"] = doc
             route["_opening"] = False
+            self._build_index(doc)
             # The book is on screen, so the "Downloading…" toast has
             # nothing left to report (#2). This page is the one that waited
             # for it, so it is the one that takes it down.
@@ -169,6 +194,83 @@ class ReaderPage(Page):
         self.ctx.run.run(work, done, self.ctx.run.epoch, on_error=failed,
                          always=lambda: route.update(_opening=False))
 
+    def _build_index(self, doc):
+        """The second phase: count the book, then correct the position.
+
+        On the pool, with progress in the top bar. Landing moves the reader
+        only if they are still on the estimated page (``set_index``); pages
+        turned meanwhile had no fraction to write, so the position is
+        written once it has one. That write is in ``always``, not ``done``:
+        an epoch bump drops ``done``, and a reader who paged on and then
+        left would otherwise lose where they got to.
+        """
+        route = self.route
+        if doc.index() is not None or route.get("_indexing"):
+            return
+        route["_indexing"] = True
+        route["_index_progress"] = 0
+
+        def progress(done, total):
+            percent = int(100 * done / max(1, total))
+            if percent != route.get("_index_progress"):
+                route["_index_progress"] = percent
+                self.ctx.invalidate()
+
+        def work():
+            return doc.build_index(progress)
+
+        def settle():
+            route["_indexing"] = False
+            if doc.index() is not None and route.pop("_unsaved", False):
+                self._save_position(doc)
+
+        self.ctx.run.run(work, lambda _index: None, self.ctx.run.epoch,
+                         always=settle)
+
+    def _count_pages(self, doc):
+        """Lay out the whole book, so the bar can say which page of it this
+        is (``docs/readers.md`` §4.15).
+
+        Once the page is up — the viewport is the column, and only the
+        first paint knows it. On a thread of its own, not ``ctx.run``: the
+        job waits on its worker processes for as long as the book takes,
+        and a runner worker held that long is one fewer for every route
+        load (``async_runner.WORKERS``, and ``MpvtkBrowser._run_long`` for
+        the same rule). Each section that lands repaints, and a layout that
+        moves under it (a resize, A+) ends the job, whose repaint then asks
+        again at the new one. Stops with the route, through the epoch. A
+        job that fails is not retried for this route: the bar keeps the
+        chapter's page numbers, which is what it showed before there was a
+        whole-book count.
+        """
+        route = self.route
+        if (route.get("_counting") or route.get("_count_failed")
+                or not self._setting("reader_book_page_numbers", True)
+                or doc.book_page() is not None):
+            return
+        run = self.ctx.run
+        epoch = run.epoch
+
+        def count():
+            finished = False
+            try:
+                finished = doc.paginate_book(
+                    lambda _spine, _count: self.ctx.invalidate(),
+                    wanted=lambda: run.epoch == epoch)
+            except Exception:
+                log.warning("could not count the book's pages",
+                            exc_info=True)
+                route["_count_failed"] = True
+            finally:
+                route["_counting"] = None
+            if not finished and run.epoch == epoch:
+                self.ctx.invalidate()
+
+        # The thread is the flag, and what to join to see the count through.
+        route["_counting"] = threading.Thread(
+            target=count, daemon=True, name="mpvtk-count-pages")
+        route["_counting"].start()
+
     def _reader_style(self):
         from ...epub.layout import ReaderStyle
         from ...mpvtk.scaling import px
@@ -178,7 +280,9 @@ class ReaderPage(Page):
         # through px() — the same boundary strips and the cast screen cross.
         return ReaderStyle(font_px=px(self.font_size()),
                            margin_x=px(28), margin_y=px(20),
-                           justify=self._setting("reader_justify", True))
+                           justify=self._setting("reader_justify", True),
+                           optimal_breaks=self._setting(
+                               "reader_optimal_line_breaks", False))
 
     @staticmethod
     def _setting(key, fallback):
@@ -226,6 +330,9 @@ class ReaderPage(Page):
             return
         fraction = doc.fraction()
         if fraction is None:
+            # The index is still being built; _build_index writes this once
+            # there is a fraction to write.
+            self.route["_unsaved"] = True
             return
         data = self.route.get("_data") or {}
         item = data.get("item") or {}
@@ -513,6 +620,9 @@ class ReaderPage(Page):
             path = (data.get("state") or (None, None))[1]
             if path:
                 self._open_book(path)
+        elif route.get("_doc") is not None:
+            # The same, for an index build abandoned the same way.
+            self._build_index(route["_doc"])
         item = data.get("item") or {}
         doc = route.get("_doc")
         body = (self._page_node(doc, width, self._area_height(height))
@@ -587,6 +697,7 @@ class ReaderPage(Page):
         if doc.style.key() != style.key():
             doc.set_style(style)
             self.route.pop("_entry", None)
+            self.route.pop("_ahead", None)
 
     def _page_node(self, doc, width, height):
         """The page bitmap, with the two halves that turn it."""
@@ -601,6 +712,7 @@ class ReaderPage(Page):
         if entry is None:
             return Column([Spacer(), chrome.busy(), Spacer()],
                           id=self.AREA_ID, flex=1)
+        self._count_pages(doc)
         # An ImageMap rather than an Image under transparent boxes: regions
         # are the toolkit's answer for "this bitmap is clickable in places"
         # (GUIDE §6). A click on the right-hand side turns forward, on the
@@ -644,10 +756,19 @@ class ReaderPage(Page):
         col_w, col_x = style.column(physical[0])
         if doc.set_viewport(col_w, physical[1] - 2 * style.margin_y):
             route.pop("_entry", None)
+            route.pop("_ahead", None)
         key = self._page_key(doc.page_key(), physical, palette_name)
         entry = route.get("_entry")
         if entry is not None and route.get("_entry_key") == key:
             store.keep(entry)
+            self._render_ahead(doc, physical, logical, palette_name, key)
+            return entry
+        ahead = route.get("_ahead")
+        entry = ahead.pop(key, None) if ahead else None
+        if entry is not None and store.holds(entry):
+            # Drawn before it was turned to: the turn is a swap.
+            self._show(entry, key)
+            self._render_ahead(doc, physical, logical, palette_name, key)
             return entry
         if route.get("_busy_key") == key:
             # Already being drawn. Keep showing the previous page rather
@@ -674,12 +795,13 @@ class ReaderPage(Page):
 
         def done(result):
             drawn_key, entry = result
-            route["_entry"] = entry
-            route["_entry_key"] = drawn_key
+            self._show(entry, drawn_key)
             # If drawn_key != key the reader moved on between the submit
             # and the worker. The bitmap is still correct and correctly
             # named, so it is kept; the repaint below then asks for the
             # page we are actually on.
+            if drawn_key == key:
+                self._render_ahead(doc, physical, logical, palette_name, key)
             self.ctx.invalidate()
 
         def failed(exc):
@@ -704,6 +826,96 @@ class ReaderPage(Page):
             store.keep(previous)
         return previous
 
+    def _render_ahead(self, doc, physical, logical, palette_name, key):
+        """Draw the pages the reader may turn to next, on the pool.
+
+        Once per page shown (``key``): the neighbours the document names —
+        next, previous, first of the next section — in that order, each
+        into the strip store as a finished BGRA entry under the same key
+        :meth:`_bitmap` will ask for, so the turn is a dictionary hit. What
+        is held is bounded by :data:`AHEAD_BYTES`; past it the least likely
+        neighbour is not drawn, and entries from pages behind the reader
+        are dropped oldest first. A dropped entry is only forgotten here —
+        the strip store frees it in its own time, because only it knows
+        what the renderer is still compositing.
+
+        One job for all of them rather than one each, so a held RIGHT key
+        queues one render-ahead per page rather than three, and the job
+        stops as soon as the page it was drawing around is not the one on
+        screen.
+        """
+        from collections import OrderedDict
+
+        from ...epub import paint
+
+        route = self.route
+        if route.get("_ahead_for") == key:
+            return
+        route["_ahead_for"] = key
+        store = self.ctx.art.strips
+        ahead = route.get("_ahead")
+        if ahead is None:
+            ahead = route["_ahead"] = OrderedDict()
+        page_bytes = physical[0] * physical[1] * 4
+        budget = min(AHEAD_BYTES, store.MAX_BYTES // 4)
+        room = max(0, budget // max(1, page_bytes))
+        # Oldest first: what _show shelved from pages ago, before anything
+        # drawn for the page on screen.
+        while len(ahead) > room:
+            ahead.popitem(last=False)
+        if not room:
+            return
+        style = doc.style
+        col_w, col_x = style.column(physical[0])
+        colors = paint.palette(palette_name)
+
+        landed = []
+
+        def work():
+            drawn = []
+            for spine, number in doc.neighbours()[:room]:
+                if route.get("_ahead_for") != key:
+                    break       # the reader moved on; so does this
+                name = self._page_key(doc.key_at(spine, number), physical,
+                                      palette_name)
+                if name in ahead or name == route.get("_entry_key"):
+                    continue    # drawn: on screen, or shelved by _show
+                page_key, image = doc.render_at(
+                    spine, number, physical, colors,
+                    (col_x, style.margin_y))
+                name = self._page_key(page_key, physical, palette_name)
+                drawn.append((name, store.bitmap(name, image,
+                                                 lsize=logical)))
+            return drawn
+
+        def done(drawn):
+            landed.append(True)
+            for name, entry in drawn:
+                ahead[name] = entry
+            while len(ahead) > room:
+                ahead.popitem(last=False)
+
+        def settle():
+            # Superseded before it landed: let the next frame ask again
+            # rather than leave this page with nothing drawn around it.
+            if not landed and route.get("_ahead_for") == key:
+                route["_ahead_for"] = None
+
+        self.ctx.run.run(work, done, self.ctx.run.epoch, always=settle)
+
+    def _show(self, entry, key):
+        """Make ``entry`` the page on screen, shelving the one it replaces
+        with the render-ahead: the page just left is the likeliest one to
+        be turned back to, and it is already drawn."""
+        from collections import OrderedDict
+
+        route = self.route
+        previous, previous_key = route.get("_entry"), route.get("_entry_key")
+        if previous is not None and previous_key not in (None, key):
+            route.setdefault("_ahead", OrderedDict())[previous_key] = previous
+        route["_entry"] = entry
+        route["_entry_key"] = key
+
     @staticmethod
     def _page_key(page_key, physical, palette_name):
         """The strip-store key for a page identity.
@@ -726,6 +938,10 @@ class ReaderPage(Page):
         if fraction is not None:
             right.append(Text("%.0f%%" % (fraction * 100), size="caption",
                               color=theme.SUBTLE_FG))
+        elif self.route.get("_indexing"):
+            right.append(Text(_("Indexing… %(percent)d%%") % {
+                "percent": self.route.get("_index_progress", 0)},
+                size="caption", color=theme.SUBTLE_FG))
         return Row([
             Button("", id="rd-back", icon="arrow_back", w=34, h=34, pad=0,
                    justify="center", tip=_("Back"),
@@ -736,7 +952,15 @@ class ReaderPage(Page):
 
     def _bottom_bar(self, doc, width):
         pages = ""
-        if doc is not None:
+        # The book's page once every section is counted; the chapter's
+        # until then, which is all there is to go on (§4.15).
+        book = doc.book_page() if doc is not None else None
+        if book is not None:
+            scrub = self.route.get("_scrub")
+            pages = _("Page %(page)d of %(total)d") % {
+                "page": (book[0] if scrub is None else scrub) + 1,
+                "total": book[1]}
+        elif doc is not None:
             pages = _("Page %(page)d of %(total)d") % {
                 "page": doc.page_number + 1, "total": doc.page_count()}
         narrow = width < 760
@@ -761,7 +985,9 @@ class ReaderPage(Page):
         ]
         if not narrow and pages:
             children.append(Text(pages, size="caption", color=theme.SUBTLE_FG))
-        children.append(Spacer())
+        scrubber = (self._scrubber(doc, book)
+                    if book is not None and not narrow else None)
+        children.append(scrubber if scrubber is not None else Spacer())
         if doc is not None:
             picker = self._chapter_picker(doc)
             if picker is not None:
@@ -777,6 +1003,44 @@ class ReaderPage(Page):
         return Row(children, h=BOTTOM_BAR_H, pad=(10, 6), gap=6,
                    align="center", bg=theme.PANEL_BG)
 
+    def _scrubber(self, doc, book):
+        """A slider over the whole book, with a slit where each chapter
+        starts. None for a book of one page.
+
+        Dragging only moves the number beside it; the reader goes there on
+        release, as the seek bars do, because every step of a drag would
+        otherwise be a page laid out and drawn.
+        """
+        page, total = book
+        starts = doc.section_starts()
+        if total < 2 or starts is None:
+            return None
+        last = float(total - 1)
+        marks = sorted({starts[chapter.spine_index] / last
+                        for chapter in doc.chapters()
+                        if chapter.spine_index < len(starts)
+                        and 0 < starts[chapter.spine_index] < last})
+        return Slider("rd-scrub", value=page, min=0, max=last, force=True,
+                      flex=1, marks=marks or None,
+                      on_change=self._scrub_change,
+                      on_commit=self._scrub_commit,
+                      on_cancel=self._scrub_cancel)
+
+    def _scrub_change(self, value):
+        self.route["_scrub"] = int(round(float(value)))
+        self.ctx.invalidate()
+
+    def _scrub_commit(self, value):
+        self.route.pop("_scrub", None)
+        doc = self.route.get("_doc")
+        if doc is not None and doc.goto_book_page(int(round(float(value)))):
+            self._save_position(doc)
+        self.ctx.invalidate()
+
+    def _scrub_cancel(self):
+        self.route.pop("_scrub", None)
+        self.ctx.invalidate()
+
     def _palette_label(self):
         name = self.palette_name()
         return {"light": _("Light"), "sepia": _("Sepia"),
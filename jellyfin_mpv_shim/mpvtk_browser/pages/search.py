@@ -20,6 +20,7 @@ from ...i18n import _
 from ...mpvtk.widgets import Text, VScroll
 from .. import theme
 from ..components import chrome
+from ..search_index import merge
 from .base import Page
 
 log = logging.getLogger("mpvtk_browser.pages.search")
@@ -51,20 +52,49 @@ PEOPLE_ROW = object()
 ARTISTS_ROW = object()
 SONGS_ROW = object()
 
+#: Shortest term the search box sends to the server while it is being typed
+#: into. One letter matches most of a library and is the answer nobody is
+#: waiting for; the local index still answers it.
+TYPING_MIN_CHARS = 2
+
 
 class SearchPage(Page):
     kind = "search"
 
     def load(self, epoch):
+        """Ask the server about the route's term.
+
+        **While the box is being typed into** (``_typing``, see
+        ``ViewsMixin._search_typed``) a load is only the settled term's: the
+        typing debounce calls back here once keys stop arriving, and marks
+        the term it settled on as ``_settled``. Any other load of a typing
+        route -- the one navigate() makes -- has nothing to ask yet.
+
+        **A newer load supersedes this one.** An HTTP request cannot be
+        taken back once sent, so superseding means the rest are not sent:
+        the work checks ``_search_gen`` between its requests and gives up,
+        and an answer for a term the box no longer holds is dropped rather
+        than drawn.
+        """
         srv = self.route.get("server") or self.ctx.server
         term = self.route.get("term", "")
         source = self.ctx.source
         route = self.route
+        if route.get("_typing") and (route.get("_settled") != term
+                                     or len(term) < TYPING_MIN_CHARS):
+            return
+        gen = route["_search_gen"] = route.get("_search_gen", 0) + 1
+
+        def stale():
+            return route.get("_search_gen") != gen
 
         def work():
             if not term:
-                return {"items": [], "people": [], "artists": [], "live": {}}
+                return {"term": term, "items": [], "people": [],
+                        "artists": [], "live": {}}
             items = source.search(srv, term)
+            if stale():
+                return None
             people = []
             try:
                 people = source.search_people(srv, term)
@@ -75,6 +105,8 @@ class SearchPage(Page):
             # fewer than /Artists here and none at all on some servers), and
             # a featured artist has no MusicArtist item to be found as.
             # getattr'd because a source may predate the method.
+            if stale():
+                return None
             artists = []
             search_artists = getattr(source, "search_artists", None)
             if search_artists is not None:
@@ -86,15 +118,39 @@ class SearchPage(Page):
             # /Search/Hints media types — and only where there is a tuner,
             # so the overwhelming majority of users pay nothing for it. Both
             # halves are getattr'd: the offline source has neither.
+            if stale():
+                return None
             live = {}
             if getattr(source, "has_live_tv", lambda _s: False)(srv):
                 search_live = getattr(source, "search_live_tv", None)
                 if search_live is not None:
                     live = search_live(srv, term) or {}
-            return {"items": items, "people": people, "artists": artists,
-                    "live": live}
+            return {"term": term, "items": items, "people": people,
+                    "artists": artists, "live": live}
 
-        self.route_async(work, lambda d: route.__setitem__("_data", d), epoch)
+        def done(data):
+            if data is None or data.get("term") != route.get("term"):
+                return          # superseded; its successor is on the way
+            route["_data"] = data
+
+        self.route_async(work, done, epoch)
+
+    def _local(self, term):
+        """What the source already knows matches ``term`` -- no request, so
+        it answers a keystroke. Memoized on the route, because render runs
+        far more often than the term changes."""
+        route = self.route
+        if route.get("_local_term") != term:
+            search_local = getattr(self.ctx.source, "search_local", None)
+            hits = []
+            if search_local is not None and term:
+                try:
+                    hits = search_local(route.get("server")
+                                        or self.ctx.server, term)
+                except Exception:
+                    log.debug("local search failed", exc_info=True)
+            route["_local"], route["_local_term"] = hits, term
+        return route.get("_local") or []
 
     def render(self, size):
         art = self.ctx.art
@@ -104,21 +160,48 @@ class SearchPage(Page):
         if not term:
             return chrome.error(_("Type in the search box above."))
         data = route.get("_data")
-        if data is None:
+        typing = bool(route.get("_typing"))
+        # The server's answer for this term, or None while it is still to
+        # come. An answer without a term is one from before answers carried
+        # theirs, and is this term's.
+        if data is not None and data.get("term", term) != term:
+            data = None
+        local = self._local(term)
+        if data is None and not local and not typing:
             return chrome.busy()
-        items = data.get("items") or []
-        people = data.get("people") or []
-        artists = data.get("artists") or []
+        # Local hits in front of the server's answer and under it: the
+        # people and artists it found are rows of their own, the rest are
+        # grouped with the items below.
+        local_people = [it for it in local if it.get("Type") == "Person"]
+        local_artists = [it for it in local
+                         if it.get("Type") == "MusicArtist"]
+        local_items = [it for it in local
+                       if it.get("Type") not in ("Person", "MusicArtist")]
+        data = data or {}
+        # Too short to have been sent: nothing is coming, so neither
+        # "Searching" nor "No results" is true yet.
+        unsent = typing and len(term) < TYPING_MIN_CHARS
+        pending = not data and not unsent
+        items = merge(data.get("items") or [], local_items)
+        people = merge(data.get("people") or [], local_people)
+        artists = merge(data.get("artists") or [], local_artists)
         # "page", not "heading": the section titles below this one ARE
         # headings, so at that tier the page title had no rank over them and
         # the screen read as a list of equals with a sentence on top.
         rows = [Text(_('Results for "%s"') % term, size="page", bold=True)]
+        if pending:
+            # Not a spinner over the rows: the local ones are worth reading
+            # while the rest arrive, and a spinner per keystroke flickers.
+            rows.append(Text(_("Searching…"), color=theme.SUBTLE_FG))
         # Searching is a keyboard gesture even from a remote (the search
         # button puts the cursor in the box), so the results land focused
         # on the first of them — otherwise submitting leaves focus in the
         # box, where the arrow keys still move the caret. Whichever row
         # comes first owns it; `first` is claimed by the first row built.
-        first = [True]
+        # Not while typing, though: focus leaving the box would take the
+        # next keystroke with it. Enter ends typing (``_search``) and asks
+        # for focus again.
+        first = [not typing]
 
         def claim():
             got, first[0] = first[0], False
@@ -220,7 +303,8 @@ class SearchPage(Page):
                  and it.get("Type") != "Audio"][:ROW_MAX]
         if other:
             rows.append(tiles.tile_row(_("Other"), other, "search-other"))
-        if not items and not people and not artists and not any(live.values()):
+        if not pending and not unsent and not items and not people and not artists \
+                and not any(live.values()):
             rows.append(Text(_("No results found."), size="large",
                              color=theme.SUBTLE_FG))
         return VScroll(chrome.padded_body(rows, gap=12, align="stretch"),
@@ -0,0 +1,155 @@
+"""What each screen asks the server for, and what it keeps of the answer.
+
+A ``Projection`` is the two halves of one decision: the ``Fields`` a query
+sends, and the DTO keys the screen reading the result actually draws or acts
+on. The first was always declared (``LIST_FIELDS`` and friends in
+``repository``); the second was not, so a hundred-item grid page carried
+every key the server volunteered -- ``ImageBlurHashes`` for three image
+types, ``Etag``, ``LockedFields``, ``ExternalUrls`` on an offline item --
+for as long as the route stayed on the stack or in the navigator's forward
+history. An offline grid was the worst of it: its items are the catalog's
+``item_json``, which is a detail DTO with ``MediaSources`` and ``People`` in
+it.
+
+**Trimming is a whitelist, so it is only applied where the reads are known.**
+The grid, the person filmography and the non-Live-TV list routes: their
+items go to the tile renderer, the list view, the tile menu and
+``_open_item``, and ``tests/test_projections.py`` drives all four with a DTO
+that records what is read and fails on a key the projection would have
+dropped. A screen that hands its items to something else -- a programme
+seeds the program page with the whole DTO, a detail page *is* the DTO -- is
+not in :data:`ROUTES` and keeps everything.
+
+Keys starting with ``_`` are ours, not the server's (``_image_url``,
+``_recording``, ``_subtitle``) and always survive. Nested values are kept
+whole: ``UserData`` is a handful of scalars and half the screen reads it.
+
+No imports from the rest of the browser, so ``repository`` can take its
+field strings from here and a page can ask for its projection without
+importing the repository.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+#: Which item this is and what kind -- everything ``_open_item`` routes on.
+#: ``Path`` because a book's format is read off it (``books.book_format``)
+#: and an offline item carries it.
+IDENTITY_KEYS = frozenset({
+    "Id", "ServerId", "Name", "SortName", "Type", "MediaType", "IsFolder",
+    "CollectionType", "ParentId", "Path", "LocationType",
+})
+
+#: What a tile's caption, badges and the list view draw. All unconditional
+#: BaseItemDto properties -- see the note on ``LIST_FIELDS``.
+CAPTION_KEYS = frozenset({
+    "ProductionYear", "PremiereDate", "EndDate", "Status", "RunTimeTicks",
+    "OfficialRating", "CommunityRating", "CriticRating",
+    "SeriesName", "SeasonName", "IndexNumber", "IndexNumberEnd",
+    "ParentIndexNumber", "Album", "AlbumArtist", "AlbumArtists", "Artists",
+    "ChannelName", "ChannelNumber", "Number", "StartDate", "EpisodeTitle",
+})
+
+#: What the tile menu and the watched/favourite/version badges act on.
+STATE_KEYS = frozenset({
+    "UserData", "MediaSourceCount", "CanDelete", "CanDownload",
+    "SeriesId", "SeasonId", "AlbumId", "ChannelId", "PlaylistItemId",
+    "TimerId", "SeriesTimerId",
+})
+
+#: Everything ``image_spec`` and ``backdrop_spec`` resolve artwork through,
+#: own and inherited.
+ART_KEYS = frozenset({
+    "ImageTags", "BackdropImageTags", "PrimaryImageAspectRatio",
+    "ParentBackdropImageTags", "ParentBackdropItemId",
+    "ParentLogoImageTag", "ParentLogoItemId",
+    "ParentPrimaryImageItemId", "ParentPrimaryImageTag",
+    "ParentThumbImageTag", "ParentThumbItemId",
+    "SeriesPrimaryImageTag", "SeriesThumbImageTag",
+    "AlbumPrimaryImageTag", "ChannelPrimaryImageTag",
+})
+
+#: What any tile screen keeps.
+TILE_KEYS = IDENTITY_KEYS | CAPTION_KEYS | STATE_KEYS | ART_KEYS
+
+
+@dataclass(frozen=True)
+class Projection:
+    """``fields`` to ask for; ``keys`` to keep, or None to keep the lot."""
+
+    fields: str
+    keys: Optional[frozenset] = None
+
+    def trim(self, item):
+        """``item`` with only the keys this projection keeps.
+
+        A new dict, never the caller's: the same DTO can be on two routes,
+        and trimming one must not take a key from under the other. Holes
+        (None, from ``pagination.spread``) pass through.
+        """
+        if self.keys is None or not isinstance(item, dict):
+            return item
+        keys = self.keys
+        return {k: v for k, v in item.items()
+                if k in keys or k.startswith("_")}
+
+    def trim_all(self, items):
+        if self.keys is None:
+            return items
+        return [self.trim(item) for item in items]
+
+
+#: Rows, lists and a clicked item's seed. Overview because a row's clicked
+#: tile seeds a page that shows the text while the real DTO loads.
+ROW = Projection(
+    fields="PrimaryImageAspectRatio,Overview,MediaSourceCount,CanDelete",
+    keys=TILE_KEYS | {"Overview"})
+
+#: A library grid -- the one place a hundred items arrive at once.
+GRID = Projection(
+    fields="PrimaryImageAspectRatio,MediaSourceCount,CanDelete",
+    keys=TILE_KEYS)
+
+#: A books grid, which draws its description on the same screen.
+BOOKS_GRID = Projection(fields=GRID.fields + ",Overview",
+                        keys=TILE_KEYS | {"Overview"})
+
+#: Music browse. Not trimmed: the music screens are not covered by the read
+#: audit, and their lists are albums and tracks rather than DTOs with a
+#: detail page's worth of fields.
+MUSIC = Projection(fields="PrimaryImageAspectRatio,ItemCounts,CanDelete")
+
+#: The detail view, which is the whole DTO by definition.
+DETAIL = Projection(
+    fields=("Path,Overview,Genres,Studios,People,Taglines,SortName,"
+            "MediaSources,MediaStreams,Chapters,ProviderIds,"
+            "PrimaryImageAspectRatio,DateCreated,CanDelete"))
+
+#: Route kind -> the projection its items are stored under. Absent kinds
+#: store what the source returned.
+ROUTES = {
+    "grid": GRID,
+    "person": GRID,
+    "list": ROW,
+}
+
+#: ``list`` specs whose items are ordinary tiles. Programmes and recordings
+#: are not: a programme tile seeds the program page with its own DTO, and
+#: the guide vocabulary (IsKids, IsSports, ...) is read in too many places
+#: to whitelist honestly.
+TRIMMED_LIST_TYPES = frozenset({"items", "nextup", "studios"})
+
+
+def for_route(route) -> Optional[Projection]:
+    """The projection ``route``'s items are kept under, or None for all."""
+    kind = (route or {}).get("kind")
+    projection = ROUTES.get(kind)
+    if projection is None:
+        return None
+    if kind == "list":
+        spec = route.get("list") or {}
+        if spec.get("type") not in TRIMMED_LIST_TYPES:
+            return None
+    if route.get("collection_type") == "books":
+        return BOOKS_GRID
+    return projection
@@ -14,6 +14,7 @@ import logging
 from urllib.parse import urlparse
 import os
 import random
+import threading
 
 from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Optional
@@ -27,6 +28,8 @@ from ..i18n import _
 from ..sync.db import SyncDB, STATUS_COMPLETE
 from . import home_sections
 from . import live_tv
+from . import projections
+from .search_index import ITEM_LIMIT, SearchIndex
 from . import user_prefs
 from . import view_prefs
 
@@ -44,7 +47,9 @@ def _iso_utc(when):
 
 log = logging.getLogger("mpvtk_browser.repository")
 
-# Fields requested for grids/rows. Kept lean for speed.
+# Fields requested for grids/rows. Kept lean for speed. The strings live in
+# ``projections`` with the DTO keys each screen keeps of the answer; the
+# reasoning for what is in them stays here, beside the queries.
 #
 # Only names in the server's ItemFields enum belong here. Everything a tile
 # actually renders beyond these — ProductionYear, Artists, Album, RunTimeTicks,
@@ -61,7 +66,7 @@ log = logging.getLogger("mpvtk_browser.repository")
 # to answer (it is the length of the item's own alternate-version lists, not a
 # media-source resolution -- that is MediaSources, which DETAIL_FIELDS pays
 # for and a browse query must not).
-LIST_FIELDS = "PrimaryImageAspectRatio,Overview,MediaSourceCount,CanDelete"
+LIST_FIELDS = projections.ROW.fields
 
 #: An item's own artwork counts as landscape at or above this, which is what
 #: lets `backdrop_spec` use a home video's extracted still for its header and
@@ -78,7 +83,7 @@ _LANDSCAPE_ART = 0.8
 # a clicked one seeds a page that shows the text while the real DTO loads.
 # jellyfin-web's grid asks for the aspect ratio only when the view is Primary;
 # MediaSourceCount it asks for everywhere, and so do we -- see LIST_FIELDS.
-GRID_FIELDS = "PrimaryImageAspectRatio,MediaSourceCount,CanDelete"
+GRID_FIELDS = projections.GRID.fields
 
 #: CanDelete is in all four field sets, and it has to be ASKED FOR: a list query
 #: omits it entirely (measured -- the key is absent, not False), so a Delete
@@ -101,7 +106,7 @@ GRID_FIELDS = "PrimaryImageAspectRatio,MediaSourceCount,CanDelete"
 #: folder does not have it unless someone wrote an .nfo. Without this the
 #: only place a book's description could come from is a second request per
 #: folder open.
-BOOKS_GRID_FIELDS = GRID_FIELDS + ",Overview"
+BOOKS_GRID_FIELDS = projections.BOOKS_GRID.fields
 
 # What a library's grid lists, by collection type -- jellyfin-web's default
 # tab for that view (LibraryTab.Movies -> Movie, and so on).
@@ -187,17 +192,13 @@ OFFLINE_ROW_KIND = "downloaded"
 #: Without it a music album offered Delete from Disk on its detail page
 #: (which uses DETAIL_FIELDS) and never from its tile menu, with nothing
 #: to suggest the two disagreed.
-MUSIC_FIELDS = "PrimaryImageAspectRatio,ItemCounts,CanDelete"
+MUSIC_FIELDS = projections.MUSIC.fields
 
 # Fields requested for the detail view. Intentionally a superset (MediaSources,
 # MediaStreams, People, ...) so cached DTOs are already complete for the eventual
 # offline-sync feature. The ratings, premiere date and production year the view
 # also shows are unconditional properties and need no field — see LIST_FIELDS.
-DETAIL_FIELDS = (
-    "Path,Overview,Genres,Studios,People,Taglines,SortName,"
-    "MediaSources,MediaStreams,Chapters,ProviderIds,"
-    "PrimaryImageAspectRatio,DateCreated,CanDelete"
-)
+DETAIL_FIELDS = projections.DETAIL.fields
 
 # CollectionTypes we do not surface (video-only browser, phase 1). Playlists
 # ARE surfaced (as a normal library tile): Jellyfin lets a playlist's declared
@@ -514,6 +515,10 @@ class LibrarySource:
         # free from the /Views response get_libraries already fetches; see
         # has_live_tv for why that answer is authoritative.
         self._has_live_tv: dict[str, bool] = {}
+        # uuid -> SearchIndex of every searchable item a browse call has
+        # returned, for search_local. Fed by the calls whose answers are
+        # lists of items (grids, lists, episodes, searches); see _seen.
+        self._indexes: dict[str, SearchIndex] = {}
         for info in servers:
             try:
                 conn = ServerConn(info, device_id, player_name, verify_ssl)
@@ -558,6 +563,31 @@ class LibrarySource:
     def _conn(self, server_uuid) -> ServerConn:
         return self._conns[server_uuid]
 
+    def _seen(self, server_uuid, items):
+        """``items``, after adding them to ``server_uuid``'s search index.
+
+        A source built without __init__ (as the query-shape tests do) has
+        no indexes and skips this, the way has_live_tv answers for one."""
+        indexes = getattr(self, "_indexes", None)
+        if indexes is None:
+            return items
+        index = indexes.get(server_uuid)
+        if index is None:
+            index = indexes.setdefault(server_uuid, SearchIndex())
+        index.add(items)
+        return items
+
+    def search_local(self, server_uuid, term, limit=SEARCH_LIMIT):
+        """Items already seen this session whose name matches ``term``.
+
+        No request: it answers from what earlier screens and searches
+        returned, which is what lets the search screen draw on the first
+        keystroke and replace it when :meth:`search` lands. Partial by
+        construction -- see ``search_index``.
+        """
+        index = (getattr(self, "_indexes", None) or {}).get(server_uuid)
+        return index.query(term, limit) if index is not None else []
+
     def stop(self):
         for conn in self._conns.values():
             conn.stop()
@@ -1883,7 +1913,8 @@ class LibrarySource:
             image_type_limit=1,
             enable_image_types="Primary,Thumb,Backdrop",
             **kwargs) or {}
-        return result.get("Items", []), result.get("TotalRecordCount", 0)
+        return (self._seen(server_uuid, result.get("Items", [])),
+                result.get("TotalRecordCount", 0))
 
     def get_library_items(self, server_uuid, parent_id, sort_by="SortName",
                           sort_order="Ascending", start_index=0, limit=100,
@@ -1921,7 +1952,8 @@ class LibrarySource:
             image_type_limit=1,
             enable_image_types=browse_image_types(image_type),
             **self._filter_kwargs(filters)) or {}
-        return result.get("Items", []), result.get("TotalRecordCount", 0)
+        return (self._seen(server_uuid, result.get("Items", [])),
+                result.get("TotalRecordCount", 0))
 
     def get_movie_collections(self, server_uuid, sort_by="SortName",
                               sort_order="Ascending", start_index=0, limit=100,
@@ -1945,7 +1977,8 @@ class LibrarySource:
             image_type_limit=1,
             enable_image_types=browse_image_types(image_type),
             **self._filter_kwargs(filters)) or {}
-        return result.get("Items", []), result.get("TotalRecordCount", 0)
+        return (self._seen(server_uuid, result.get("Items", [])),
+                result.get("TotalRecordCount", 0))
 
     def get_person_items(self, server_uuid, person_id, start_index=0, limit=100,
                          sort_by="SortName", sort_order="Ascending"):
@@ -1960,7 +1993,8 @@ class LibrarySource:
             fields=GRID_FIELDS,
             image_type_limit=1,
             enable_image_types=browse_image_types()) or {}
-        return result.get("Items", []), result.get("TotalRecordCount", 0)
+        return (self._seen(server_uuid, result.get("Items", [])),
+                result.get("TotalRecordCount", 0))
 
     # -- music browse ------------------------------------------------------
 
@@ -1991,7 +2025,8 @@ class LibrarySource:
         if merged:
             kwargs["params"] = merged
         result = items_api.get_items(api, **kwargs) or {}
-        return result.get("Items", []), result.get("TotalRecordCount", 0)
+        return (self._seen(server_uuid, result.get("Items", [])),
+                result.get("TotalRecordCount", 0))
 
     def get_music_albums(self, server_uuid, parent_id, sort_by="SortName",
                          sort_order="Ascending", start_index=0, limit=100,
@@ -2246,7 +2281,7 @@ class LibrarySource:
         """
         api = self._conn(server_uuid).api
         result = api.get_persons(search_term=term, limit=limit) or {}
-        return result.get("Items", [])
+        return self._seen(server_uuid, result.get("Items", []))
 
     def search_artists(self, server_uuid, term, limit=ARTIST_SEARCH_LIMIT):
         """Artists matching a search term.
@@ -2259,7 +2294,7 @@ class LibrarySource:
         """
         api = self._conn(server_uuid).api
         result = api.get_artists(search_term=term, limit=limit) or {}
-        return result.get("Items", [])
+        return self._seen(server_uuid, result.get("Items", []))
 
     def get_playlists(self, server_uuid, limit=300):
         """All playlists, for the add-to-playlist picker."""
@@ -2391,7 +2426,7 @@ class LibrarySource:
     def get_episodes(self, server_uuid, series_id, season_id):
         api = self._conn(server_uuid).api
         result = api.get_season(series_id, season_id) or {}
-        return result.get("Items", [])
+        return self._seen(server_uuid, result.get("Items", []))
 
     def get_item(self, server_uuid, item_id):
         api = self._conn(server_uuid).api
@@ -2454,7 +2489,7 @@ class LibrarySource:
             fields=GRID_FIELDS,
             enable_total_record_count=False,
         ) or {}
-        return result.get("Items", [])
+        return self._seen(server_uuid, result.get("Items", []))
 
     # -- images ------------------------------------------------------------
 
@@ -2734,6 +2769,46 @@ class LibrarySource:
                               index=0 if image_type == "Backdrop" else None)
 
 
+def _aggregate_userdata(episodes):
+    """UserData for a synthesized Series/Season DTO, derived from its
+    downloaded episodes. Without it the watched badge/label lies offline:
+    ``is_watched`` falls back to UnplayedItemCount for these types, and a
+    missing UserData reads as never-watched. Counts only what's downloaded
+    — offline that IS the visible library."""
+    unplayed = sum(1 for e in episodes
+                   if not (e.get("UserData") or {}).get("Played"))
+    return {"Played": unplayed == 0, "UnplayedItemCount": unplayed}
+
+
+def _name_key(item):
+    """The offline grids' one sort order: by name, case-insensitively."""
+    return (item.get("Name") or "").lower()
+
+
+def _aired_key(item):
+    return (item.get("ParentIndexNumber") or 0, item.get("IndexNumber") or 0)
+
+
+def _catalog_order(row):
+    """``SyncDB.list``'s ORDER BY, for rows merged in Python: series, season,
+    episode, name, with NULLs first as SQLite sorts them."""
+    series, season = row.get("series_name"), row.get("parent_index")
+    episode, name = row.get("index_number"), row.get("name")
+    return (series is not None, series or "", season is not None, season or 0,
+            episode is not None, episode or 0, name is not None, name or "")
+
+
+def _rail_letter(item):
+    """What the A-Z rail files ``item`` under -- the same first letter
+    ``_apply_filters`` compares against."""
+    return ((item.get("Name") or "?")[:1]).upper()
+
+
+#: The offline library tiles, by the parent id their grid is opened with.
+#: The item type each one lists; TV and books are synthesized instead.
+OFFLINE_LIBRARY_TYPES = {"offline:movies": "Movie", "offline:videos": "Video"}
+
+
 class _OfflineSnapshot:
     """One immutable, internally-consistent view of the offline catalog.
 
@@ -2743,12 +2818,27 @@ class _OfflineSnapshot:
     the loop thread reads for artwork). Nothing mutates a snapshot's dicts
     after publish — except ``art_cache``, a memo of resolved artwork paths
     (safe: values are deterministic for the snapshot, so a racing double
-    compute is idempotent)."""
+    compute is idempotent).
+
+    **Indexed once, here, rather than per request.** Every grid page used to
+    filter ``items`` by type, synthesize the series list and sort by name,
+    and with a few thousand episodes downloaded that was an O(n log n) pass
+    per hundred-tile scroll. Everything a browse call derives from the
+    items is derived in ``_index`` instead, and a page is a slice of a list
+    that is already in order. The snapshot is immutable, so the indexes can
+    never disagree with the items they were built from.
+    """
 
     def __init__(self, rows=None, items=None, series_server=None,
                  season_server=None, season_series=None, playlists=None,
                  playlist_items=None, playlist_server=None,
-                 books=None, book_items=None):
+                 books=None, book_items=None, rev=0, parsed=None):
+        #: The catalog's journal revision this was read at; 0 for "read
+        #: whole next time". See OfflineLibrarySource.reload.
+        self.rev = rev
+        #: item_id -> its DTO as parsed from ``item_json``, or None where that
+        #: failed. What the next incremental reload reuses.
+        self.parsed = parsed or {}
         self.rows = rows or {}
         self.items = items or []
         self.series_server = series_server or {}
@@ -2762,8 +2852,137 @@ class _OfflineSnapshot:
         self.books = books or []
         #: container id -> its AudioBook chapters, in reading order.
         self.book_items = book_items or {}
+        #: Every item by name, for search. Built here rather than in
+        #: reload() so an empty snapshot has one too.
+        self.search_index = SearchIndex(limit=max(ITEM_LIMIT, len(self.items)),
+                                        types=None, keys=None)
+        self.search_index.add(self.items)
+        self._index()
         self.art_cache = {}
 
+    def _index(self):
+        #: Type -> its items, in catalog order (home rows, shuffle).
+        self.by_type: dict[str, list] = {}
+        for item in self.items:
+            self.by_type.setdefault(item.get("Type"), []).append(item)
+        self._index_series()
+        #: Library parent id -> its tiles, presorted the way the grid shows
+        #: them. A page is a slice.
+        self.listings = {
+            parent_id: sorted(self.by_type.get(kind, ()), key=_name_key)
+            for parent_id, kind in OFFLINE_LIBRARY_TYPES.items()}
+        self.listings["offline:tv"] = sorted(self.series.values(),
+                                             key=_name_key)
+        self.listings["offline:books"] = sorted(self.books, key=_name_key)
+        self.listings["offline:playlists"] = sorted(self.playlists,
+                                                    key=_name_key)
+        #: Library parent id -> rail letter -> that letter's tiles, in
+        #: listing order: a letter on the A-Z rail is a lookup. Non-letters
+        #: are filed under "#" as well as under themselves, which is the
+        #: rail's bucket for them.
+        self.letters: dict[str, dict[str, list]] = {}
+        for parent_id, listing in self.listings.items():
+            buckets: dict[str, list] = {}
+            for item in listing:
+                first = _rail_letter(item)
+                buckets.setdefault(first, []).append(item)
+                if first != "#" and not first.isalpha():
+                    buckets.setdefault("#", []).append(item)
+            self.letters[parent_id] = buckets
+        genres: set[str] = set()
+        for item in self.items:
+            genres.update(item.get("Genres") or [])
+        #: Every genre any downloaded item carries, sorted.
+        self.genres = sorted(genres)
+
+    def _index_series(self):
+        """The TV library, synthesized from the downloaded episodes: the
+        catalog stores episodes, never the series or seasons above them."""
+        #: series id -> synthesized Series DTO, first-downloaded first.
+        self.series: dict[str, dict] = {}
+        #: series id -> its episodes, in aired order.
+        self.series_episodes: dict[str, list] = {}
+        #: series id -> its synthesized Season DTOs, in season order.
+        self.seasons: dict[str, list] = {}
+        #: (series id, season id) -> its episodes, in aired order. Filed
+        #: under the synthetic "p<ParentIndexNumber>" id too, which is what
+        #: ``get_seasons`` hands out for a season with no real SeasonId.
+        self.season_episodes: dict[tuple, list] = {}
+        names: dict[str, Any] = {}
+        season_dtos: dict[str, dict] = {}
+        season_members: dict[tuple, list] = {}
+        for item in self.by_type.get("Episode", ()):
+            sid = item.get("SeriesId")
+            if not sid:
+                continue
+            if sid not in self.series_episodes:
+                self.series_episodes[sid] = []
+                names[sid] = item.get("SeriesName") or _("Series")
+                season_dtos[sid] = {}
+            self.series_episodes[sid].append(item)
+            pidx = item.get("ParentIndexNumber")
+            synthetic = "p%s" % pidx
+            self.season_episodes.setdefault((sid, synthetic), []).append(item)
+            if item.get("SeasonId"):
+                self.season_episodes.setdefault(
+                    (sid, item["SeasonId"]), []).append(item)
+            key = item.get("SeasonId") or synthetic
+            if key not in season_dtos[sid]:
+                if item.get("SeasonName"):
+                    name = item["SeasonName"]
+                elif pidx == 0:
+                    name = _("Specials")
+                elif pidx is not None:
+                    name = _("Season %d") % pidx
+                else:
+                    name = _("Episodes")
+                # SeriesId is load-bearing, not decoration: opening a Season
+                # tile reads it to build the season route (see app.py's
+                # item-type routing), and without it the route carried
+                # series_id=None — which get_episodes filters against, so
+                # every episode was discarded and the season read "Nothing
+                # here yet." The live source gets this for free from the
+                # server's own Season DTO.
+                # SeriesName for the same reason as SeriesId, one screen
+                # further on: the season page puts it in the title bar, so
+                # without it an offline season says "Season 1" and never
+                # what it is a season of. The live server's Season DTO
+                # carries it; a synthesized one has to be told.
+                season_dtos[sid][key] = {
+                    "Id": item.get("SeasonId") or key, "Name": name,
+                    "Type": "Season", "ImageTags": {}, "SeriesId": sid,
+                    "SeriesName": item.get("SeriesName"),
+                    "IndexNumber": pidx}
+            season_members.setdefault((sid, key), []).append(item)
+        for episodes in self.series_episodes.values():
+            episodes.sort(key=_aired_key)
+        for episodes in self.season_episodes.values():
+            episodes.sort(key=_aired_key)
+        for sid, episodes in self.series_episodes.items():
+            self.series[sid] = {
+                "Id": sid, "Name": names[sid], "Type": "Series",
+                "ImageTags": {},
+                # A synthesized DTO has to answer the questions a real one
+                # would, and the grid asks this one: GridPage._grid_shape
+                # takes the MEDIAN PrimaryImageAspectRatio across the row
+                # and falls back to SQUARE when nothing carries one -- so a
+                # downloaded-shows grid came out as square cards with the
+                # posters letterboxed inside them. A Series' Primary image
+                # is a poster; the server says 2:3 for these, and the
+                # offline catalog stores episodes, not the series, so there
+                # is nothing else to read it from.
+                "PrimaryImageAspectRatio": 2 / 3,
+                "UserData": _aggregate_userdata(episodes)}
+            for key, dto in season_dtos[sid].items():
+                dto["UserData"] = _aggregate_userdata(
+                    season_members[(sid, key)])
+            # Match Jellyfin's online order: by season number ascending
+            # (Specials = 0 first), with any unnumbered seasons last.
+            self.seasons[sid] = sorted(
+                season_dtos[sid].values(),
+                key=lambda s: (s.get("IndexNumber") is None,
+                               s.get("IndexNumber") or 0))
+
 
 class OfflineLibrarySource:
     """LibrarySource-compatible browser backed by the offline catalog.
@@ -2790,6 +3009,11 @@ class OfflineLibrarySource:
     #: filter. What goes is the panel.
     supported_filters = frozenset()
 
+    #: Serializes reload(); see there. On the class, so a source the tests
+    #: build without __init__ has one too. There is one offline source at a
+    #: time, so sharing it costs nothing.
+    _reload_lock = threading.Lock()
+
     def __init__(self, catalog_path):
         self.catalog_path = catalog_path
         self.root: Optional[str] = (os.path.dirname(catalog_path)
@@ -2798,32 +3022,78 @@ class OfflineLibrarySource:
         self.reload()
 
     def reload(self):
-        rows = []
-        playlists = []
-        playlist_rows = {}  # playlist_id -> ordered list of download rows
-        if self.catalog_path:
-            # reload() runs from __init__ (BrowserApp._enter_offline): a corrupt
-            # or unreadable catalog must degrade to an empty offline library, not
-            # crash the browser window. SyncDB already tolerates a missing file.
+        """Bring the snapshot up to date with the catalog.
+
+        **Incremental when the catalog can say what changed.** The catalog
+        journals every change a reader could see (``catalog_changes``, see
+        ``sync/db.py``), and the snapshot remembers the revision it was read
+        at. A reload reads only the rows changed since, parses only their
+        ``item_json``, and builds the new snapshot around every other DTO of
+        the old one -- copy-on-write, so a reader still holding the old
+        snapshot keeps an intact one. During an auto-download batch that is
+        one row per finished file, not the whole catalog per finished file.
+        A catalog without a journal, or one trimmed past our revision, is
+        read whole, as every reload was before.
+
+        Serialized: two reloads racing would each build on the same old
+        snapshot, and the slower one would publish without the faster one's
+        change.
+        """
+        with self._reload_lock:
+            self._snap = self._read(self._snap)
+
+    def _read(self, old):
+        if not self.catalog_path:
+            return _OfflineSnapshot()
+        # reload() runs from __init__ (BrowserApp._enter_offline): a corrupt
+        # or unreadable catalog must degrade to an empty offline library, not
+        # crash the browser window. SyncDB already tolerates a missing file.
+        try:
+            db = SyncDB(self.catalog_path, read_only=True)
             try:
-                db = SyncDB(self.catalog_path, read_only=True)
-                try:
-                    rows = db.list(status=STATUS_COMPLETE)
-                    playlists = db.list_playlists()
-                    for pl in playlists:
-                        playlist_rows[pl["playlist_id"]] = db.playlist_item_rows(
-                            pl["playlist_id"])
-                finally:
-                    db.close()
-            except Exception:
-                log.warning("Failed to open offline catalog %s",
-                            self.catalog_path, exc_info=True)
-                rows, playlists, playlist_rows = [], [], {}
+                return self._read_from(db, old)
+            finally:
+                db.close()
+        except Exception:
+            log.warning("Failed to open offline catalog %s",
+                        self.catalog_path, exc_info=True)
+            return _OfflineSnapshot()
+
+    def _read_from(self, db, old):
+        rev, changed, playlists_changed = db.changes_since(old.rev)
+        if old.rev and changed is not None:
+            if not changed and not playlists_changed:
+                return old
+            rows = dict(old.rows)
+            parsed = dict(old.parsed)
+            for item_id, row in db.get_many(changed).items():
+                if row.get("status") == STATUS_COMPLETE:
+                    rows[item_id] = row
+                    parsed[item_id] = self._item_from_row(row)
+            for item_id in changed:
+                if rows.get(item_id) is not old.rows.get(item_id):
+                    continue        # replaced just above
+                # Gone, or no longer complete.
+                rows.pop(item_id, None)
+                parsed.pop(item_id, None)
+            ordered = sorted(rows.values(), key=_catalog_order)
+        else:
+            # Read before the rows, so a change landing in between is in
+            # both and the next reload re-applies it (see catalog_rev).
+            rev = db.catalog_rev()
+            ordered = db.list(status=STATUS_COMPLETE)
+            parsed = {r["item_id"]: self._item_from_row(r) for r in ordered}
+            playlists_changed = True
+        if playlists_changed:
+            playlist_dtos, playlist_items, playlist_server = \
+                self._read_playlists(db, parsed)
+        else:
+            playlist_dtos, playlist_items, playlist_server = (
+                old.playlists, old.playlist_items, old.playlist_server)
         # Build into locals, then publish ONE snapshot object in a single
         # assignment. reload() can run on a browser api-pool thread (a download
         # finished while browsing offline), so a concurrent reader must never
         # observe a half-populated list or a torn mix of attributes.
-        by_id = {r["item_id"]: r for r in rows}
         items = []
         # series_id -> server_id (for series artwork)
         series_server: dict[str, Any] = {}
@@ -2831,8 +3101,8 @@ class OfflineLibrarySource:
         season_server: dict[str, Any] = {}
         # season_id -> series_id (artwork fallback)
         season_series: dict[str, Any] = {}
-        for row in rows:
-            item = self._item_from_row(row)
+        for row in ordered:
+            item = parsed.get(row["item_id"])
             if item is not None:
                 items.append(item)
             if row.get("type") == "Episode" and row.get("series_id"):
@@ -2840,12 +3110,25 @@ class OfflineLibrarySource:
                 if row.get("season_id"):
                     season_server.setdefault(row["season_id"], row.get("server_id"))
                     season_series.setdefault(row["season_id"], row["series_id"])
-        # Playlist DTOs + their ordered downloaded items (drop empties defensively;
-        # list_playlists already requires ≥1 complete item).
+        books, book_items = self._book_shelf(items)
+        return _OfflineSnapshot(
+            rows={r["item_id"]: r for r in ordered}, items=items,
+            series_server=series_server,
+            season_server=season_server, season_series=season_series,
+            playlists=playlist_dtos, playlist_items=playlist_items,
+            playlist_server=playlist_server,
+            books=books, book_items=book_items, rev=rev, parsed=parsed)
+
+    def _read_playlists(self, db, parsed):
+        """Playlist DTOs + their ordered downloaded items (drop empties
+        defensively; list_playlists already requires ≥1 complete item).
+        A member's DTO is the one the library already parsed, when it has
+        it."""
         playlist_dtos, playlist_items, playlist_server = [], {}, {}
-        for pl in playlists:
+        for pl in db.list_playlists():
             pid = pl["playlist_id"]
-            pl_items = [self._item_from_row(r) for r in playlist_rows.get(pid, [])]
+            pl_items = [parsed.get(r["item_id"]) or self._item_from_row(r)
+                        for r in db.playlist_item_rows(pid)]
             pl_items = [i for i in pl_items if i is not None]
             if not pl_items:
                 continue
@@ -2853,13 +3136,7 @@ class OfflineLibrarySource:
                                   "Type": "Playlist", "ImageTags": {}})
             playlist_items[pid] = pl_items
             playlist_server[pid] = pl.get("server_id")
-        books, book_items = self._book_shelf(items)
-        self._snap = _OfflineSnapshot(
-            rows=by_id, items=items, series_server=series_server,
-            season_server=season_server, season_series=season_series,
-            playlists=playlist_dtos, playlist_items=playlist_items,
-            playlist_server=playlist_server,
-            books=books, book_items=book_items)
+        return playlist_dtos, playlist_items, playlist_server
 
     def stop(self):
         pass
@@ -2869,30 +3146,21 @@ class OfflineLibrarySource:
 
     # -- browsing ----------------------------------------------------------
 
-    @staticmethod
-    def _aggregate_userdata(episodes):
-        """UserData for a synthesized Series/Season DTO, derived from its
-        downloaded episodes. Without it the watched badge/label lies offline:
-        ``is_watched`` falls back to UnplayedItemCount for these types, and a
-        missing UserData reads as never-watched. Counts only what's downloaded
-        — offline that IS the visible library."""
-        unplayed = sum(1 for e in episodes
-                       if not (e.get("UserData") or {}).get("Played"))
-        return {"Played": unplayed == 0, "UnplayedItemCount": unplayed}
+    _aggregate_userdata = staticmethod(_aggregate_userdata)
 
     def get_libraries(self, server_uuid):
         snap = self._snap
         libs = []
-        if any(i.get("Type") == "Movie" for i in snap.items):
+        if snap.by_type.get("Movie"):
             libs.append({"Id": "offline:movies", "Name": _("Movies"),
                          "Type": "CollectionFolder", "CollectionType": "movies",
                          "ImageTags": {}})
         # Home videos (Type=Video) are their own section, not lumped in Movies.
-        if any(i.get("Type") == "Video" for i in snap.items):
+        if snap.by_type.get("Video"):
             libs.append({"Id": "offline:videos", "Name": _("Videos"),
                          "Type": "CollectionFolder", "CollectionType": "homevideos",
                          "ImageTags": {}})
-        if any(i.get("Type") == "Episode" for i in snap.items):
+        if snap.series:
             libs.append({"Id": "offline:tv", "Name": _("TV Shows"),
                          "Type": "CollectionFolder", "CollectionType": "tvshows",
                          "ImageTags": {}})
@@ -2914,34 +3182,10 @@ class OfflineLibrarySource:
         return libs
 
     def _series_list(self, snap=None):
+        """The synthesized series, first-downloaded first. Built by the
+        snapshot; see ``_OfflineSnapshot._index_series``."""
         snap = snap or self._snap
-        episodes_by_series: dict[str, list[Any]]
-        episodes_by_series, names, order = {}, {}, []
-        for item in snap.items:
-            if item.get("Type") != "Episode":
-                continue
-            sid = item.get("SeriesId")
-            if not sid:
-                continue
-            if sid not in episodes_by_series:
-                episodes_by_series[sid] = []
-                names[sid] = item.get("SeriesName") or _("Series")
-                order.append(sid)
-            episodes_by_series[sid].append(item)
-        return [{"Id": sid, "Name": names[sid], "Type": "Series",
-                 "ImageTags": {},
-                 # A synthesized DTO has to answer the questions a real one
-                 # would, and the grid asks this one: GridPage._grid_shape
-                 # takes the MEDIAN PrimaryImageAspectRatio across the row and
-                 # falls back to SQUARE when nothing carries one -- so a
-                 # downloaded-shows grid came out as square cards with the
-                 # posters letterboxed inside them. A Series' Primary image is
-                 # a poster; the server says 2:3 for these, and the offline
-                 # catalog stores episodes, not the series, so there is
-                 # nothing else to read it from.
-                 "PrimaryImageAspectRatio": 2 / 3,
-                 "UserData": self._aggregate_userdata(episodes_by_series[sid])}
-                for sid in order]
+        return list(snap.series.values())
 
     @staticmethod
     def _book_shelf(items):
@@ -3055,13 +3299,13 @@ class OfflineLibrarySource:
         # Heterogeneous by design: titles and item lists go in first, the
         # slot/kind ints are stamped on below.
         rows: list[dict[str, Any]] = []
-        movies = [i for i in snap.items if i.get("Type") == "Movie"]
+        movies = snap.by_type.get("Movie")
         if movies:
-            rows.append({"title": _("Downloaded Movies"), "items": movies,
+            rows.append({"title": _("Downloaded Movies"), "items": list(movies),
                          "collection_type": "movies"})
-        videos = [i for i in snap.items if i.get("Type") == "Video"]
+        videos = snap.by_type.get("Video")
         if videos:
-            rows.append({"title": _("Downloaded Videos"), "items": videos,
+            rows.append({"title": _("Downloaded Videos"), "items": list(videos),
                          "collection_type": "homevideos"})
         series = self._series_list(snap)
         if series:
@@ -3117,31 +3361,27 @@ class OfflineLibrarySource:
         # the server for a kind of artwork (a downloaded item has one file per
         # type on disk) and the other scopes a server-side query. The offline
         # parent ids below already say what they list.
+        #
+        # Every listing is presorted by the snapshot, so a page is a slice;
+        # a rail letter narrows it by lookup, and only the other filters
+        # are a pass over what is left -- never a sort.
         snap = self._snap
-        if parent_id == "offline:movies":
-            items = [i for i in snap.items if i.get("Type") == "Movie"]
-        elif parent_id == "offline:videos":
-            items = [i for i in snap.items if i.get("Type") == "Video"]
-        elif parent_id == "offline:tv":
-            items = self._series_list(snap)
-        elif parent_id == "offline:books":
-            items = list(snap.books)
-        elif parent_id in snap.book_items:
-            # The chapters of one audiobook, in reading order. Returned
-            # whole and NOT re-sorted below: BooksPage plays them as a
-            # queue, and SortName would put chapter 10 after chapter 1.
+        if parent_id in snap.book_items:
+            # The chapters of one audiobook, in reading order, and NOT the
+            # name order below: BooksPage plays them as a queue, and
+            # SortName would put chapter 10 after chapter 1.
             items = snap.book_items[parent_id]
             return items[start_index:start_index + limit], len(items)
-        elif parent_id == "offline:playlists":
-            # Playlist tiles, name-sorted; contents keep playlist order via
-            # get_playlist_items and must NOT be re-sorted here.
-            items = sorted(snap.playlists,
-                           key=lambda i: (i.get("Name") or "").lower())
+        items = snap.listings.get(parent_id, [])
+        if parent_id == "offline:playlists":
+            # Playlist tiles; contents keep playlist order via
+            # get_playlist_items. Never filtered, as before.
             return items[start_index:start_index + limit], len(items)
-        else:
-            items = []
+        filters = dict(filters or {})
+        letter = filters.pop("letter", None)
+        if letter:
+            items = snap.letters.get(parent_id, {}).get(letter, [])
         items = self._apply_filters(items, filters)
-        items = sorted(items, key=lambda i: (i.get("Name") or "").lower())
         return items[start_index:start_index + limit], len(items)
 
     def get_person_items(self, server_uuid, person_id, start_index=0, limit=100,
@@ -3180,10 +3420,7 @@ class OfflineLibrarySource:
         return False
 
     def get_genres(self, server_uuid, parent_id=None):
-        genres: set[str] = set()
-        for i in self._snap.items:
-            genres.update(i.get("Genres") or [])
-        return sorted(genres)
+        return list(self._snap.genres)
 
     def get_filter_values(self, server_uuid, parent_id=None,
                           collection_type=None):
@@ -3229,13 +3466,9 @@ class OfflineLibrarySource:
                         limit=QUEUE_LIMIT):
         snap = self._snap
         if parent_id == "offline:tv":
-            pool = [i for i in snap.items if i.get("Type") == "Episode"]
-        elif parent_id == "offline:movies":
-            pool = [i for i in snap.items if i.get("Type") == "Movie"]
-        elif parent_id == "offline:videos":
-            pool = [i for i in snap.items if i.get("Type") == "Video"]
+            pool = snap.by_type.get("Episode", [])
         else:
-            pool = []
+            pool = snap.by_type.get(OFFLINE_LIBRARY_TYPES.get(parent_id), [])
         ids = [i["Id"] for i in pool if i.get("Id")]
         random.shuffle(ids)
         return ids[:limit]
@@ -3266,69 +3499,15 @@ class OfflineLibrarySource:
         return list(self._snap.playlist_items.get(playlist_id, []))
 
     def get_seasons(self, server_uuid, series_id):
-        snap = self._snap
-        episodes_by_key: dict[str, list[Any]]
-        seen, episodes_by_key, order = {}, {}, []
-        for item in snap.items:
-            if item.get("Type") != "Episode" or item.get("SeriesId") != series_id:
-                continue
-            key = item.get("SeasonId") or ("p%s" % item.get("ParentIndexNumber"))
-            if key not in seen:
-                pidx = item.get("ParentIndexNumber")
-                if item.get("SeasonName"):
-                    name = item["SeasonName"]
-                elif pidx == 0:
-                    name = _("Specials")
-                elif pidx is not None:
-                    name = _("Season %d") % pidx
-                else:
-                    name = _("Episodes")
-                # SeriesId is load-bearing, not decoration: opening a Season
-                # tile reads it to build the season route (see app.py's
-                # item-type routing), and without it the route carried
-                # series_id=None — which get_episodes filters against, so
-                # every episode was discarded and the season read "Nothing
-                # here yet." The live source gets this for free from the
-                # server's own Season DTO.
-                # SeriesName for the same reason as SeriesId, one screen
-                # further on: the season page puts it in the title bar, so
-                # without it an offline season says "Season 1" and never
-                # what it is a season of. The live server's Season DTO
-                # carries it; a synthesized one has to be told.
-                seen[key] = {"Id": item.get("SeasonId") or key, "Name": name,
-                             "Type": "Season", "ImageTags": {},
-                             "SeriesId": series_id,
-                             "SeriesName": item.get("SeriesName"),
-                             "IndexNumber": pidx}
-                episodes_by_key[key] = []
-                order.append(key)
-            episodes_by_key[key].append(item)
-        for key in order:
-            seen[key]["UserData"] = self._aggregate_userdata(episodes_by_key[key])
-        # Match Jellyfin's online order: by season number ascending (Specials =
-        # 0 first), with any unnumbered seasons last.
-        return sorted((seen[k] for k in order),
-                      key=lambda s: (s.get("IndexNumber") is None,
-                                     s.get("IndexNumber") or 0))
+        return list(self._snap.seasons.get(series_id, []))
 
     def get_episodes(self, server_uuid, series_id, season_id):
         # Seasons without a real SeasonId get a synthetic "p<ParentIndexNumber>"
-        # id in get_seasons; match those back by ParentIndexNumber (a real
-        # SeasonId is a hex GUID and never starts with "p").
-        synthetic = isinstance(season_id, str) and season_id.startswith("p")
-        eps = []
-        for i in self._snap.items:
-            if i.get("Type") != "Episode" or i.get("SeriesId") != series_id:
-                continue
-            if synthetic:
-                if ("p%s" % i.get("ParentIndexNumber")) != season_id:
-                    continue
-            elif i.get("SeasonId") != season_id:
-                continue
-            eps.append(i)
-        eps.sort(key=lambda i: (i.get("ParentIndexNumber") or 0,
-                                i.get("IndexNumber") or 0))
-        return eps
+        # id in get_seasons; the snapshot files every episode under that id
+        # as well as its real one (a real SeasonId is a hex GUID and never
+        # starts with "p").
+        return list(self._snap.season_episodes.get((series_id, season_id),
+                                                   []))
 
     @staticmethod
     def _item_from_row(row):
@@ -3372,12 +3551,12 @@ class OfflineLibrarySource:
                 return item
         # Synthesize a Series DTO so the series overview page renders offline.
         if item_id in snap.series_server:
-            eps = [i for i in snap.items if i.get("SeriesId") == item_id
-                   and i.get("Type") == "Episode"]
-            name = next((i.get("SeriesName") for i in eps), _("Series"))
-            return {"Id": item_id, "Name": name, "Type": "Series",
-                    "ImageTags": {},
-                    "UserData": self._aggregate_userdata(eps)}
+            series = snap.series.get(item_id) or {}
+            return {"Id": item_id,
+                    "Name": series.get("Name") or _("Series"),
+                    "Type": "Series", "ImageTags": {},
+                    "UserData": series.get("UserData")
+                    or _aggregate_userdata([])}
         # A synthesized audiobook container. BooksPage asks for the folder's
         # own DTO to draw the album header, so this is not optional -- the
         # album renders with no title and no action bar without it.
@@ -3386,10 +3565,7 @@ class OfflineLibrarySource:
         return None
 
     def get_series_queue(self, server_uuid, series_id, start_item_id=None, limit=100):
-        eps = [i for i in self._snap.items
-               if i.get("Type") == "Episode" and i.get("SeriesId") == series_id]
-        eps.sort(key=lambda i: (i.get("ParentIndexNumber") or 0,
-                                i.get("IndexNumber") or 0))
+        eps = self._snap.series_episodes.get(series_id, [])
         if start_item_id:
             ids = [e.get("Id") for e in eps]
             if start_item_id in ids:
@@ -3444,9 +3620,11 @@ class OfflineLibrarySource:
         # Same budget as online, and for the same reason -- the screen above
         # splits one answer into a row per type. A downloaded library is
         # small enough that this is the whole of it either way.
-        needle = term.lower()
-        return [i for i in self._snap.items
-                if needle in (i.get("Name") or "").lower()][:limit]
+        return self._snap.search_index.query(term, limit)
+
+    def search_local(self, server_uuid, term, limit=SEARCH_LIMIT):
+        """The whole answer, offline: the catalog is the index."""
+        return self.search(server_uuid, term, limit)
 
     # -- images (local files) ---------------------------------------------
 
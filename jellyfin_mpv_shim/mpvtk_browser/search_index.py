@@ -0,0 +1,183 @@
+"""Search over items the browser has already been shown.
+
+Answers a keystroke from memory, so the search screen has something to draw
+before the server has been asked anything. The server is still the
+authority -- it knows the whole library, this knows what has scrolled past
+-- and its answer replaces this one as it lands (see ``pages/search.py``).
+
+**Trigrams for substrings, word starts for short terms.** A search box is
+typed into one letter at a time, so the first two keystrokes are too short
+to have a trigram at all; they match the start of a word instead, which is
+also what a two-letter search is usually for ("st" for Star Trek, not for
+"Best"). From three letters on, the candidates are the intersection of the
+term's trigram postings, and each one is checked against the name itself --
+trigrams are a filter, and "abcab" has every trigram of "cabc" without
+containing it.
+
+Bounded, oldest first: a session that walks a 40,000-film library would
+otherwise index all of it, and the point of this is a fast partial answer,
+not a second catalog. And what it keeps of each item is a tile
+(``projections.TILE_KEYS``), which is all a result row draws: the browse
+calls feeding it ask for ``Overview`` and more, and holding twenty thousand
+of those whole would undo the trimming the grids do.
+"""
+
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from .projections import TILE_KEYS
+
+#: How many items one index holds before the oldest go.
+ITEM_LIMIT = 20000
+
+#: What is worth indexing: the types a search screen draws a row for.
+#: Mirrors ``repository.SEARCH_TYPES`` plus the two whose rows come from
+#: their own requests.
+INDEXED_TYPES = frozenset({
+    "Movie", "Series", "Episode", "Video", "MusicVideo", "MusicAlbum",
+    "Audio", "AudioBook", "Book", "MusicArtist", "Person",
+})
+
+
+def normalize(text):
+    """Case- and accent-folded, so "Amelie" finds "Amélie"."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in decomposed
+                   if not unicodedata.combining(ch)).casefold()
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """Per-server index of item DTOs. Thread-safe: fed from api-pool
+    threads, queried from the loop thread."""
+
+    def __init__(self, limit=ITEM_LIMIT, types=INDEXED_TYPES,
+                 keys=TILE_KEYS):
+        self._limit = limit
+        #: None indexes every type -- the offline catalog, which is only
+        #: ever things someone chose to download.
+        self._types = types
+        #: The DTO keys an entry keeps, or None to keep the caller's dict
+        #: itself -- the offline snapshot, which holds every item anyway.
+        self._keys_kept = keys
+        self._index_lock = threading.Lock()
+        #: id -> (folded name, item), oldest first.
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        #: trigram -> ids.
+        self._grams: dict = {}
+        #: first one and two letters of each word -> ids.
+        self._starts: dict = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, items):
+        """Index every searchable DTO in ``items``; anything else is skipped.
+        Re-adding an id refreshes it (newer UserData wins)."""
+        with self._index_lock:
+            for item in items or ():
+                if not isinstance(item, dict):
+                    continue
+                item_id, name = item.get("Id"), item.get("Name")
+                if not item_id or not name:
+                    continue
+                if self._types is not None \
+                        and item.get("Type") not in self._types:
+                    continue
+                self._drop(item_id)
+                folded = normalize(name)
+                if self._keys_kept is not None:
+                    keep = self._keys_kept
+                    item = {k: v for k, v in item.items()
+                            if k in keep or k.startswith("_")}
+                self._items[item_id] = (folded, item)
+                for key in self._keys(folded):
+                    table = self._grams if len(key) == 3 else self._starts
+                    table.setdefault(key, set()).add(item_id)
+            while len(self._items) > self._limit:
+                self._drop(next(iter(self._items)))
+
+    def clear(self):
+        with self._index_lock:
+            self._items.clear()
+            self._grams.clear()
+            self._starts.clear()
+
+    @staticmethod
+    def _keys(folded):
+        # Told apart by length: trigrams are 3, word starts 1 and 2. A
+        # word start of 3 would collide with a trigram, and a three-letter
+        # term goes to the trigrams anyway.
+        starts = set()
+        for word in folded.split():
+            starts.add(word[:1])
+            starts.add(word[:2])
+        return _trigrams(folded) | starts
+
+    def _drop(self, item_id):
+        entry = self._items.pop(item_id, None)
+        if entry is None:
+            return
+        for key in self._keys(entry[0]):
+            table = self._grams if len(key) == 3 else self._starts
+            ids = table.get(key)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del table[key]
+
+    def query(self, term, limit=None):
+        """Items whose name matches ``term``, best first.
+
+        Best is: the name starts with it, then a word does, then it is
+        anywhere in the name; name order within each. The same ranking the
+        server's search gives a title match, near enough that a result does
+        not jump rows when the server's answer replaces this one.
+        """
+        needle = normalize(term).strip()
+        if not needle:
+            return []
+        with self._index_lock:
+            if len(needle) < 3:
+                ids = set(self._starts.get(needle, ()))
+            else:
+                ids = None
+                for gram in _trigrams(needle):
+                    posting = self._grams.get(gram)
+                    if not posting:
+                        return []
+                    ids = set(posting) if ids is None else ids & posting
+                    if not ids:
+                        return []
+                ids = ids or set()
+            hits = []
+            for item_id in ids:
+                folded, item = self._items[item_id]
+                at = folded.find(needle)
+                if at < 0:
+                    continue
+                if at == 0:
+                    rank = 0
+                elif folded[at - 1] == " ":
+                    rank = 1
+                else:
+                    rank = 2
+                hits.append((rank, folded, item))
+        hits.sort(key=lambda h: (h[0], h[1]))
+        out = [h[2] for h in hits]
+        return out if limit is None else out[:limit]
+
+
+def merge(server, local):
+    """The server's answer, then any local hit it did not include.
+
+    Server first because it is ranked against the whole library; the local
+    tail is what the server has not returned *yet* (a superseded query, a
+    slow one) or will not (an offline item on a server that is away)."""
+    seen = {item.get("Id") for item in server}
+    return list(server) + [item for item in local
+                           if item.get("Id") not in seen]
@@ -1499,6 +1499,22 @@ class StripStore:
                     self._touch(key)
                     return
 
+    def holds(self, entry):
+        """Whether ``entry`` is still this cache's, touching it if so.
+
+        For a caller that made an entry ahead of showing it -- the reader's
+        next page -- and has not asked for it since. It may have aged out
+        in between, and an entry that has is FREED, so it is checked by
+        identity: ``keep``'s match on ``src`` would take a recycled address
+        for the old bitmap.
+        """
+        with self._lock:
+            for key, cached in self._cache.items():
+                if cached is entry:
+                    self._touch(key)
+                    return True
+        return False
+
     def set_memory_pressure(self, tight):
         """Switch between the roomy and the small-machine byte budget.
 
@@ -6,12 +6,18 @@ methods on the browser, plus the SORTS re-export. It shrinks to nothing as
 those callers move; see ``docs/archive/ARCHITECTURE_TARGET.md`` §3.2.
 """
 
+import logging
+import time
+
 from ..i18n import _
 from .components import chrome, detail
+from .pages.search import TYPING_MIN_CHARS
 # Grid sort modes live with the page that owns them; re-exported because
 # app.py and the tests have always imported them from here.
 from .pages.grid import SORTS  # noqa: F401
 
+log = logging.getLogger("mpvtk_browser.views")
+
 
 class ViewsMixin:
 
@@ -67,12 +73,96 @@ class ViewsMixin:
         return detail.people_row(self.tiles, people)
 
 
+    #: How long the search box has to be still before the server is asked.
+    #: Long enough that a word typed at speed is one query rather than one
+    #: per letter, short enough that a pause reads as "now look".
+    SEARCH_DEBOUNCE = 0.35
+
     def _search(self, term):
+        """Enter, or the Search button: search for ``term`` now.
+
+        On a results screen the box is already driving, this ends the typing
+        rather than pushing a second screen for the same search: the query
+        goes now instead of after the debounce (unless its answer is already
+        drawn), and focus moves to the results.
+        """
         term = (term or "").strip()
         if not term:
             return
-        self.navigate({"kind": "search", "server": self.server,
-                       "term": term, "title": _("Search")})
+        route = self.route
+        if route.get("kind") != "search" or not route.get("_typing"):
+            self.navigate({"kind": "search", "server": self.server,
+                           "term": term, "title": _("Search")})
+            return
+        route.pop("_typing", None)
+        route["term"] = route["_settled"] = term
+        if (route.get("_data") or {}).get("term") != term:
+            self._load_route(route)
+        focus = getattr(self.app, "focus", None)
+        if focus is not None:
+            try:
+                focus()
+            except Exception:
+                log.debug("autofocus request failed", exc_info=True)
+        self.invalidate()
+
+    def _search_typed(self, term):
+        """A keystroke in the search box: search as it is typed.
+
+        The first term long enough opens a results screen marked
+        ``_typing``; every keystroke after that rewrites its term in place,
+        which redraws from the local index at once (``SearchPage._local``)
+        and restarts the wait before the server is asked. One settle thread
+        per browser does the waiting, like the UserDataChanged debounce.
+        """
+        self._search_box["term"] = term
+        term = (term or "").strip()
+        route = self.route
+        if route.get("kind") != "search" or not route.get("_typing"):
+            if len(term) < TYPING_MIN_CHARS:
+                return
+            route = {"kind": "search", "server": self.server, "term": term,
+                     "title": _("Search"), "_typing": True,
+                     "_typed_at": time.monotonic()}
+            self.navigate(route)
+        else:
+            route["term"] = term
+            route["_typed_at"] = time.monotonic()
+            self.invalidate()
+        self._settle_search()
+
+    def _settle_search(self):
+        def tick():
+            while True:
+                # The route on screen, read again every time round rather
+                # than the one this thread was started for: a keystroke
+                # that opens a new results screen while this one waits is
+                # refused a thread of its own, and its term would never be
+                # sent.
+                route = self.route
+                due = route.get("_typed_at", 0) + self.SEARCH_DEBOUNCE
+                wait = due - time.monotonic()
+                if wait > 0:
+                    if self._shutdown_evt.wait(wait):
+                        return
+                    continue
+                # Decided under the lock _start_daemon takes: a keystroke
+                # either lands before this and is seen, or after it and
+                # finds the slot free to start its own thread. Releasing
+                # the slot here is the toast timer's early release.
+                with self._poller_lock:
+                    if self.route is not route:
+                        continue        # moved while we looked; look again
+                    term = route.get("term")
+                    if route.get("kind") != "search" \
+                            or not route.get("_typing") \
+                            or route.get("_settled") == term:
+                        self._search_thread = None
+                        return
+                route["_settled"] = term
+                self._load_route(route)
+
+        self._start_daemon("_search_thread", "mpvtk-search", tick)
 
 
     # ---------------------------------------- route loaders
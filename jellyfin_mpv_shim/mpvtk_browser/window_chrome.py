@@ -309,7 +309,7 @@ def chrome_bar(b, compact, probe=False, servers=None,
                 # abuts, on every screen.
                 size="large",
                 w=140 if compact else 220,
-                on_change=lambda v: b._search_box.__setitem__("term", v),
+                on_change=b._search_typed,
                 on_submit=b._search),
         # The textbox submits on Enter, but a visible button is the
         # discoverable affordance (and the only one with a pointer).
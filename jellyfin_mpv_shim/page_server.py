@@ -0,0 +1,191 @@
+"""Comic pages held in memory and handed to mpv over loopback HTTP.
+
+The comic reader plays each page as a file (``docs/readers.md`` §5), and
+"a file" used to mean one written to disk and unlinked again for every page
+turned — a write and a delete per page, on an SD card too. With
+``settings.comic_pages_in_memory`` the page's bytes stay in this process
+instead, and mpv is handed ``http://127.0.0.1:<port>/<token>/<name>``.
+
+**Loopback HTTP rather than ``memory://``.** mpv's ``memory://`` takes the
+data *in the URL*, which is a C string on libmpv and a JSON string on the
+IPC backend: a JPEG has NUL bytes in it and is not UTF-8, so neither can
+carry one. HTTP is a protocol every mpv build opens, on both backends, and a
+page is one GET of bytes already in RAM.
+
+**The token is the access control.** The server listens on 127.0.0.1 only,
+but other users on the same machine can reach that too; every URL carries a
+random token generated at start, and anything else is a 404.
+
+**Bounded, and shared with the prefetch.** ``MEMORY_BUDGET`` bytes across
+every open comic, least recently used out first; the reader's prefetch
+fills the same store, so a page extracted ahead is a page already served.
+A page over ``MEMORY_PAGE_MAX`` is not held at all — the archive writes it
+to disk the old way. See ``docs/readers.md`` §5.9.
+"""
+
+import logging
+import secrets
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+
+log = logging.getLogger("comic.server")
+
+#: Largest page held in memory. Past it the page is a file, as before: a
+#: page that size is a scan at print resolution, rare, and not worth a
+#: fifth of the budget.
+MEMORY_PAGE_MAX = 8 * 1024 * 1024
+
+#: Bytes of page held in memory, across every open comic. The reader's
+#: prefetch window is five pages (``pages/comic.py``) plus the one queued
+#: in mpv, so this holds that many at MEMORY_PAGE_MAX with room over — a
+#: page is evicted only once nothing is about to ask for it.
+MEMORY_BUDGET = 64 * 1024 * 1024
+
+#: Content types by suffix. mpv sniffs the content anyway; this is for
+#: ffmpeg's http protocol, which passes the type on as a probing hint.
+_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png",
+          ".gif": "image/gif", ".webp": "image/webp", ".bmp": "image/bmp",
+          ".avif": "image/avif", ".jxl": "image/jxl"}
+
+
+class PageServer:
+    """Bytes by name, served on loopback until evicted or discarded."""
+
+    def __init__(self, budget=MEMORY_BUDGET):
+        self.budget = budget
+        #: name -> bytes, most recently used last.
+        self._pages = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._token = secrets.token_urlsafe(16)
+        self._httpd = None
+        self._thread = None
+
+    # -- the store ---------------------------------------------------------
+
+    def put(self, name, data):
+        """Hold ``data`` as ``name`` and return the URL mpv can load it
+        from, or None when the server cannot be started."""
+        base = self._base()
+        if base is None:
+            return None
+        with self._lock:
+            old = self._pages.pop(name, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._pages[name] = data
+            self._bytes += len(data)
+            # Never the page just put: it is about to be asked for.
+            while self._bytes > self.budget and len(self._pages) > 1:
+                _name, dropped = self._pages.popitem(last=False)
+                self._bytes -= len(dropped)
+        return base + quote(name)
+
+    def get(self, name):
+        """The bytes held as ``name``, or None. Counts as a use."""
+        with self._lock:
+            data = self._pages.get(name)
+            if data is not None:
+                self._pages.move_to_end(name)
+            return data
+
+    def url(self, name):
+        """Where ``name`` is served, if it is held; None otherwise."""
+        base = self._base()
+        if base is None or self.get(name) is None:
+            return None
+        return base + quote(name)
+
+    def discard(self, prefix):
+        """Drop every page whose name starts with ``prefix`` — a comic's
+        pages, when it closes."""
+        with self._lock:
+            for name in [n for n in self._pages if n.startswith(prefix)]:
+                self._bytes -= len(self._pages.pop(name))
+
+    @property
+    def held_bytes(self):
+        return self._bytes
+
+    # -- the server --------------------------------------------------------
+
+    def _base(self):
+        """``http://127.0.0.1:<port>/<token>/``, starting the server on
+        first use. None when it cannot listen."""
+        with self._lock:
+            if self._httpd is None:
+                try:
+                    self._httpd = ThreadingHTTPServer(("127.0.0.1", 0),
+                                                      self._handler())
+                except OSError:
+                    log.warning("cannot serve comic pages from memory; "
+                                "writing them to disk", exc_info=True)
+                    return None
+                self._httpd.daemon_threads = True
+                self._thread = threading.Thread(
+                    target=self._httpd.serve_forever, name="comic-pages",
+                    daemon=True)
+                self._thread.start()
+            return "http://127.0.0.1:%d/%s/" % (
+                self._httpd.server_address[1], self._token)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self._answer(body=True)
+
+            def do_HEAD(self):
+                self._answer(body=False)
+
+            def _answer(self, body):
+                token, _sep, name = self.path.lstrip("/").partition("/")
+                data = None
+                # As bytes: http.server decodes the request line as
+                # latin-1, and compare_digest refuses a str that is not
+                # ASCII -- a stray high byte was a traceback, not a 404.
+                if secrets.compare_digest(token.encode("latin-1"),
+                                          server._token.encode()):
+                    data = server.get(unquote(name))
+                if data is None:
+                    self.send_error(404)
+                    return
+                suffix = name[name.rfind("."):].lower() if "." in name else ""
+                self.send_response(200)
+                self.send_header("Content-Type",
+                                 _TYPES.get(suffix, "application/octet-stream"))
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(data)
+
+            def log_message(self, fmt, *args):
+                log.debug("page server: " + fmt, *args)
+
+        return Handler
+
+    def stop(self):
+        """Stop serving and drop every page. For tests and shutdown."""
+        with self._lock:
+            httpd, self._httpd = self._httpd, None
+            self._pages.clear()
+            self._bytes = 0
+        if httpd is not None:
+            httpd.shutdown()
+            httpd.server_close()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared():
+    """The process's one page server, made on first use."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = PageServer()
+        return _shared
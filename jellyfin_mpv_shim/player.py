@@ -35,6 +35,7 @@ from .mpv_events import observe as observe_property
 from .mpv_events import wait_property
 from .player_audio import AudioMixin
 from .player_reporting import ReportingMixin
+from .player_advance import AdvanceMixin
 from . import player_window
 from .player_window import WindowMixin, wlog
 from .mpv_options import build_mpv_options, mpv_scripts, resolve_osc_style
@@ -45,7 +46,6 @@ from .menu import OSDMenu
 from .osc_bridge import OscBridge
 from .constants import APP_NAME
 from .syncplay import SyncPlayManager
-from .update_check import UpdateChecker
 from .i18n import _
 
 if TYPE_CHECKING:
@@ -526,13 +526,17 @@ def chapter_target(chapters, pos, direction):
     return None
 
 
-class PlayerManager(AudioMixin, ReportingMixin, WindowMixin):
+class PlayerManager(AudioMixin, ReportingMixin, WindowMixin, AdvanceMixin):
     """
     The underlying player is thread safe, however, locks are used in this
     class to prevent concurrent control events hitting the player, which
     violates assumptions.
     """
 
+    #: Guards building :attr:`update_check`. Its own lock rather than
+    #: ``_lock``, which the first access may arrive holding or not.
+    _update_check_lock = Lock()
+
     def __init__(self):
         self._video = None
         self.timeline_trigger = None
@@ -587,7 +591,8 @@ class PlayerManager(AudioMixin, ReportingMixin, WindowMixin):
         # read back, because writing it is a resize command (see
         # _sync_window_geometry) and a redundant write is not free.
         self._geometry_armed = None
-        self.update_check = UpdateChecker(self)
+        # Built on first use; see the update_check property.
+        self._update_check = None
         # Both built by the first _init_mpv and kept across every later one.
         self.menu = None
         self.syncplay = None
@@ -1254,6 +1259,9 @@ class PlayerManager(AudioMixin, ReportingMixin, WindowMixin):
         self._observe("window-maximized", self._on_border_change)
         self._observe("fullscreen", self._on_border_change)
         self._observe("eof-reached", self._on_eof_reached)
+        # Moves only when mpv advances onto a track appended for gapless
+        # music (player_advance); every start of ours replaces the playlist.
+        self._observe("playlist-pos", self._on_playlist_pos)
         self._observe("playback-abort", self._on_playback_abort)
         self._observe("seeking", self._on_seeking)
         self._observe("pause", self._on_pause_change)
@@ -2117,6 +2125,8 @@ class PlayerManager(AudioMixin, ReportingMixin, WindowMixin):
                     "Queued task %s failed.", getattr(func, "__name__", func)
                 )
         self._pump_trickplay()
+        self._pump_preresolve()
+        self._pump_gapless()
         prev_hud_skip = self._hud_skip
         try:
             if (
@@ -2310,18 +2320,36 @@ class PlayerManager(AudioMixin, ReportingMixin, WindowMixin):
             self._player.http_header_fields = []
         except Exception:
             log.debug("could not clear http-header-fields", exc_info=True)
+        header = self._auth_header_for(video)
+        if header is None:
+            return False
+        try:
+            self._player.http_header_fields = ["Authorization: " + header]
+        except Exception:
+            log.warning("mpv would not take http-header-fields; falling back "
+                        "to a token in the URL", exc_info=True)
+            return False
+        return True
+
+    def _auth_header_for(self, video):
+        """The Authorization header mpv may be given for ``video``, or None
+        when it must not be (no token yet, or a subtitle on another host).
+
+        The decision half of _apply_auth_headers, with no mpv access, so the
+        next entry's pre-resolution (player_advance) can ask it ahead of time.
+        """
         client = getattr(video, "client", None)
         if client is None:
-            return False
+            return None
         try:
             header = client.http._get_authenication_header()
         except Exception:
             log.debug("could not build an auth header", exc_info=True)
-            return False
+            return None
         if not header or "Token=" not in header:
             # No token yet (an unauthenticated probe): nothing to send, and
             # claiming success would strip a url that needs one.
-            return False
+            return None
         try:
             foreign = video.foreign_subtitle_hosts()
         except Exception:
@@ -2336,14 +2364,8 @@ class PlayerManager(AudioMixin, ReportingMixin, WindowMixin):
             log.info("Not sending the auth header to mpv: this item has a "
                      "subtitle on %s, and the option is not per-URL.",
                      ", ".join(sorted(str(h) for h in foreign)))
-            return False
-        try:
-            self._player.http_header_fields = ["Authorization: " + header]
-        except Exception:
-            log.warning("mpv would not take http-header-fields; falling back "
-                        "to a token in the URL", exc_info=True)
-            return False
-        return True
+            return None
+        return header
 
     def _forced_hwdec(self):
         """Whether a shader profile has named the decoder it requires.
@@ -2567,6 +2589,9 @@ class PlayerManager(AudioMixin, ReportingMixin, WindowMixin):
                 # hand mpv a file only to stop it a moment later.
                 loaded = False
             else:
+                # A replace clears mpv's playlist, and an appended track
+                # with it (see player_advance).
+                self._gapless = None
                 self._player.play(self.url)
                 loaded = wait_property(
                     self._player,
@@ -2625,6 +2650,20 @@ class PlayerManager(AudioMixin, ReportingMixin, WindowMixin):
             return
         # A start that got this far succeeded; nothing is left to retry.
         self._failed_playback = None
+        self._begin_playback(video, offset, no_initial_timeline,
+                             is_initial_play, apply_memory, pause_stills)
+
+    def _begin_playback(self, video, offset=0, no_initial_timeline=False,
+                        is_initial_play=False, apply_memory=True,
+                        pause_stills=True):
+        """Everything that follows mpv having ``video`` playing: adopt it as
+        the current item, reset the per-file state, carry the track memory
+        over and report the start.
+
+        The second half of _play_media, and the whole of a gapless handoff
+        (player_advance), where mpv moved to an appended file by itself and
+        there is no load to wait for.
+        """
         self._video = video
         # Carried down to the set_paused() below, which is unconditional and
         # would otherwise undo this a few dozen lines later.
@@ -2714,7 +2753,8 @@ class PlayerManager(AudioMixin, ReportingMixin, WindowMixin):
         # the field symptom being intermittent TLS errors and opens dragging
         # out to tens of seconds. update() fires this once playback is
         # genuinely live (see _pump_trickplay).
-        self._trickplay_pending = bool(self.trickplay and not v_audio)
+        self._trickplay_pending = bool(self.trickplay
+                                       and not self._current_is_audio())
 
         self.should_send_timeline = True
         # Fresh offline-record throttle window for each newly playing item.
@@ -3223,7 +3263,7 @@ class PlayerManager(AudioMixin, ReportingMixin, WindowMixin):
                         video.parent.queue[0]["Id"])
                     new_video = first.video if first else None
                 else:
-                    new_video = video.parent.get_next().video
+                    new_video = self._next_media(video).video
                 self.send_timeline_stopped(True)
                 if new_video is None:
                     # Offline and the next episode isn't downloaded: end the
@@ -3310,7 +3350,7 @@ class PlayerManager(AudioMixin, ReportingMixin, WindowMixin):
     def play_next(self):
         video = self._video
         if video and video.parent.has_next:
-            new_video = video.parent.get_next().video
+            new_video = self._next_media(video).video
             self.send_timeline_stopped(True)
             if self.syncplay.is_enabled():
                 self.syncplay.request_next(video.get_playlist_id())
@@ -4136,6 +4176,36 @@ class PlayerManager(AudioMixin, ReportingMixin, WindowMixin):
             self._handle_mpv_disconnect()
             return False
 
+    def stream_health(self):
+        """Seconds of media mpv holds ahead of playback, for a stream read
+        from the network; None when nothing is, or mpv will not say.
+
+        What the download pacer reads (sync.manager._Pacer). A local file,
+        downloaded or on a share mpv reads as a file, is None rather than
+        its small read-ahead: it competes with no download, and its one
+        second of cache would read as a stream starving. Fully buffered is
+        infinite; stalled waiting for the network is zero.
+        """
+        if not self.is_playing():
+            return None
+        try:
+            if not self._player.demuxer_via_network:
+                return None
+            if self._player.paused_for_cache:
+                return 0.0
+            state = self._player.demuxer_cache_state or {}
+        except _mpv_errors:
+            self._handle_mpv_disconnect()
+            return None
+        except Exception:
+            return None
+        if state.get("eof"):
+            return float("inf")
+        if state.get("underrun"):
+            return 0.0
+        ahead = state.get("cache-duration")
+        return float(ahead) if ahead is not None else None
+
     def is_not_paused(self):
         try:
             return bool(
@@ -4208,6 +4278,24 @@ class PlayerManager(AudioMixin, ReportingMixin, WindowMixin):
         except _mpv_errors:
             self._handle_mpv_disconnect()
 
+    @property
+    def update_check(self):
+        """The release checker, built the first time something asks.
+
+        The first playback runs it and the OSD menu shows what it found;
+        neither is needed to put the first window up, and its module brings
+        ``webbrowser`` and the version parser with it
+        (``docs/architecture.md`` §9). Locked so a menu opened while the
+        first file starts cannot make a second one.
+        """
+        if self._update_check is None:
+            with self._update_check_lock:
+                if self._update_check is None:
+                    from .update_check import UpdateChecker
+
+                    self._update_check = UpdateChecker(self)
+        return self._update_check
+
     @property
     def osc_enabled(self):
         """Whether this player is supposed to have on-screen controls at all.
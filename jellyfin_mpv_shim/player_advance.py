@@ -0,0 +1,276 @@
+"""Moving to the next queue entry without a gap. ``AdvanceMixin``.
+
+**Pre-resolution.** Starting an entry is three server round trips before mpv
+is handed anything: the item (``Video.__init__``), PlaybackInfo, and the media
+segments (both in ``get_playback_url``). On a queue advance they all used to
+happen on the action thread *after* the previous file ended, so the gap
+between episodes -- and the dead air between album tracks -- was their sum
+plus mpv's open. Now, ``settings.preresolve_next_secs`` before the end, the
+next entry is built and resolved on a thread of its own, and the advance
+takes it if nothing it depended on has changed since. See
+docs/mpv-backends.md section 12.
+
+**What "changed" means is the key** (:meth:`_advance_key`): the published
+queue (replaced whole, never mutated -- see ``Media.insert_items``), the
+position in it, and the entry. Track memory is not in it: _play_media
+carries it into the new item after the url is built, on either path.
+Anything else that would change the resolution -- a quality override, a
+header that did not take -- is caught by ``Video.get_playback_url`` itself,
+which uses a pre-resolved url only when it was asked for the same thing.
+
+**Gapless music.** A resolved url is still a ``loadfile`` replace at the
+advance: mpv tears the file down, opens the next one cold, and the album has
+a gap in it. When the current item and the next are both audio
+(``settings.gapless_music``), the resolved url is instead appended to mpv's
+own playlist with ``prefetch-playlist`` on, and mpv moves onto it by itself
+at the end of the file. ``playlist-pos`` moving is the advance:
+:meth:`_gapless_handoff` reports the finished track and runs the same
+post-load bookkeeping as any start (``_begin_playback``), with no load. The
+playlist is kept to the current file and at most the one after it.
+
+The resolution runs without ``_lock``: it happens while the current file is
+playing, which is the whole point, and it must not queue behind a seek. The
+append and the handoff take it, because each acts on mpv's playlist and a
+start replaces that playlist.
+
+Before editing this file, read ``docs/mpv-backends.md``.
+"""
+
+import logging
+import threading
+import time
+
+from .conf import settings
+
+log = logging.getLogger("player")
+
+
+class AdvanceMixin:
+    #: (key, Media) for the next entry, resolved ahead; None when there is
+    #: none or it was taken.
+    _advance_ready = None
+    #: The key the pre-resolution in flight or held was made for, so the
+    #: next update() does not start a second one for the same entry.
+    _advance_started = None
+    #: Guards the two above between the resolving thread and the advance.
+    #: One player per process, so one lock at class level will do.
+    _advance_lock = threading.Lock()
+    #: (key, Media, epoch, url) while the next track sits appended in mpv's
+    #: playlist, waiting for mpv to move onto it; None otherwise. The epoch
+    #: is _play_epoch at the append, so a start in between retires it.
+    _gapless = None
+
+    def _advance_key(self, video):
+        """What the next entry's pre-resolution depends on, or None when
+        there is no next entry to resolve."""
+        media = getattr(video, "parent", None)
+        try:
+            if media is None or not media.has_next:
+                return None
+            queue = media.queue
+            entry = queue[media.seq + 1]
+            return (id(queue), media.seq, entry.get("PlaylistItemId"),
+                    entry.get("Id"))
+        except (AttributeError, IndexError, KeyError, TypeError):
+            # Not a queue this can key; the advance builds the entry itself.
+            return None
+
+    def _pump_preresolve(self):
+        """Start resolving the next entry once the current one is within
+        preresolve_next_secs of its end. Called from update() on the action
+        thread; reads mpv only once the cheap checks say it might matter."""
+        try:
+            lead = float(settings.preresolve_next_secs or 0)
+        except (TypeError, ValueError):
+            lead = 0
+        video = self._video
+        if (lead <= 0 or video is None or not settings.auto_play
+                or not getattr(video.parent, "has_next", False)):
+            return
+        if self.syncplay.is_enabled():
+            # The group decides what plays next, and when; an entry resolved
+            # here could be the wrong one by the time it says.
+            return
+        try:
+            position = self._player.playback_time
+            duration = self._player.duration
+        except Exception:
+            # A dead mpv is update()'s to notice, a few lines further on.
+            return
+        if position is None or not duration or duration - position > lead:
+            return
+        key = self._advance_key(video)
+        if key is None or key == self._advance_started:
+            return
+        with self._advance_lock:
+            self._advance_started = key
+            self._advance_ready = None
+        threading.Thread(target=self._preresolve, args=(video, key),
+                         name="preresolve-next", daemon=True).start()
+
+    def _preresolve(self, video, key):
+        """The pre-resolution thread: build the next entry and resolve its
+        url, and keep them if the key is still the one asked for."""
+        began = time.monotonic()
+        try:
+            media = video.parent.get_next()
+            new_video = media.video if media is not None else None
+            if new_video is None:
+                return
+            # Live items are refused by preresolve itself: PlaybackInfo
+            # opens a tuner for them. See Video.is_live.
+            new_video.preresolve(self._predict_auth_header(new_video))
+        except Exception:
+            # The advance resolves it the old way; nothing is lost but time.
+            log.debug("Pre-resolving the next entry failed.", exc_info=True)
+            return
+        with self._advance_lock:
+            if self._advance_started != key:
+                return
+            self._advance_ready = (key, media)
+        log.debug("Next entry resolved ahead in %.2fs.",
+                  time.monotonic() - began)
+
+    def _next_media(self, video):
+        """The Media for the entry after ``video``: the pre-resolved one
+        when it was made for exactly this advance, else built now."""
+        key = self._advance_key(video)
+        armed, self._gapless = self._gapless, None
+        if armed is not None and key is not None and armed[0] == key:
+            # Appended to mpv already; the caller's play() replaces the
+            # playlist, and the entry with it.
+            return armed[1]
+        with self._advance_lock:
+            ready, self._advance_ready = self._advance_ready, None
+            self._advance_started = None
+        if ready is not None and key is not None and ready[0] == key:
+            log.debug("Advancing to an entry resolved ahead.")
+            return ready[1]
+        return video.parent.get_next()
+
+    def _predict_auth_header(self, video):
+        """Whether play() will get mpv to take the Authorization header for
+        ``video`` -- the one input to its url the pre-resolution cannot
+        observe, because finding out means setting it. A wrong guess costs
+        only the saving: get_playback_url resolves again on a mismatch."""
+        return bool(self._mpv_alive and self._auth_header_for(video))
+
+    # -- gapless music -------------------------------------------------------
+
+    @staticmethod
+    def _is_audio(video):
+        item = getattr(video, "item", None) or {}
+        return item.get("MediaType") == "Audio" or item.get("Type") == "Audio"
+
+    def _pump_gapless(self):
+        """Append the resolved next track to mpv's playlist, or take back one
+        the queue has moved away from. Called from update() after
+        _pump_preresolve, on the action thread."""
+        video = self._video
+        armed = self._gapless
+        if armed is not None:
+            if video is None or armed[2] != self._play_epoch:
+                # A start or a stop replaced mpv's playlist already.
+                self._gapless = None
+            elif self._advance_key(video) != armed[0]:
+                self._withdraw_gapless()
+            return
+        ready = self._advance_ready
+        if (ready is None or not settings.gapless_music or video is None
+                or not settings.auto_play or self.repeat_mode == "one"
+                or not self._is_audio(video)
+                or self.syncplay.is_enabled()):
+            return
+        key, media = ready
+        new_video = getattr(media, "video", None)
+        held = getattr(new_video, "_preresolved", None)
+        if (held is None or not self._is_audio(new_video)
+                or held[0] != bool(video.auth_via_header)
+                or self._advance_key(video) != key):
+            # A header that would have to change between the two files
+            # cannot: http-header-fields is global and mpv opens the next
+            # one by itself. That advance takes the ordinary path.
+            return
+        if not self._lock.acquire(blocking=False):
+            # A start or a stop is under way; the next update() looks again.
+            return
+        try:
+            if self._video is not video or self._gapless is not None:
+                return
+            with self._advance_lock:
+                if self._advance_ready is not ready:
+                    return
+                self._advance_ready = None
+            try:
+                self._player.prefetch_playlist = True
+                self._player.command("loadfile", held[1], "append")
+            except Exception:
+                log.debug("Could not append the next track.", exc_info=True)
+                with self._advance_lock:
+                    self._advance_ready = ready
+                return
+            self._gapless = (key, media, self._play_epoch, held[1])
+            log.debug("Next track appended to mpv's playlist.")
+        finally:
+            self._lock.release()
+
+    def _withdraw_gapless(self):
+        """Take the appended track back out of mpv's playlist: the queue was
+        edited after it went in, so it is no longer what comes next."""
+        self._gapless = None
+        try:
+            self._player.command("playlist-remove", 1)
+        except Exception:
+            log.debug("Could not withdraw the appended track.", exc_info=True)
+
+    def _on_playlist_pos(self, _name, pos):
+        """mpv moved along its playlist: onto the appended track, when one
+        is armed. Deferred to the action thread like every other advance."""
+        armed = self._gapless
+        if armed is None or not isinstance(pos, int) or pos < 1:
+            return
+        self.put_task(self._gapless_handoff, armed[2])
+
+    def _gapless_handoff(self, epoch):
+        """mpv is playing the appended track: make it the current item.
+
+        What finished_callback and play() would have done, minus the load:
+        the finished track is reported (played, if it got to its end), its
+        entry leaves mpv's playlist, and _begin_playback adopts the new one.
+        """
+        with self._lock:
+            armed = self._gapless
+            if armed is None or armed[2] != epoch or epoch != self._play_epoch:
+                return
+            self._gapless = None
+            key, media, _epoch, url = armed
+            previous = self._video
+            if previous is None:
+                return
+            if self._advance_key(previous) != key:
+                # Edited between update()'s last look and mpv's move: what is
+                # playing is not what the queue now says comes next. End the
+                # track the ordinary way, which replaces it.
+                self._reached_eof = True
+                self._queue_finished()
+                return
+            new_video = media.video
+            # mpv has this url open; it is not a second start's to reuse.
+            new_video._preresolved = None
+            finished = self._finished_at_eof(previous)
+            self._reached_eof = finished
+            if settings.force_set_played and finished:
+                previous.set_played()
+            self.send_timeline_stopped(
+                True, options=self.get_timeline_options(True, video=previous))
+            try:
+                self._player.command("playlist-remove", 0)
+            except Exception:
+                log.debug("Could not drop the finished track from mpv's "
+                          "playlist.", exc_info=True)
+            self.pause_ignore = True
+            self.do_not_handle_pause = True
+            self.start_time = time.time()
+            self.url = url
+            log.info("Gapless advance to the next track.")
+            self._begin_playback(new_video)
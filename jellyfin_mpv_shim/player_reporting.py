@@ -407,20 +407,38 @@ class ReportingMixin:
                 # written while the server is still there. See
                 # `_record_progress` for the second gate that had to come
                 # off, and why there is now no gate here at all.
-                #
-                # Throttled, so this does not hammer SQLite on every 5s
-                # tick.
-                now = time.monotonic()
-                if now - self._last_offline_record >= 30:
-                    options = self.get_timeline_options(video=video)
-                    if options is not None:
-                        self._last_offline_record = now
-                        self._record_progress(
-                            video, options.get("PositionTicks"))
+                self._record_progress_due(video)
         except _mpv_errors:
             log.warning("MPV connection lost during timeline update.")
             self._handle_mpv_disconnect()
 
+    @synchronous("_tl_lock")
+    def record_timeline_locally(self):
+        """send_timeline's local half alone, for the ticks on which no report
+        to the server is due (see timeline.ReportPacer). The catalog keeps
+        its own cadence whatever the server is being sent."""
+        from .player import _mpv_errors
+
+        video = self._video
+        try:
+            if (
+                self.should_send_timeline
+                and video
+                and not self._player.playback_abort
+            ):
+                self._record_progress_due(video)
+        except _mpv_errors:
+            self._handle_mpv_disconnect()
+
+    def _record_progress_due(self, video):
+        # Throttled, so this does not hammer SQLite on every 5s tick.
+        now = time.monotonic()
+        if now - self._last_offline_record >= 30:
+            options = self.get_timeline_options(video=video)
+            if options is not None:
+                self._last_offline_record = now
+                self._record_progress(video, options.get("PositionTicks"))
+
     @synchronous("_tl_lock")
     def _session_playing_safe(self, client, options):
         try:
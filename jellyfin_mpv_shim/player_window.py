@@ -435,13 +435,65 @@ class WindowMixin:
             # image_display_duration (1s) and then idles.
             self._player.image_display_duration = "inf"
             self._player.keep_open = True
-            self._player.command("loadfile", path, "replace")
+            if settings.comic_preload_next and self._picture_is_next(path):
+                # preload_picture put it there and mpv has opened it.
+                self._player.command("playlist-next")
+            else:
+                self._player.command("loadfile", path, "replace")
             self._showing_browse_bg = False
         except _mpv_errors:
             self._handle_mpv_disconnect()
             return False
         return True
 
+    def preload_picture(self, path):
+        """Queue ``path`` behind the picture on screen, for mpv to open.
+
+        The comic reader's warm next page (``settings.comic_preload_next``,
+        docs/readers.md section 5.8). With ``prefetch-playlist`` on, mpv
+        opens the next playlist entry's demuxer as soon as the current
+        file has been read to its end -- at once, for a still -- so the
+        turn that reaches it is a ``playlist-next`` onto a file already
+        probed rather than a ``loadfile`` that starts cold. One slot: the
+        playlist is cut back to the picture on screen first.
+
+        Only while a picture is up. ``keep_open`` is what stops mpv moving
+        onto the queued entry by itself, and an image with
+        ``image_display_duration=inf`` never reaches its end anyway.
+        """
+        if (not self._mpv_alive or self._video is not None
+                or self._showing_browse_bg or not path):
+            return False
+        from .player import _mpv_errors     # per call: see the module docs
+        try:
+            if self._picture_is_next(path):
+                return True
+            self._player.prefetch_playlist = True
+            self._player.command("playlist-clear")
+            self._player.command("loadfile", path, "append")
+        except _mpv_errors:
+            self._handle_mpv_disconnect()
+            return False
+        return True
+
+    def _picture_is_next(self, path):
+        """Whether mpv's playlist entry after the current one is ``path``.
+
+        Asked of mpv rather than remembered, because anything may have
+        replaced the playlist since the preload -- a film, a stop on
+        yielding the window -- and a remembered answer would then
+        ``playlist-next`` onto nothing.
+        """
+        try:
+            entries = list(self._player.playlist or ())
+        except Exception:
+            return False
+        for n, entry in enumerate(entries):
+            if entry.get("current") or entry.get("playing"):
+                after = entries[n + 1] if n + 1 < len(entries) else None
+                return bool(after) and after.get("filename") == path
+        return False
+
     def reset_picture_view(self):
         """Put video-zoom and video-pan back, whatever is playing.
 
@@ -21,6 +21,7 @@ import json
 import logging
 import time
 
+from .. import items_api
 from ..conf import settings
 from .db import (STATUS_COMPLETE, STATUS_DOWNLOADING, STATUS_PENDING,
                  ORIGIN_AUTO_NEXT_UP, ORIGIN_AUTO_LOOKAHEAD)
@@ -37,6 +38,31 @@ log = logging.getLogger("sync.auto")
 #: the server's comma binder discards names it cannot parse.
 _FIELDS = "MediaSources,ParentId"
 
+#: What a lookahead window is fetched with: _FIELDS less MediaSources. The
+#: window is mostly episodes already held, and MediaSources (every stream of
+#: every version, per item) is nearly all of each DTO's weight -- so it is
+#: asked for afterwards, in bulk, for only the ids a pass might queue. See
+#: _with_sources.
+_WINDOW_FIELDS = "ParentId"
+
+#: Page size for the library-wide Next Up read that anchors every followed
+#: series at once (_watch_positions). Next Up has one entry per started
+#: series, so a page covers most libraries in one request.
+_ANCHOR_PAGE = 100
+
+#: At most this many pages of it per pass. Past that, the series not found
+#: fall back to one /NextUp?SeriesId= each -- the old cost, never more.
+_ANCHOR_PAGES = 5
+
+#: Ids per /Items?Ids= lookup. The ids ride in the query string, which
+#: servers and proxies cap (see api.get_items).
+_SOURCES_BATCH = 50
+
+#: How long an unchanged series' window is trusted without asking again. A
+#: rescan can re-id episodes, and nothing else tells us; a day bounds how
+#: long a stale window can be planned from.
+_PLAN_MAX_AGE = 86400
+
 _GB = 1 << 30
 
 #: Charged against the budget for an item whose size the server does not
@@ -129,6 +155,15 @@ class AutoDownloader:
         self.is_busy = is_busy or (lambda: False)
         self._now = now
         self.last_run = 0.0
+        self._plans = {}
+
+    #: {(server_uuid, series_id): (anchor, count, stamp, window)} -- the
+    #: inputs of the last lookahead plan per series. A series whose anchor
+    #: has not moved is planned from here without an episode query; see
+    #: _window. Class-level so an instance built without __init__ starts
+    #: with no cache rather than without the attribute.
+    _plans = None
+    _now = staticmethod(time.time)
 
     # -- scheduling --------------------------------------------------------
 
@@ -431,7 +466,8 @@ class AutoDownloader:
                 for item in self._next_up(api):
                     yield server_uuid, item, ORIGIN_AUTO_NEXT_UP
             if int(settings.auto_download_lookahead or 0) > 0:
-                for item in self._lookahead(api, server_uuid):
+                items = self._lookahead(api, server_uuid)
+                for item in self._with_sources(api, items):
                     yield server_uuid, item, ORIGIN_AUTO_LOOKAHEAD
 
     def _next_up(self, api):
@@ -463,31 +499,35 @@ class AutoDownloader:
         a ratchet -- the window walks the whole series whether or not anybody
         watches it. Anchored on Next Up, it only advances when the user does.
 
+        **Planned in bulk.** The anchors come from one paged Next Up read for
+        every followed series (_watch_positions), the windows come without
+        MediaSources, and a series whose anchor has not moved reuses its last
+        window (_window) -- so an unchanged series costs no request of its
+        own. Sizes are fetched later, for the candidates only.
+
         Pinned by test_the_window_does_not_walk_the_series_on_its_own.
         See docs/offline-sync.md section 4.
         """
         flat = int(settings.auto_download_lookahead or 0)
         window = hysteresis()
+        count = window[1] if window is not None else flat
+        followed = self._followed_series(server_uuid)
+        anchors = self._watch_positions(api, followed)
+        self._forget_plans(server_uuid, followed)
         out = []
-        for series_id in self._followed_series(server_uuid):
-            anchor = self._watch_position(api, series_id)
+        for series_id in followed:
+            if series_id in anchors:
+                anchor = anchors[series_id]
+            else:
+                anchor = self._watch_position(api, series_id)
             if anchor is None:
                 # Nothing next: the series is finished, or the server will not
                 # say. Either way, extending the window is a guess, and the
                 # wrong guess here is the runaway this method exists to avoid.
                 continue
-            count = window[1] if window is not None else flat
-            try:
-                result = api.get_episodes(series_id, start_item_id=anchor,
-                                          limit=count,
-                                          fields=_FIELDS) or {}
-            except Exception:
-                log.debug("Lookahead fetch failed for %s", series_id,
-                          exc_info=True)
+            items = self._window(api, server_uuid, series_id, anchor, count)
+            if items is None:
                 continue
-            # StartItemId is inclusive, so the first entry is the anchor —
-            # the next episode to watch, which is part of the window.
-            items = (result.get("Items", []) or [])[:count]
             if window is not None:
                 low = window[0]
                 held = self._held_ids(server_uuid, series_id)
@@ -503,6 +543,88 @@ class AutoDownloader:
             out.extend(items)
         return out
 
+    def _window(self, api, server_uuid, series_id, anchor, count):
+        """The ``count`` episodes from ``anchor`` on, or None on failure.
+
+        Reused from the last pass when the anchor and the size are the same
+        and that window was **full**: a short one ran into the end of what
+        has aired, and the next episode may have aired since. Copies are
+        handed out, so nothing a caller attaches ends up in the cache.
+        """
+        plans = self._plans if self._plans is not None else {}
+        self._plans = plans
+        key = (server_uuid, series_id)
+        now = self._now()
+        cached = plans.get(key)
+        if (cached is not None and cached[:2] == (anchor, count)
+                and len(cached[3]) >= count
+                and now - cached[2] < _PLAN_MAX_AGE):
+            return [dict(item) for item in cached[3]]
+        try:
+            result = api.get_episodes(series_id, start_item_id=anchor,
+                                      limit=count,
+                                      fields=_WINDOW_FIELDS) or {}
+        except Exception:
+            log.debug("Lookahead fetch failed for %s", series_id,
+                      exc_info=True)
+            plans.pop(key, None)
+            return None
+        # StartItemId is inclusive, so the first entry is the anchor —
+        # the next episode to watch, which is part of the window.
+        items = (result.get("Items", []) or [])[:count]
+        plans[key] = (anchor, count, now,
+                      [{"Id": i.get("Id"), "Type": i.get("Type")}
+                       for i in items])
+        return items
+
+    def _forget_plans(self, server_uuid, followed):
+        """Drop cached windows of series no longer followed on a server, so
+        the cache is bounded by what is held rather than by history."""
+        if not self._plans:
+            return
+        for key in [k for k in self._plans
+                    if k[0] == server_uuid and k[1] not in followed]:
+            del self._plans[key]
+
+    def _with_sources(self, api, items):
+        """``items``, each carrying MediaSources -- fetched in bulk for the
+        ones a pass could queue, batch by batch as ``fill`` asks for them.
+
+        The window query leaves MediaSources out (_WINDOW_FIELDS), and most
+        of a window is already held, which ``fill`` skips; asking for sizes
+        only for what is not in the catalog, one /Items?Ids= per
+        _SOURCES_BATCH, is what keeps them from costing a heavy payload per
+        series. A generator, like _candidates, so a spent budget stops the
+        lookups too. A failed lookup leaves the items unsized, which
+        _size_of charges as _UNKNOWN_SIZE -- never as free.
+        """
+        for start in range(0, len(items), _SOURCES_BATCH):
+            batch = items[start:start + _SOURCES_BATCH]
+            if self._interrupted():
+                return
+            wanted = [i.get("Id") for i in batch
+                      if i.get("Id") and "MediaSources" not in i]
+            found = {}
+            if wanted:
+                try:
+                    known = self.manager.db.get_many(wanted)
+                    wanted = [i for i in wanted if i not in known]
+                    if wanted:
+                        result = items_api.get_items(
+                            api, ids=wanted, fields="MediaSources",
+                            enable_images=False,
+                            enable_user_data=False) or {}
+                        found = {i.get("Id"): i.get("MediaSources")
+                                 for i in result.get("Items") or []}
+                except Exception:
+                    log.debug("Could not size lookahead candidates",
+                              exc_info=True)
+            for item in batch:
+                sources = found.get(item.get("Id"))
+                if sources:
+                    item = dict(item, MediaSources=sources)
+                yield item
+
     def _held_ids(self, server_uuid, series_id):
         """Ids of this series we hold or have asked for, or None if unknown.
 
@@ -529,6 +651,39 @@ class AutoDownloader:
                 if row.get("server_uuid") == server_uuid
                 and row.get("status") in held}
 
+    @staticmethod
+    def _watch_positions(api, series_ids):
+        """``{series_id: next episode id}`` for the followed series that
+        the library-wide Next Up names, read a page at a time.
+
+        One entry per started series, so a page or two anchors every
+        followed series in one request each, where asking per series cost
+        one request each. Stops as soon as all are found. Series absent from
+        it -- not started yet, finished, or past the last page read -- are
+        simply not in the answer; the caller asks for those one at a time,
+        which is the per-series question and the only one that names the
+        first episode of a series nobody has started.
+        """
+        wanted = set(series_ids)
+        found = {}
+        if not wanted:
+            return found
+        try:
+            for page in range(_ANCHOR_PAGES):
+                result = api.get_next(index=page * _ANCHOR_PAGE,
+                                      limit=_ANCHOR_PAGE) or {}
+                items = list(result.get("Items") or [])
+                for item in items:
+                    series_id = item.get("SeriesId")
+                    if series_id in wanted and series_id not in found:
+                        found[series_id] = item.get("Id")
+                if len(items) < _ANCHOR_PAGE or wanted <= set(found):
+                    break
+        except Exception:
+            log.debug("Next Up fetch failed for the lookahead anchors",
+                      exc_info=True)
+        return found
+
     @staticmethod
     def _watch_position(api, series_id):
         """Id of the next episode to watch in one series, or None.
@@ -552,6 +707,4 @@ class AutoDownloader:
         """Series ids we hold at least one completed download for, on one
         server. This is the scope of the lookahead: the shows the user has
         shown some interest in, as opposed to Next Up's whole library."""
-        return {row["series_id"]
-                for row in self.manager.db.list(status=STATUS_COMPLETE)
-                if row["server_uuid"] == server_uuid and row["series_id"]}
+        return self.manager.db.held_series(server_uuid)
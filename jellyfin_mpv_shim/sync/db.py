@@ -3,8 +3,11 @@
 Single writer (the main process via :class:`SyncDB`), many readers (the browser
 opens the same file read-only). WAL mode lets a reader and the writer coexist
 across processes. Read-only handles tolerate a missing file (empty catalog).
+The writer commits in groups (see COMMIT_INTERVAL), so a reader on another
+connection sees a write once its group is committed.
 """
 
+import contextlib
 import json
 import logging
 import os
@@ -12,9 +15,20 @@ import pathlib
 import sqlite3
 import threading
 import time
+from collections import deque
 
 log = logging.getLogger("sync.db")
 
+#: How long a write may wait for its commit (s). Writes are grouped: each is
+#: applied at once, inside one open transaction, and that transaction is
+#: committed this long after the first write into it -- one fsync for every
+#: progress step, playstate mirror and userdata merge in between, rather
+#: than one each. See SyncDB._group for what commits sooner.
+COMMIT_INTERVAL = 1.0
+
+#: Commits remembered for SyncDB.commit_rate.
+COMMIT_WINDOW = 60.0
+
 # Columns of the `downloads` row, in order. Kept as a list so upsert/read share
 # one source of truth.
 COLUMNS = [
@@ -87,10 +101,16 @@ CREATE TABLE IF NOT EXISTS downloads (
     -- scope can be resolved for downloaded media with the server away --
     -- and without the play path making a call at all. NULL on rows written
     -- before this, and on anything the lookup could not answer.
-    library_id TEXT
+    library_id TEXT,
+    -- sha256 of the media file, hex. Taken as the bytes streamed in and
+    -- recorded at the commit point, so it is the hash of what was
+    -- downloaded, not of whatever is on disk later -- which is what the
+    -- verifier compares against. Also the key two rows holding the same
+    -- file share it by (see SyncManager._link_twin). NULL until complete,
+    -- and on rows completed before it existed.
+    content_hash TEXT
 );
 CREATE INDEX IF NOT EXISTS idx_downloads_series ON downloads(series_id);
-CREATE INDEX IF NOT EXISTS idx_downloads_status ON downloads(status);
 CREATE TABLE IF NOT EXISTS pending_playstate (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     server_uuid TEXT,
@@ -118,6 +138,15 @@ CREATE TABLE IF NOT EXISTS playlist_items (
     PRIMARY KEY (playlist_id, item_id)
 );
 CREATE INDEX IF NOT EXISTS idx_playlist_items_item ON playlist_items(item_id);
+-- When each stored file was last read back and found to match its hash.
+-- Keyed by the hash, not the item: rows sharing a file share one inode, and
+-- reading it once answers for all of them. A table of its own rather than a
+-- column so the verifier's stamp is not an UPDATE of a complete row, which
+-- the change journal below would hand to every offline reader.
+CREATE TABLE IF NOT EXISTS content_checks (
+    content_hash TEXT PRIMARY KEY,
+    checked_at INTEGER
+);
 -- Auto-downloads the scheduler is done with. Without this, dropping an
 -- unwatched episode after `keep_days` accomplishes nothing: it is still the
 -- server's Next Up (unwatched is exactly why it is there), so the very next
@@ -134,13 +163,85 @@ CREATE TABLE IF NOT EXISTS auto_discarded (
     item_id TEXT PRIMARY KEY,
     discarded_at INTEGER
 );
+-- The change journal: one row per change a reader of the offline library
+-- could see, so the browser's offline source can re-read what changed since
+-- it last looked rather than the whole catalog (see changes_since). Written
+-- by triggers, not by the methods above, so no writer can forget to -- and
+-- a writer in another process journals too.
+--
+-- `playlists` is 1 when the change can alter a playlist's downloaded
+-- contents: the row is a member of one, or the change is to playlists
+-- themselves (item_id NULL then).
+CREATE TABLE IF NOT EXISTS catalog_changes (
+    rev INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_id TEXT,
+    playlists INTEGER DEFAULT 0
+);
+-- Every insert, whatever its status: INSERT OR REPLACE is how a complete
+-- row is re-queued, and REPLACE fires no delete trigger.
+CREATE TRIGGER IF NOT EXISTS downloads_journal_insert AFTER INSERT ON downloads
+BEGIN
+    INSERT INTO catalog_changes (item_id, playlists) VALUES (NEW.item_id,
+        EXISTS (SELECT 1 FROM playlist_items WHERE item_id = NEW.item_id));
+END;
+-- Updates only where a complete row is involved. Progress is an UPDATE of
+-- downloaded_bytes several times a second per transfer, and none of it is
+-- visible offline until the row completes.
+CREATE TRIGGER IF NOT EXISTS downloads_journal_update AFTER UPDATE ON downloads
+WHEN OLD.status = 'complete' OR NEW.status = 'complete'
+BEGIN
+    INSERT INTO catalog_changes (item_id, playlists) VALUES (NEW.item_id,
+        EXISTS (SELECT 1 FROM playlist_items WHERE item_id = NEW.item_id));
+END;
+CREATE TRIGGER IF NOT EXISTS downloads_journal_delete AFTER DELETE ON downloads
+BEGIN
+    INSERT INTO catalog_changes (item_id, playlists) VALUES (OLD.item_id,
+        EXISTS (SELECT 1 FROM playlist_items WHERE item_id = OLD.item_id));
+END;
+CREATE TRIGGER IF NOT EXISTS playlists_journal_insert AFTER INSERT ON playlists
+BEGIN
+    INSERT INTO catalog_changes (item_id, playlists) VALUES (NULL, 1);
+END;
+CREATE TRIGGER IF NOT EXISTS playlists_journal_delete AFTER DELETE ON playlists
+BEGIN
+    INSERT INTO catalog_changes (item_id, playlists) VALUES (NULL, 1);
+END;
+CREATE TRIGGER IF NOT EXISTS playlist_items_journal_insert
+AFTER INSERT ON playlist_items
+BEGIN
+    INSERT INTO catalog_changes (item_id, playlists) VALUES (NULL, 1);
+END;
+CREATE TRIGGER IF NOT EXISTS playlist_items_journal_delete
+AFTER DELETE ON playlist_items
+BEGIN
+    INSERT INTO catalog_changes (item_id, playlists) VALUES (NULL, 1);
+END;
+-- Bounded: every 1024th entry drops what is 4096 behind it (JOURNAL_KEPT).
+-- A reader that far behind finds the gap and reads the whole catalog, which
+-- is what it would have done before the journal existed.
+CREATE TRIGGER IF NOT EXISTS catalog_changes_trim AFTER INSERT ON catalog_changes
+WHEN NEW.rev % 1024 = 0
+BEGIN
+    DELETE FROM catalog_changes WHERE rev <= NEW.rev - 4096;
+END;
 """
 
+#: How many journal entries outlive a trim. Written into the trigger above;
+#: here for the tests and for anyone wondering how far behind is too far.
+JOURNAL_KEPT = 4096
+
 STATUS_PENDING = "pending"
 STATUS_DOWNLOADING = "downloading"
 STATUS_COMPLETE = "complete"
 STATUS_ERROR = "error"
 
+#: Statuses whose write is a durability point: committed before update()
+#: returns, rather than with the next group. These are the transitions a
+#: crash must not undo -- a file promoted with its row still "downloading"
+#: would be re-queued and fetched again, and a failure forgotten would be
+#: retried forever.
+DURABLE_STATUSES = frozenset({STATUS_COMPLETE, STATUS_ERROR})
+
 
 class SyncDB:
     def __init__(self, db_path, read_only=False):
@@ -148,6 +249,10 @@ class SyncDB:
         self.read_only = read_only
         self._lock = threading.Lock()
         self._conn = None
+        #: Commits the group waiting in the open transaction; see _group.
+        self._commit_timer = None
+        #: monotonic() of recent commits, for commit_rate.
+        self._commits = deque()
 
         if read_only:
             if not os.path.exists(db_path):
@@ -169,14 +274,53 @@ class SyncDB:
     #: CREATE TABLE IF NOT EXISTS is a no-op on an existing catalog, so a new
     #: column only reaches an existing install through here.
     _ADDED_COLUMNS = (("origin", "TEXT"), ("completed_at", "INTEGER"),
-                      ("library_id", "TEXT"))
+                      ("library_id", "TEXT"), ("content_hash", "TEXT"))
+
+    #: Indexes for the catalog's hot reads, as (name, columns). Built in
+    #: _migrate rather than _SCHEMA, because several of them name columns
+    #: that only exist once it has run.
+    #:
+    #: Most are *covering*: every column the query reads is in the index, so
+    #: it is answered without visiting the table. That is the point. A row
+    #: carries its item, source and userdata JSON ahead of ``origin``,
+    #: ``completed_at`` and the rest, and a value too large for its page
+    #: continues on overflow pages that reading any later column has to
+    #: walk. A size total or an id set that went to the table paged through
+    #: every blob on the way. ``test_sync_query_plans`` fails on any read
+    #: that scans the table.
+    _INDEXES = (
+        # list(status): a status, in display order, without a sort.
+        ("idx_downloads_listing",
+         "status, series_name, parent_index, index_number, name"),
+        # list(): everything, in display order.
+        ("idx_downloads_order",
+         "series_name, parent_index, index_number, name"),
+        # The pending queue, in enqueue order (rowid is implicit).
+        ("idx_downloads_queue", "status, added_at"),
+        # What is held: the id sets the browser badges with, and the series
+        # the lookahead follows.
+        ("idx_downloads_held",
+         "status, item_id, series_id, season_id, server_uuid"),
+        # Auto-download's size and its reaper; downloaded_bytes also makes
+        # it total_size's narrowest scan.
+        ("idx_downloads_origin", "origin, status, downloaded_bytes"),
+        ("idx_downloads_content", "content_hash"),
+    )
+
+    #: Indexes an earlier build made that _INDEXES has made redundant,
+    #: dropped in _migrate. ``idx_downloads_status`` is a prefix of the
+    #: listing, queue and held indexes, which answer every status lookup it
+    #: did; kept, it is one more index for every status change to update.
+    _DROPPED_INDEXES = ("idx_downloads_status",)
 
     def _migrate(self):
         """Bring an existing catalog up to the current schema.
 
-        Additive only: new nullable columns, never a drop or a rewrite, so a
-        catalog touched by this build still opens in an older one. Runs on
-        every open — PRAGMA table_info is the check, so it is a no-op once
+        Additive only: new nullable columns, never a column dropped or a
+        table rewritten, so a catalog touched by this build still opens in
+        an older one. The one drop is of a redundant index
+        (_DROPPED_INDEXES), which an older build's _SCHEMA creates again on
+        open. Runs on every open — PRAGMA table_info is the check, so it is a no-op once
         the columns exist.
         """
         try:
@@ -192,6 +336,12 @@ class SyncDB:
                     continue
                 self._conn.execute(
                     "ALTER TABLE downloads ADD COLUMN %s %s" % (col, decl))
+            for name, columns in self._INDEXES:
+                self._conn.execute(
+                    "CREATE INDEX IF NOT EXISTS %s ON downloads(%s)"
+                    % (name, columns))
+            for name in self._DROPPED_INDEXES:
+                self._conn.execute("DROP INDEX IF EXISTS %s" % name)
             # Unconditional, not gated on "did this run add the column":
             # DDL autocommits, so a crash (or a failed backfill) between the
             # ALTER and this UPDATE would otherwise leave origin NULL
@@ -217,18 +367,111 @@ class SyncDB:
         with self._lock:
             if self._conn is None:
                 return
-            if not self.read_only:
-                # Fold the WAL back into the main db file on a clean shutdown so
-                # a stale -wal/-shm pair can't linger for the next launch.
-                try:
-                    self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
-                except sqlite3.Error:
-                    log.debug("WAL checkpoint on close failed", exc_info=True)
-            self._conn.close()
-            self._conn = None
+            try:
+                self._commit_locked()
+            finally:
+                if not self.read_only:
+                    # Fold the WAL back into the main db file on a clean
+                    # shutdown so a stale -wal/-shm pair can't linger for
+                    # the next launch.
+                    try:
+                        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    except sqlite3.Error:
+                        log.debug("WAL checkpoint on close failed",
+                                  exc_info=True)
+                self._conn.close()
+                self._conn = None
 
     # -- writes (main process) --------------------------------------------
 
+    @contextlib.contextmanager
+    def _group(self, durable=False):
+        """One write, applied now and committed with its group.
+
+        Held under ``_lock``. The statements run at once inside the open
+        transaction, so this process reads its own writes immediately and
+        a failed one still raises at its caller; only the commit waits,
+        for COMMIT_INTERVAL or a durability point, whichever is first. A
+        durable write whose commit fails raises too, with its whole group
+        undone: its caller is about to act on it being on disk.
+        Readers in another process see committed state only, so they see a
+        grouped write up to COMMIT_INTERVAL late -- WAL, and what they read,
+        are otherwise unchanged. SyncManager commits before every change it
+        pushes, so a reader that was told to look finds the change.
+
+        Each write is its own savepoint: a statement that fails undoes that
+        write, not the group it joined. Never leave a half-open savepoint
+        holding the write lock on the shared connection.
+        """
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+        self._conn.execute("SAVEPOINT write")
+        try:
+            yield
+            self._conn.execute("RELEASE write")
+        except Exception:
+            try:
+                self._conn.execute("ROLLBACK TO write")
+                self._conn.execute("RELEASE write")
+            except sqlite3.Error:
+                # Some errors (a full disk, an IO error) end the whole
+                # transaction on their own; the group went with it.
+                if self._conn.in_transaction:
+                    self._conn.rollback()
+            raise
+        if durable:
+            self._commit_locked()
+        elif self._commit_timer is None:
+            self._commit_timer = threading.Timer(COMMIT_INTERVAL,
+                                                 self._flush_on_timer)
+            self._commit_timer.daemon = True
+            self._commit_timer.start()
+
+    def _commit_locked(self):
+        """Commit the open group, if there is one. Held under ``_lock``.
+
+        A commit that fails rolls the group back and raises: every write in
+        it is gone, and whoever asked for the commit has to know."""
+        timer, self._commit_timer = self._commit_timer, None
+        if timer is not None:
+            timer.cancel()
+        if self._conn is None or not self._conn.in_transaction:
+            return
+        try:
+            self._conn.commit()
+        except sqlite3.Error:
+            log.error("Catalog commit failed; the writes since the last "
+                      "one are lost.", exc_info=True)
+            self._conn.rollback()
+            raise
+        now = time.monotonic()
+        self._commits.append(now)
+        while self._commits and self._commits[0] < now - COMMIT_WINDOW:
+            self._commits.popleft()
+
+    def flush(self):
+        """Commit every write made so far. A durability point on demand:
+        SyncManager calls it before telling anyone the catalog changed."""
+        with self._lock:
+            self._commit_locked()
+
+    def _flush_on_timer(self):
+        """:meth:`flush` for the group timer, which has no caller to raise
+        to: the failure is logged by _commit_locked, and the writers
+        already returned on the understanding that theirs could wait."""
+        try:
+            self.flush()
+        except sqlite3.Error:
+            pass
+
+    def commit_rate(self):
+        """Commits per second over the last COMMIT_WINDOW."""
+        with self._lock:
+            cutoff = time.monotonic() - COMMIT_WINDOW
+            while self._commits and self._commits[0] < cutoff:
+                self._commits.popleft()
+            return len(self._commits) / COMMIT_WINDOW
+
     def upsert(self, row: dict):
         values = [row.get(col) for col in COLUMNS]
         placeholders = ",".join("?" for _ in COLUMNS)
@@ -236,16 +479,10 @@ class SyncDB:
         with self._lock:
             if self._conn is None:
                 return
-            try:
+            with self._group():
                 self._conn.execute(
                     "INSERT OR REPLACE INTO downloads (%s) VALUES (%s)" % (cols, placeholders),
                     values)
-                self._conn.commit()
-            except sqlite3.Error:
-                # Don't leave a half-open transaction holding a write lock on
-                # the shared connection; roll back before propagating.
-                self._conn.rollback()
-                raise
 
     def update(self, item_id, **fields):
         if not fields:
@@ -255,28 +492,20 @@ class SyncDB:
         with self._lock:
             if self._conn is None:
                 return
-            try:
+            with self._group(durable=fields.get("status") in DURABLE_STATUSES):
                 self._conn.execute(
                     "UPDATE downloads SET %s WHERE item_id=?" % assignments, params)
-                self._conn.commit()
-            except sqlite3.Error:
-                self._conn.rollback()
-                raise
 
     def delete(self, item_id):
         with self._lock:
             if self._conn is None:
                 return
-            try:
+            with self._group(durable=True):
                 self._conn.execute("DELETE FROM downloads WHERE item_id=?", (item_id,))
                 # Drop the item from any playlist it belonged to so a deleted
                 # file can't leave a dangling membership row behind.
                 self._conn.execute("DELETE FROM playlist_items WHERE item_id=?",
                                    (item_id,))
-                self._conn.commit()
-            except sqlite3.Error:
-                self._conn.rollback()
-                raise
 
     # -- playlists ---------------------------------------------------------
 
@@ -284,16 +513,12 @@ class SyncDB:
         with self._lock:
             if self._conn is None:
                 return
-            try:
+            with self._group():
                 self._conn.execute(
                     "INSERT OR REPLACE INTO playlists "
                     "(playlist_id, server_id, server_uuid, name, added_at) "
                     "VALUES (?,?,?,?,?)",
                     (playlist_id, server_id, server_uuid, name, int(time.time())))
-                self._conn.commit()
-            except sqlite3.Error:
-                self._conn.rollback()
-                raise
 
     def replace_playlist_items(self, playlist_id, entries):
         """Set a playlist's membership to ``entries`` (list of
@@ -302,7 +527,7 @@ class SyncDB:
         with self._lock:
             if self._conn is None:
                 return
-            try:
+            with self._group():
                 self._conn.execute(
                     "DELETE FROM playlist_items WHERE playlist_id=?", (playlist_id,))
                 self._conn.executemany(
@@ -310,24 +535,16 @@ class SyncDB:
                     "(playlist_id, item_id, sort_index, owned) VALUES (?,?,?,?)",
                     [(playlist_id, iid, idx, 1 if owned else 0)
                      for iid, idx, owned in entries])
-                self._conn.commit()
-            except sqlite3.Error:
-                self._conn.rollback()
-                raise
 
     def delete_playlist(self, playlist_id):
         with self._lock:
             if self._conn is None:
                 return
-            try:
+            with self._group():
                 self._conn.execute("DELETE FROM playlists WHERE playlist_id=?",
                                    (playlist_id,))
                 self._conn.execute(
                     "DELETE FROM playlist_items WHERE playlist_id=?", (playlist_id,))
-                self._conn.commit()
-            except sqlite3.Error:
-                self._conn.rollback()
-                raise
 
     def playlist_owned_ids(self, playlist_id):
         """Item ids this playlist download is responsible for (owned=1)."""
@@ -367,7 +584,7 @@ class SyncDB:
         with self._lock:
             if self._conn is None:
                 return
-            try:
+            with self._group():
                 existing = self._conn.execute(
                     "SELECT id, position_ticks, played FROM pending_playstate "
                     "WHERE server_uuid=? AND item_id=?",
@@ -389,10 +606,6 @@ class SyncDB:
                         "VALUES (?,?,?,?,?)",
                         (server_uuid, item_id, position_ticks,
                          1 if played else None, int(time.time())))
-                self._conn.commit()
-            except sqlite3.Error:
-                self._conn.rollback()
-                raise
 
     def update_userdata(self, item_id, played=None, position_ticks=None):
         """Merge offline playback progress into the download row's stored
@@ -451,14 +664,10 @@ class SyncDB:
                 # must not shadow the fresh position (the browser recomputes
                 # it from position/runtime when rendering).
                 userdata.pop("PlayedPercentage", None)
-                try:
+                with self._group():
                     self._conn.execute(
                         "UPDATE downloads SET userdata_json=? WHERE item_id=?",
                         (json.dumps(userdata), item_id))
-                    self._conn.commit()
-                except sqlite3.Error:
-                    self._conn.rollback()
-                    raise
             return changed
 
     def watched_targets(self, item_id, server_uuid=None):
@@ -520,14 +729,10 @@ class SyncDB:
             userdata.pop("PlayedPercentage", None)
             if userdata == before:
                 return False
-            try:
+            with self._group():
                 self._conn.execute(
                     "UPDATE downloads SET userdata_json=? WHERE item_id=?",
                     (json.dumps(userdata), item_id))
-                self._conn.commit()
-            except sqlite3.Error:
-                self._conn.rollback()
-                raise
             return True
 
     def set_reading_position(self, item_id, position_ticks):
@@ -564,14 +769,10 @@ class SyncDB:
             userdata["PlaybackPositionTicks"] = position_ticks
             # Derived; see update_userdata.
             userdata.pop("PlayedPercentage", None)
-            try:
+            with self._group():
                 self._conn.execute(
                     "UPDATE downloads SET userdata_json=? WHERE item_id=?",
                     (json.dumps(userdata), item_id))
-                self._conn.commit()
-            except sqlite3.Error:
-                self._conn.rollback()
-                raise
 
     def clear_playstate(self, ids):
         if not ids:
@@ -579,13 +780,9 @@ class SyncDB:
         with self._lock:
             if self._conn is None:
                 return
-            try:
+            with self._group():
                 self._conn.executemany(
                     "DELETE FROM pending_playstate WHERE id=?", [(i,) for i in ids])
-                self._conn.commit()
-            except sqlite3.Error:
-                self._conn.rollback()
-                raise
 
     # -- reads (either process) -------------------------------------------
 
@@ -638,6 +835,76 @@ class SyncDB:
         rows = self._query("SELECT * FROM downloads WHERE item_id=?", (item_id,))
         return rows[0] if rows else None
 
+    def get_many(self, item_ids):
+        """The rows for ``item_ids`` that exist, as ``{item_id: row}``.
+        Chunked: SQLite caps the number of bound parameters."""
+        ids = list(item_ids)
+        out = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            for row in self._query(
+                    "SELECT * FROM downloads WHERE item_id IN (%s)"
+                    % ",".join("?" for _ in chunk), tuple(chunk)):
+                out[row["item_id"]] = row
+        return out
+
+    def catalog_rev(self):
+        """The newest journal revision, or 0 on a catalog without one.
+
+        Read *before* a full read of the catalog, never after: a change
+        landing between the two is then both in the read and in the next
+        ``changes_since``, and applying it twice is harmless. The other
+        order would lose it.
+        """
+        with self._lock:
+            if self._conn is None:
+                return 0
+            try:
+                row = self._conn.execute(
+                    "SELECT seq FROM sqlite_sequence "
+                    "WHERE name = 'catalog_changes'").fetchone()
+            except sqlite3.Error:
+                return 0
+        return row[0] if row else 0
+
+    def changes_since(self, rev):
+        """What changed after journal revision ``rev``.
+
+        Returns ``(new_rev, item_ids, playlists)``: the revision the answer
+        is good up to, the ids of changed ``downloads`` rows (present,
+        changed or gone -- the caller looks), and whether any playlist's
+        downloaded contents may have changed. ``item_ids`` is None when the
+        journal cannot answer -- a catalog from before it existed, one
+        trimmed past ``rev``, or one recreated since, whose revisions
+        started again below it -- and the caller must read everything.
+        """
+        with self._lock:
+            if self._conn is None:
+                return rev, None, True
+            try:
+                rows = self._conn.execute(
+                    "SELECT rev, item_id, playlists FROM catalog_changes "
+                    "WHERE rev > ? ORDER BY rev", (rev,)).fetchall()
+                # After the entries, not before: a trim landing between the
+                # two then reads as a gap, which is the safe mistake.
+                low, high = self._conn.execute(
+                    "SELECT MIN(rev), MAX(rev) FROM catalog_changes"
+                ).fetchone()
+            except sqlite3.Error:
+                log.debug("no change journal to read", exc_info=True)
+                return rev, None, True
+        if rev and (high is None or high < rev):
+            # Trimming never empties the journal, nor takes it below a
+            # revision it handed out: this is another catalog.
+            return high or 0, None, True
+        if not rows:
+            return rev, set(), False
+        if low is None or low > rev + 1:
+            # Entries between rev and the oldest kept one are gone.
+            return rows[-1][0], None, True
+        ids = {r[1] for r in rows if r[1] is not None}
+        return rows[-1][0], ids, any(r[2] for r in rows)
+
     def list(self, status=None, series_id=None):
         sql = "SELECT * FROM downloads"
         clauses, params = [], []
@@ -683,6 +950,14 @@ class SyncDB:
                             "WHERE status=? AND season_id IS NOT NULL",
                             (STATUS_COMPLETE,))}
 
+    def held_series(self, server_uuid):
+        """Series ids with at least one complete download from
+        ``server_uuid``. Answered from idx_downloads_held alone."""
+        return {r["series_id"] for r in self._query(
+            "SELECT DISTINCT series_id FROM downloads WHERE status=? "
+            "AND server_uuid=? AND series_id IS NOT NULL",
+            (STATUS_COMPLETE, server_uuid))}
+
     def total_size(self):
         rows = self._query("SELECT COALESCE(SUM(downloaded_bytes),0) AS s FROM downloads")
         return rows[0]["s"] if rows else 0
@@ -727,14 +1002,10 @@ class SyncDB:
         with self._lock:
             if self._conn is None:
                 return
-            try:
+            with self._group():
                 self._conn.execute(
                     "INSERT OR REPLACE INTO auto_discarded VALUES (?, ?)",
                     (item_id, int(time.time())))
-                self._conn.commit()
-            except sqlite3.Error:
-                self._conn.rollback()
-                raise
 
     def clear_discarded(self, item_id):
         """Forget a tombstone — the user asked for this item by hand, which
@@ -742,13 +1013,9 @@ class SyncDB:
         with self._lock:
             if self._conn is None:
                 return
-            try:
+            with self._group():
                 self._conn.execute(
                     "DELETE FROM auto_discarded WHERE item_id=?", (item_id,))
-                self._conn.commit()
-            except sqlite3.Error:
-                self._conn.rollback()
-                raise
 
     def discarded_ids(self):
         return {r["item_id"] for r in
@@ -759,6 +1026,59 @@ class SyncDB:
         called in that direction."""
         self.update(item_id, origin=origin)
 
+    def find_content(self, content_hash, exclude=None):
+        """A complete row, other than ``exclude``, whose file hashes to
+        ``content_hash`` -- the copy a new download of the same bytes can
+        link to rather than keep. None if there is none."""
+        if not content_hash:
+            return None
+        rows = self._query(
+            "SELECT * FROM downloads WHERE content_hash=? AND status=? "
+            "AND item_id IS NOT ? ORDER BY rowid LIMIT 1",
+            (content_hash, STATUS_COMPLETE, exclude))
+        return rows[0] if rows else None
+
+    def list_content(self, content_hash):
+        """Every complete row holding the file that hashes to
+        ``content_hash``."""
+        return self._query(
+            "SELECT * FROM downloads WHERE content_hash=? AND status=?",
+            (content_hash, STATUS_COMPLETE))
+
+    def next_unchecked(self, before):
+        """The complete row whose file was checked longest ago, if that was
+        before ``before`` (epoch seconds), else None. A file counts as
+        checked when it completed -- its hash was taken as it arrived, which
+        is a check of its own -- so the later of that and its last check is
+        what ages."""
+        checked = ("MAX(COALESCE(c.checked_at, 0), "
+                   "COALESCE(d.completed_at, 0))")
+        rows = self._query(
+            "SELECT d.*, %s AS checked FROM downloads d "
+            "LEFT JOIN content_checks c ON c.content_hash = d.content_hash "
+            "WHERE d.status=? AND d.content_hash IS NOT NULL AND %s < ? "
+            "ORDER BY checked, d.rowid LIMIT 1" % (checked, checked),
+            (STATUS_COMPLETE, before))
+        return rows[0] if rows else None
+
+    def checked_at(self, content_hash):
+        """When the file hashing to ``content_hash`` was last read back and
+        found to match (epoch seconds), or None if it never was."""
+        rows = self._query(
+            "SELECT checked_at FROM content_checks WHERE content_hash=?",
+            (content_hash,))
+        return rows[0]["checked_at"] if rows else None
+
+    def mark_checked(self, content_hash, when=None):
+        with self._lock:
+            if self._conn is None:
+                return
+            with self._group():
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO content_checks VALUES (?, ?)",
+                    (content_hash, int(when if when is not None
+                                       else time.time())))
+
     def is_complete(self, item_id):
         row = self.get(item_id)
         return bool(row and row["status"] == STATUS_COMPLETE)
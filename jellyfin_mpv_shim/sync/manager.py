@@ -1,18 +1,24 @@
 """Offline download manager (main process).
 
-Owns the catalog DB and a single background download worker. The browser drives
-it over IPC (estimate / enqueue / delete) and receives change + progress pushes.
-Downloads pull the original file via /Items/{id}/Download.
+Owns the catalog DB and a background worker that schedules downloads onto a
+few concurrent transfers. The browser drives it over IPC (estimate / enqueue /
+delete) and receives change + progress pushes. Downloads pull the original
+file via /Items/{id}/Download.
 """
 
+import hashlib
 import json
 import logging
 import math
 import os
+import re
 from urllib.parse import urlparse
 import shutil
+import sys
 import threading
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 
@@ -45,6 +51,66 @@ FOLDER_ITEM_TYPES = frozenset({"Folder", "CollectionFolder", "UserView"})
 CHUNK = 1 << 20            # 1 MiB
 PROGRESS_STEP = 4 << 20    # push progress every ~4 MiB
 PLAYSTATE_INTERVAL = 30    # replay offline playstate at least this often (s)
+PLAYSTATE_BATCH = 50       # pending items whose server userdata one /Items read fetches
+
+#: Shortest gap between two progress pushes, across every transfer. Each
+#: transfer reports every PROGRESS_STEP, which was one push per 4 MiB while
+#: there was one transfer; three fast ones on a LAN would be a push every
+#: few milliseconds, each a redraw on the far side. What arrives in between
+#: is kept, latest per item, and goes out with the next push.
+PROGRESS_INTERVAL = 0.5
+
+#: Threads fetching items' small side assets -- artwork, subtitles,
+#: trickplay tiles, media segments -- while their media streams. Shared by
+#: every transfer; each waits for its own before its commit point.
+SIDE_WORKERS = 4
+
+#: Beside a segmented download's .part: which byte ranges are on disk.
+#: The .part itself cannot say -- it is preallocated to full size, so its
+#: length, which is the single stream's resume offset, means nothing. A
+#: .part with one of these next to it is always resumed segmented, whatever
+#: download_segments says now. See _stream_segmented.
+SEGMENTS_SUFFIX = ".segments"
+
+#: Longest a throttled transfer sleeps before looking at stop and cancel
+#: again. The budget can owe seconds on a slow cap, and a delete should not
+#: wait for them.
+THROTTLE_SLICE = 0.25
+
+#: How often the pacer looks at the stream playing beside the downloads
+#: (s). Each look is a player property read, which on the IPC backend is a
+#: round trip; the cache it reads moves in seconds anyway.
+ADAPT_INTERVAL = 2.0
+
+#: Seconds of a network stream buffered ahead of playback below which the
+#: downloads are slowed, and above which they are let back up. The gap
+#: between the two is what keeps the rate from flapping at one threshold.
+ADAPT_LOW = 10.0
+ADAPT_HIGH = 30.0
+
+#: The pacer never slows the downloads below this (bytes/s). A stream that
+#: still starves with the downloads at a trickle is starving for some other
+#: reason, and stopping them outright would not feed it.
+ADAPT_FLOOR = 64 << 10
+
+#: How much the limit grows per healthy look. Halving on a starving look
+#: and growing by a quarter on a healthy one backs off fast and creeps
+#: back, which is the order a stream that is stuttering wants.
+ADAPT_GROWTH = 1.25
+
+#: Most bytes per second the verifier reads. Checking a library is work
+#: nobody is waiting on, and a 40 GiB remux read flat out is a minute of
+#: the disk doing nothing else; at this rate it is an hour of the disk
+#: barely noticing.
+VERIFY_RATE = 16 << 20
+
+#: How long the verifier rests when nothing is due (s).
+VERIFY_IDLE = 600
+
+#: How long it waits before looking again while something is playing (s).
+#: A check under way is abandoned, not paused: playback from a local file
+#: is the one reader that must never wait on it.
+VERIFY_BUSY_WAIT = 60
 
 #: Minimum gap between two catalog sweeps, whatever asked for them.
 #:
@@ -104,6 +170,356 @@ USERDATA_EVENT_MAX = 200
 STOP_JOIN_TIMEOUT = 10     # how long stop() waits for the worker to unwind (s)
 
 
+def _origin_class(row):
+    """Which side of the fair queue a row waits on: "user" or "auto"."""
+    return "auto" if is_auto(row.get("origin")) else "user"
+
+
+def _transfer_limits():
+    """(transfers in flight, transfers per server), from the settings.
+
+    Clamped to at least one each, and the per-server cap to the total: a
+    zero would park the queue for good, which is not what anyone typing it
+    meant.
+    """
+    try:
+        total = max(1, int(settings.download_concurrency or 1))
+        per_server = max(1, int(settings.download_per_server or 1))
+    except (TypeError, ValueError):
+        return 1, 1
+    return total, min(total, per_server)
+
+
+def _quiet_windows(spec):
+    """``[(start, end), ...]`` in minutes past midnight, from a
+    download_quiet_hours value such as ``"23:00-07:00, 12:00-13:00"``.
+
+    A window may wrap midnight. One that does not parse is dropped and
+    named in the log, rather than read as "always" or "never": either
+    guess would be wrong for somebody.
+    """
+    windows = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        match = re.match(r"^(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})$", part)
+        if match:
+            h1, m1, h2, m2 = (int(g) for g in match.groups())
+            if h1 < 24 and h2 < 24 and m1 < 60 and m2 < 60:
+                windows.append((h1 * 60 + m1, h2 * 60 + m2))
+                continue
+        if part not in _quiet_warned:
+            _quiet_warned.add(part)
+            log.warning("Ignoring download_quiet_hours entry %r; expected "
+                        "HH:MM-HH:MM.", part)
+    return windows
+
+
+#: Quiet-hours entries already complained about, so a typo is logged once
+#: rather than once per chunk downloaded.
+_quiet_warned = set()
+
+#: ``(spec, windows)`` for the download_quiet_hours value last parsed. The
+#: check runs on every chunk a transfer writes, and the setting changes when
+#: somebody edits it; comparing the string is what notices the edit.
+_quiet_parsed = (None, ())
+
+
+def _parsed_windows(spec):
+    """:func:`_quiet_windows` of ``spec``, parsed once per value."""
+    global _quiet_parsed
+    parsed = _quiet_parsed
+    if parsed[0] != spec:
+        parsed = _quiet_parsed = (spec, tuple(_quiet_windows(spec)))
+    return parsed[1]
+
+
+def _in_quiet_hours(spec, minute):
+    """Whether ``minute`` (past midnight) falls inside a window of
+    ``spec``. Start inclusive, end exclusive; a window whose start and end
+    are equal is empty."""
+    for start, end in _parsed_windows(spec):
+        if start < end and start <= minute < end:
+            return True
+        if start > end and (minute >= start or minute < end):
+            return True
+    return False
+
+
+def _quiet_now():
+    """Whether download_quiet_hours holds downloads at this moment."""
+    spec = settings.download_quiet_hours
+    if not spec:
+        return False
+    now = time.localtime()
+    return _in_quiet_hours(spec, now.tm_hour * 60 + now.tm_min)
+
+
+def _verify_days():
+    """download_verify_days as a number; 0, checking nothing, for a value
+    that is not one."""
+    try:
+        return float(settings.download_verify_days or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _segment_count():
+    """download_segments, clamped to at least one."""
+    try:
+        return max(1, int(settings.download_segments or 1))
+    except (TypeError, ValueError):
+        return 1
+
+
+class _Sessions:
+    """A pooled, keep-alive requests.Session per origin.
+
+    ``requests.get`` builds a session per call and throws it away, and the
+    connection and TLS handshake go with it. A season download was dozens
+    of handshakes against one server: one per file, per subtitle, per
+    trickplay tile, per poster. Keyed by origin rather than by server
+    because a subtitle's url can name another host (see _download_subs);
+    that host gets a pool of its own, never a connection meant for ours.
+
+    Sized when an origin is first used, from the settings: a transfer holds
+    one connection per segment, and the side fetches the rest.
+    ``pool_block`` is False, unlike the thumbnail store's: a connection
+    here can be held for the hour a remux takes, and a request queued
+    behind it would wait that hour. Past the size, a request gets a
+    connection of its own that is closed after it.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        return self._session(url).get(url, **kwargs)
+
+    def _session(self, url):
+        parts = urlparse(url)
+        origin = (parts.scheme, parts.hostname, parts.port)
+        with self._sessions_lock:
+            session = self._sessions.get(origin)
+            if session is None:
+                _total, per_server = _transfer_limits()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=per_server * _segment_count() + SIDE_WORKERS,
+                    pool_block=False)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[origin] = session
+            return session
+
+    def close(self):
+        """Close every pooled connection. The pool is rebuilt on next use."""
+        with self._sessions_lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            try:
+                session.close()
+            except Exception:
+                log.debug("Closing a download session failed.", exc_info=True)
+
+
+class _Budget:
+    """The bandwidth cap, shared by every transfer.
+
+    A token bucket holding at most one second's allowance. ``take`` charges
+    what a transfer has just read and answers how long it should sleep to
+    keep the sum under the cap -- a debt rather than a refusal, so a 1 MiB
+    chunk against a 256 KiB/s cap costs its four seconds instead of never
+    fitting. Transfers that charge the same bucket share the rate between
+    them without knowing about each other.
+
+    The rate is a callable, read on every charge, so the setting applies
+    to the transfers already running.
+    """
+
+    def __init__(self, rate):
+        self._rate = rate
+        self._budget_lock = threading.Lock()
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+
+    def take(self, nbytes):
+        try:
+            rate = float(self._rate() or 0)
+        except (TypeError, ValueError):
+            rate = 0.0
+        if rate <= 0:
+            return 0.0
+        with self._budget_lock:
+            now = time.monotonic()
+            self._tokens = min(rate,
+                               self._tokens + (now - self._stamp) * rate)
+            self._stamp = now
+            self._tokens -= nbytes
+            return 0.0 if self._tokens >= 0 else -self._tokens / rate
+
+
+class _Pacer:
+    """Slows the downloads while the stream playing beside them starves.
+
+    ``health`` answers how many seconds of a network stream mpv holds ahead
+    of playback, or None when nothing is streaming from the network. Every
+    ADAPT_INTERVAL the pacer compares it with ADAPT_LOW and ADAPT_HIGH:
+    below the first it halves its limit, starting from the rate the
+    downloads were actually getting; above the second it grows the limit
+    by ADAPT_GROWTH, and drops it once it is twice what they get, because
+    a limit nobody reaches is no limit. In between it holds. Nothing
+    streaming, or download_adaptive off, is no limit at all.
+
+    Slowing rather than pausing is the point: music or a stream from a
+    server on the LAN keeps its cache full with the downloads running, and
+    only a stream that is actually short of bytes costs them anything.
+    """
+
+    def __init__(self, health):
+        self._health = health
+        self._pacer_lock = threading.Lock()
+        #: Bytes/s the downloads may use between them, or None.
+        self.limit = None
+        self._bytes = 0
+        self._stamp = time.monotonic()
+
+    def cap(self, rate):
+        """``rate`` (bytes/s, 0 unlimited) with the pacer's limit applied,
+        in the same terms."""
+        limit = self.limit
+        if limit is None:
+            return rate
+        return min(rate, limit) if rate > 0 else limit
+
+    def note(self, nbytes):
+        """Count ``nbytes`` just read, and look at the stream if it is
+        time to."""
+        with self._pacer_lock:
+            self._bytes += nbytes
+            now = time.monotonic()
+            elapsed = now - self._stamp
+            if elapsed < ADAPT_INTERVAL:
+                return
+            seen = self._bytes / elapsed
+            self._bytes = 0
+            self._stamp = now
+            self._adjust(seen)
+
+    def _adjust(self, seen):
+        ahead = None
+        if settings.download_adaptive:
+            try:
+                ahead = self._health()
+            except Exception:
+                log.debug("Could not read the stream's cache.", exc_info=True)
+        if ahead is None:
+            self.limit = None
+        elif ahead < ADAPT_LOW:
+            base = self.limit if self.limit is not None else seen
+            self.limit = max(ADAPT_FLOOR, base / 2)
+            log.debug("Stream has %.1fs buffered; downloads slowed to "
+                      "%d KiB/s.", ahead, self.limit // 1024)
+        elif ahead >= ADAPT_HIGH and self.limit is not None:
+            self.limit *= ADAPT_GROWTH
+            if self.limit >= 2 * seen:
+                self.limit = None
+
+
+def _segment_plan(size, count):
+    """``[first, last, done]`` for each of ``count`` ranges covering
+    ``size`` bytes; ``last`` is inclusive, as in a Range header."""
+    step = -(-size // max(1, count))
+    return [[first, min(size, first + step) - 1, 0]
+            for first in range(0, size, step)]
+
+
+def _content_range(headers):
+    """``(first, last, total)`` from a Content-Range header, or None."""
+    raw = ((headers or {}).get("Content-Range") or "").strip()
+    match = re.match(r"bytes (\d+)-(\d+)/(\d+)$", raw)
+    return tuple(int(g) for g in match.groups()) if match else None
+
+
+def _write_all(fh, data):
+    """Write all of ``data`` to an unbuffered file, which may take less
+    than it is given in one call."""
+    view = memoryview(data)
+    while view:
+        view = view[fh.write(view):]
+
+
+def _write_image(path, data):
+    """Put ``data`` at ``path`` whole: written under a name of this
+    thread's own and renamed into place.
+
+    Artwork is fetched on the side pool, beside other transfers, and a
+    series' or a season's is shared by every episode in it: two of them
+    finishing together both find ``poster.jpg`` missing and both write
+    it. Written in place, the offline browser could read it half done, or
+    the slower writer's truncate could empty the faster one's file."""
+    staging = "%s.%d.tmp" % (path, threading.get_ident())
+    try:
+        with open(staging, "wb") as fh:
+            fh.write(data)
+        os.replace(staging, path)
+    except OSError:
+        try:
+            os.remove(staging)
+        except OSError:
+            pass
+        raise
+
+
+def _hash_file(path, stopping=None, rate=0):
+    """sha256 of the file at ``path``, hex. Reads at most ``rate`` bytes
+    per second when given one, and raises _Stopped as soon as
+    ``stopping()`` says so."""
+    hasher = hashlib.sha256()
+    began = time.monotonic()
+    done = 0
+    with open(path, "rb") as fh:
+        while True:
+            if stopping is not None and stopping():
+                raise _Stopped()
+            block = fh.read(CHUNK)
+            if not block:
+                break
+            hasher.update(block)
+            done += len(block)
+            if rate:
+                ahead = done / rate - (time.monotonic() - began)
+                if ahead > 0:
+                    time.sleep(ahead)
+    return hasher.hexdigest()
+
+
+def _lower_priority():
+    """Drop the calling thread to the lowest CPU priority.
+
+    Linux only, where a priority is per thread and where the CFQ and BFQ
+    IO schedulers also derive a thread's IO priority from it unless one was
+    set explicitly. Elsewhere ``setpriority`` would name the whole process
+    (or, with a thread id, some other one), so this does nothing there and
+    VERIFY_RATE is all the restraint there is.
+    """
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        log.debug("could not lower the verifier's priority", exc_info=True)
+
+
+class _RangesRefused(Exception):
+    """A segmented download cannot go on: the server ignored or refused a
+    Range, or described a file of another size. _stream drops the
+    segments and fetches the file as one stream."""
+
+
 class _Stopped(Exception):
     """Raised inside the worker when the app is shutting down mid-download."""
 
@@ -112,6 +528,12 @@ class _Cancelled(Exception):
     """Raised inside the worker when the active download is being deleted."""
 
 
+class _Held(_Stopped):
+    """Raised inside a transfer when download_quiet_hours begins. Handled as
+    a stop -- the row goes back to pending and its .part is kept -- and the
+    worker starts nothing until the quiet hours end."""
+
+
 def _same_origin(url, server):
     """Whether ``url`` is on the same host as ``server``.
 
@@ -170,6 +592,16 @@ def _sub_format(codec):
 
 
 class SyncManager:
+    #: Set in __init__. A class default so a manager built without it (the
+    #: auth-header tests stream through one made by __new__) is unthrottled
+    #: rather than an AttributeError on the first chunk.
+    _budget = None
+    _pacer = None
+    #: item_id -> (.part path, bytes, sha256) for a stream that has just
+    #: ended; see _content_digest. A class default for the same reason as
+    #: _budget: a manager made by __new__ streams without recording one.
+    _digests = None
+
     def __init__(self):
         self.db = None
         self.root = None
@@ -195,12 +627,47 @@ class SyncManager:
         # that it is still the current generation, so an abandoned one
         # exits no matter what _stop is set to afterwards.
         self._generation = 0
-        # Coordinates the worker with deletes of the item it is actively
-        # downloading: the worker owns cleanup so files/rows can't be yanked
-        # out from under an in-flight write.
+        # Coordinates the transfers with deletes of the items they are
+        # actively downloading: a transfer owns cleanup of its item so
+        # files/rows can't be yanked out from under an in-flight write.
         self._active_lock = threading.Lock()
-        self._active_item = None
+        #: Item ids a transfer has claimed, from the moment it marks the row
+        #: downloading until its commit point or its cleanup.
+        self._active = set()
         self._cancelled = set()
+        #: server uuid -> (retry after, consecutive failures). A transfer
+        #: that fails transiently backs off its own server only: the worker
+        #: used to back off as a whole, which with one transfer at a time
+        #: was the same thing, and with several would let one flaky server
+        #: stall downloads from every other.
+        self._backoff = {}
+        #: The fair queue's memory: which origin class was started last, so
+        #: a tie goes to the other one. See _next_runnable.
+        self._last_class = None
+        self._pacer = _Pacer(lambda: self.stream_health())
+        self._budget = _Budget(lambda: self._pacer.cap(
+            (settings.download_max_kbps or 0) * 1024))
+        #: Every outbound request goes through this; see _Sessions.
+        self._http = _Sessions()
+        self._side_pool = ThreadPoolExecutor(max_workers=SIDE_WORKERS,
+                                             thread_name_prefix="sync-side")
+        #: Progress waiting for the next push, item_id -> (name, downloaded,
+        #: total), and when the last push went. See _push_progress.
+        self._progress_lock = threading.Lock()
+        self._progress_pending = {}
+        self._progress_at = 0.0
+        self._digests = {}
+        #: The background check of downloaded files; see _verify_loop. Has
+        #: its own stop signal because the worker's, _wake, is cleared by
+        #: the worker on every pass.
+        self._verifier = None
+        self._halt = threading.Event()
+        #: Whether something is playing. Set in start(); the verifier stands
+        #: aside while it is true.
+        self.is_busy = lambda: False
+        #: Seconds of a network stream buffered ahead, or None; what the
+        #: pacer reads. Set in start().
+        self.stream_health = lambda: None
         # Set while relocate() is moving the store (worker stopped, catalog
         # closed). enqueue/delete short-circuit so nothing writes to a catalog
         # that is mid-move.
@@ -235,13 +702,19 @@ class SyncManager:
 
     # -- lifecycle ---------------------------------------------------------
 
-    def start(self, get_client, get_clients=None, is_busy=None):
+    def start(self, get_client, get_clients=None, is_busy=None,
+              stream_health=None):
         """get_clients (() -> {uuid: client}) and is_busy (() -> bool) power
         auto-download; both optional so existing callers and the tests keep
-        working, in which case auto-download simply finds no servers."""
+        working, in which case auto-download simply finds no servers.
+        stream_health (() -> seconds or None) feeds the pacer; see _Pacer."""
         self.get_client = get_client
         if get_clients is not None:
             self.get_clients = get_clients
+        if is_busy is not None:
+            self.is_busy = is_busy
+        if stream_health is not None:
+            self.stream_health = stream_health
         self.auto = AutoDownloader(self, get_clients=get_clients,
                                    is_busy=is_busy,
                                    should_stop=lambda: self._stop)
@@ -268,10 +741,15 @@ class SyncManager:
         except Exception:
             log.debug("Startup disk reconcile failed.", exc_info=True)
         self._stop = False
+        self._halt.clear()
         self._generation += 1
         self._worker = threading.Thread(target=self._run,
                                         args=(self._generation,), daemon=True)
         self._worker.start()
+        self._verifier = threading.Thread(
+            target=self._verify_loop, args=(self._generation,),
+            name="sync-verify", daemon=True)
+        self._verifier.start()
 
     def relocate(self, new_path, progress=None):
         """Move the download tree to new_path and re-point the manager at it.
@@ -294,7 +772,7 @@ class SyncManager:
         if old_root and os.path.abspath(old_root) == new_root:
             return True, ""
         with self._active_lock:
-            if self._active_item is not None:
+            if self._active:
                 return False, _("Can't change the download folder while a "
                                 "download is in progress. Wait for it to finish, "
                                 "then try again.")
@@ -313,7 +791,7 @@ class SyncManager:
         self._relocating = True
         if not self.stop():
             # The worker is still alive and still holds an open .part handle.
-            # The _active_item check above is not enough on its own: it is
+            # The _active check above is not enough on its own: it is
             # sampled before stop(), and the chunk loop only notices _stop
             # between chunks -- a stalled connection parks it in a socket read
             # for up to the 60s read timeout. Moving the tree out from under
@@ -448,6 +926,9 @@ class SyncManager:
     def stop(self):
         """Stop the download worker and close the catalog.
 
+        The worker joins its transfers before it exits, so a worker that
+        has unwound is one with no transfer left either.
+
         Returns True if the worker actually unwound. False means it is still
         running and still owns an open ``.part`` handle -- callers that are
         about to touch the store's files (relocate) MUST NOT proceed on a
@@ -456,22 +937,28 @@ class SyncManager:
         """
         self._stop = True
         self._wake.set()
+        self._halt.set()
         # Join the worker so it isn't killed mid-write, then close the catalog.
         # The chunk loop polls self._stop every chunk, but a chunk can take up
         # to the 60s read timeout to arrive, so this join genuinely can expire.
+        # The verifier too: it holds a media file open, which on Windows is
+        # enough to make relocate's move fail.
         joined = True
-        worker = self._worker
-        if worker is not None and worker.is_alive():
-            worker.join(timeout=STOP_JOIN_TIMEOUT)
-            if worker.is_alive():
-                joined = False
-                log.warning("Download worker did not stop within %ds.",
-                            STOP_JOIN_TIMEOUT)
+        for thread, what in ((self._worker, "Download worker"),
+                             (self._verifier, "File check")):
+            if thread is not None and thread.is_alive():
+                thread.join(timeout=STOP_JOIN_TIMEOUT)
+                if thread.is_alive():
+                    joined = False
+                    log.warning("%s did not stop within %ds.", what,
+                                STOP_JOIN_TIMEOUT)
         if self.db is not None:
             try:
                 self.db.close()
             except Exception:
                 log.debug("Closing catalog on stop failed.", exc_info=True)
+        if joined:
+            self._http.close()
         return joined
 
     # -- queries (also used by the browser via IPC) ------------------------
@@ -489,7 +976,7 @@ class SyncManager:
         """Snapshot the browser caches for indicators + the status bar."""
         if not self.db:
             return {"items": [], "series": [], "total_bytes": 0, "active": 0,
-                    "downloading": None}
+                    "downloading": None, "commits_per_sec": 0.0}
         rows = self.db.list()
         items = [r["item_id"] for r in rows if r["status"] == STATUS_COMPLETE]
         series = sorted({r["series_id"] for r in rows
@@ -500,7 +987,8 @@ class SyncManager:
         downloading = next((r["name"] for r in rows
                             if r["status"] == STATUS_DOWNLOADING), None)
         return {"items": items, "series": series, "total_bytes": total,
-                "active": active, "downloading": downloading}
+                "active": active, "downloading": downloading,
+                "commits_per_sec": self.db.commit_rate()}
 
     # -- estimate / enqueue / delete --------------------------------------
 
@@ -622,10 +1110,10 @@ class SyncManager:
                       exc_info=True)
 
     def _cancel_if_active(self, item_id):
-        """If the worker is downloading `item_id`, flag it for cancellation and
-        let the worker do the file/row cleanup. Returns True if it was active."""
+        """If a transfer is downloading `item_id`, flag it for cancellation and
+        let the transfer do the file/row cleanup. Returns True if it was active."""
         with self._active_lock:
-            if self._active_item == item_id:
+            if item_id in self._active:
                 self._cancelled.add(item_id)
                 return True
         return False
@@ -908,6 +1396,14 @@ class SyncManager:
                 shutil.rmtree(child_path, ignore_errors=True)
 
     def _notify_change(self):
+        # A push tells the browser to read the catalog, and its handle sees
+        # committed writes only: commit first, or it looks and finds nothing.
+        if self.db is not None:
+            try:
+                self.db.flush()
+            except Exception:
+                log.debug("catalog flush before a change push failed",
+                          exc_info=True)
         try:
             self.on_change()
         except Exception:
@@ -916,57 +1412,117 @@ class SyncManager:
     # -- worker ------------------------------------------------------------
 
     def _run(self, gen=None):
+        """The worker: keeps up to download_concurrency transfers running.
+
+        Each transfer is a thread of its own running :meth:`_download`;
+        this loop only decides what starts next, and does the housekeeping
+        (playstate replay, the catalog sweep, the auto pass) in between.
+        It joins every transfer it started before it returns, which is what
+        lets stop() keep meaning "nothing holds a .part any more".
+        """
         def stopping():
             """Shutting down, or superseded by a newer worker."""
             return self._stop or (gen is not None
                                   and gen != self._generation)
 
+        #: item_id -> (thread, row), this worker's transfers only. A
+        #: superseded worker's transfers finish under their own generation
+        #: check, not this one's.
+        transfers = {}
         error_streak = 0
-        while not stopping():
-            # Consume the wake signal up front. It used to be cleared only in
-            # the idle branch, which is unreachable while a pending row
-            # exists — so _download's no-client wait() returned instantly and
-            # one queued download against an unreachable server busy-spun
-            # this loop at full speed.
-            self._wake.clear()
-            try:
-                # Replay offline playstate on its own cadence — not only when the
-                # queue is idle — so one pending download for an unreachable
-                # server can't starve watched-state sync for a reachable one.
-                now = time.monotonic()
-                if now - self._last_playstate >= PLAYSTATE_INTERVAL:
-                    self._last_playstate = now
-                    self._sync_playstate()
-                self._note_connected_servers()
-                self._sweep_if_due(now)
-                row = self._next_runnable()
-                # Only between downloads: a pass here would otherwise
-                # enqueue work while the user's own download is streaming,
-                # and tick() is a no-op unless the interval has elapsed.
-                # Gated on *runnable* work, not on the queue being empty: a
-                # pending row for a server we cannot reach is not a download
-                # in progress, and treating it as one used to mean one dead
-                # server switched auto-download's reaper off for the life of
-                # the process — retention and the cap silently stopped being
-                # enforced, with the queue's own log line the only clue.
-                if self.auto is not None and row is None:
-                    self.auto.tick()
-                    row = self._next_runnable()
-                if row is None:
-                    self._wake.wait(5)
-                    continue
-                self._download(row, stopping=stopping)
-                error_streak = 0
-            except Exception:
-                # The worker must survive anything (disk full, DB errors —
-                # note the error path's own db.update can raise again on a
-                # full disk); back off so a persistent failure can't spin.
-                error_streak += 1
-                log.exception("Download worker iteration failed.")
-                self._wake.wait(min(60, 5 * error_streak))
+        try:
+            while not stopping():
+                # Consume the wake signal up front. It used to be cleared
+                # only in the idle branch, which is unreachable while a
+                # pending row exists — so _download's no-client wait()
+                # returned instantly and one queued download against an
+                # unreachable server busy-spun this loop at full speed.
+                self._wake.clear()
+                try:
+                    # Replay offline playstate on its own cadence — not only
+                    # when the queue is idle — so one pending download for an
+                    # unreachable server can't starve watched-state sync for
+                    # a reachable one.
+                    now = time.monotonic()
+                    if now - self._last_playstate >= PLAYSTATE_INTERVAL:
+                        self._last_playstate = now
+                        self._sync_playstate()
+                    self._note_connected_servers()
+                    self._sweep_if_due(now)
+                    for item_id in [i for i, (t, _row) in transfers.items()
+                                    if not t.is_alive()]:
+                        del transfers[item_id]
+                    total, _per_server = _transfer_limits()
+                    row = None
+                    quiet = _quiet_now()
+                    if len(transfers) < total and not quiet:
+                        row = self._next_runnable(
+                            [r for _t, r in transfers.values()])
+                    # Only while nothing is transferring: a pass here would
+                    # otherwise enqueue work while the user's own download is
+                    # streaming, and tick() is a no-op unless the interval
+                    # has elapsed. Gated on *runnable* work, not on the queue
+                    # being empty: a pending row for a server we cannot reach
+                    # is not a download in progress, and treating it as one
+                    # used to mean one dead server switched auto-download's
+                    # reaper off for the life of the process — retention and
+                    # the cap silently stopped being enforced, with the
+                    # queue's own log line the only clue.
+                    if (self.auto is not None and row is None
+                            and not transfers and not quiet):
+                        self.auto.tick()
+                        row = self._next_runnable()
+                    if row is None:
+                        # A transfer finishing sets _wake, so a free slot is
+                        # filled as soon as it opens, not after this.
+                        self._wake.wait(5)
+                        continue
+                    self._last_class = _origin_class(row)
+                    thread = threading.Thread(
+                        target=self._transfer, args=(row, stopping),
+                        name="sync-transfer", daemon=True)
+                    transfers[row["item_id"]] = (thread, row)
+                    thread.start()
+                    error_streak = 0
+                except Exception:
+                    # The worker must survive anything (disk full, DB errors);
+                    # back off so a persistent failure can't spin.
+                    error_streak += 1
+                    log.exception("Download worker iteration failed.")
+                    self._wake.wait(min(60, 5 * error_streak))
+        finally:
+            # No timeout: a transfer parked in a socket read keeps this
+            # thread alive with it, so stop() sees a worker that has not
+            # unwound and relocate refuses -- which is the truth.
+            for thread, _row in list(transfers.values()):
+                thread.join()
+
+    def _transfer(self, row, stopping):
+        """One transfer's thread: download ``row``, and on a transient
+        failure back its server off so the worker does not restart it in a
+        spin. _download has already left the row pending to resume."""
+        server_uuid = row.get("server_uuid")
+        try:
+            self._download(row, stopping=stopping)
+            with self._active_lock:
+                self._backoff.pop(server_uuid, None)
+        except Exception:
+            log.exception("Download of %s failed.",
+                          row.get("name") or row.get("item_id"))
+            with self._active_lock:
+                _until, streak = self._backoff.get(server_uuid, (0, 0))
+                streak += 1
+                self._backoff[server_uuid] = (
+                    time.monotonic() + min(60, 5 * streak), streak)
+        finally:
+            self._wake.set()    # a slot is free
+
+    def _next_runnable(self, running=()):
+        """The pending row to start next, or None.
 
-    def _next_runnable(self):
-        """The first pending row we can actually start now, or None.
+        ``running`` is the rows already transferring. Those are skipped, as
+        is a row whose server is at its download_per_server cap or backing
+        off after a failure.
 
         Rows whose server does not resolve are *skipped*, not waited on. The
         queue is drained in enqueue order (see db.list) and the worker used to
@@ -980,16 +1536,74 @@ class SyncManager:
 
         _sync_playstate already iterates past unresolvable clients for exactly
         this reason; this is the same rule for the download queue.
+
+        **Fair between what was asked for and what was scheduled.** The
+        queue is one list in enqueue order, and an auto pass can add twenty
+        rows at once; taken strictly in order, an episode queued by hand a
+        second later would wait for all twenty. So the head of each origin
+        class is found, and the class with fewer transfers running goes
+        next -- on a tie, the one that did not go last. With work on both
+        sides they alternate; with one side empty the other has every slot.
         """
+        _total, per_server = _transfer_limits()
+        running = list(running or ())
+        busy_ids = {r["item_id"] for r in running}
+        per_host = Counter(r.get("server_uuid") for r in running)
+        per_class = Counter(_origin_class(r) for r in running)
+        now = time.monotonic()
+        with self._active_lock:
+            backing_off = {uuid for uuid, (until, _n) in self._backoff.items()
+                           if until > now}
+        heads = {}
         blocked = 0
         for row in self.db.list(status=STATUS_PENDING):
-            if self.get_client(row["server_uuid"]) is not None:
-                if blocked:
-                    log.debug("Skipped %d pending download(s) whose server is "
-                              "unreachable.", blocked)
-                return row
-            blocked += 1
-        return None
+            uuid = row["server_uuid"]
+            cls = _origin_class(row)
+            if (cls in heads or row["item_id"] in busy_ids
+                    or uuid in backing_off or per_host[uuid] >= per_server):
+                continue
+            if self.get_client(uuid) is None:
+                blocked += 1
+                continue
+            heads[cls] = row
+            if len(heads) == 2:
+                break
+        if blocked:
+            log.debug("Skipped %d pending download(s) whose server is "
+                      "unreachable.", blocked)
+        if len(heads) < 2:
+            return next(iter(heads.values()), None)
+        # dict order is the order the heads were met in, which is enqueue
+        # order: with no history and nothing running, that decides.
+        first, second = heads
+        if per_class[first] != per_class[second]:
+            pick = min((first, second), key=lambda c: per_class[c])
+        elif self._last_class == first:
+            pick = second
+        else:
+            pick = first
+        return heads[pick]
+
+    def _push_progress(self, item_id, name, downloaded, total):
+        """Hand one transfer's progress to on_progress, coalesced.
+
+        Every transfer reports here; what reaches on_progress is at most one
+        round per PROGRESS_INTERVAL, carrying the latest figure for each item
+        that moved since the last one. Nothing is dropped but the figures a
+        later one superseded.
+        """
+        with self._progress_lock:
+            self._progress_pending[item_id] = (name, downloaded, total)
+            now = time.monotonic()
+            if now - self._progress_at < PROGRESS_INTERVAL:
+                return
+            self._progress_at = now
+            batch, self._progress_pending = self._progress_pending, {}
+        for pushed_id, (pushed_name, done, size) in batch.items():
+            try:
+                self.on_progress(pushed_id, pushed_name, done, size)
+            except Exception:
+                pass
 
     def _sync_playstate(self):
         """Replay offline playstate once a server is reachable — advancing only:
@@ -997,32 +1611,70 @@ class SyncManager:
         pending = self.db.list_playstate()
         if not pending:
             return
-        done = []
+        by_server = {}
         for entry in pending:
-            client = self.get_client(entry.get("server_uuid"))
+            by_server.setdefault(entry.get("server_uuid"), []).append(entry)
+        done = []
+        for server_uuid, entries in by_server.items():
+            client = self.get_client(server_uuid)
             if client is None:
                 continue  # still offline for this server
-            try:
-                server_ud = client.jellyfin.get_userdata_for_item(
-                    entry["item_id"]) or {}
-                update = {}
-                if entry.get("played") and not server_ud.get("Played"):
-                    update["Played"] = True
-                local_pos = entry.get("position_ticks") or 0
-                if local_pos > (server_ud.get("PlaybackPositionTicks") or 0):
-                    update["PlaybackPositionTicks"] = local_pos
-                if update:
-                    client.jellyfin.update_userdata_for_item(entry["item_id"],
-                                                             update)
-                done.append(entry["id"])
-            except Exception:
-                log.debug("Failed to replay playstate %s", entry.get("id"),
-                          exc_info=True)
+            known = self._server_userdata(
+                client, [entry["item_id"] for entry in entries])
+            for entry in entries:
+                if self._replay_playstate(client, entry, known):
+                    done.append(entry["id"])
         if done:
             self.db.clear_playstate(done)
             log.info("Synced %d offline playstate change(s) to the server.",
                      len(done))
 
+    def _server_userdata(self, client, item_ids):
+        """{item id: UserData} for ``item_ids``, read PLAYSTATE_BATCH at a
+        time through /Items?Ids= rather than one request per item.
+
+        A whole offline stretch of listening comes back at once, and asking
+        per item was two round trips a track for what is mostly a no-op.
+        Whatever this cannot answer is asked for per item, as before.
+        """
+        known = {}
+        for start in range(0, len(item_ids), PLAYSTATE_BATCH):
+            batch = item_ids[start:start + PLAYSTATE_BATCH]
+            try:
+                result = items_api.get_items(
+                    client.jellyfin, ids=batch, enable_images=False,
+                    enable_user_data=True) or {}
+            except Exception:
+                log.debug("Could not read userdata in bulk", exc_info=True)
+                continue
+            for item in result.get("Items") or []:
+                if item.get("Id") and isinstance(item.get("UserData"), dict):
+                    known[item["Id"]] = item["UserData"]
+        return known
+
+    def _replay_playstate(self, client, entry, known):
+        """Send one pending row's advance, if the server still needs it.
+        True when the row is settled and can be cleared."""
+        try:
+            server_ud = known.get(entry["item_id"])
+            if server_ud is None:
+                server_ud = client.jellyfin.get_userdata_for_item(
+                    entry["item_id"]) or {}
+            update = {}
+            if entry.get("played") and not server_ud.get("Played"):
+                update["Played"] = True
+            local_pos = entry.get("position_ticks") or 0
+            if local_pos > (server_ud.get("PlaybackPositionTicks") or 0):
+                update["PlaybackPositionTicks"] = local_pos
+            if update:
+                client.jellyfin.update_userdata_for_item(entry["item_id"],
+                                                         update)
+            return True
+        except Exception:
+            log.debug("Failed to replay playstate %s", entry.get("id"),
+                      exc_info=True)
+            return False
+
     def _sweep_if_due(self, now):
         """Run a pending catalog sweep, unless one ran too recently.
 
@@ -1364,14 +2016,14 @@ class SyncManager:
                 self.db.delete(item_id)
                 self._notify_change()
                 return
-            self._active_item = item_id
+            self._active.add(item_id)
         # A delete may have raced in just before we marked the item active (it
         # would have taken the direct path and removed the row). If the row is
         # gone, don't resurrect it.
         if not self.db.get(item_id):
             self._remove_files(row)
             with self._active_lock:
-                self._active_item = None
+                self._active.discard(item_id)
             return
         self.db.update(item_id, status=STATUS_DOWNLOADING)
         self._notify_change()
@@ -1395,30 +2047,46 @@ class SyncManager:
                 json.dump(item, fh)
             with open(os.path.join(item_dir, "source.json"), "w") as fh:
                 json.dump(source, fh)
-            self._download_artwork(client, item, item_dir)
+            # The side assets are small requests that used to run one after
+            # another before the media's first byte; now they run on the
+            # side pool alongside it, over the same pooled connections.
+            side = [self._side_pool.submit(self._download_artwork, client,
+                                           item, item_dir)]
             if not book:
                 # Subtitles, trickplay tiles and media segments are all
                 # properties of a media source. A book has none, so each of
                 # these would be a request that can only come back empty.
-                self._download_subs(client, item_id, source, item_dir)
-                self._download_trickplay(client, item_id, source, item_dir)
-                self._download_segments(client, source, item_dir)
+                side += [
+                    self._side_pool.submit(self._download_subs, client,
+                                           item_id, source, item_dir),
+                    self._side_pool.submit(self._download_trickplay, client,
+                                           item_id, source, item_dir),
+                    self._side_pool.submit(self._download_segments, client,
+                                           source, item_dir)]
             if item.get("Type") == "Episode" and item.get("SeriesId"):
-                self._download_series_art(client, row.get("server_id"),
-                                          item["SeriesId"])
+                side.append(self._side_pool.submit(
+                    self._download_series_art, client, row.get("server_id"),
+                    item["SeriesId"]))
                 if item.get("SeasonId"):
-                    self._download_season_art(client, row.get("server_id"),
-                                              item["SeasonId"])
+                    side.append(self._side_pool.submit(
+                        self._download_season_art, client,
+                        row.get("server_id"), item["SeasonId"]))
 
             media_path = os.path.join(item_dir, "media." + (row["ext"] or "mkv"))
             tmp = media_path + ".part"
             url = client.jellyfin.download_url(item_id, include_apikey=False)
             expected = row.get("size_bytes") or 0
             served = {}
-            size, total = self._stream(url, media_path, item_id, row.get("name"),
-                                       expected, stopping=stopping,
-                                       headers=self._headers_for(client, url),
-                                       on_headers=served.update)
+            try:
+                size, total = self._stream(
+                    url, media_path, item_id, row.get("name"), expected,
+                    stopping=stopping, headers=self._headers_for(client, url),
+                    on_headers=served.update)
+            finally:
+                # Before anything else touches the item's folder: the commit
+                # marks it complete, and a cancel deletes it, and neither may
+                # happen under a side fetch still writing into it.
+                self._await_side(side, item_id)
             ext = row["ext"]
             if book:
                 # The response says what the file actually is, and it is the
@@ -1462,19 +2130,26 @@ class SyncManager:
                 self._notify_change()
                 return
             self._short_read_stalls.pop(item_id, None)
+            # Before the lock: a segmented download has no streamed hash,
+            # and reading a large file back must not hold up deletes.
+            digest = self._content_digest(item_id, tmp, size, stopping)
+            twin = self._find_twin(row, digest, size)
 
             # Commit point: promote the .part and mark complete atomically with a
             # final cancellation check under the active lock, so a delete that
             # lands after the last chunk (S4) is honoured instead of being lost
-            # to a COMPLETE row. Clearing _active_item here means any delete that
+            # to a COMPLETE row. Releasing the item here means any delete that
             # arrives after the commit takes the direct path against the now
             # fully-downloaded item rather than the deferred-cancel path.
             rel = os.path.relpath(media_path, self.root)
             with self._active_lock:
                 if item_id in self._cancelled:
                     raise _Cancelled()
-                os.replace(tmp, media_path)
+                if twin is None or not self._link_twin(row, tmp, media_path,
+                                                       twin):
+                    os.replace(tmp, media_path)
                 self.db.update(item_id, status=STATUS_COMPLETE, file_path=rel,
+                               content_hash=digest,
                                downloaded_bytes=size,
                                size_bytes=size or expected,
                                ext=ext,
@@ -1485,13 +2160,19 @@ class SyncManager:
                                # queue for hours should age from when it landed
                                # on disk.
                                completed_at=int(time.time()))
-                self._active_item = None
+                self._active.discard(item_id)
             log.info("Downloaded %s (%.1f MiB).", row.get("name") or item_id,
                      size / (1 << 20))
         except _Cancelled:
             log.info("Download cancelled (deleted): %s", row.get("name") or item_id)
             self._remove_files(row)
             self.db.delete(item_id)
+        except _Held:
+            # Quiet hours began mid-file. Pending, like a stop, so it
+            # resumes from the .part when they end.
+            log.info("Download held for quiet hours: %s", item_id)
+            self.db.update(item_id, status=STATUS_PENDING)
+            self._notify_change()
         except _Stopped:
             # App is quitting mid-download: leave it pending so it resumes next
             # launch (the .part file is kept), rather than poisoning it to error.
@@ -1527,10 +2208,111 @@ class SyncManager:
             self.db.update(item_id, status=STATUS_ERROR)
         finally:
             with self._active_lock:
-                self._active_item = None
+                self._active.discard(item_id)
                 self._cancelled.discard(item_id)
+            with self._progress_lock:
+                # Nothing more to say about it; a held-back figure pushed
+                # after the change push would show a finished item as 97%.
+                self._progress_pending.pop(item_id, None)
+            if self._digests is not None:
+                self._digests.pop(item_id, None)
         self._notify_change()
 
+    def _content_digest(self, item_id, tmp, size, stopping=None):
+        """The sha256 of the finished ``tmp``: the one _stream_request took
+        as the bytes arrived, when it covers all ``size`` of them, else
+        read back from disk. Only a segmented download, or a .part found
+        already complete, pays for that read -- the ranges land out of
+        order, and a hash cannot be taken out of order."""
+        streamed = (self._digests.pop(item_id, None)
+                    if self._digests is not None else None)
+        if streamed is not None and streamed[:2] == (tmp, size):
+            return streamed[2]
+        return _hash_file(tmp, stopping or (lambda: self._stop))
+
+    def _find_twin(self, row, digest, size):
+        """A download already holding ``digest``'s bytes that a new one may
+        be linked to, or None.
+
+        Only one whose file was checked within download_verify_days -- by
+        the verifier, or by arriving, which is the rule next_unchecked ages
+        files by. The fresh copy is known good; a twin is only known to
+        have been good when it was last read, and linking to one that has
+        rotted since would drop the good copy and spread the bad one to a
+        second item. Reading it back here instead would be a second full
+        read of the file, unpaced, at every commit that has a twin: one
+        past its check is left to the verifier, and the new download keeps
+        a copy of its own. With the verifier off nothing reads a stored
+        file back, and a twin is trusted as every other file is.
+        """
+        twin = self.db.find_content(digest, exclude=row["item_id"])
+        if twin is None or not twin.get("file_path"):
+            return None
+        days = _verify_days()
+        if days > 0:
+            checked = max(self.db.checked_at(digest) or 0,
+                          twin.get("completed_at") or 0)
+            if checked < time.time() - days * 86400:
+                return None
+        try:
+            if os.path.getsize(os.path.join(self.root,
+                                            twin["file_path"])) != size:
+                return None
+        except OSError:
+            return None
+        return twin
+
+    def _link_twin(self, row, tmp, media_path, twin):
+        """Store the finished ``tmp`` as a hardlink to ``twin``, a download
+        _find_twin found holding the same bytes, and drop it. True if it
+        did.
+
+        The same file under two item ids is ordinary: an episode in two
+        users' libraries, or on two servers pointed at one share. The bytes
+        had to come down to be hashed, so this saves disk, not bandwidth.
+        Called under _active_lock at the commit point. A twin deleted under
+        it is only its own name going: the link, once made, is a file in
+        its own right, and until then its absence is an OSError and the
+        .part is promoted as usual. Files are never written after their
+        commit point, which is what makes sharing an inode safe.
+        """
+        source = os.path.join(self.root, twin["file_path"])
+        staging = media_path + ".link"
+        try:
+            if os.path.exists(staging):
+                os.remove(staging)
+            os.link(source, staging)
+            os.replace(staging, media_path)
+        except OSError:
+            # No hardlinks here (FAT, some network shares), or the twin is
+            # mid-delete: keep a copy of our own.
+            log.debug("could not link %s to %s", media_path, source,
+                      exc_info=True)
+            try:
+                os.remove(staging)
+            except OSError:
+                pass
+            return False
+        try:
+            os.remove(tmp)
+        except OSError:
+            log.debug("could not remove %s", tmp, exc_info=True)
+        log.info("%s is the same file as %s; stored once.",
+                 row.get("name") or row["item_id"],
+                 twin.get("name") or twin["item_id"])
+        return True
+
+    @staticmethod
+    def _await_side(futures, item_id):
+        """Wait for an item's side fetches. Each is best-effort, as it was
+        when they ran inline: a missing poster is not a failed download."""
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                log.debug("A side download for %s failed.", item_id,
+                          exc_info=True)
+
     def _headers_for(self, client, url):
         """Credentials for ``url``, as a headers dict, or ``{}``.
 
@@ -1575,6 +2357,26 @@ class SyncManager:
         size (size_bytes or Content-Length) for the short-read guard, or 0.
         """
         tmp = dest + ".part"
+        if os.path.exists(tmp + SEGMENTS_SUFFIX) or self._wants_segments(
+                tmp, expected):
+            try:
+                return self._stream_segmented(url, tmp, item_id, name,
+                                              expected, stopping, headers,
+                                              on_headers)
+            except _RangesRefused as exc:
+                # Whatever the ranges wrote is only trustworthy with the
+                # map that described it, and the map is for a plan the
+                # server will not serve. Start clean.
+                log.info("Segmented download of %s abandoned (%s); fetching "
+                         "it as one stream.", name or item_id, exc)
+                # The .part before its map. A full-size .part with no map
+                # reads below as a finished single stream and is promoted;
+                # a map with no .part is refused and cleared next time.
+                for path in (tmp, tmp + SEGMENTS_SUFFIX):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
         resume = os.path.getsize(tmp) if os.path.exists(tmp) else 0
         # A prior run may have died between the stream finishing and the
         # promotion, leaving a full-size .part. Re-requesting with
@@ -1603,6 +2405,185 @@ class SyncManager:
             return self._stream_request(url, tmp, item_id, name, expected,
                                         0, stopping, headers, on_headers)
 
+    @staticmethod
+    def _wants_segments(tmp, expected):
+        """Whether a fresh download of ``expected`` bytes should be split.
+
+        Never a download already under way as one stream: a plain .part is
+        resumed the way it was begun. And never a size we do not know --
+        the ranges are planned from it, and a book's is not known until
+        its response arrives.
+        """
+        try:
+            floor = int(settings.download_segment_min_mb or 0) << 20
+        except (TypeError, ValueError):
+            return False
+        return (_segment_count() > 1 and bool(expected) and expected >= floor
+                and not os.path.exists(tmp))
+
+    def _stream_segmented(self, url, tmp, item_id, name, expected,
+                          stopping=None, headers=None, on_headers=None):
+        """Fetch ``url`` into ``tmp`` as several byte ranges at once.
+
+        The .part is preallocated to full size (sparse wherever the
+        filesystem can) and each range is written in place by a thread of
+        its own. Which bytes have landed is kept in the segment map beside
+        it, written as they land, so a crash resumes each range where it
+        stopped rather than the file from the start. The map exists for
+        as long as the preallocated .part does: without it, a full-size
+        file of zeros would pass for a finished single stream. A range's bytes are
+        counted only after an unbuffered write has returned, so the map
+        never claims more than a dead process left on disk.
+
+        Every response is checked against the plan: a 206 whose
+        Content-Range is the range asked for, of a file the size the plan
+        was made for. Anything else -- a 200 that ignored the Range, a 416,
+        another total because the file changed on the server -- raises
+        _RangesRefused, and _stream falls back to one stream.
+
+        Returns ``(downloaded, total)`` like _stream_request, so a short
+        range is the caller's short read and resumes from the map.
+        Otherwise raises what a range raised first, after every range has
+        stopped -- stop() relies on no thread of this download outliving
+        it.
+        """
+        segmap = tmp + SEGMENTS_SUFFIX
+        plan, size = None, expected
+        try:
+            with open(segmap) as fh:
+                saved = json.load(fh)
+            plan, size = saved["segments"], saved["size"]
+        except (OSError, ValueError, KeyError, TypeError):
+            if os.path.exists(segmap):
+                raise _RangesRefused("unreadable segment map")
+        if plan is not None and expected and size != expected:
+            raise _RangesRefused("segment map is for %d bytes, not %d"
+                                 % (size, expected))
+        if plan is None:
+            plan = _segment_plan(size, _segment_count())
+            # The map before the .part it describes, for the same reason
+            # the abandon path in _stream removes them the other way round.
+            self._save_segments(segmap, size, plan)
+        if not os.path.exists(tmp):
+            if any(seg[2] for seg in plan):
+                raise _RangesRefused("segment map without its .part")
+            with open(tmp, "wb") as fh:
+                fh.truncate(size)
+
+        stopping = stopping or (lambda: self._stop)
+        shared = {"lock": threading.Lock(), "error": None,
+                  "saved": sum(seg[2] for seg in plan),
+                  "on_headers": on_headers}
+        abort = threading.Event()
+        threads = [threading.Thread(
+            target=self._fetch_segment, name="sync-segment", daemon=True,
+            args=(url, tmp, segmap, seg, plan, size, item_id, name,
+                  stopping, headers, shared, abort))
+            for seg in plan if seg[0] + seg[2] <= seg[1]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with shared["lock"]:
+            self._save_segments(segmap, size, plan)
+        if shared["error"] is not None:
+            raise shared["error"]
+        downloaded = sum(seg[2] for seg in plan)
+        if downloaded >= size:
+            # Complete: without its map the .part is an ordinary full-size
+            # one, which _stream promotes if the commit never happens.
+            os.remove(segmap)
+        return downloaded, size
+
+    def _fetch_segment(self, url, tmp, segmap, seg, plan, size, item_id,
+                       name, stopping, headers, shared, abort):
+        """One range of _stream_segmented, on its own thread. Records the
+        first error in ``shared`` and sets ``abort`` for the rest."""
+        try:
+            first = seg[0] + seg[2]
+            headers = dict(headers or {})
+            headers["Range"] = "bytes=%d-%d" % (first, seg[1])
+            with self._http.get(url, stream=True, headers=headers,
+                              verify=not settings.ignore_ssl_cert,
+                              timeout=(10, 60)) as resp:
+                if resp.status_code in (200, 416):
+                    raise _RangesRefused("HTTP %d for a Range request"
+                                         % resp.status_code)
+                resp.raise_for_status()
+                answered = _content_range(resp.headers)
+                if answered != (first, seg[1], size):
+                    raise _RangesRefused("asked for bytes %d-%d/%d, got %r"
+                                         % (first, seg[1], size, answered))
+                length = resp.headers.get("Content-Length")
+                if length is not None and int(length) != seg[1] - first + 1:
+                    raise _RangesRefused("Content-Length %s for %d bytes"
+                                         % (length, seg[1] - first + 1))
+                with shared["lock"]:
+                    # Any range's headers describe the file; the first to
+                    # arrive is handed on, once.
+                    on_headers, shared["on_headers"] = shared["on_headers"], None
+                if on_headers is not None:
+                    on_headers(resp.headers)
+                with open(tmp, "r+b", buffering=0) as fh:
+                    fh.seek(first)
+                    for chunk in resp.iter_content(CHUNK):
+                        if abort.is_set():
+                            return
+                        if stopping():
+                            raise _Stopped()
+                        if item_id in self._cancelled:
+                            raise _Cancelled()
+                        if not chunk:
+                            continue
+                        # Never past its own range, whatever is sent.
+                        chunk = chunk[:seg[1] + 1 - seg[0] - seg[2]]
+                        _write_all(fh, chunk)
+                        self._segment_progress(segmap, seg, plan, size,
+                                               len(chunk), item_id, name,
+                                               shared)
+                        if seg[0] + seg[2] > seg[1]:
+                            break
+                        self._throttle(len(chunk), item_id, stopping)
+        except Exception as exc:
+            with shared["lock"]:
+                if shared["error"] is None:
+                    shared["error"] = exc
+            abort.set()
+
+    def _segment_progress(self, segmap, seg, plan, size, nbytes, item_id,
+                          name, shared):
+        """Count ``nbytes`` onto ``seg``; every PROGRESS_STEP across the
+        ranges, save the map and report, as the single stream does."""
+        with shared["lock"]:
+            seg[2] += nbytes
+            downloaded = sum(s[2] for s in plan)
+            if downloaded - shared["saved"] < PROGRESS_STEP:
+                return
+            shared["saved"] = downloaded
+            self._save_segments(segmap, size, plan)
+        self.db.update(item_id, downloaded_bytes=downloaded)
+        self._push_progress(item_id, name, downloaded, size)
+
+    @staticmethod
+    def _save_segments(segmap, size, plan):
+        """Write the segment map whole, or not at all: a torn map would
+        claim ranges nobody wrote.
+
+        And only after what it claims: the .part's data is synced before a
+        map that marks any of it done, and the map itself before it is
+        renamed into place. Without that a power cut -- an ordinary event
+        on the boxes this runs on -- can land the map and lose the data,
+        and the resume then skips the hole it describes as written."""
+        if any(seg[2] for seg in plan):
+            with open(segmap[:-len(SEGMENTS_SUFFIX)], "r+b") as part:
+                os.fsync(part.fileno())
+        staging = segmap + ".tmp"
+        with open(staging, "w") as fh:
+            json.dump({"size": size, "segments": plan}, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(staging, segmap)
+
     def _stream_request(self, url, tmp, item_id, name, expected,
                         resume, stopping=None, headers=None, on_headers=None):
         verify = not settings.ignore_ssl_cert
@@ -1612,7 +2593,7 @@ class SyncManager:
         headers = dict(headers or {})
         if resume:
             headers["Range"] = "bytes=%d-" % resume
-        with requests.get(url, stream=True, headers=headers, verify=verify,
+        with self._http.get(url, stream=True, headers=headers, verify=verify,
                           timeout=(10, 60)) as resp:
             if resume and resp.status_code == 200:
                 resume = 0  # server ignored Range; restart cleanly
@@ -1620,6 +2601,15 @@ class SyncManager:
             if on_headers is not None:
                 on_headers(resp.headers)
             total = expected or (int(resp.headers.get("Content-Length", 0)) + resume)
+            # Hashed as it streams, so a finished download needs no second
+            # read. A resume reads back the bytes it is resuming after: the
+            # hash's state died with the process that had it.
+            hasher = (hashlib.sha256() if self._digests is not None
+                      else None)
+            if hasher is not None and resume:
+                with open(tmp, "rb") as prior:
+                    for block in iter(lambda: prior.read(CHUNK), b""):
+                        hasher.update(block)
             downloaded = resume
             last_push = downloaded
             mode = "ab" if resume else "wb"
@@ -1633,16 +2623,121 @@ class SyncManager:
                     if not chunk:
                         continue
                     fh.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
                     downloaded += len(chunk)
                     if downloaded - last_push >= PROGRESS_STEP:
                         self.db.update(item_id, downloaded_bytes=downloaded)
-                        try:
-                            self.on_progress(item_id, name, downloaded, total)
-                        except Exception:
-                            pass
+                        self._push_progress(item_id, name, downloaded, total)
                         last_push = downloaded
+                    self._throttle(len(chunk), item_id, stopping)
+        if hasher is not None:
+            self._digests[item_id] = (tmp, downloaded, hasher.hexdigest())
         return downloaded, total
 
+    def _throttle(self, nbytes, item_id, stopping):
+        """Charge ``nbytes`` to the shared bandwidth budget, and sleep off
+        whatever it says is owed -- in slices, so a stop or a delete is not
+        kept waiting behind a slow cap. The .part is consistent at every
+        point this can raise: the chunk was written before the charge."""
+        if _quiet_now():
+            raise _Held()
+        if self._pacer is not None:
+            self._pacer.note(nbytes)
+        delay = self._budget.take(nbytes) if self._budget else 0.0
+        while delay > 0:
+            if stopping():
+                raise _Stopped()
+            if item_id in self._cancelled:
+                raise _Cancelled()
+            step = min(delay, THROTTLE_SLICE)
+            time.sleep(step)
+            delay -= step
+
+    # -- verification ------------------------------------------------------
+
+    def _verify_loop(self, gen):
+        """The verifier's thread: read downloaded files back, oldest check
+        first, and compare each with the hash taken as it arrived.
+
+        Runs beside the worker rather than in it: a check is minutes of
+        reading, and the worker must stay free to start transfers. Paced by
+        VERIFY_RATE at the lowest priority the platform gives a thread
+        (_lower_priority), and abandons a check the moment something plays.
+        """
+        _lower_priority()
+
+        def stopping():
+            return (self._halt.is_set() or gen != self._generation
+                    or self.is_busy())
+
+        while not self._halt.is_set() and gen == self._generation:
+            try:
+                delay = self._verify_next(stopping)
+            except Exception:
+                log.exception("Checking a downloaded file failed.")
+                delay = VERIFY_IDLE
+            self._halt.wait(delay)
+
+    def _verify_next(self, stopping=None):
+        """Check the file whose turn it is, if any. Returns how long to wait
+        before looking again."""
+        days = _verify_days()
+        if days <= 0 or self.db is None:
+            return VERIFY_IDLE
+        if self.is_busy():
+            return VERIFY_BUSY_WAIT
+        row = self.db.next_unchecked(time.time() - days * 86400)
+        if row is None:
+            return VERIFY_IDLE
+        expected = row["content_hash"]
+        path = os.path.join(self.root, row.get("file_path") or "")
+        try:
+            actual = _hash_file(path, stopping, VERIFY_RATE)
+        except _Stopped:
+            return VERIFY_BUSY_WAIT
+        except OSError:
+            # Unreadable is not the same as wrong. A sync_path on a drive
+            # that is not plugged in reads as every file missing, and
+            # re-downloading the library over it would be the worst answer.
+            # A file that really is gone is _reconcile_disk's to re-queue.
+            log.warning("Could not read %s to check it.", path, exc_info=True)
+            return VERIFY_IDLE
+        if actual == expected:
+            self.db.mark_checked(expected)
+            return 0
+        self._requeue_content(expected, row)
+        return 0
+
+    def _requeue_content(self, content_hash, row):
+        """Re-download every item holding the file that no longer hashes to
+        ``content_hash``. They share its inode (see _link_twin), so one bad
+        read condemns all of them, and each comes back as its own download,
+        to be linked again as they land."""
+        log.error("%s no longer matches the file that was downloaded; "
+                  "downloading it again.", row.get("name") or row["item_id"])
+        for held in self.db.list_content(content_hash):
+            with self._active_lock:
+                if held["item_id"] in self._active:
+                    continue    # already being replaced
+                self._requeue_row(held)
+        self._notify_change()
+        self._wake.set()
+
+    def _requeue_row(self, held):
+        """Drop ``held``'s file and queue it to download again. Called under
+        _active_lock, with ``held`` known not to be active."""
+        if held.get("file_path"):
+            try:
+                os.remove(os.path.join(self.root, held["file_path"]))
+            except OSError:
+                log.debug("could not remove %s", held["file_path"],
+                          exc_info=True)
+        # File before row: a crash between the two leaves a complete row
+        # with no file, which _reconcile_disk re-queues.
+        self.db.update(held["item_id"], status=STATUS_PENDING,
+                       downloaded_bytes=0, file_path=None, content_hash=None)
+
     def _download_trickplay(self, client, item_id, source, item_dir):
         """Download trickplay (scrubbing preview) tiles for offline use."""
         api = client.jellyfin
@@ -1672,10 +2767,12 @@ class SyncManager:
         tp_dir = os.path.join(item_dir, "trickplay", str(width))
         os.makedirs(tp_dir, exist_ok=True)
         for i in range(tiles):
+            if self._stop:
+                return      # shutdown; the transfer is waiting on this
             url = api.trickplay_tile_url(item_id, width, i, source.get("Id"),
                                          include_apikey=False)
             try:
-                resp = requests.get(url, timeout=(10, 30), verify=verify,
+                resp = self._http.get(url, timeout=(10, 30), verify=verify,
                                     headers=self._headers_for(client, url))
                 resp.raise_for_status()
                 with open(os.path.join(tp_dir, "%d.jpg" % i), "wb") as fh:
@@ -1741,11 +2838,10 @@ class SyncManager:
                                                include_apikey=False)))
         for path, url in jobs:
             try:
-                resp = requests.get(url, timeout=(10, 30), verify=verify,
+                resp = self._http.get(url, timeout=(10, 30), verify=verify,
                                     headers=self._headers_for(client, url))
                 resp.raise_for_status()
-                with open(path, "wb") as fh:
-                    fh.write(resp.content)
+                _write_image(path, resp.content)
             except Exception:
                 log.debug("Series art failed: %s", url, exc_info=True)
 
@@ -1764,12 +2860,11 @@ class SyncManager:
         url = client.jellyfin.artwork(playlist_id, "Primary", 600,
                                       include_apikey=False)
         try:
-            resp = requests.get(url, timeout=(10, 30),
+            resp = self._http.get(url, timeout=(10, 30),
                                 verify=not settings.ignore_ssl_cert,
                                 headers=self._headers_for(client, url))
             resp.raise_for_status()
-            with open(poster, "wb") as fh:
-                fh.write(resp.content)
+            _write_image(poster, resp.content)
         except Exception:
             # Playlists without an image are normal — the tile falls back to
             # its glyph, same as online.
@@ -1803,11 +2898,10 @@ class SyncManager:
         url = client.jellyfin.artwork(season_id, "Primary", 600,
                                       include_apikey=False)
         try:
-            resp = requests.get(url, timeout=(10, 30), verify=verify,
+            resp = self._http.get(url, timeout=(10, 30), verify=verify,
                                 headers=self._headers_for(client, url))
             resp.raise_for_status()
-            with open(poster, "wb") as fh:
-                fh.write(resp.content)
+            _write_image(poster, resp.content)
         except Exception:
             log.debug("Season art failed for %s", season_id, exc_info=True)
 
@@ -1827,11 +2921,10 @@ class SyncManager:
         verify = not settings.ignore_ssl_cert
         for name, url in jobs:
             try:
-                resp = requests.get(url, timeout=(10, 30), verify=verify,
+                resp = self._http.get(url, timeout=(10, 30), verify=verify,
                                     headers=self._headers_for(client, url))
                 resp.raise_for_status()
-                with open(os.path.join(item_dir, name), "wb") as fh:
-                    fh.write(resp.content)
+                _write_image(os.path.join(item_dir, name), resp.content)
             except Exception:
                 log.debug("Artwork %s failed for %s", name, item.get("Id"),
                           exc_info=True)
@@ -1879,7 +2972,7 @@ class SyncManager:
             # handed our access token to whatever host the path named.
             try:
                 os.makedirs(subs_dir, exist_ok=True)
-                resp = requests.get(url, timeout=(10, 30), verify=verify,
+                resp = self._http.get(url, timeout=(10, 30), verify=verify,
                                     headers=self._headers_for(client, url))
                 resp.raise_for_status()
                 with open(os.path.join(subs_dir, "%s.%s" % (index, fmt)), "wb") as fh:
@@ -1,6 +1,7 @@
 import logging
 import threading
 import os
+import time
 
 import jellyfin_apiclient_python.exceptions
 
@@ -10,6 +11,62 @@ from .utils import Timer
 
 log = logging.getLogger("timeline")
 
+#: The thread's tick, and the progress interval right after an edge. The
+#: local duties (the music bar, the volume, idle) run on every tick.
+REPORT_BASE = 5
+#: How far the position may stray from where steady playback would have
+#: put it before the difference counts as a seek. mpv's own seek keys do
+#: not all go through timeline_handle, so the pacer looks for itself.
+SEEK_SLACK = 3.0
+
+
+class ReportPacer:
+    """Whether a tick's progress report goes to the server.
+
+    Every tick used to POST ``/Sessions/Playing/Progress``, changed or not,
+    and a server with many clients pays for each of them. A report now goes
+    at once on an *edge* -- a pause, a seek, a track or item change, or
+    anything that called ``timeline_handle`` -- and during steady playback
+    the interval after it doubles, up to ``ceiling``. The server needs a
+    check-in well inside its idle-playback sweep (five minutes) and
+    interpolates the position between reports, as every client's UI does.
+    """
+
+    def __init__(self):
+        self.interval = REPORT_BASE
+        self._sent_at = None
+        self._state = None
+        self._mark = None
+
+    def tick(self, now, edge, state, position=None, speed=1.0,
+             ceiling=REPORT_BASE):
+        """Record this tick; True when a report is due. ``state`` is what
+        an edge changes (item, pause, tracks); None means unknown, and
+        unknown always reports."""
+        jumped = self._jumped(now, state, position, speed)
+        changed = state is None or state != self._state
+        self._state = state
+        if edge or jumped or changed or self._sent_at is None:
+            self.interval = REPORT_BASE
+        elif now - self._sent_at < self.interval:
+            return False
+        else:
+            self.interval = max(REPORT_BASE,
+                                min(self.interval * 2, ceiling or 0))
+        self._sent_at = now
+        return True
+
+    def _jumped(self, now, state, position, speed):
+        mark, self._mark = self._mark, (now, position, state)
+        if (mark is None or position is None or mark[1] is None
+                or state is None or mark[2] != state):
+            return False
+        paused = state[1]
+        expected = mark[1]
+        if not paused:
+            expected += (now - mark[0]) * (speed or 1.0)
+        return abs(position - expected) > SEEK_SLACK
+
 
 class TimelineManager(threading.Thread):
     def __init__(self):
@@ -21,6 +78,7 @@ class TimelineManager(threading.Thread):
         # playback stopped, so we push "stopped" once on the active→inactive
         # edge (e.g. end of a queue) rather than every idle tick.
         self._pushed_stopped = False
+        self.pacer = ReportPacer()
 
         threading.Thread.__init__(self)
 
@@ -39,6 +97,7 @@ class TimelineManager(threading.Thread):
                 "shutdown without it.", self.JOIN_TIMEOUT)
 
     def run(self):
+        edge = True
         while not self.halt:
             # This thread must survive anything — if it dies, progress
             # reporting and the idle hooks are silently gone for the rest of
@@ -46,7 +105,10 @@ class TimelineManager(threading.Thread):
             # error can't turn into a busy loop.
             try:
                 if playerManager.is_active():
-                    self.send_timeline()
+                    if self._report_due(edge):
+                        self.send_timeline()
+                    else:
+                        playerManager.record_timeline_locally()
                     # Keep the browser's music bar position in sync between the
                     # discrete state-change pushes (the bar interpolates locally
                     # while playing).
@@ -86,9 +148,30 @@ class TimelineManager(threading.Thread):
                     playerManager.idle_quit()
             except Exception:
                 log.exception("Error in timeline thread.")
-            if self.trigger.wait(5):
+            edge = self.trigger.wait(REPORT_BASE)
+            if edge:
                 self.trigger.clear()
 
+    def _report_due(self, edge):
+        """Ask the pacer, with what it needs read off the player. Anything
+        unreadable reports, which is what every tick used to do."""
+        try:
+            video = playerManager._video
+            state = (video.item_id, playerManager.is_paused(),
+                     video.aid, video.sid)
+            position = playerManager.get_time()
+            speed = playerManager.get_speed()
+            ceiling = settings.progress_report_max_secs
+            # A SyncPlay group rides on the tick (sync_playback_time), and
+            # an offline item reports to nobody but the catalog.
+            if (video.client is None
+                    or playerManager.syncplay.is_enabled()):
+                ceiling = REPORT_BASE
+        except Exception:
+            return True
+        return self.pacer.tick(time.monotonic(), edge, state, position,
+                               speed, ceiling)
+
     def delay_idle(self):
         self.idleTimer.restart()
         self.is_idle = False
@@ -126,3 +126,83 @@ def paragraphs(count, words=40, word="word"):
     """``count`` paragraphs of roughly ``words`` words each."""
     return "".join("<p>%s</p>" % " ".join([word] * words)
                    for _i in range(count))
+
+
+def calibre_css(classes=400):
+    """A stylesheet the size and shape of a Calibre conversion's.
+
+    Calibre names a class for every distinct computed style it met in the
+    source (``calibre1`` … ``calibre400``), and adds the descendant and
+    child rules its heuristics produce. Most classes set nothing this
+    reader draws; it still has to look at every one.
+    """
+    rules = []
+    for n in range(1, classes + 1):
+        decls = ["display: block", "margin-top: 0", "line-height: 1.2"]
+        if n % 7 == 0:
+            decls.append("font-style: italic")
+        if n % 11 == 0:
+            decls.append("font-weight: bold")
+        if n % 13 == 0:
+            decls.append("text-indent: 1.5em")
+        rules.append(".calibre%d { %s }" % (n, "; ".join(decls)))
+        if n % 5 == 0:
+            rules.append("div.calibre%d > p.calibre%d { text-align: center }"
+                         % (n, n + 1))
+        if n % 9 == 0:
+            rules.append(".calibre%d span.calibre%d { font-size: 0.9em }"
+                         % (n, n + 2))
+    rules += ["p { margin: 0 }", "h1, h2, h3 { page-break-before: always }",
+              "a { text-decoration: none }", "#start { margin-top: 2em }",
+              "blockquote p { text-indent: 0 }"]
+    return "\n".join(rules)
+
+
+def calibre_chapter(number, paras=120, classes=400):
+    """A chapter of a Calibre conversion: every element classed, spans
+    within paragraphs, wrappers within wrappers.
+
+    A handful of the sheet's classes per chapter, as in the real thing —
+    the body text is one class, the odd emphasis or centred line another —
+    and different ones from chapter to chapter.
+    """
+    out = ['<div class="calibre%d"><h2 class="calibre%d">Chapter %d</h2>'
+           % (number % classes + 1, (number * 3) % classes + 1, number)]
+    for n in range(paras):
+        cls = (number * 31 + n % 6 * 7) % classes + 1
+        words = " ".join(["word"] * 12)
+        out.append(
+            '<p class="calibre%d">%s <span class="calibre%d">%s</span> '
+            '<em class="calibre%d">%s</em> %s</p>'
+            % (cls, words, (cls + 2) % classes + 1, words,
+               (cls + 5) % classes + 1, words, words))
+        if n % 17 == 0:
+            out.append('<blockquote class="calibre%d"><p>%s</p></blockquote>'
+                       % ((cls + 1) % classes + 1, words))
+    out.append("</div>")
+    return "".join(out)
+
+
+def corpus(directory):
+    """The books a parse benchmark reads, written to ``directory``.
+
+    Three shapes, because they are slow for different reasons: a plain
+    book with a small hand-written sheet, a Calibre conversion (hundreds of
+    classes, every element classed) and a book whose chapters each carry
+    their own ``<style>`` block as well.
+    """
+    plain = build_epub(
+        os.path.join(directory, "plain.epub"),
+        ["<h1>Chapter %d</h1>%s" % (n, paragraphs(80, words=60))
+         for n in range(1, 11)],
+        css="p { text-indent: 1em } h1 { font-size: 1.6em }")
+    calibre = build_epub(
+        os.path.join(directory, "calibre.epub"),
+        [calibre_chapter(n) for n in range(1, 11)], css=calibre_css())
+    inline = build_epub(
+        os.path.join(directory, "inline.epub"),
+        [xhtml(calibre_chapter(n, classes=150),
+               '<link rel="stylesheet" type="text/css" href="style.css"/>'
+               '<style>.calibre%d { font-weight: bold }</style>' % n)
+         for n in range(1, 11)], css=calibre_css(150))
+    return [plain, calibre, inline]
@@ -679,6 +679,7 @@ class FakeController:
         #: other observable, because the picture is mpv's and not a node in
         #: any scene this suite can read.
         self.pictures = []
+        self.preloaded = []
         self.picture_views = []
         self.pictures_cleared = 0
         self.picture_views_reset = 0
@@ -687,6 +688,10 @@ class FakeController:
         self.pictures.append(path)
         return True
 
+    def preload_picture(self, path):
+        self.preloaded.append(path)
+        return True
+
     def clear_picture(self):
         self.pictures_cleared += 1
 
@@ -408,7 +408,13 @@ class FakeMPV:
         self.eof_reached = False
         self.chapter_list = []
         self.track_list = []
+        # Read by show_picture to ask whether a preloaded comic page is
+        # next. Not kept in step with loadfile: empty means "not next",
+        # which is the cold-load path every test here expects.
+        self.playlist = []
         self.demuxer_cache_state = None
+        self.demuxer_via_network = False
+        self.paused_for_cache = False
         self.mpv_version = "mpv 0.40.0"
         self.vf = []
         self.fullscreen = False
@@ -426,6 +432,7 @@ class FakeMPV:
         # on, the browse window turns it off, and the bug worth catching
         # is a picture-view reset putting it back mid-playback.
         self.keepaspect = True
+        self.prefetch_playlist = False
         self.video_zoom = 0.0
         self.video_pan_x = 0.0
         self.video_pan_y = 0.0
@@ -1134,7 +1141,7 @@ def build_player(player_module, video=None):
 
     pm.menu = _FakeMenu(journal=pm.journal)
     pm.syncplay = _FakeSyncplay(journal=pm.journal)
-    pm.update_check = _FakeUpdateCheck()
+    pm._update_check = _FakeUpdateCheck()
     from jellyfin_mpv_shim.osc_bridge import OscBridge
     pm.osc_bridge = OscBridge(pm)
     return pm
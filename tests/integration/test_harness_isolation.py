@@ -101,7 +101,6 @@ class BuildPlayerTracksTheConstructor(unittest.TestCase):
         "_video",         # the test's video, passed in
         "menu",           # _FakeMenu
         "syncplay",       # _FakeSyncplay
-        "update_check",   # _FakeUpdateCheck
         "osc_bridge",     # built against the fake pm
     }
 
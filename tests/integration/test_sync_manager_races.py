@@ -34,7 +34,7 @@ class DeleteAtCommitRaceTest(h.TmpDirTest):
         # but before the row is marked COMPLETE must win — the item ends deleted,
         # never left COMPLETE. We pin the interleaving with a barrier: the fake
         # stream finishes the .part, then blocks until the deleter has run
-        # delete_item (which flags _cancelled because _active_item is set), then
+        # delete_item (which flags _cancelled because "a" is in _active), then
         # returns into the commit check.
         m = make_manager(self.tmp, self.addCleanup)
         add_row(m, "a", size_bytes=100)
@@ -70,7 +70,7 @@ class DeleteAtCommitRaceTest(h.TmpDirTest):
         self.assertIsNone(m.db.get("a"), "delete lost to a COMPLETE row")
         self.assertFalse(os.path.exists(item_dir), "files left after delete")
         self.assertNotIn("a", m._cancelled)
-        self.assertIsNone(m._active_item)
+        self.assertNotIn("a", m._active)
 
 
 class ShortReadStallEscalationTest(h.TmpDirTest):
@@ -116,7 +116,7 @@ class TransientErrorResumeTest(h.TmpDirTest):
         with self.assertRaises(manager_module.requests.RequestException):
             m._download(m.db.get("a"))
         self.assertEqual(m.db.get("a")["status"], STATUS_PENDING)
-        self.assertIsNone(m._active_item)
+        self.assertNotIn("a", m._active)
 
     def test_http_4xx_is_permanent_error(self):
         # Contrast: a 4xx (gone/forbidden) is permanent -> ERROR, not resumed.
@@ -204,12 +204,8 @@ class StopMidDownloadTest(h.TmpDirTest):
             seen_headers.update(kwargs.get("headers") or {})
             return Resp()
 
-        orig = manager_module.requests.get
-        manager_module.requests.get = fake_get
-        try:
-            size, total = m._stream(dest, dest, "a", "a", 100)
-        finally:
-            manager_module.requests.get = orig
+        m._http.get = fake_get
+        size, total = m._stream(dest, dest, "a", "a", 100)
 
         self.assertEqual(seen_headers.get("Range"), "bytes=40-")
         self.assertEqual(size, 100)
@@ -57,7 +57,9 @@ class FakeApi:
         if series_id is not None:
             nxt = self.watching.get(series_id)
             return {"Items": [{"Id": nxt, "Type": "Episode"}] if nxt else []}
-        return {"Items": list(self._next_up)}
+        if index is None:
+            return {"Items": list(self._next_up)}
+        return {"Items": self._next_up[index:index + limit]}
 
     def get_episodes(self, series_id, season_id=None, start_item_id=None,
                      fields=None, limit=None):
@@ -72,7 +74,21 @@ class FakeApi:
             # StartItemId is inclusive.
             items = (items[ids.index(start_item_id):]
                      if start_item_id in ids else [])
-        return {"Items": items[:limit] if limit else list(items)}
+        items = items[:limit] if limit else list(items)
+        if "MediaSources" not in (fields or ""):
+            # Like the server: a list query leaves out what it was not
+            # asked for.
+            items = [{k: v for k, v in i.items() if k != "MediaSources"}
+                     for i in items]
+        return {"Items": items}
+
+    def items(self, params=None):
+        """GET /Items?Ids= -- the bulk lookup the planner sizes with."""
+        params = dict(params or {})
+        self.calls.append(("items", "/Items", params))
+        known = {i["Id"]: i for s in self._series.values() for i in s}
+        ids = [i for i in (params.get("Ids") or "").split(",") if i]
+        return {"Items": [known[i] for i in ids if i in known]}
 
     def get_userdata_for_item(self, item_id):
         return None       # "server reachable but says nothing"
@@ -399,7 +415,7 @@ class FillTest(AutoTest):
         api, auto = self._binge(watching=None)
         auto.fill(10 * GB)
         self.assertEqual(self.mgr.enqueued, [])
-        self.assertEqual([c[0] for c in api.calls], ["get_next"],
+        self.assertNotIn("get_episodes", [c[0] for c in api.calls],
                          "it asked for episodes without an anchor")
 
     def test_followed_series_ignores_other_servers(self):
@@ -421,6 +437,101 @@ class FillTest(AutoTest):
         self.assertEqual([e[1] for e in self.mgr.enqueued], ["e1"])
 
 
+class BatchedPlanTest(AutoTest):
+    """The lookahead for many series in a few requests: one Next Up page
+    anchors all of them, windows come without MediaSources, sizes are looked
+    up for what could be queued, and a series that has not moved costs no
+    request of its own on the next pass."""
+
+    def _library(self, series=8, count=4, watching=2):
+        settings.auto_download_next_up = False
+        settings.auto_download_lookahead = 2
+        episodes = {}
+        next_up = []
+        for n in range(series):
+            sid = "s%d" % n
+            episodes[sid] = [{"Id": "%se%d" % (sid, i), "Type": "Episode",
+                              "SeriesId": sid,
+                              "MediaSources": [{"Size": 1 * GB}]}
+                             for i in range(1, count + 1)]
+            self.db.upsert(row("%se1" % sid, series_id=sid, ep=1))
+            next_up.append(episodes[sid][watching - 1])
+        api = FakeApi(next_up=next_up, series=episodes,
+                      watching={sid: eps[watching - 1]["Id"]
+                                for sid, eps in episodes.items()})
+        return api, self._auto(clients={"srv": FakeClient(api)})
+
+    def _calls(self, api, name):
+        return [c for c in api.calls if c[0] == name]
+
+    def test_one_next_up_read_anchors_every_series(self):
+        api, auto = self._library()
+        auto.fill(100 * GB)
+        anchors = self._calls(api, "get_next")
+        self.assertEqual(len(anchors), 1)
+        self.assertIsNone(anchors[0][2]["SeriesId"])
+        self.assertEqual(len(self.mgr.enqueued), 16)
+
+    def test_windows_leave_media_sources_out(self):
+        api, auto = self._library()
+        auto.fill(100 * GB)
+        for call in self._calls(api, "get_episodes"):
+            self.assertNotIn("MediaSources", call[2]["Fields"] or "")
+
+    def test_sizes_are_fetched_in_bulk_for_the_candidates_only(self):
+        api, auto = self._library(series=3, watching=1)
+        auto.fill(100 * GB)
+        lookups = self._calls(api, "items")
+        self.assertEqual(len(lookups), 1)
+        asked = set(lookups[0][2]["Ids"].split(","))
+        # s*e1 is held; only the episode after it could be queued.
+        self.assertEqual(asked, {"s0e2", "s1e2", "s2e2"})
+        self.assertIn("MediaSources", lookups[0][2]["Fields"])
+
+    def test_the_real_size_is_charged(self):
+        api, auto = self._library(series=6, watching=1)
+        auto.fill(3 * GB)
+        # At the 2 GB unknown-size fallback only 2 would fit; at 1 GB, 3 do.
+        self.assertEqual(len(self.mgr.enqueued), 3)
+
+    def test_an_unchanged_series_costs_nothing_next_pass(self):
+        api, auto = self._library()
+        auto.fill(100 * GB)
+        api.calls.clear()
+        auto.fill(100 * GB)
+        self.assertEqual(self._calls(api, "get_episodes"), [])
+        self.assertEqual(len(self._calls(api, "get_next")), 1)
+
+    def test_a_series_that_moved_is_asked_again(self):
+        api, auto = self._library()
+        auto.fill(100 * GB)
+        api.calls.clear()
+        api._next_up[0] = api._series["s0"][2]
+        auto.fill(100 * GB)
+        asked = [c[1] for c in self._calls(api, "get_episodes")]
+        self.assertEqual(asked, ["/s0/Episodes"])
+
+    def test_a_short_window_is_not_trusted(self):
+        """It ran into the end of what has aired; the next episode may have
+        aired since."""
+        api, auto = self._library(series=1, count=2, watching=2)
+        auto.fill(100 * GB)
+        api.calls.clear()
+        auto.fill(100 * GB)
+        self.assertEqual(len(self._calls(api, "get_episodes")), 1)
+
+    def test_an_unstarted_series_is_still_anchored(self):
+        """Library-wide Next Up leaves out series nobody has started; the
+        per-series question names their first episode."""
+        api, auto = self._library(series=2)
+        api._next_up = api._next_up[:1]
+        auto.fill(100 * GB)
+        per_series = [c[2]["SeriesId"] for c in self._calls(api, "get_next")
+                      if c[2]["SeriesId"]]
+        self.assertEqual(per_series, ["s1"])
+        self.assertIn("s1e3", [e[1] for e in self.mgr.enqueued])
+
+
 class MigrationTest(unittest.TestCase):
     """The catalog predates these columns and has no migration framework."""
 
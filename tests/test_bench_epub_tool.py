@@ -0,0 +1,44 @@
+"""`tools/bench_epub_parse.py` still runs, on its own corpus.
+
+A benchmark is run rarely and by someone chasing a slow book, so the way it
+breaks is quietly: a fixture renamed, an internal it reports on moved, and
+the first person to need the numbers gets a traceback instead. This runs it
+once over the corpus and checks it said something about every book.
+
+The numbers themselves are not asserted; they belong to the machine.
+"""
+
+import contextlib
+import io
+import os
+import unittest
+
+import jellyfin_mpv_shim
+
+PKG = os.path.dirname(os.path.abspath(jellyfin_mpv_shim.__file__))
+TOOLS = os.path.join(os.path.dirname(PKG), "tools")
+
+
+def load_tool():
+    import importlib.util
+    path = os.path.join(TOOLS, "bench_epub_parse.py")
+    spec = importlib.util.spec_from_file_location("bench_epub_parse", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class BenchEpubParseTest(unittest.TestCase):
+    def test_reports_every_book_in_the_corpus(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(load_tool().main(["--repeat", "1"]), 0)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines],
+                         ["plain.epub", "calibre.epub", "inline.epub"])
+        # The Calibre book's sheet was read, or the number means nothing.
+        self.assertGreater(int(lines[1].split("rules")[0].split()[-1]), 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+"""The comic archive's page reads: one positioned read, the same bytes.
+
+The property is that **a page read from its recorded offset is the page
+the archive library would have given**, for every way a page can be stored
+— stored and deflated zip entries, plain tar members — and that anything
+the index cannot vouch for (a compressed tar, a compressor it does not
+have, a file replaced under it) is read the old way rather than wrongly.
+The speed is the absence of a reopen, so that is asserted directly.
+"""
+
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from jellyfin_mpv_shim import comic
+from jellyfin_mpv_shim.comic import ComicArchive, ComicError
+
+
+def page_bytes(n):
+    # Compressible but not uniform, so deflate has work to do and a page
+    # read at the wrong offset cannot come back equal by accident.
+    return (b"page %03d " % n) * (200 + 37 * n) + bytes(range(256)) * n
+
+
+def build_cbz(path, pages=6, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, "w", compression) as archive:
+        for n in range(pages):
+            archive.writestr("p%d.jpg" % (n + 1), page_bytes(n))
+        archive.writestr("ComicInfo.xml", "<ComicInfo/>")
+    return path
+
+
+def build_cbt(path, pages=6, mode="w"):
+    with tarfile.open(path, mode) as archive:
+        for n in range(pages):
+            data = page_bytes(n)
+            info = tarfile.TarInfo("comic/p%d.jpg" % (n + 1))
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return path
+
+
+class ArchiveHarness(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+
+    def path(self, name):
+        return os.path.join(self._tmp.name, name)
+
+    def open(self, path):
+        archive = ComicArchive(path)
+        self.addCleanup(archive.close)
+        return archive
+
+    def read_all(self, archive):
+        return [archive._read(n, name) for n, name in enumerate(archive.pages)]
+
+
+class TestIndexedReads(ArchiveHarness):
+    def test_every_zip_entry_comes_back_as_zipfile_reads_it(self):
+        for compression in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            with self.subTest(compression=compression):
+                path = build_cbz(self.path("c%d.cbz" % compression),
+                                 compression=compression)
+                archive = self.open(path)
+                self.assertNotIn(None, archive._spans)
+                with zipfile.ZipFile(path) as source:
+                    expected = [source.read(n) for n in archive.pages]
+                self.assertEqual(self.read_all(archive), expected)
+
+    def test_every_tar_member_comes_back_as_tarfile_reads_it(self):
+        path = build_cbt(self.path("c.cbt"))
+        archive = self.open(path)
+        self.assertNotIn(None, archive._spans)
+        self.assertEqual(self.read_all(archive),
+                         [page_bytes(n) for n in range(6)])
+
+    def test_a_page_is_read_without_reopening_the_archive(self):
+        for path in (build_cbz(self.path("a.cbz")),
+                     build_cbt(self.path("a.cbt"))):
+            with self.subTest(path=path):
+                archive = self.open(path)
+                with mock.patch.object(comic.zipfile, "ZipFile") as zf, \
+                        mock.patch.object(comic.tarfile, "open") as tf:
+                    self.read_all(archive)
+                zf.assert_not_called()
+                tf.assert_not_called()
+
+    def test_a_damaged_page_says_so(self):
+        path = build_cbz(self.path("d.cbz"), compression=zipfile.ZIP_STORED)
+        archive = self.open(path)
+        offset = archive._spans[2][0]
+        stat = os.stat(path)
+        with open(path, "r+b") as handle:
+            handle.seek(offset + 5)
+            handle.write(b"X")
+        # Same size and time, so the index still vouches for the file.
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        with self.assertRaises(ComicError):
+            archive._read(2, archive.pages[2])
+
+    def test_the_cap_applies_to_an_indexed_read(self):
+        archive = self.open(build_cbz(self.path("big.cbz")))
+        with mock.patch.object(comic, "MAX_PAGE_BYTES", 1000):
+            with self.assertRaises(ComicError):
+                archive._read(5, archive.pages[5])
+
+
+class TestReadByName(ArchiveHarness):
+    def test_a_compressed_tar_is_read_the_old_way(self):
+        archive = self.open(build_cbt(self.path("z.cbt"), mode="w:gz"))
+        self.assertEqual(archive._spans, [None] * 6)
+        self.assertEqual(self.read_all(archive),
+                         [page_bytes(n) for n in range(6)])
+
+    def test_a_compressor_zipfile_has_and_this_does_not(self):
+        path = build_cbz(self.path("bz.cbz"), compression=zipfile.ZIP_BZIP2)
+        archive = self.open(path)
+        self.assertEqual(archive._spans, [None] * 6)
+        self.assertEqual(self.read_all(archive),
+                         [page_bytes(n) for n in range(6)])
+
+    def test_a_file_replaced_after_opening_is_not_read_at_old_offsets(self):
+        path = build_cbz(self.path("r.cbz"))
+        archive = self.open(path)
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as rebuilt:
+            rebuilt.writestr("cover.txt", b"x" * 333)
+            for n in range(6):
+                rebuilt.writestr("p%d.jpg" % (n + 1), page_bytes(n))
+        os.utime(path, (1, 1))
+        self.assertEqual(self.read_all(archive),
+                         [page_bytes(n) for n in range(6)])
+
+
+class TestPagesInMemory(ArchiveHarness):
+    def setUp(self):
+        super().setUp()
+        from jellyfin_mpv_shim.page_server import PageServer
+
+        self.server = PageServer()
+        self.addCleanup(self.server.stop)
+
+    def test_a_page_is_served_and_never_written(self):
+        import urllib.request
+
+        archive = ComicArchive(build_cbz(self.path("m.cbz")),
+                               memory=self.server)
+        self.addCleanup(archive.close)
+        for n in range(6):
+            url, data = archive.page_source(n)
+            self.assertEqual(data, page_bytes(n))
+            with urllib.request.urlopen(url, timeout=5) as response:
+                self.assertEqual(response.read(), page_bytes(n))
+        self.assertIsNone(archive._dir, "a page went to disk")
+
+    def test_a_page_too_big_to_hold_is_a_file(self):
+        archive = ComicArchive(build_cbz(self.path("b.cbz")),
+                               memory=self.server)
+        self.addCleanup(archive.close)
+        with mock.patch("jellyfin_mpv_shim.page_server.MEMORY_PAGE_MAX",
+                        len(page_bytes(2))):
+            small, _held = archive.page_source(2)
+            large, none = archive.page_source(3)
+        self.assertTrue(small.startswith("http://"))
+        self.assertIsNone(none)
+        with open(large, "rb") as handle:
+            self.assertEqual(handle.read(), page_bytes(3))
+
+    def test_closing_drops_the_pages_it_held(self):
+        archive = ComicArchive(build_cbz(self.path("c.cbz")),
+                               memory=self.server)
+        archive.page_source(0)
+        archive.page_source(1)
+        self.assertGreater(self.server.held_bytes, 0)
+        archive.close()
+        self.assertEqual(self.server.held_bytes, 0)
+        with self.assertRaises(ComicError):
+            archive.page_source(2)
+
+
+if __name__ == "__main__":
+    unittest.main()
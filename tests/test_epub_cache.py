@@ -0,0 +1,215 @@
+"""The book cache: what a second open of the same epub skips.
+
+Two properties carry it. **A page laid out from a cached break is the page
+a full pagination made** — checked page by page over a book with the
+awkward cases in it (drop capitals, images, forced breaks), because a page
+that is nearly right is a line skipped or shown twice. And **a cache never
+answers for a file or a layout it was not built from**: a changed file, a
+different type size and a corrupt entry are each a miss, and the book that
+comes back from a miss is the book that comes back without a cache.
+"""
+
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from jellyfin_mpv_shim.epub import cache, content, layout, locations
+from jellyfin_mpv_shim.epub.book import EpubDocument
+
+from tests._epub_fixtures import build_epub, paragraphs, png_bytes
+
+COLUMN = (420, 520)
+
+CSS = ".cap{font-size:3.2em} .brk{page-break-before:always}"
+
+
+def chapters():
+    return [
+        paragraphs(14, words=50),
+        '<p><span class="cap">O</span>nce %s</p>%s<p><img src="p.png"/></p>'
+        '<p class="brk">%s</p>%s' % (" ".join(["upon"] * 80),
+                                     paragraphs(6, words=40),
+                                     " ".join(["after"] * 30),
+                                     paragraphs(9, words=55)),
+        "<h1>Three</h1>" + paragraphs(20, words=35),
+    ]
+
+
+def describe(page):
+    """Everything drawn, as comparable data."""
+    out = [page.number, page.start_offset, page.end_offset, page.cursor]
+    for item in page.items:
+        if isinstance(item, layout.Line):
+            out.append(("line", item.y, item.char_offset, item.text(),
+                        tuple(p.x for p in item.pieces)))
+        else:
+            out.append((type(item).__name__, item.y, item.char_offset))
+    return out
+
+
+class CacheHarness(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = build_epub(os.path.join(self._tmp.name, "book.epub"),
+                               chapters(), css=CSS,
+                               extra={"p.png": png_bytes(300, 200)})
+        self.root = os.path.join(self._tmp.name, "cache")
+
+    def open(self, cache_dir=True, **style):
+        from jellyfin_mpv_shim.epub.layout import ReaderStyle
+
+        doc = EpubDocument(self.path, ReaderStyle(**style),
+                           cache_dir=self.root if cache_dir else None)
+        self.addCleanup(doc.close)
+        doc.set_viewport(*COLUMN)
+        return doc
+
+
+class TestSections(CacheHarness):
+    def test_a_section_survives_the_round_trip(self):
+        doc = self.open(cache_dir=False)
+        for spine in range(doc.spine_count):
+            blocks, chars = doc._section(spine)
+            data = content.section_to_json(blocks, chars)
+            back, back_chars = content.section_from_json(data)
+            self.assertEqual(back_chars, chars)
+            self.assertEqual(content.section_to_json(back, back_chars), data)
+            self.assertEqual([b.text() for b in back],
+                             [b.text() for b in blocks])
+
+    def test_anything_else_is_refused(self):
+        for data in (None, [], {"v": 2}, {"v": 1, "styles": [],
+                                          "blocks": [{"k": "para",
+                                                      "s": [["x", 3, 0]]}],
+                                          "chars": 1}):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    content.section_from_json(data)
+
+
+class TestPaginatePage(CacheHarness):
+    def test_every_page_is_the_page_a_full_pagination_made(self):
+        doc = self.open(cache_dir=False)
+        for style in ({}, {"font_px": 30, "justify": False}):
+            measure = layout.Measurer(layout.ReaderStyle(**style))
+            for spine in range(doc.spine_count):
+                blocks, _chars = doc._section(spine)
+                pages = layout.paginate(blocks, COLUMN[0], COLUMN[1],
+                                        measure, doc._image_size, spine)
+                self.assertGreater(len(pages), 1)
+                for page in pages:
+                    alone = layout.paginate_page(
+                        blocks, COLUMN[0], COLUMN[1], measure,
+                        doc._image_size, spine, page.number, page.cursor)
+                    self.assertEqual(describe(alone), describe(page),
+                                     "spine %d page %d" % (spine,
+                                                           page.number))
+
+
+class TestDocument(CacheHarness):
+    def walk(self, doc):
+        seen = [describe(doc.current_page())]
+        while doc.next_page():
+            seen.append(describe(doc.current_page()))
+        return seen
+
+    def test_a_second_open_reads_nothing_it_already_worked_out(self):
+        first = self.open()
+        first.build_index()
+        expected = self.walk(first)
+        second = self.open()
+        with mock.patch.object(locations, "build") as build, \
+                mock.patch.object(content, "parse_spine_item") as parse, \
+                mock.patch.object(layout, "paginate") as paginate:
+            index = second.build_index()
+            pages = self.walk(second)
+        build.assert_not_called()
+        parse.assert_not_called()
+        paginate.assert_not_called()
+        self.assertEqual(pages, expected)
+        self.assertEqual(index.to_json(), first.index().to_json())
+
+    def test_resuming_lays_out_only_the_page_it_lands_on(self):
+        first = self.open()
+        first.build_index()
+        self.walk(first)
+        second = self.open()
+        second.build_index()
+        with mock.patch.object(layout, "paginate_page",
+                               wraps=layout.paginate_page) as one:
+            second.goto_fraction(0.5)
+            second.current_page()
+        self.assertEqual(one.call_count, 1)
+
+    def test_another_layout_is_a_miss(self):
+        self.walk(self.open())
+        with mock.patch.object(layout, "paginate",
+                               wraps=layout.paginate) as paginate:
+            self.open(font_px=30).current_page()
+        paginate.assert_called_once()
+
+    def test_a_changed_file_is_another_book(self):
+        self.open().build_index()
+        later = time.time() + 10
+        os.utime(self.path, (later, later))
+        with mock.patch.object(locations, "build",
+                               wraps=locations.build) as build:
+            self.open().build_index()
+        build.assert_called_once()
+        self.assertEqual(len(os.listdir(self.root)), 2)
+
+    def test_a_corrupt_entry_is_rebuilt(self):
+        doc = self.open()
+        doc.build_index()
+        self.walk(doc)
+        (entry,) = os.listdir(self.root)
+        for name in os.listdir(os.path.join(self.root, entry)):
+            with open(os.path.join(self.root, entry, name), "wb") as out:
+                out.write(b'{"v": 1, "trunc')
+        again = self.open()
+        self.assertEqual(again.build_index().to_json(),
+                         doc.index().to_json())
+        self.assertEqual(self.walk(again), self.walk(self.open(False)))
+
+    def test_a_stale_break_falls_back_to_a_full_pagination(self):
+        doc = self.open()
+        self.walk(doc)
+        disk = doc._disk
+        key = doc._disk_layout_key()
+        breaks = disk.load_breaks(key, 0)
+        # A break pointing somewhere else than its offset says.
+        start, end, _cursor = breaks[3]
+        breaks[3] = (start, end, (0, 0))
+        disk.store_breaks(key, 0, breaks)
+        again = self.open()
+        again.goto_page(3)
+        fresh = self.open(cache_dir=False)
+        fresh.goto_page(3)
+        self.assertEqual(describe(again.current_page()),
+                         describe(fresh.current_page()))
+
+    def test_no_cache_directory_is_no_cache(self):
+        doc = EpubDocument(self.path, cache_dir=os.path.join(
+            self.path, "not-a-directory"))
+        self.addCleanup(doc.close)
+        doc.set_viewport(*COLUMN)
+        self.assertIsNone(doc._disk.dir)
+        self.assertTrue(doc.build_index().count)
+        self.assertTrue(doc.current_page().items)
+
+
+class TestPrune(unittest.TestCase):
+    def test_the_least_recently_opened_books_go(self):
+        with tempfile.TemporaryDirectory() as root:
+            for n in range(5):
+                os.makedirs(os.path.join(root, "b%d" % n))
+                os.utime(os.path.join(root, "b%d" % n), (n, n))
+            cache.prune(root, keep=3)
+            self.assertEqual(sorted(os.listdir(root)), ["b2", "b3", "b4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -18,11 +18,13 @@ import os
 import tempfile
 import unittest
 import zipfile
+from unittest import mock
 
 from jellyfin_mpv_shim.epub import content, css, xmlish
 from jellyfin_mpv_shim.epub.archive import (EpubError, TooLarge, open_epub)
 
-from tests._epub_fixtures import build_epub, paragraphs, png_bytes, xhtml
+from tests._epub_fixtures import (build_epub, calibre_css, corpus,
+                                  paragraphs, png_bytes, xhtml)
 
 BOMB = """<?xml version="1.0"?>
 <!DOCTYPE lolz [
@@ -595,5 +597,89 @@ class TestNovelTypography(unittest.TestCase):
         self.assertIn("one\ntwo", blocks[0].text())
 
 
+def every_rule_against(sheet, node):
+    """What :meth:`css.Stylesheet.match` answered before it had an index or
+    a memory: every rule tried, in cascade order."""
+    rules = [rule for bucket in (sheet._by_id, sheet._by_class,
+                                 sheet._by_tag)
+             for group in bucket.values() for rule in group]
+    rules += sheet._universal
+    out = {}
+    for rule in sorted(rules, key=lambda r: (r.spec, r.order)):
+        if rule.matches(node):
+            out.update(rule.decls)
+    return out
+
+
+class TestRememberedMatches(unittest.TestCase):
+    """Matching remembers what applies to an element; it must remember
+    only what the element alone decides."""
+
+    def test_every_element_gets_what_trying_every_rule_gives(self):
+        sheet = css.Stylesheet()
+        sheet.add(calibre_css() + " #n7 { font-style: italic }")
+        markup = "".join(
+            '<div class="calibre%d"><p class="calibre%d" id="n%d">x '
+            '<span class="calibre%d">y</span></p></div>'
+            % (n % 12 + 1, n % 12 + 2, n, n % 12 + 3) for n in range(60))
+        root = xmlish.parse(xhtml(markup))
+        nodes = root.find("body").find_all("p")
+        nodes += root.find("body").find_all("span")
+        self.assertGreater(len(nodes), 100)
+        for _pass in range(2):               # the second from the memory
+            for node in nodes:
+                self.assertEqual(sheet.matched(node)[0],
+                                 every_rule_against(sheet, node))
+        self.assertLess(len(sheet._memo), 40)
+
+    def test_a_rule_about_ancestors_is_never_remembered_as_settled(self):
+        sheet = css.Stylesheet()
+        sheet.add("blockquote p { font-style: italic } p { margin: 0 }")
+        root = xmlish.parse(xhtml(
+            "<p>out</p><blockquote><p>in</p></blockquote>"))
+        outside, inside = root.find("body").find_all("p")
+        self.assertNotIn("font-style", sheet.matched(outside)[0])
+        self.assertEqual(sheet.matched(inside)[0].get("font-style"),
+                         "italic")
+        self.assertIsNone(sheet.matched(inside)[1])
+
+    def test_an_id_no_rule_names_is_not_part_of_the_element(self):
+        sheet = css.Stylesheet()
+        sheet.add("a.noteref { vertical-align: super }")
+        root = xmlish.parse(xhtml("".join(
+            '<p><a class="noteref" id="r%d">%d</a></p>' % (n, n)
+            for n in range(50))))
+        keys = {sheet.matched(a)[1] for a in root.find_all("a")}
+        self.assertEqual(len(keys), 1)
+
+    def test_a_book_parses_as_it_did_without_the_memory(self):
+        with tempfile.TemporaryDirectory() as scratch:
+            for path in corpus(scratch):
+                package = open_epub(path)
+                remembered = [content.section_to_json(
+                    *content.parse_spine_item(package, n, {}))
+                    for n in range(len(package.spine))]
+                with mock.patch.object(
+                        css.Stylesheet, "matched",
+                        lambda sheet, node: (every_rule_against(sheet, node),
+                                             None)):
+                    tried = [content.section_to_json(
+                        *content.parse_spine_item(package, n, {}))
+                        for n in range(len(package.spine))]
+                self.assertEqual(remembered, tried, os.path.basename(path))
+
+    def test_chapters_share_one_parse_of_the_linked_sheet(self):
+        with tempfile.TemporaryDirectory() as scratch:
+            path = corpus(scratch)[1]
+            package = open_epub(path)
+            cache = {}
+            with mock.patch.object(css, "parse", wraps=css.parse) as parse:
+                for n in range(len(package.spine)):
+                    content.parse_spine_item(package, n, cache)
+            parse.assert_called_once()
+            sheets = [v for k, v in cache.items() if isinstance(k, tuple)]
+            self.assertEqual(len(sheets), 1)
+
+
 if __name__ == "__main__":
     unittest.main()
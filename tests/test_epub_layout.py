@@ -15,8 +15,10 @@ showed up.
 """
 
 import os
+import random
 import tempfile
 import unittest
+from unittest import mock
 
 from jellyfin_mpv_shim.epub import content, layout
 from jellyfin_mpv_shim.epub.book import EpubDocument
@@ -466,6 +468,140 @@ class TestPagination(unittest.TestCase):
         self.assertEqual(len(pages), 2)
 
 
+def optimal_measurer(**kw):
+    return layout.Measurer(layout.ReaderStyle(optimal_breaks=True, **kw))
+
+
+class _OptimalBreaks:
+    """Runs a test class again with the optimal breaker: everything the
+    greedy one promises about a page, this one has to promise too."""
+
+    def setUp(self):
+        super().setUp()
+        patch = mock.patch("%s.measurer" % __name__, optimal_measurer)
+        patch.start()
+        self.addCleanup(patch.stop)
+        layout._paragraphs.clear()
+        self.addCleanup(layout._paragraphs.clear)
+
+
+class TestLineBreakingOptimally(_OptimalBreaks, TestLineBreaking):
+    pass
+
+
+class TestNovelTypographyOptimally(_OptimalBreaks,
+                                   TestNovelTypographyOnThePage):
+    pass
+
+
+class TestPaginationOptimally(_OptimalBreaks, TestPagination):
+    pass
+
+
+class FixedMeasurer(layout.Measurer):
+    """Ten pixels a character, so the breaks are the same on every machine
+    whatever its fonts."""
+
+    def width(self, text, span_style):
+        return 10.0 * len(text) * span_style.scale
+
+
+def prose(seed, paragraphs=40, words=70):
+    rng = random.Random(seed)
+    vocabulary = ("a an the of it is was by to in at on for as and but "
+                  "quick brown fox lazy dog river garden window evening "
+                  "remarkable unexpectedly considerable circumstances "
+                  "well-intentioned notwithstanding").split()
+    return "".join("<p>%s</p>" % " ".join(rng.choice(vocabulary)
+                                          for _w in range(words))
+                   for _p in range(paragraphs))
+
+
+class TestOptimalBreaks(unittest.TestCase):
+    WIDTH = 420
+
+    def setUp(self):
+        layout._paragraphs.clear()
+        self.addCleanup(layout._paragraphs.clear)
+
+    def wrap(self, blocks, optimal, **style):
+        measure = FixedMeasurer(layout.ReaderStyle(optimal_breaks=optimal,
+                                                   **style))
+        return [layout._wrap(block, self.WIDTH, measure, 0)
+                for block in blocks]
+
+    @staticmethod
+    def looseness(paragraphs):
+        """Every justified line's widest gap, in spaces."""
+        out = []
+        for lines in paragraphs:
+            for line in lines[:-1]:
+                gaps = [b.x - (a.x + 10 * len(a.text))
+                        for a, b in zip(line.pieces, line.pieces[1:])]
+                if gaps:
+                    out.append(max(gaps) / 10.0)
+        return out
+
+    def test_the_same_words_in_the_same_order(self):
+        blocks = blocks_of(prose(1) + "<p>one<br/><br/>two three</p>"
+                           + "<p>%s</p>" % ("日本語の本。" * 40))
+        for greedy, optimal in zip(self.wrap(blocks, False),
+                                   self.wrap(blocks, True)):
+            self.assertEqual("".join(ln.text() for ln in optimal),
+                             "".join(ln.text() for ln in greedy))
+
+    def test_the_spacing_is_more_even_than_one_line_at_a_time(self):
+        blocks = blocks_of(prose(2))
+        greedy = self.looseness(self.wrap(blocks, False))
+        optimal = self.looseness(self.wrap(blocks, True))
+        self.assertLess(sum((g - 1) ** 3 for g in optimal),
+                        0.8 * sum((g - 1) ** 3 for g in greedy))
+        self.assertLess(sum(g > 3 for g in optimal),
+                        sum(g > 3 for g in greedy))
+
+    def test_no_line_is_wider_than_the_measure(self):
+        blocks = blocks_of(prose(3) + "<p>%s</p>" % ("x" * 80))
+        for lines in self.wrap(blocks, True):
+            for line in lines[:-1]:
+                last = line.pieces[-1]
+                self.assertLessEqual(last.x + 10 * len(last.text),
+                                     self.WIDTH)
+
+    def test_a_paragraph_is_broken_once_per_layout(self):
+        blocks = blocks_of(prose(4, paragraphs=6))
+        with mock.patch.object(layout, "_optimal_breaks",
+                               wraps=layout._optimal_breaks) as breaker:
+            self.wrap(blocks, True)
+            self.assertEqual(breaker.call_count, 6)
+            # A new measurer, as a style change makes, and a setting that
+            # moves no widths: nothing to re-break.
+            self.wrap(blocks, True, justify=False)
+            self.assertEqual(breaker.call_count, 6)
+            self.wrap(blocks, True, font_px=30)
+            self.assertEqual(breaker.call_count, 12)
+
+    def test_a_page_laid_out_on_its_own_breaks_nothing_again(self):
+        blocks = blocks_of(prose(5, paragraphs=12))
+        measure = FixedMeasurer(layout.ReaderStyle(optimal_breaks=True))
+        pages = layout.paginate(blocks, self.WIDTH, 700, measure)
+        with mock.patch.object(layout, "_optimal_breaks",
+                               wraps=layout._optimal_breaks) as breaker:
+            again = layout.paginate_page(blocks, self.WIDTH, 700, measure,
+                                         number=3, cursor=pages[3].cursor)
+        breaker.assert_not_called()
+        self.assertEqual([ln.text() for ln in again.items],
+                         [ln.text() for ln in pages[3].items])
+
+    def test_the_cache_is_bounded(self):
+        with mock.patch.object(layout, "PARAGRAPH_CACHE", 3):
+            self.wrap(blocks_of(prose(6, paragraphs=8)), True)
+        self.assertEqual(len(layout._paragraphs), 3)
+
+    def test_it_is_part_of_the_layout(self):
+        self.assertNotEqual(layout.ReaderStyle().key(),
+                            layout.ReaderStyle(optimal_breaks=True).key())
+
+
 class TestDocumentPosition(unittest.TestCase):
     """The offset-is-the-state property, against a real book."""
 
@@ -482,6 +618,68 @@ class TestDocumentPosition(unittest.TestCase):
         self.doc.set_viewport(*COLUMN)
         self.doc.build_index()
 
+    def test_a_resume_without_the_index_is_corrected_when_it_lands(self):
+        index = self.doc.index()
+        for fraction in (0.1, 0.45, 0.8, 1.0):
+            with self.subTest(fraction=fraction):
+                self.doc.set_index(None)
+                self.doc.goto_fraction(fraction)
+                estimate = self.doc.spine_index
+                exact = index.position_of(fraction)
+                # Equal chapters: a size estimate lands in the right one.
+                self.assertEqual(estimate, exact[0])
+                self.doc.set_index(index)
+                self.assertEqual((self.doc.spine_index,
+                                  self.doc.char_offset), exact)
+
+    def test_a_reader_who_moved_is_left_where_they_went(self):
+        index = self.doc.index()
+        self.doc.set_index(None)
+        self.doc.goto_fraction(0.45)
+        self.doc.next_page()
+        where = (self.doc.spine_index, self.doc.char_offset)
+        self.assertFalse(self.doc.set_index(index))
+        self.assertEqual((self.doc.spine_index, self.doc.char_offset), where)
+
+    def test_the_estimate_is_in_order_through_the_book(self):
+        self.doc.set_index(None)
+        positions = [self.doc.estimate_position(f / 20.0)
+                     for f in range(21)]
+        self.assertEqual(positions, sorted(positions))
+        self.assertEqual(positions[0], (0, 0))
+        self.assertEqual(positions[-1][0], self.doc.spine_count - 1)
+
+    def test_the_neighbours_are_the_pages_a_turn_reaches(self):
+        for spine, number in ((0, 0), (0, 3), (1, 0), (3, 0)):
+            with self.subTest(at=(spine, number)):
+                self.doc.goto(spine, self.doc.pages(spine)[number]
+                              .start_offset)
+                expected = []
+                for turn in (self.doc.next_page, self.doc.prev_page):
+                    if turn():
+                        expected.append((self.doc.spine_index,
+                                         self.doc.page_number))
+                        self.doc.goto(spine, self.doc.pages(spine)[number]
+                                      .start_offset)
+                self.assertEqual(self.doc.neighbours()[:len(expected)],
+                                 expected)
+                if spine + 1 < self.doc.spine_count:
+                    self.assertIn((spine + 1, 0), self.doc.neighbours())
+
+    def test_drawing_another_page_leaves_the_reader_where_they_are(self):
+        from jellyfin_mpv_shim.epub import paint
+
+        self.doc.goto(1, 0)
+        where = (self.doc.spine_index, self.doc.page_number)
+        colors = paint.palette("light")
+        key, image = self.doc.render_at(2, 1, (300, 400), colors)
+        self.assertEqual((self.doc.spine_index, self.doc.page_number), where)
+        self.assertEqual(key, self.doc.key_at(2, 1))
+        self.doc.goto(2, self.doc.pages(2)[1].start_offset)
+        same_key, same = self.doc.render_keyed((300, 400), colors)
+        self.assertEqual(same_key, key)
+        self.assertEqual(same.tobytes(), image.tobytes())
+
     def test_paging_forward_reaches_the_end_and_stops(self):
         seen = set()
         turns = 0
@@ -0,0 +1,227 @@
+"""The whole book laid out at once: the same pages, and "page 4 of 312".
+
+The property is that **a section laid out in a worker is the section the
+reader would have laid out itself** — the same breaks, checked against
+``layout.paginate`` for every section of a book with images, drop capitals
+and forced breaks in it — so a book-wide page number is the count of pages
+the reader will actually turn. Then that the count is only ever trusted at
+the layout it was made at, and that a job whose layout moves stops.
+
+Most of these hand the job a thread pool, because what is under test is the
+document's side of it; one counts a book on real worker processes, which is
+the only way to find out that what crosses to them pickles.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from jellyfin_mpv_shim.epub import layout, pagination
+from jellyfin_mpv_shim.epub.book import EpubDocument
+
+from tests._epub_fixtures import build_epub, paragraphs, png_bytes
+
+COLUMN = (420, 520)
+
+CSS = ".cap{font-size:3.2em} .brk{page-break-before:always}"
+
+
+def chapters():
+    return [
+        "<h1>One</h1>" + paragraphs(12, words=50),
+        '<p><span class="cap">O</span>nce %s</p><p><img src="p.png"/></p>'
+        '<p class="brk">%s</p>%s' % (" ".join(["upon"] * 80),
+                                     " ".join(["after"] * 30),
+                                     paragraphs(9, words=55)),
+        "<p>A page of its own.</p>",
+        "<h1>Four</h1>" + paragraphs(20, words=35),
+    ]
+
+
+class PaginationHarness(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = build_epub(os.path.join(self._tmp.name, "book.epub"),
+                               chapters(), css=CSS,
+                               toc=[("One", "ch1.xhtml"),
+                                    ("Four", "ch4.xhtml")],
+                               extra={"p.png": png_bytes(300, 200)})
+        self.root = os.path.join(self._tmp.name, "cache")
+
+    def open(self, cache_dir=True, **style):
+        doc = EpubDocument(self.path, layout.ReaderStyle(**style),
+                           cache_dir=self.root if cache_dir else None)
+        self.addCleanup(doc.close)
+        doc.set_viewport(*COLUMN)
+        return doc
+
+    def threads(self):
+        executor = ThreadPoolExecutor(2)
+        self.addCleanup(executor.shutdown)
+        return executor
+
+    def serial_breaks(self, doc):
+        """Every section's breaks, laid out here one after another."""
+        out = []
+        for spine in range(doc.spine_count):
+            blocks, _chars = doc._section(spine)
+            pages = layout.paginate(blocks, COLUMN[0], COLUMN[1],
+                                    doc.measurer, doc._image_size, spine)
+            out.append([(p.start_offset, p.end_offset, p.cursor)
+                        for p in pages])
+        return out
+
+
+class TestWholeBook(PaginationHarness):
+    def test_every_section_is_laid_out_as_the_reader_would(self):
+        for style in ({}, {"font_px": 30, "justify": False},
+                      {"optimal_breaks": True}):
+            with self.subTest(style=style):
+                doc = self.open(cache_dir=False, **style)
+                counted = []
+                self.assertTrue(doc.paginate_book(
+                    lambda spine, count: counted.append(spine),
+                    executor=self.threads()))
+                expected = self.serial_breaks(self.open(False, **style))
+                self.assertEqual([doc._known_breaks(s)
+                                  for s in range(doc.spine_count)], expected)
+                # The section on screen was already laid out.
+                self.assertEqual(sorted(counted), [1, 2, 3])
+
+    def test_on_worker_processes_too(self):
+        doc = self.open()
+        self.addCleanup(pagination.shutdown)
+        self.assertTrue(doc.paginate_book())
+        self.assertEqual(doc.page_counts(),
+                         [len(b) for b in self.serial_breaks(doc)])
+
+    def test_the_book_page_is_the_pages_turned_to_get_there(self):
+        doc = self.open(cache_dir=False)
+        self.assertIsNone(doc.book_page())
+        doc.paginate_book(executor=self.threads())
+        page, total = doc.book_page()
+        seen = [page]
+        while doc.next_page():
+            seen.append(doc.book_page()[0])
+        self.assertEqual(seen, list(range(total)))
+
+    def test_going_to_a_book_page_lands_on_it(self):
+        doc = self.open(cache_dir=False)
+        self.assertFalse(doc.goto_book_page(3))
+        doc.paginate_book(executor=self.threads())
+        starts = doc.section_starts()
+        total = doc.book_page()[1]
+        for number in sorted({0, 1, total - 1} | set(starts)):
+            doc.goto_book_page(number)
+            self.assertEqual(doc.book_page(), (number, total))
+        doc.goto_book_page(starts[3])
+        self.assertEqual((doc.spine_index, doc.page_number), (3, 0))
+
+    def test_a_later_chapter_is_not_laid_out_again(self):
+        doc = self.open(cache_dir=False)
+        doc.paginate_book(executor=self.threads())
+        with mock.patch.object(layout, "paginate") as paginate:
+            doc.goto(3)
+            doc.current_page()
+        paginate.assert_not_called()
+
+
+class TestRemembered(PaginationHarness):
+    def test_a_second_open_starts_no_work(self):
+        self.open().paginate_book(executor=self.threads())
+        again = self.open()
+        idle = mock.Mock()
+        self.assertTrue(again.paginate_book(executor=idle))
+        idle.submit.assert_not_called()
+        self.assertIsNotNone(again.book_page())
+
+    def test_another_layout_counts_again(self):
+        first = self.open()
+        first.paginate_book(executor=self.threads())
+        bigger = self.open(font_px=30)
+        self.assertIsNone(bigger.book_page())
+        self.assertTrue(bigger.paginate_book(executor=self.threads()))
+        self.assertGreater(bigger.book_page()[1], first.book_page()[1])
+
+    def test_breaks_from_other_faces_are_not_trusted(self):
+        real = pagination.paginate_section
+
+        def elsewhere(*args):
+            spine, breaks, _fingerprint = real(*args)
+            return spine, [(0, 0, (0, 0))] * len(breaks), ("other",)
+
+        doc = self.open()
+        with mock.patch.object(pagination, "paginate_section", elsewhere):
+            self.assertTrue(doc.paginate_book(executor=self.threads()))
+        self.assertEqual([doc._known_breaks(s)
+                          for s in range(doc.spine_count)],
+                         self.serial_breaks(self.open(False)))
+
+
+class TestStopping(PaginationHarness):
+    def test_a_resize_stops_the_job(self):
+        doc = self.open()
+
+        def resize(_spine, _count):
+            doc.set_viewport(COLUMN[0] + 60, COLUMN[1])
+
+        self.assertFalse(doc.paginate_book(resize, executor=self.threads()))
+        self.assertIsNone(doc.book_page())
+        # What it counted before the resize is kept, under its own layout.
+        doc.set_viewport(*COLUMN)
+        counted = []
+        self.assertTrue(doc.paginate_book(
+            lambda spine, _count: counted.append(spine),
+            executor=self.threads()))
+        self.assertLess(len(counted), 3)
+
+    def test_a_reader_who_left_stops_it(self):
+        doc = self.open()
+        self.assertFalse(doc.paginate_book(wanted=lambda: False,
+                                           executor=self.threads()))
+        self.assertIsNone(doc.book_page())
+
+    def test_it_stops_while_every_worker_is_busy(self):
+        """Noticed without a section landing, and what it queued is
+        dropped: the pool is shared with the next book."""
+        doc = self.open()
+        executor = ThreadPoolExecutor(1)
+        self.addCleanup(executor.shutdown)
+        busy = threading.Event()
+        executor.submit(busy.wait)
+        # Only so a job that does not stop fails rather than hangs.
+        release = threading.Timer(5, busy.set)
+        release.start()
+        self.addCleanup(release.cancel)
+        with mock.patch.object(pagination, "paginate_section",
+                               wraps=pagination.paginate_section) as section:
+            started = time.monotonic()
+            self.assertFalse(doc.paginate_book(wanted=lambda: False,
+                                               executor=executor))
+            self.assertLess(time.monotonic() - started, 2)
+            busy.set()
+            executor.shutdown(wait=True)
+        self.assertEqual(section.call_count, 0)
+
+
+class TestPool(unittest.TestCase):
+    def tearDown(self):
+        pagination.shutdown()
+
+    def test_one_pool_serves_every_book(self):
+        self.assertIs(pagination.pool(), pagination.pool())
+
+    def test_a_broken_pool_is_replaced(self):
+        broken = pagination.pool()
+        pagination.discard(broken)
+        self.assertIsNot(pagination.pool(), broken)
+        broken.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
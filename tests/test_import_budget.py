@@ -0,0 +1,149 @@
+"""What a launch imports before its first window, and the budget on it.
+
+``tools/importtime.py`` runs the imports ``mpv_shim.main`` makes, in its
+order, in a fresh interpreter. Two things are held here:
+
+* **The lazy subsystems stay lazy.** The reader, the comic viewer, the live
+  TV guide, the update checker and the tray are loaded by the first thing
+  that uses them, and none of that happens before the home screen draws
+  (``docs/architecture.md`` §9). One top-level import in the wrong place
+  brings a whole subsystem back into every launch, and nothing else would
+  notice.
+* **Each step has a budget of shim modules, and it may only go down.** A
+  count rather than milliseconds: the milliseconds belong to the machine
+  (the tool reports them), the modules a step loads belong to the code. A
+  step that grows past its budget has taken on something new to load
+  before the window — make that lazy, or raise the number in the same
+  change and say why.
+
+A step that fails to import here (the player and what needs it, without
+libmpv) is not held to a budget: what it loaded before failing is not what
+it loads.
+"""
+
+import importlib.util
+import os
+import unittest
+
+import jellyfin_mpv_shim
+
+PKG = os.path.dirname(os.path.abspath(jellyfin_mpv_shim.__file__))
+TOOLS = os.path.join(os.path.dirname(PKG), "tools")
+
+#: Shim modules each startup step may newly load. A step with no entry is
+#: measured but not held to anything — the player's four need libmpv to be
+#: measured at all.
+BUDGET = {
+    "jellyfin_mpv_shim.mpv_shim": 10,
+    "jellyfin_mpv_shim.trickplay": 2,
+    "jellyfin_mpv_shim.win_fribidi": 1,
+    "jellyfin_mpv_shim.exit_watchdog": 1,
+    "jellyfin_mpv_shim.single_instance": 1,
+    "jellyfin_mpv_shim.mpvtk.rawimage": 8,
+    "PIL": 0,
+    "jellyfin_mpv_shim.mpvtk_browser.ui": 21,
+    "jellyfin_mpv_shim.clients": 0,
+    "jellyfin_mpv_shim.sync.manager": 5,
+    "jellyfin_mpv_shim.sync.offline_media": 1,
+    "jellyfin_mpv_shim.media": 0,
+    # 66 -> 49: the page registry imports a page when its kind is routed.
+    "jellyfin_mpv_shim.mpvtk_browser.app": 49,
+}
+
+#: Loaded by the first thing that uses them, never by a launch.
+LAZY = (
+    "jellyfin_mpv_shim.epub",
+    "jellyfin_mpv_shim.comic",
+    "jellyfin_mpv_shim.page_server",
+    "jellyfin_mpv_shim.update_check",
+    "jellyfin_mpv_shim.tray",
+    "jellyfin_mpv_shim.mpvtk_browser.guide_view",
+    "jellyfin_mpv_shim.mpvtk_browser.pages.reader",
+    "jellyfin_mpv_shim.mpvtk_browser.pages.comic",
+    "jellyfin_mpv_shim.mpvtk_browser.pages.livetv",
+)
+
+SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      1500 |       1620 | zipimport
+import time:        40 |         40 |       deep.leaf
+import time:       300 |        340 |     deep.mid
+import time:       900 |       1240 |   deep
+WARNING: not an import line
+import time:        10 |       1250 | top
+"""
+
+
+def load_tool():
+    path = os.path.join(TOOLS, "importtime.py")
+    spec = importlib.util.spec_from_file_location("importtime", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestParsing(unittest.TestCase):
+    def setUp(self):
+        self.tool = load_tool()
+
+    def test_a_line_is_its_times_its_depth_and_its_name(self):
+        records = self.tool.parse(SAMPLE)
+        self.assertEqual(
+            [(r.self_us, r.cumulative_us, r.depth, r.name) for r in records],
+            [(120, 120, 1, "_io"), (1500, 1620, 0, "zipimport"),
+             (40, 40, 3, "deep.leaf"), (300, 340, 2, "deep.mid"),
+             (900, 1240, 1, "deep"), (10, 1250, 0, "top")])
+
+    def test_top_level_is_what_the_program_imported(self):
+        self.assertEqual(
+            [r.name for r in self.tool.top_level(self.tool.parse(SAMPLE))],
+            ["zipimport", "top"])
+
+    def test_steps_are_cut_at_the_marks(self):
+        mark = self.tool.MARK
+        steps = self.tool.split_steps(
+            "import time:         5 |          5 | a\n%s a\n"
+            "import time:         7 |          9 | b\n%s b\n"
+            "%s c\n" % (mark, mark, mark))
+        self.assertEqual({name: [r.name for r in records]
+                          for name, records in steps.items()},
+                         {"a": ["a"], "b": ["b"], "c": []})
+
+
+class TestStartup(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tool = load_tool()
+        cls.steps = cls.tool.run_startup()
+
+    def test_every_step_was_run(self):
+        self.assertEqual([s.name for s in self.steps], list(self.tool.STARTUP))
+        self.assertLessEqual(set(BUDGET), set(self.tool.STARTUP))
+
+    def test_the_lazy_subsystems_are_not_loaded(self):
+        loaded = {m for step in self.steps for m in step.new}
+        self.assertEqual(
+            sorted(m for m in LAZY if m in loaded), [],
+            "Imported before the first window; import these where they are "
+            "first used instead (docs/architecture.md §9).")
+
+    def test_each_step_is_within_its_budget(self):
+        for step in self.steps:
+            if step.name not in BUDGET:
+                continue
+            with self.subTest(step.name):
+                if step.error:
+                    self.skipTest("%s did not import: %s"
+                                  % (step.name, step.error))
+                new = self.tool.shim_modules(step.new)
+                self.assertLessEqual(
+                    len(new), BUDGET[step.name],
+                    "%s now loads %d shim modules, over its budget of %d. "
+                    "Make what it gained lazy, or raise the budget and say "
+                    "why:\n  %s" % (step.name, len(new), BUDGET[step.name],
+                                    "\n  ".join(new)))
+
+
+if __name__ == "__main__":
+    unittest.main()
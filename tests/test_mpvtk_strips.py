@@ -216,6 +216,21 @@ class TestStripStore(unittest.TestCase):
         self.assertTrue(os.path.exists(entry["src"]),
                         "freed the bitmap the cast screen is drawing")
 
+    def test_an_entry_made_ahead_is_only_held_until_it_ages_out(self):
+        """The reader draws the next page before it is turned to and does
+        not touch it meanwhile. By the turn it may have been freed, and a
+        freed entry's src is an address the next bitmap can be given."""
+        s = self._store()
+        s.MAX_BYTES = 1
+        ahead = s.bitmap("next-page", _poster(size=(400, 300)))
+        self.assertTrue(s.holds(ahead))
+        for n in range(4):
+            self._row(s, "other%d" % n)
+            s.on_scene_pushed()
+        self.assertFalse(s.holds(ahead))
+        self.assertFalse(s.holds(dict(ahead)),
+                         "a copy is not the entry, whatever its src")
+
     def test_the_same_key_arriving_twice_frees_one_and_counts_one(self):
         """Both insert paths drop the lock across the composite, and the
         same key really does arrive by two routes (a grid composites through
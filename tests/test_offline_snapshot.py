@@ -0,0 +1,150 @@
+"""The offline snapshot is indexed once, and a grid page is a slice of it.
+
+Each answer here is checked against the derivation it replaced -- filter the
+catalog, then sort by name -- so the indexes cannot drift from what the
+screens showed before they existed.
+"""
+
+import sys
+import unittest
+from unittest import mock
+
+sys.argv = [sys.argv[0]]
+
+from jellyfin_mpv_shim.mpvtk_browser import repository  # noqa: E402
+from jellyfin_mpv_shim.mpvtk_browser.repository import (  # noqa: E402
+    OfflineLibrarySource, _OfflineSnapshot)
+
+_NAMES = ["zulu", "Alpha", "bravo", "2 Fast", "alpha two", "Écho", "!bang",
+          "Charlie", "delta", "Bravo Two", "#Alive", None]
+
+
+def _items():
+    out = []
+    for i, name in enumerate(_NAMES * 3):
+        out.append({"Id": "m%d" % i, "Name": name, "Type": "Movie",
+                    "ProductionYear": 2000 + i % 3,
+                    "Genres": ["Drama"] if i % 2 else ["Comedy"],
+                    "UserData": {"Played": i % 3 == 0,
+                                 "IsFavorite": i % 4 == 0}})
+    for i in range(12):
+        out.append({"Id": "e%d" % i, "Name": "Ep %d" % i, "Type": "Episode",
+                    "SeriesId": "s%d" % (i % 2),
+                    "SeriesName": "Show %d" % (i % 2),
+                    "SeasonId": "se%d" % (i % 4) if i < 8 else None,
+                    "ParentIndexNumber": i % 4, "IndexNumber": 12 - i,
+                    "UserData": {"Played": i < 3}})
+    return out
+
+
+def _source(items):
+    src = OfflineLibrarySource.__new__(OfflineLibrarySource)
+    src.catalog_path = None
+    src.root = None
+    src._snap = _OfflineSnapshot(items=items)
+    return src
+
+
+def _naive(items, filters):
+    items = OfflineLibrarySource._apply_filters(items, filters)
+    return sorted(items, key=lambda i: (i.get("Name") or "").lower())
+
+
+class ListingTest(unittest.TestCase):
+    def setUp(self):
+        self.items = _items()
+        self.src = _source(self.items)
+        self.movies = [i for i in self.items if i["Type"] == "Movie"]
+
+    def test_every_filter_matches_the_old_derivation(self):
+        letters = [None, "#", "A", "B", "E", "É", "Z", "Q"]
+        for letter in letters:
+            for unplayed in (False, True):
+                for favorite in (False, True):
+                    filters = {"letter": letter, "unplayed": unplayed,
+                               "favorite": favorite}
+                    got, total = self.src.get_library_items(
+                        "offline", "offline:movies", limit=1000,
+                        filters=filters)
+                    want = _naive(self.movies, filters)
+                    self.assertEqual([i["Id"] for i in got],
+                                     [i["Id"] for i in want], filters)
+                    self.assertEqual(total, len(want))
+
+    def test_a_name_starting_with_hash_is_listed_once(self):
+        """It is filed under "#" as its own letter; filing it again as a
+        non-letter listed it twice and over-counted the bucket."""
+        got, total = self.src.get_library_items(
+            "offline", "offline:movies", limit=1000,
+            filters={"letter": "#"})
+        ids = [i["Id"] for i in got if i["Name"] == "#Alive"]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(total, len(got))
+
+    def test_a_page_is_a_slice(self):
+        whole, total = self.src.get_library_items(
+            "offline", "offline:movies", limit=1000)
+        page, page_total = self.src.get_library_items(
+            "offline", "offline:movies", start_index=5, limit=7)
+        self.assertEqual(page, whole[5:12])
+        self.assertEqual(page_total, total)
+
+    def test_paging_does_not_sort(self):
+        self.src.get_library_items("offline", "offline:movies")
+        with mock.patch.object(repository, "_name_key",
+                               side_effect=AssertionError("sorted")):
+            self.src.get_library_items("offline", "offline:movies",
+                                       start_index=10, limit=10,
+                                       filters={"letter": "B"})
+            self.src.get_library_items("offline", "offline:tv")
+
+    def test_a_page_cannot_edit_the_index(self):
+        page, _t = self.src.get_library_items("offline", "offline:movies")
+        page.clear()
+        again, _t = self.src.get_library_items("offline", "offline:movies")
+        self.assertTrue(again)
+
+    def test_the_series_grid_is_name_sorted(self):
+        got, total = self.src.get_library_items("offline", "offline:tv")
+        self.assertEqual([s["Name"] for s in got], ["Show 0", "Show 1"])
+        self.assertEqual(total, 2)
+
+
+class SeriesIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.items = _items()
+        self.src = _source(self.items)
+
+    def test_episodes_are_in_aired_order(self):
+        eps = self.src.get_episodes("offline", "s0", "se0")
+        self.assertEqual([e["Id"] for e in eps], ["e4", "e0"])
+
+    def test_a_synthetic_season_id_finds_its_episodes(self):
+        (season,) = [s for s in self.src.get_seasons("offline", "s0")
+                     if s["IndexNumber"] == 0 and s["Id"].startswith("p")]
+        eps = self.src.get_episodes("offline", "s0", season["Id"])
+        want = sorted((i for i in self.items if i.get("SeriesId") == "s0"
+                       and i.get("ParentIndexNumber") == 0),
+                      key=lambda i: i["IndexNumber"])
+        self.assertEqual(eps, want)
+
+    def test_seasons_carry_their_aggregate(self):
+        seasons = self.src.get_seasons("offline", "s0")
+        self.assertEqual([s["IndexNumber"] for s in seasons][:2], [0, 0])
+        for season in seasons:
+            self.assertIn("UnplayedItemCount", season["UserData"])
+
+    def test_the_series_queue_starts_where_asked(self):
+        queue = self.src.get_series_queue("offline", "s1",
+                                          start_item_id="e5")
+        self.assertEqual(queue[0]["Id"], "e5")
+        whole = self.src.get_series_queue("offline", "s1")
+        self.assertEqual(queue, whole[whole.index(queue[0]):])
+
+    def test_genres(self):
+        self.assertEqual(self.src.get_genres("offline"), ["Comedy", "Drama"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+"""The loopback page server: bytes in, the same bytes out, and no further.
+
+Over a real socket, because what mpv does with the URL is an HTTP GET and
+the properties worth pinning are about what that GET answers: the page, for
+the right token; nothing, for any other; and nothing once the page has been
+evicted or its comic closed.
+"""
+
+import socket
+import unittest
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from jellyfin_mpv_shim.page_server import PageServer
+
+
+def fetch(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.headers.get("Content-Type"), response.read()
+
+
+class TestPageServer(unittest.TestCase):
+    def setUp(self):
+        self.server = PageServer(budget=1000)
+        self.addCleanup(self.server.stop)
+
+    def test_a_page_comes_back_as_it_went_in(self):
+        data = bytes(range(256)) * 3         # NULs and non-UTF-8 alike
+        url = self.server.put("c1/00003.jpg", data)
+        self.assertTrue(url.startswith("http://127.0.0.1:"))
+        self.assertEqual(fetch(url), ("image/jpeg", data))
+
+    def test_another_token_is_not_found(self):
+        url = self.server.put("c1/00001.png", b"x" * 10)
+        token = url.split("/")[3]
+        with self.assertRaises(urllib.error.HTTPError) as caught:
+            fetch(url.replace(token, "guess"))
+        self.assertEqual(caught.exception.code, 404)
+
+    def test_a_high_byte_in_the_path_is_not_found(self):
+        """Sent raw: a client that percent-encodes would never send one."""
+        url = urllib.parse.urlsplit(self.server.put("c1/a.jpg", b"x"))
+        with socket.create_connection((url.hostname, url.port),
+                                      timeout=5) as conn:
+            conn.sendall(b"GET /\xe9t\xe9/a.jpg HTTP/1.0\r\n\r\n")
+            status = conn.makefile("rb").readline()
+        self.assertEqual(status.split()[1], b"404")
+
+    def test_the_least_recently_used_page_goes_first(self):
+        first = self.server.put("c1/a.jpg", b"a" * 400)
+        self.server.put("c1/b.jpg", b"b" * 400)
+        self.server.get("c1/a.jpg")              # a is used again
+        self.server.put("c1/c.jpg", b"c" * 400)
+        self.assertIsNone(self.server.get("c1/b.jpg"))
+        self.assertEqual(fetch(first)[1], b"a" * 400)
+        self.assertLessEqual(self.server.held_bytes, 1000)
+
+    def test_a_page_over_the_budget_is_still_served_until_the_next(self):
+        """It is about to be asked for; the budget is met on the next put."""
+        url = self.server.put("c1/big.jpg", b"z" * 5000)
+        self.assertEqual(len(fetch(url)[1]), 5000)
+        self.server.put("c1/small.jpg", b"s")
+        self.assertIsNone(self.server.get("c1/big.jpg"))
+
+    def test_discarding_a_comic_drops_only_its_pages(self):
+        self.server.put("c1/a.jpg", b"a")
+        kept = self.server.put("c2/a.jpg", b"b")
+        self.server.discard("c1/")
+        self.assertIsNone(self.server.url("c1/a.jpg"))
+        self.assertEqual(fetch(kept)[1], b"b")
+
+
+if __name__ == "__main__":
+    unittest.main()
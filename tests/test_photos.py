@@ -642,7 +642,8 @@ class SubtitleSidecarAuthTest(unittest.TestCase):
             "subtitle_url": staticmethod(
                 lambda *a, **kw: "https://example.com/built")})()
 
-        real_get, mod.requests.get = mod.requests.get, fake_get
+        mgr = SyncManager.__new__(SyncManager)
+        mgr._http = type("Pool", (), {"get": staticmethod(fake_get)})()
         real_mk, mod.os.makedirs = mod.os.makedirs, lambda *a, **kw: None
         real_open = mod.open if hasattr(mod, "open") else None
         try:
@@ -652,12 +653,11 @@ class SubtitleSidecarAuthTest(unittest.TestCase):
             builtins.open = lambda *a, **kw: io.BytesIO()
             try:
                 SyncManager._download_subs(
-                    SyncManager.__new__(SyncManager), client, "i1",
+                    mgr, client, "i1",
                     {"Id": "s1", "MediaStreams": [stream]}, "/tmp/x")
             finally:
                 builtins.open = real_builtin_open
         finally:
-            mod.requests.get = real_get
             mod.os.makedirs = real_mk
             del real_open
         return seen
@@ -922,10 +922,12 @@ class PhotoPauseRuleTest(unittest.TestCase):
 
         from jellyfin_mpv_shim.player import PlayerManager
 
-        source = inspect.getsource(PlayerManager._play_media)
+        # The post-load half of _play_media is _begin_playback, which the
+        # gapless handoff shares.
+        source = inspect.getsource(PlayerManager._begin_playback)
         self.assertIn(
             "self.set_paused(hold_still, False)", source,
-            "the initial unpause in _play_media no longer consults the "
+            "the initial unpause in _begin_playback no longer consults the "
             "hold-the-still decision, so opening a photo starts a slideshow")
 
     def test_the_player_takes_the_flag_and_defaults_to_pausing(self):
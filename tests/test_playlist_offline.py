@@ -431,8 +431,6 @@ class TestPlaylistArtDownload(TmpTest):
     the playlist's own poster to show."""
 
     def _manager(self, fetched, status=200):
-        import jellyfin_mpv_shim.sync.manager as mgr
-
         class FakeResp:
             status_code = status
             content = b"jpeg"
@@ -445,16 +443,13 @@ class TestPlaylistArtDownload(TmpTest):
             fetched.append(url)
             return FakeResp()
 
-        real, mgr.requests = mgr.requests, type(
-            "R", (), {"get": staticmethod(fake_get)})
-        self.addCleanup(lambda: setattr(mgr, "requests", real))
-
         jf = FakeJellyfin([])
         # include_apikey mirrors the apiclient signature; the sync manager
         # passes False and sends the token as a header instead.
         jf.artwork = (lambda item_id, kind, size, include_apikey=True:
                       "http://s/%s/%s" % (item_id, kind))
         m = make_manager(self.tmp, jf)
+        m._http.get = fake_get
         self.addCleanup(m.db.close)
         return m
 
@@ -0,0 +1,294 @@
+"""Resolving the next queue entry while the current one is still playing,
+and handing music to mpv ahead so an album plays without a gap.
+
+The advance takes what was resolved ahead only when it was made for exactly
+that advance; anything else -- an edited queue, a different quality, a header
+that did not take -- resolves again the old way.
+"""
+
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.argv = [sys.argv[0]]      # importing player reaches args.get_args()
+
+from jellyfin_mpv_shim import player_advance  # noqa: E402
+from jellyfin_mpv_shim.media import Video  # noqa: E402
+from jellyfin_mpv_shim.player import PlayerManager  # noqa: E402
+
+
+class _Resolved(Exception):
+    """Raised by a stubbed terminate_transcode: the url was negotiated."""
+
+
+def make_video(item=None, preresolved=None, auth=False):
+    video = Video.__new__(Video)
+    video.item = item if item is not None else {"Type": "Episode"}
+    video.item_id = "next"
+    video.is_photo = False
+    video.trs_ovr = None
+    video.auth_via_header = auth
+    video._preresolved = preresolved
+    video.client = mock.MagicMock()
+    return video
+
+
+class FakeMedia:
+    def __init__(self, queue, seq, built):
+        self.queue = queue
+        self.seq = seq
+        self.built = built
+        self.video = mock.MagicMock()
+        self.video.parent = self
+
+    @property
+    def has_next(self):
+        return self.seq < len(self.queue) - 1
+
+    def get_next(self):
+        media = FakeMedia(self.queue, self.seq + 1, self.built)
+        self.built.append(media)
+        return media
+
+
+class VideoTest(unittest.TestCase):
+    def test_the_held_url_is_used_once(self):
+        video = make_video(preresolved=(False, "http://next"))
+        self.assertEqual(video.get_playback_url(), "http://next")
+        with mock.patch.object(Video, "terminate_transcode",
+                               side_effect=_Resolved):
+            with self.assertRaises(_Resolved):
+                video.get_playback_url()
+
+    def test_a_different_request_negotiates_again(self):
+        cases = (
+            dict(auth=True),                        # the header took after all
+            dict(call={"video_bitrate": 4000}),     # a quality change
+            dict(call={"force_transcode": True}),
+            dict(trs_ovr=(4000, False)),
+        )
+        for case in cases:
+            with self.subTest(case=case):
+                video = make_video(preresolved=(False, "http://next"),
+                                   auth=case.get("auth", False))
+                if "trs_ovr" in case:
+                    video.trs_ovr = case["trs_ovr"]
+                with mock.patch.object(Video, "terminate_transcode",
+                                       side_effect=_Resolved):
+                    with self.assertRaises(_Resolved):
+                        video.get_playback_url(**case.get("call", {}))
+                self.assertIsNone(video._preresolved)
+
+    def test_preresolve_holds_the_url_it_built(self):
+        video = make_video()
+        with mock.patch.object(Video, "get_playback_url",
+                               return_value="http://next") as resolve:
+            self.assertTrue(video.preresolve(True))
+        resolve.assert_called_once_with()
+        self.assertTrue(video.auth_via_header)
+        self.assertEqual(video._preresolved, (True, "http://next"))
+
+    def test_live_items_are_never_resolved_ahead(self):
+        items = (
+            {"Type": "TvChannel"},
+            {"Type": "Episode", "MediaSources": [{"IsInfiniteStream": True}]},
+            {"Type": "Movie", "MediaSources": [{"RequiresOpening": True}]},
+        )
+        for item in items:
+            with self.subTest(item=item):
+                video = make_video(item=item)
+                with mock.patch.object(Video, "get_playback_url") as resolve:
+                    self.assertFalse(video.preresolve(False))
+                resolve.assert_not_called()
+                self.assertIsNone(video._preresolved)
+
+
+class AdvanceTest(unittest.TestCase):
+    def setUp(self):
+        for name, value in (("preresolve_next_secs", 30), ("auto_play", True)):
+            patch = mock.patch.object(player_advance.settings, name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.built = []
+        self.queue = [{"Id": "a", "PlaylistItemId": "p0"},
+                      {"Id": "b", "PlaylistItemId": "p1"}]
+        self.current = FakeMedia(self.queue, 0, self.built)
+        pm = PlayerManager.__new__(PlayerManager)
+        pm._video = self.current.video
+        pm._player = mock.MagicMock(playback_time=580.0, duration=600.0)
+        pm.syncplay = mock.MagicMock()
+        pm.syncplay.is_enabled.return_value = False
+        pm._mpv_alive = False
+        pm._advance_lock = threading.Lock()
+        self.pm = pm
+
+    def _pump_and_wait(self):
+        self.pm._pump_preresolve()
+        deadline = time.monotonic() + 5
+        while self.pm._advance_ready is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_the_advance_takes_the_entry_resolved_ahead(self):
+        self._pump_and_wait()
+        self.assertEqual(len(self.built), 1)
+        ahead = self.built[0]
+        ahead.video.preresolve.assert_called_once_with(False)
+        self.assertIs(self.pm._next_media(self.current.video), ahead)
+        self.assertEqual(len(self.built), 1)
+        self.assertIsNone(self.pm._advance_ready)
+
+    def test_an_edited_queue_builds_the_entry_again(self):
+        self._pump_and_wait()
+        # Queues are published whole, never edited in place.
+        self.current.queue = [self.queue[0], {"Id": "c", "PlaylistItemId": "p2"}]
+        fresh = self.pm._next_media(self.current.video)
+        self.assertIsNot(fresh, self.built[0])
+        self.assertEqual(len(self.built), 2)
+
+    def test_one_resolution_per_entry(self):
+        self._pump_and_wait()
+        self.pm._pump_preresolve()
+        self.assertEqual(len(self.built), 1)
+
+    def test_nothing_is_resolved_early(self):
+        cases = {
+            "far from the end": lambda: setattr(self.pm._player,
+                                                "playback_time", 100.0),
+            "switched off": lambda: setattr(player_advance.settings,
+                                            "preresolve_next_secs", 0),
+            "no auto play": lambda: setattr(player_advance.settings,
+                                            "auto_play", False),
+            "syncplay": lambda: setattr(
+                self.pm.syncplay.is_enabled, "return_value", True),
+            "last entry": lambda: setattr(self.current, "seq", 1),
+        }
+        for label, arrange in cases.items():
+            with self.subTest(label):
+                self.setUp()
+                arrange()
+                with mock.patch.object(player_advance.threading,
+                                       "Thread") as thread:
+                    self.pm._pump_preresolve()
+                thread.assert_not_called()
+
+    def test_a_failed_resolution_leaves_the_advance_to_itself(self):
+        self.current.get_next = mock.Mock(side_effect=[RuntimeError("down"),
+                                                       "built now"])
+        self.pm._pump_preresolve()
+        deadline = time.monotonic() + 5
+        while (self.current.get_next.call_count < 1
+               and time.monotonic() < deadline):
+            time.sleep(0.01)
+        time.sleep(0.05)
+        self.assertEqual(self.pm._next_media(self.current.video), "built now")
+
+
+class GaplessTest(unittest.TestCase):
+    def setUp(self):
+        for name, value in (("gapless_music", True), ("auto_play", True),
+                            ("force_set_played", True)):
+            patch = mock.patch.object(player_advance.settings, name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.queue = [{"Id": "a", "PlaylistItemId": "p0"},
+                      {"Id": "b", "PlaylistItemId": "p1"}]
+        self.current = FakeMedia(self.queue, 0, [])
+        self.current.video.item = {"Type": "Audio"}
+        self.current.video.auth_via_header = True
+        self.nxt = FakeMedia(self.queue, 1, [])
+        self.nxt.video.item = {"Type": "Audio"}
+        self.nxt.video._preresolved = (True, "http://b")
+        pm = PlayerManager.__new__(PlayerManager)
+        pm._video = self.current.video
+        pm._player = mock.MagicMock()
+        pm.syncplay = mock.MagicMock()
+        pm.syncplay.is_enabled.return_value = False
+        pm.repeat_mode = "none"
+        pm._play_epoch = 4
+        pm._lock = threading.RLock()
+        pm._advance_lock = threading.Lock()
+        pm._advance_ready = (pm._advance_key(self.current.video), self.nxt)
+        pm.tasks = []
+        pm.put_task = lambda func, *args: pm.tasks.append((func, args))
+        pm._begin_playback = mock.Mock()
+        pm.send_timeline_stopped = mock.Mock()
+        pm.get_timeline_options = mock.Mock(return_value={"at": "end"})
+        pm._finished_at_eof = mock.Mock(return_value=True)
+        self.pm = pm
+
+    def _appended(self):
+        return [c.args for c in self.pm._player.command.call_args_list
+                if c.args[:1] == ("loadfile",)]
+
+    def test_the_next_track_is_appended_with_prefetch(self):
+        self.pm._pump_gapless()
+        self.assertEqual(self._appended(), [("loadfile", "http://b", "append")])
+        self.assertTrue(self.pm._player.prefetch_playlist)
+        self.assertIsNone(self.pm._advance_ready)
+        self.pm._pump_gapless()
+        self.assertEqual(len(self._appended()), 1)
+
+    def test_mpv_moving_on_is_the_advance(self):
+        self.pm._pump_gapless()
+        self.pm._on_playlist_pos("playlist-pos", 0)
+        self.assertEqual(self.pm.tasks, [])
+        self.pm._on_playlist_pos("playlist-pos", 1)
+        func, args = self.pm.tasks.pop()
+        func(*args)
+        self.current.video.set_played.assert_called_once_with()
+        self.pm.get_timeline_options.assert_called_once_with(
+            True, video=self.current.video)
+        self.pm.send_timeline_stopped.assert_called_once_with(
+            True, options={"at": "end"})
+        self.pm._player.command.assert_any_call("playlist-remove", 0)
+        self.pm._begin_playback.assert_called_once_with(self.nxt.video)
+        self.assertIsNone(self.nxt.video._preresolved)
+        self.assertEqual(self.pm.url, "http://b")
+        self.assertIsNone(self.pm._gapless)
+
+    def test_a_start_in_between_retires_the_handoff(self):
+        self.pm._pump_gapless()
+        self.pm._on_playlist_pos("playlist-pos", 1)
+        self.pm._play_epoch += 1
+        func, args = self.pm.tasks.pop()
+        func(*args)
+        self.pm._begin_playback.assert_not_called()
+
+    def test_an_edited_queue_takes_the_track_back(self):
+        self.pm._pump_gapless()
+        self.current.queue = [self.queue[0], {"Id": "c", "PlaylistItemId": "p2"}]
+        self.pm._pump_gapless()
+        self.pm._player.command.assert_any_call("playlist-remove", 1)
+        self.assertIsNone(self.pm._gapless)
+
+    def test_a_skip_takes_the_appended_entry(self):
+        self.pm._pump_gapless()
+        self.assertIs(self.pm._next_media(self.current.video), self.nxt)
+        self.assertIsNone(self.pm._gapless)
+
+    def test_only_music_to_music_is_gapless(self):
+        cases = {
+            "video playing": lambda: setattr(self.current.video, "item",
+                                             {"Type": "Episode"}),
+            "video next": lambda: setattr(self.nxt.video, "item",
+                                          {"Type": "Movie"}),
+            "switched off": lambda: setattr(player_advance.settings,
+                                            "gapless_music", False),
+            "repeat one": lambda: setattr(self.pm, "repeat_mode", "one"),
+            "header differs": lambda: setattr(self.nxt.video, "_preresolved",
+                                              (False, "http://b?ApiKey=t")),
+            "syncplay": lambda: setattr(
+                self.pm.syncplay.is_enabled, "return_value", True),
+        }
+        for label, arrange in cases.items():
+            with self.subTest(label):
+                self.setUp()
+                arrange()
+                self.pm._pump_gapless()
+                self.assertEqual(self._appended(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,242 @@
+"""Each screen keeps only the DTO keys it reads.
+
+The projection is a whitelist, which makes it exactly as safe as the list
+is complete: a key the tiles read and the projection drops does not fail,
+it reads as absent -- a watched badge that never draws, a Delete entry that
+never appears. So the audit below does not trust the list. It hands the
+grid a DTO that records every key it is asked for, drives the places a grid
+item goes (grid view, list view, the tile menu, a click), and fails on a
+server key the projection would have thrown away.
+"""
+
+import sys
+import unittest
+
+sys.argv = [sys.argv[0]]
+
+from jellyfin_mpv_shim.mpvtk_browser import projections  # noqa: E402
+from jellyfin_mpv_shim.mpvtk_browser.app import MpvtkBrowser  # noqa: E402
+from jellyfin_mpv_shim.mpvtk_browser.repository import (  # noqa: E402
+    BOOKS_GRID_FIELDS, GRID_FIELDS, LIST_FIELDS, LibrarySource)
+
+from tests._shell_harness import (  # noqa: E402
+    FakeController, FakeSource, _SyncPool, build_scene)
+
+
+class _Recording(dict):
+    """A DTO that notes which keys were asked of it."""
+
+    def __init__(self, data, seen):
+        super().__init__(data)
+        self._seen = seen
+
+    def get(self, key, default=None):
+        self._seen.add(key)
+        return super().get(key, default)
+
+    def __getitem__(self, key):
+        self._seen.add(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self._seen.add(key)
+        return super().__contains__(key)
+
+
+#: One of each type a grid lists, with the keys a real answer carries for
+#: it -- including the ones no tile should want.
+_TYPES = [
+    {"Type": "Movie", "ProductionYear": 2001, "RunTimeTicks": 6 * 10**10,
+     "MediaSourceCount": 2, "CanDelete": True},
+    {"Type": "Series", "IsFolder": True, "Status": "Continuing",
+     "EndDate": None, "UserData": {"UnplayedItemCount": 3}},
+    {"Type": "Episode", "SeriesName": "Show", "SeriesId": "s1",
+     "IndexNumber": 2, "ParentIndexNumber": 1,
+     "SeriesPrimaryImageTag": "st", "ParentThumbItemId": "s1",
+     "ParentThumbImageTag": "pt", "ParentBackdropItemId": "s1",
+     "ParentBackdropImageTags": ["pb"]},
+    {"Type": "Season", "IsFolder": True, "SeriesId": "s1",
+     "SeriesName": "Show", "IndexNumber": 1},
+    {"Type": "BoxSet", "IsFolder": True},
+    {"Type": "Folder", "IsFolder": True},
+    {"Type": "Video", "RunTimeTicks": 10**9},
+    {"Type": "MusicVideo", "Artists": ["A"], "Album": "B"},
+]
+
+#: What a server answers beyond what anything here draws.
+_NOISE = {
+    "ImageBlurHashes": {"Primary": {"t": "LEHV6nWB2yk8pyo0adR*.7kCMdnj"}},
+    "Etag": "e", "LockedFields": [], "LockData": False,
+    "ExternalUrls": [{"Name": "IMDb", "Url": "http://x"}],
+    "MediaSources": [{"Id": "ms"}], "People": [{"Name": "p"}],
+}
+
+
+def _dto(index, extra, seen=None):
+    base = {"Id": "g%d" % index, "Name": "Item %d" % index,
+            "ServerId": "srv1", "PrimaryImageAspectRatio": 2 / 3,
+            "ImageTags": {"Primary": "t%d" % index},
+            "BackdropImageTags": ["b%d" % index],
+            "UserData": {"Played": False, "IsFavorite": True,
+                         "PlaybackPositionTicks": 10},
+            "_subtitle": None}
+    base.update(extra)
+    base.update(_NOISE)
+    return base if seen is None else _Recording(base, seen)
+
+
+def _browser(items, view=None):
+    src = FakeSource()
+    src.has_poster = True
+    # The real resolver, not the fake's: it is the single biggest reader of
+    # the DTO and the one most likely to grow a new key.
+    real = LibrarySource.__new__(LibrarySource)
+    src.image_spec = (lambda item, image_type="Primary", width=280,
+                      inherit=True:
+                      real.image_spec(item, image_type, width, inherit))
+    src.grid_items = items
+    if view:
+        src.view_settings = view
+    b = MpvtkBrowser(app=None, source=src, controller=FakeController())
+    b._pool = _SyncPool()
+    b.server = "srv1"
+    return b, src
+
+
+def _grid(b, ctype="movies"):
+    b.navigate({"kind": "grid", "server": "srv1", "parent_id": "lib1",
+                "collection_type": ctype, "title": "L"})
+
+
+class TrimTest(unittest.TestCase):
+    def test_unlisted_keys_go_and_listed_ones_stay(self):
+        out = projections.GRID.trim(_dto(0, {"Type": "Movie"}))
+        self.assertNotIn("ImageBlurHashes", out)
+        self.assertNotIn("MediaSources", out)
+        self.assertEqual(out["ImageTags"], {"Primary": "t0"})
+        self.assertEqual(out["UserData"]["PlaybackPositionTicks"], 10)
+
+    def test_our_own_annotations_survive(self):
+        out = projections.GRID.trim({"Id": "x", "_recording": True})
+        self.assertEqual(out, {"Id": "x", "_recording": True})
+
+    def test_the_callers_dict_is_not_touched(self):
+        """The same DTO can sit on two routes at once."""
+        item = _dto(0, {"Type": "Movie"})
+        projections.GRID.trim(item)
+        self.assertIn("ImageBlurHashes", item)
+
+    def test_holes_pass_through(self):
+        self.assertEqual(projections.GRID.trim_all([None, {"Id": "a"}]),
+                         [None, {"Id": "a"}])
+
+    def test_an_untrimmed_projection_keeps_everything(self):
+        item = _dto(0, {"Type": "Movie"})
+        self.assertIs(projections.DETAIL.trim(item), item)
+
+    def test_the_field_strings_are_the_repositorys(self):
+        self.assertEqual(GRID_FIELDS, projections.GRID.fields)
+        self.assertEqual(LIST_FIELDS, projections.ROW.fields)
+        self.assertEqual(BOOKS_GRID_FIELDS, projections.BOOKS_GRID.fields)
+
+    def test_every_requested_field_that_is_a_key_is_kept(self):
+        """Asking the server for a field and then dropping it is paying for
+        bytes twice -- once on the wire and once in the audit below."""
+        for projection in (projections.GRID, projections.ROW,
+                           projections.BOOKS_GRID):
+            for field in projection.fields.split(","):
+                self.assertIn(field, projection.keys)
+
+
+class RoutesTest(unittest.TestCase):
+    def test_a_grid_is_trimmed(self):
+        self.assertIs(projections.for_route({"kind": "grid"}),
+                      projections.GRID)
+
+    def test_a_books_grid_keeps_the_description(self):
+        got = projections.for_route({"kind": "grid",
+                                     "collection_type": "books"})
+        self.assertIn("Overview", got.keys)
+
+    def test_a_guide_list_is_not(self):
+        """A programme tile seeds the program page with its whole DTO."""
+        self.assertIsNone(projections.for_route(
+            {"kind": "list", "list": {"type": "programs"}}))
+        self.assertIs(projections.for_route(
+            {"kind": "list", "list": {"type": "items"}}), projections.ROW)
+
+    def test_a_detail_page_is_not(self):
+        self.assertIsNone(projections.for_route({"kind": "detail"}))
+
+
+class LandingTest(unittest.TestCase):
+    """What reaches route state is the trimmed item."""
+
+    def test_the_first_page_lands_trimmed(self):
+        b, _src = _browser([_dto(i, _TYPES[0]) for i in range(30)])
+        _grid(b)
+        first = b.route["_items"][0]
+        self.assertEqual(first["Id"], "g0")
+        self.assertNotIn("ImageBlurHashes", first)
+        self.assertNotIn("MediaSources", first)
+
+    def test_a_window_lands_trimmed(self):
+        from tests._shell_harness import grid_scroll
+        b, _src = _browser([_dto(i, _TYPES[0]) for i in range(500)])
+        _grid(b)
+        grid_scroll(b, b.route, 20_000, 40_000)
+        loaded = [it for it in b.route["_items"][20:] if it]
+        self.assertTrue(loaded, "no window was fetched")
+        for item in loaded:
+            self.assertNotIn("ImageBlurHashes", item)
+
+    def test_a_books_grid_keeps_its_overview(self):
+        b, _src = _browser([_dto(0, dict(_TYPES[0], Overview="text"))])
+        _grid(b, ctype="books")
+        self.assertEqual(b.route["_items"][0].get("Overview"), "text")
+
+
+class ReadAuditTest(unittest.TestCase):
+    """Nothing a grid item reaches reads a key its projection drops."""
+
+    def _audit(self, view=None):
+        seen = set()
+        items = [_dto(i, extra, seen) for i, extra in enumerate(_TYPES)]
+        b, _src = _browser(items, view=view)
+        # Installed untrimmed, so the recorder is what the screen reads
+        # from; the trim itself is covered above.
+        projections.ROUTES["grid"], saved = (
+            projections.Projection(projections.GRID.fields),
+            projections.ROUTES["grid"])
+        try:
+            _grid(b)
+            build_scene(b)
+            for item in items:
+                b._tile_menu_entries(item)
+            for item in items:
+                b._open_item(item)
+                b.go_back()
+        finally:
+            projections.ROUTES["grid"] = saved
+        return {k for k in seen if not k.startswith("_")}
+
+    def _check(self, seen):
+        missing = sorted(seen - projections.GRID.keys)
+        self.assertEqual(missing, [],
+                         "read by the grid but dropped by its projection")
+
+    def test_the_grid_view(self):
+        self._check(self._audit())
+
+    def test_the_list_view(self):
+        self._check(self._audit(view={"imageType": ("list", None)}))
+
+    def test_the_audit_can_fail(self):
+        """A recorder that saw nothing would pass every check above."""
+        seen = self._audit()
+        for key in ("Id", "Type", "ImageTags", "UserData"):
+            self.assertIn(key, seen)
+
+
+if __name__ == "__main__":
+    unittest.main()
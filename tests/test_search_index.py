@@ -0,0 +1,216 @@
+"""Search as it is typed: the local index, and the debounce in front of the
+server."""
+
+import sys
+import time
+import unittest
+
+sys.argv = [sys.argv[0]]
+
+from jellyfin_mpv_shim.mpvtk_browser.app import MpvtkBrowser  # noqa: E402
+from jellyfin_mpv_shim.mpvtk_browser.repository import (  # noqa: E402
+    LibrarySource, _OfflineSnapshot)
+from jellyfin_mpv_shim.mpvtk_browser.search_index import (  # noqa: E402
+    SearchIndex, merge, normalize)
+
+from tests._shell_harness import (  # noqa: E402
+    FakeController, FakeSource, _SyncPool, build_scene)
+
+
+def _item(item_id, name, kind="Movie"):
+    return {"Id": item_id, "Name": name, "Type": kind}
+
+
+def _names(items):
+    return [it["Name"] for it in items]
+
+
+class IndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex()
+        self.index.add([_item("1", "Star Trek"), _item("2", "The Best"),
+                        _item("3", "Amélie"), _item("4", "Lost Stars"),
+                        _item("5", "Abcab")])
+
+    def test_a_short_term_matches_word_starts(self):
+        """"st" is for Star Trek, not for every name with an s-t in it."""
+        self.assertEqual(_names(self.index.query("st")),
+                         ["Star Trek", "Lost Stars"])
+
+    def test_a_longer_term_matches_anywhere(self):
+        self.assertEqual(_names(self.index.query("est")), ["The Best"])
+
+    def test_trigrams_are_only_a_filter(self):
+        """Every trigram of "cabc" is in "abcab"; the name is not."""
+        self.assertEqual(self.index.query("cabc"), [])
+
+    def test_accents_and_case_fold(self):
+        self.assertEqual(_names(self.index.query("AMELIE")), ["Amélie"])
+        self.assertEqual(normalize("Amélie"), "amelie")
+
+    def test_name_starts_rank_before_word_starts(self):
+        self.index.add([_item("6", "Stargate")])
+        self.assertEqual(_names(self.index.query("star")),
+                         ["Star Trek", "Stargate", "Lost Stars"])
+
+    def test_the_limit(self):
+        self.assertEqual(len(self.index.query("st", limit=1)), 1)
+
+    def test_re_adding_refreshes(self):
+        self.index.add([_item("1", "Voyager")])
+        self.assertEqual(_names(self.index.query("voy")), ["Voyager"])
+        self.assertEqual(_names(self.index.query("trek")), [])
+
+    def test_the_oldest_go_first(self):
+        index = SearchIndex(limit=2)
+        index.add([_item("1", "One"), _item("2", "Two"), _item("3", "Three")])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.query("one"), [])
+        self.assertEqual(_names(index.query("thr")), ["Three"])
+
+    def test_what_a_search_does_not_draw_is_skipped(self):
+        self.index.add([_item("9", "Starlight Season", "Season"),
+                        {"Id": "10", "Type": "Movie"}, None])
+        self.assertEqual(_names(self.index.query("starl")), [])
+
+    def test_an_entry_is_a_tile_not_the_whole_dto(self):
+        """The browse calls that feed it ask for Overview and more; twenty
+        thousand of those kept whole would undo the grids' trimming."""
+        dto = dict(_item("7", "Starfall"), Overview="x" * 500,
+                   MediaSources=[{}], ImageTags={"Primary": "t"},
+                   UserData={"Played": True}, _image_url="u")
+        self.index.add([dto])
+        hit, = self.index.query("starf")
+        self.assertEqual(set(hit), {"Id", "Name", "Type", "ImageTags",
+                                    "UserData", "_image_url"})
+        self.assertIn("Overview", dto, "the caller's dict was trimmed")
+
+    def test_merge_puts_the_server_first(self):
+        server = [_item("1", "A"), _item("2", "B")]
+        local = [_item("3", "C"), _item("1", "A")]
+        self.assertEqual(_names(merge(server, local)), ["A", "B", "C"])
+
+
+class SourceTest(unittest.TestCase):
+    def test_the_live_source_indexes_what_it_returns(self):
+        src = LibrarySource.__new__(LibrarySource)
+        src._indexes = {}
+        src._seen("srv", [_item("1", "Star Trek")])
+        self.assertEqual(_names(src.search_local("srv", "tre")),
+                         ["Star Trek"])
+        self.assertEqual(src.search_local("other", "tre"), [])
+
+    def test_the_offline_snapshot_indexes_every_type(self):
+        snap = _OfflineSnapshot(items=[_item("1", "Chapter One", "Photo")])
+        self.assertEqual(_names(snap.search_index.query("chap")),
+                         ["Chapter One"])
+
+    def test_the_offline_snapshot_shares_its_items(self):
+        """It holds every item already; a trimmed copy would be a second."""
+        item = dict(_item("1", "Chapter One"), Overview="text")
+        snap = _OfflineSnapshot(items=[item])
+        self.assertIs(snap.search_index.query("chap")[0], item)
+
+
+class _Counting(FakeSource):
+    def __init__(self):
+        super().__init__()
+        self.searched = []
+        self.local = [_item("l1", "Local Movie")]
+
+    def search(self, server_uuid, term, limit=800):
+        self.searched.append(term)
+        return super().search(server_uuid, term, limit)
+
+    def search_local(self, server_uuid, term, limit=800):
+        return list(self.local)
+
+
+class TypingTest(unittest.TestCase):
+    def setUp(self):
+        self.src = _Counting()
+        self.b = MpvtkBrowser(app=None, source=self.src,
+                              controller=FakeController())
+        self.b._pool = _SyncPool()
+        self.b.server = "srv1"
+        self.b.SEARCH_DEBOUNCE = 0.05
+
+    def _settle(self):
+        for _ in range(300):
+            if self.b._search_thread is None:
+                return
+            time.sleep(0.01)
+        self.fail("the settle thread never finished")
+
+    def _type(self, text):
+        for i in range(1, len(text) + 1):
+            self.b._search_typed(text[:i])
+
+    def test_one_letter_stays_put(self):
+        self.b._search_typed("s")
+        self.assertEqual(self.b.route.get("kind"), "home")
+
+    def test_a_word_is_one_query(self):
+        self._type("star")
+        self.assertEqual(self.b.route["kind"], "search")
+        self._settle()
+        self.assertEqual(self.src.searched, ["star"])
+        self.assertEqual(self.b.route["_data"]["term"], "star")
+
+    def test_a_new_results_screen_within_the_wait_is_still_searched(self):
+        """The settle thread is one per browser. A results screen opened
+        while it waits for another is refused a thread of its own, so the
+        running one has to follow the route on screen."""
+        self._type("star")
+        self.b.navigate({"kind": "home"})
+        self._type("moon")
+        self._settle()
+        self.assertEqual(self.src.searched, ["moon"])
+        self.assertEqual(self.b.route["_data"]["term"], "moon")
+
+    def test_typing_rewrites_the_screen_rather_than_pushing(self):
+        self._type("star")
+        route = self.b.route
+        self._type("start")
+        self.assertIs(self.b.route, route)
+        self.assertEqual(route["term"], "start")
+
+    def test_the_local_answer_is_drawn_before_the_server_is_asked(self):
+        self.b.SEARCH_DEBOUNCE = 5.0
+        self._type("lo")
+        self.assertEqual(self.src.searched, [])
+        build_scene(self.b)
+        self.assertEqual(_names(self.b.route["_local"]), ["Local Movie"])
+        self.b._shutdown_evt.set()
+
+    def test_enter_asks_now_and_ends_typing(self):
+        self.b.SEARCH_DEBOUNCE = 5.0
+        self._type("star")
+        route = self.b.route
+        self.b._search("star")
+        self.assertIs(self.b.route, route)
+        self.assertNotIn("_typing", route)
+        self.assertEqual(self.src.searched, ["star"])
+        self.b._shutdown_evt.set()
+
+    def test_a_superseded_answer_is_dropped(self):
+        """The box moved on while the first request was out: the rest of
+        that search is not sent, and its answer is not drawn."""
+        route = {"kind": "search", "server": "srv1", "term": "sta"}
+        people = []
+        self.src.search_people = lambda *a, **k: people.append(1) or []
+        real = self.src.search
+
+        def search(server_uuid, term, limit=800):
+            route["term"] = "star"
+            route["_search_gen"] += 1
+            return real(server_uuid, term, limit)
+
+        self.src.search = search
+        self.b.navigate(route)
+        self.assertNotIn("_data", route)
+        self.assertEqual(people, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -192,15 +192,14 @@ class OfflineSeasonTest(unittest.TestCase):
         downloaded episodes, and it has to be told what the live one gets
         for free."""
         from jellyfin_mpv_shim.mpvtk_browser.repository import (
-            OfflineLibrarySource)
+            OfflineLibrarySource, _OfflineSnapshot)
 
         src = OfflineLibrarySource.__new__(OfflineLibrarySource)
-        src._snap = type("S", (), {"items": [
+        src._snap = _OfflineSnapshot(items=[
             {"Type": "Episode", "SeriesId": "sh1", "SeasonId": "se1",
              "SeriesName": "A Show", "ParentIndexNumber": 1,
              "SeasonName": "Season 1"},
-        ]})()
-        src._aggregate_userdata = staticmethod(lambda items: {})
+        ])
         (season,) = src.get_seasons("s1", "sh1")
         self.assertEqual(season["SeriesName"], "A Show")
 
@@ -18,6 +18,7 @@ import tempfile
 import threading
 import unittest
 import zipfile
+from unittest import mock
 
 from jellyfin_mpv_shim.mpvtk_browser.app import MpvtkBrowser
 
@@ -700,6 +701,112 @@ class TestArchiveLifetime(ComicHarness):
                                  "page %d came back as another page" % i)
 
 
+class TestPrefetch(ComicHarness):
+    """The pages a turn will want are on disk before it wants them."""
+
+    def setUp(self):
+        super().setUp()
+        self.cbz = build_cbz(os.path.join(self._tmp.name, "long.cbz"),
+                             pages=12, size=(80, 120))
+
+    def extracted(self, browser):
+        return set(self.page(browser).archive._extracted)
+
+    def test_the_next_pages_are_extracted_when_one_is_shown(self):
+        browser = self.open_comic()
+        build_scene(browser)
+        self.assertEqual(self.extracted(browser), {0, 1, 2, 3})
+
+    def test_turning_onto_a_prefetched_page_reads_nothing(self):
+        browser = self.open_comic()
+        build_scene(browser)
+        page = self.page(browser)
+        reads = []
+        real = page.archive._read
+        page.archive._read = lambda i, n: reads.append(i) or real(i, n)
+        page._turn(1)
+        self.assertNotIn(1, reads)
+        self.assertEqual(reads, [4], "only the new end of the window")
+
+    def test_paging_back_looks_back(self):
+        browser = self.open_comic()
+        build_scene(browser)
+        page = self.page(browser)
+        page._goto(9)
+        page._turn(-1)
+        self.assertTrue({5, 6, 7, 8} <= self.extracted(browser))
+
+    def test_a_jump_retires_the_window_it_left(self):
+        """On the deferred pool, so the prefetch is still queued when the
+        reader jumps away."""
+        browser = MpvtkBrowser(app=None, source=FakeSource())
+        browser._pool = pool = _DeferredPool()
+        browser.source.items["cb1"] = comic()
+        browser.controller = FakeController()
+        browser.server = "srv1"
+        browser.controller.book_downloads["cb1"] = ("complete", self.cbz)
+        browser.navigate({"kind": "comic", "server": "srv1",
+                          "item_id": "cb1", "title": "A Comic"})
+        pool.release(0)          # item load
+        pool.release(0)          # archive open
+        pool.release(0)          # page 0 lands, queueing its prefetch
+        self.page(browser)._goto(9)
+        pool.release(0)          # the stale prefetch runs
+        self.assertEqual(self.extracted(browser), {0})
+        pool.drain()
+        self.assertEqual(self.extracted(browser), {0, 8, 9, 10, 11})
+
+    def test_the_next_page_is_queued_in_mpv_only_when_asked(self):
+        from jellyfin_mpv_shim.conf import settings
+
+        saved = settings.comic_preload_next
+        self.addCleanup(setattr, settings, "comic_preload_next", saved)
+        settings.comic_preload_next = False
+        browser = self.open_comic()
+        build_scene(browser)
+        self.assertEqual(browser.controller.preloaded, [])
+        settings.comic_preload_next = True
+        page = self.page(browser)
+        page._turn(1)
+        self.assertEqual(browser.controller.preloaded,
+                         [page.archive.page_path(2)])
+        page._goto(5)
+        page._turn(-1)
+        self.assertEqual(browser.controller.preloaded[-1],
+                         page.archive.page_path(3),
+                         "paging back queues the page before")
+        page._turn(-1)
+        page._turn(-1)
+        page._turn(-1)
+        queued = len(browser.controller.preloaded)
+        page._turn(-1)              # onto page 0: nothing before it
+        self.assertEqual(len(browser.controller.preloaded), queued)
+
+
+class TestPagesInMemory(ComicHarness):
+    def test_the_pages_handed_over_are_urls_and_nothing_is_written(self):
+        from jellyfin_mpv_shim import page_server
+        from jellyfin_mpv_shim.conf import settings
+
+        saved = settings.comic_pages_in_memory
+        self.addCleanup(setattr, settings, "comic_pages_in_memory", saved)
+        settings.comic_pages_in_memory = True
+        server = page_server.PageServer()
+        self.addCleanup(server.stop)
+        with mock.patch.object(page_server, "shared", lambda: server):
+            browser = self.open_comic()
+            build_scene(browser)
+            page = self.page(browser)
+            page._turn(1)
+        self.assertTrue(all(p.startswith("http://127.0.0.1:")
+                            for p in browser.controller.pictures))
+        self.assertIsNone(page.archive._dir, "a page went to disk")
+        self.assertTrue(browser.route.get("_size"),
+                        "the page size was not read from its bytes")
+        page.close()
+        self.assertEqual(server.held_bytes, 0)
+
+
 class TestShutdown(ComicHarness):
     def test_quitting_inside_a_comic_deletes_the_extracted_pages(self):
         """The live page is never retired — retirement is observed from
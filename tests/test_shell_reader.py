@@ -14,7 +14,10 @@ observable.
 
 import os
 import tempfile
+import threading
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
 from jellyfin_mpv_shim.books import EPUB_FULL_TICKS
 from jellyfin_mpv_shim.conf import settings
@@ -63,7 +66,8 @@ class ReaderHarness(unittest.TestCase):
     #: with ``save`` stubbed: these are real settings now, and a test that
     #: wrote one would rewrite the developer's own conf.json — and then
     #: leave the next test reading whatever the last one chose.
-    READER_KEYS = ("reader_font_size", "reader_theme", "reader_justify")
+    READER_KEYS = ("reader_font_size", "reader_theme", "reader_justify",
+                   "reader_optimal_line_breaks", "reader_book_page_numbers")
 
     def setUp(self):
         self.settings = settings
@@ -73,6 +77,22 @@ class ReaderHarness(unittest.TestCase):
         self.addCleanup(self._restore_settings)
         self._tmp = tempfile.TemporaryDirectory()
         self.addCleanup(self._tmp.cleanup)
+        # The book cache lives in the user's cache directory; a test run
+        # must neither fill it nor be answered from it.
+        books = os.path.join(self._tmp.name, "books")
+        patch = mock.patch("jellyfin_mpv_shim.conffile.get_cache_dir",
+                           lambda _app, _sub: books)
+        patch.start()
+        self.addCleanup(patch.stop)
+        # The whole-book count on threads: a process pool is seconds of
+        # interpreters starting for a property test_epub_pagination already
+        # covers.
+        executor = ThreadPoolExecutor(1)
+        self.addCleanup(executor.shutdown)
+        pool = mock.patch("jellyfin_mpv_shim.epub.pagination.pool",
+                          lambda: executor)
+        pool.start()
+        self.addCleanup(pool.stop)
         self.epub = build_epub(
             os.path.join(self._tmp.name, "novel.epub"),
             [paragraphs(20, words=45) for _i in range(4)],
@@ -97,8 +117,17 @@ class ReaderHarness(unittest.TestCase):
                           "item_id": "bk1", "title": "A Novel"})
         self.src = src
         self.item = item
+        # Before the temporary cache goes: the count writes into it.
+        self.addCleanup(self.counted)
         return browser
 
+    @staticmethod
+    def counted():
+        """Wait for the whole-book count, which runs on its own thread."""
+        for thread in threading.enumerate():
+            if thread.name == "mpvtk-count-pages":
+                thread.join()
+
     def _restore_settings(self):
         settings.save = self._saved_save
         for key, value in self._saved.items():
@@ -241,6 +270,53 @@ class TestReading(ReaderHarness):
         self.assertGreater(doc.spine_index, 0,
                            "the reader never left the first chapter")
 
+    def test_the_bar_numbers_pages_across_the_book(self):
+        browser = self.open_reader()
+        build_scene(browser)
+        self.counted()
+        doc = self.doc(browser)
+        page, total = doc.book_page()
+        self.assertGreater(total, doc.page_count())
+        browser._on_claimed_key("RIGHT")
+        nodes, _handlers = build_scene(browser)
+        self.assertIn("Page %d of %d" % (page + 2, total),
+                      [node.get("text") for node in nodes])
+
+    def test_the_scrubber_goes_to_a_page_of_the_book(self):
+        browser = self.open_reader()
+        build_scene(browser)
+        self.counted()
+        doc = self.doc(browser)
+        starts = doc.section_starts()
+        nodes, handlers = build_scene(browser)
+        self.assertIn("rd-scrub", ids(nodes))
+        handlers["rd-scrub"]["commit"](starts[2] + 1)
+        self.assertEqual((doc.spine_index, doc.page_number), (2, 1))
+        self.assertTrue(browser.controller.positions_written)
+
+    def test_the_count_runs_on_a_thread_of_its_own(self):
+        """Not on a runner worker, which it would hold for the whole book."""
+        seen = []
+
+        def paginate_book(_doc, *_a, **_k):
+            seen.append(threading.current_thread().name)
+            return True
+
+        with mock.patch("jellyfin_mpv_shim.epub.book.EpubDocument"
+                        ".paginate_book", paginate_book):
+            build_scene(self.open_reader())
+            self.counted()
+        self.assertEqual(seen, ["mpvtk-count-pages"])
+
+    def test_without_the_setting_pages_are_numbered_per_chapter(self):
+        settings.reader_book_page_numbers = False
+        browser = self.open_reader()
+        nodes, _handlers = build_scene(browser)
+        self.assertIsNone(self.doc(browser).book_page())
+        self.assertNotIn("rd-scrub", ids(nodes))
+        self.assertIn("Page 1 of %d" % self.doc(browser).page_count(),
+                      [node.get("text") for node in nodes])
+
     def test_the_chapter_picker_jumps_to_its_document(self):
         browser = self.open_reader()
         _nodes, handlers = build_scene(browser)
@@ -341,6 +417,16 @@ class TestReading(ReaderHarness):
         self.assertEqual(len(set(widths)), 3,
                          "the open book kept its original type size")
 
+    def test_the_line_breaker_setting_reaches_an_open_book(self):
+        browser = self.open_reader()
+        build_scene(browser)
+        doc = self.doc(browser)
+        self.assertFalse(doc.style.optimal_breaks)
+        settings.reader_optimal_line_breaks = True
+        build_scene(browser)
+        self.assertTrue(doc.style.optimal_breaks)
+        self.assertTrue(doc.current_page().items)
+
 
 class TestCopying(ReaderHarness):
     """The context menu, which is what stands in for selecting text."""
@@ -613,6 +699,100 @@ class TestPosition(ReaderHarness):
         self.assertEqual(item["UserData"]["PlaybackPositionTicks"], ticks)
 
 
+class TestIndexInBackground(ReaderHarness):
+    """The index follows the first page rather than preceding it."""
+
+    def unindexed(self, browser):
+        doc = self.doc(browser)
+        doc._index = None
+        return doc
+
+    def test_pages_turned_before_the_index_are_written_when_it_lands(self):
+        browser = self.open_reader()
+        build_scene(browser)
+        doc = self.unindexed(browser)
+        for _i in range(12):
+            browser._on_claimed_key("RIGHT")
+        self.assertEqual(browser.controller.positions_written, [],
+                         "a position was written with no index to measure it")
+        self.page(browser)._build_index(doc)
+        self.assertIsNotNone(doc.index())
+        item_id, ticks = browser.controller.positions_written[-1]
+        self.assertEqual(item_id, "bk1")
+        self.assertAlmostEqual(ticks / float(EPUB_FULL_TICKS),
+                               doc.fraction(), places=5)
+
+    def test_an_untouched_book_writes_nothing_when_it_lands(self):
+        browser = self.open_reader()
+        build_scene(browser)
+        doc = self.unindexed(browser)
+        self.page(browser)._build_index(doc)
+        self.assertEqual(browser.controller.positions_written, [])
+
+    def test_the_bar_says_the_book_is_being_indexed(self):
+        browser = self.open_reader()
+        self.unindexed(browser)
+        browser.route.update(_indexing=True, _index_progress=40)
+        nodes, _handlers = build_scene(browser)
+        self.assertTrue(any("40%" in str(node.get("text", ""))
+                            for node in nodes), "no indexing progress shown")
+
+
+class TestRenderAhead(ReaderHarness):
+    """A page turn is a swap to a bitmap drawn while the last one was read."""
+
+    def test_the_next_page_is_drawn_before_it_is_turned_to(self):
+        browser = self.open_reader()
+        build_scene(browser)
+        doc = self.doc(browser)
+        ahead = browser.route["_ahead"]
+        self.assertEqual(len(ahead), 2, "next page and next chapter")
+        browser._on_claimed_key("RIGHT")
+        with mock.patch.object(doc, "render_keyed",
+                               wraps=doc.render_keyed) as render:
+            nodes, _handlers = build_scene(browser)
+        render.assert_not_called()
+        self.assertTrue(any(node["t"] in ("img", "imgmap") for node in nodes))
+        self.assertEqual(doc.page_number, 1)
+
+    def test_turning_back_shows_the_page_just_left(self):
+        browser = self.open_reader()
+        build_scene(browser)
+        doc = self.doc(browser)
+        browser._on_claimed_key("RIGHT")
+        build_scene(browser)
+        browser._on_claimed_key("LEFT")
+        with mock.patch.object(doc, "render_keyed") as render, \
+                mock.patch.object(doc, "render_at",
+                                  wraps=doc.render_at) as ahead:
+            build_scene(browser)
+        render.assert_not_called()
+        # Page 1 is still held from before; only what is new is drawn.
+        self.assertNotIn((0, 1), [c.args[:2] for c in ahead.call_args_list])
+
+    def test_what_is_held_stays_within_the_budget(self):
+        browser = self.open_reader()
+        target = "jellyfin_mpv_shim.mpvtk_browser.pages.reader.AHEAD_BYTES"
+        with mock.patch(target, 1):
+            build_scene(browser)
+            self.assertEqual(browser.route.get("_ahead") or {}, {})
+        entry = browser.route["_entry"]
+        two_pages = entry["iw"] * entry["ih"] * 4 * 2
+        with mock.patch(target, two_pages):
+            for _i in range(6):
+                browser._on_claimed_key("RIGHT")
+                build_scene(browser)
+                self.assertLessEqual(len(browser.route["_ahead"]), 2)
+
+    def test_a_new_type_size_forgets_the_pages_drawn_at_the_old_one(self):
+        browser = self.open_reader()
+        _nodes, handlers = build_scene(browser)
+        before = set(browser.route["_ahead"])
+        handlers["rd-bigger"]["click"]()
+        build_scene(browser)
+        self.assertFalse(before & set(browser.route["_ahead"]))
+
+
 class TestHeadless(ReaderHarness):
     def test_a_cast_target_cannot_reach_the_reader(self):
         """``headless`` means the library is unreachable from this machine,
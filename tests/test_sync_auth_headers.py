@@ -14,8 +14,9 @@ tiles silently absent. That is the case the enumeration below is really for.
 
 So the important test here is not any single site -- it is
 ``TestEveryCallSiteIsCovered``, which reads the module's AST and fails on a
-``requests.*`` call that does not pass ``headers=``. A new download helper
-gets this wrong by default; this makes "by default" fail.
+request that does not pass ``headers=`` -- a ``requests.*`` verb, or the
+pooled ``self._http`` the module's calls now go through. A new download
+helper gets this wrong by default; this makes "by default" fail.
 """
 
 import ast
@@ -28,6 +29,11 @@ from jellyfin_mpv_shim.sync import manager as sync_manager
 from jellyfin_mpv_shim.sync.manager import SyncManager, _same_origin
 
 SERVER = "https://srv.example:8920"
+
+#: What counts as issuing a request. ``requests.Session()`` and the adapter
+#: that pools it are calls on ``requests`` too, and send nothing.
+VERBS = {"get", "post", "put", "patch", "delete", "head", "options",
+         "request"}
 TOKEN_HEADER = 'MediaBrowser Client="Shim", DeviceId="d", Token="REALTOKEN"'
 
 
@@ -92,11 +98,12 @@ class TestTheMediaDownloadCarriesIt(unittest.TestCase):
 
     def setUp(self):
         # __new__, not __init__: the real one opens the catalog db and starts
-        # a worker thread, and none of that is what this is about. The two
+        # a worker thread, and none of that is what this is about. The
         # attributes the streaming loop reads are set by hand.
         self.mgr = SyncManager.__new__(SyncManager)
         self.mgr._cancelled = set()
         self.mgr._stop = False
+        self.mgr._http = sync_manager._Sessions()
         self.client = _Client()
 
     def _run(self, tmp, resume=0):
@@ -123,7 +130,7 @@ class TestTheMediaDownloadCarriesIt(unittest.TestCase):
             seen["headers"] = kw.get("headers")
             return _Resp()
 
-        with mock.patch.object(sync_manager.requests, "get", fake_get):
+        with mock.patch.object(self.mgr._http, "get", fake_get):
             self.mgr._stream_request(
                 SERVER + "/Items/x/Download", tmp, "x", "name", 4, resume,
                 lambda: False,
@@ -165,11 +172,16 @@ class TestEveryCallSiteIsCovered(unittest.TestCase):
             if not isinstance(node, ast.Call):
                 continue
             fn = node.func
+            if not (isinstance(fn, ast.Attribute) and fn.attr in VERBS):
+                continue
             # requests.get / requests.post / ...
-            if (isinstance(fn, ast.Attribute)
-                    and isinstance(fn.value, ast.Name)
-                    and fn.value.id == "requests"):
+            if isinstance(fn.value, ast.Name) and fn.value.id == "requests":
                 out.append((node.lineno, "requests." + fn.attr, node))
+            # self._http.get -- the pooled sessions, which is where every
+            # request went once connections were kept alive
+            elif (isinstance(fn.value, ast.Attribute)
+                    and fn.value.attr == "_http"):
+                out.append((node.lineno, "_http." + fn.attr, node))
         return out
 
     def test_there_are_call_sites_to_check(self):
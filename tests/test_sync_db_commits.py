@@ -0,0 +1,153 @@
+"""Grouped commits in the offline catalog: writes apply at once for this
+process, reach other connections when their group commits, and the state
+transitions a crash must not undo commit before they return."""
+
+import sqlite3
+import time
+import unittest
+from unittest import mock
+
+from jellyfin_mpv_shim.sync import db as db_module
+from jellyfin_mpv_shim.sync.db import (SyncDB, STATUS_COMPLETE,
+                                       STATUS_PENDING)
+
+from tests.test_sync_manager import TmpTest, add_row, make_manager
+
+
+class _CommitFails:
+    """A catalog connection whose commit fails, as on a full disk. The
+    sqlite3 connection's own methods cannot be patched."""
+
+    def __init__(self, conn):
+        self._real = conn
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
+
+    def commit(self):
+        raise sqlite3.OperationalError("database or disk is full")
+
+
+class GroupedCommitTest(TmpTest):
+    def setUp(self):
+        super().setUp()
+        # Long enough that no test here races the timer by accident.
+        patch = mock.patch.object(db_module, "COMMIT_INTERVAL", 30)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.m = make_manager(self.tmp, self.addCleanup)
+        self.db = self.m.db
+        add_row(self.m, "a")
+        add_row(self.m, "b")
+        self.db.flush()
+        self.reader = SyncDB(self.db.path, read_only=True)
+        self.addCleanup(self.reader.close)
+
+    def _seen(self, item_id):
+        return self.reader.get(item_id)
+
+    def test_progress_is_grouped(self):
+        before = len(self.db._commits)
+        for n in range(1, 50):
+            self.db.update("a", downloaded_bytes=n)
+        # This process reads its own writes...
+        self.assertEqual(self.db.get("a")["downloaded_bytes"], 49)
+        # ...another connection waits for the commit, and there is one.
+        self.assertEqual(self._seen("a")["downloaded_bytes"], 0)
+        self.db.flush()
+        self.assertEqual(self._seen("a")["downloaded_bytes"], 49)
+        self.assertEqual(len(self.db._commits) - before, 1)
+
+    def test_the_timer_commits_the_group(self):
+        with mock.patch.object(db_module, "COMMIT_INTERVAL", 0.05):
+            self.db.update("a", downloaded_bytes=7)
+            deadline = time.monotonic() + 5
+            while (self._seen("a")["downloaded_bytes"] != 7
+                   and time.monotonic() < deadline):
+                time.sleep(0.01)
+        self.assertEqual(self._seen("a")["downloaded_bytes"], 7)
+
+    def test_completion_and_delete_are_durable(self):
+        self.db.update("b", downloaded_bytes=3)
+        self.db.update("a", status=STATUS_COMPLETE)
+        self.assertEqual(self._seen("a")["status"], STATUS_COMPLETE)
+        # A durability point commits the group it closes, too.
+        self.assertEqual(self._seen("b")["downloaded_bytes"], 3)
+        self.db.delete("b")
+        self.assertIsNone(self._seen("b"))
+
+    def test_a_pending_transition_is_grouped(self):
+        self.db.update("a", status=STATUS_COMPLETE)
+        self.db.update("a", status=STATUS_PENDING)
+        self.assertEqual(self._seen("a")["status"], STATUS_COMPLETE)
+
+    def test_a_failed_write_undoes_only_itself(self):
+        self.db.update("a", downloaded_bytes=5)
+        with self.assertRaises(sqlite3.OperationalError):
+            self.db.update("b", no_such_column=1)
+        self.db.flush()
+        self.assertEqual(self._seen("a")["downloaded_bytes"], 5)
+
+    def _fail_commits(self):
+        real = self.db._conn
+        self.db._conn = _CommitFails(real)
+        self.addCleanup(setattr, self.db, "_conn", real)
+
+    def test_a_durable_write_whose_commit_fails_raises(self):
+        """Its caller is about to promote the file on the strength of it."""
+        self._fail_commits()
+        with self.assertLogs("sync.db", "ERROR"), \
+                self.assertRaises(sqlite3.OperationalError):
+            self.db.update("a", status=STATUS_COMPLETE)
+        self.assertEqual(self.db.get("a")["status"], STATUS_PENDING)
+
+    def test_a_flush_whose_commit_fails_raises(self):
+        self.db.update("a", downloaded_bytes=5)
+        self._fail_commits()
+        with self.assertLogs("sync.db", "ERROR"), \
+                self.assertRaises(sqlite3.OperationalError):
+            self.db.flush()
+        self.assertEqual(self.db.get("a")["downloaded_bytes"], 0)
+
+    def test_the_timer_logs_a_failed_commit(self):
+        """Nobody is waiting on it to raise to."""
+        self.db.update("a", downloaded_bytes=5)
+        self._fail_commits()
+        with self.assertLogs("sync.db", "ERROR"):
+            self.db._flush_on_timer()
+
+    def test_a_change_push_commits_first(self):
+        seen = []
+        self.m.on_change = lambda: seen.append(
+            self._seen("a")["downloaded_bytes"])
+        self.db.update("a", downloaded_bytes=9)
+        self.m._notify_change()
+        self.assertEqual(seen, [9])
+
+    def test_close_commits(self):
+        self.db.update("a", downloaded_bytes=11)
+        self.db.close()
+        self.assertEqual(self._seen("a")["downloaded_bytes"], 11)
+
+    def test_the_catalog_stays_in_wal_mode(self):
+        mode = self.db._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    def test_the_commit_rate(self):
+        self.db._commits.clear()
+        for n in range(3):
+            self.db.update("a", downloaded_bytes=n)
+            self.db.flush()
+        self.assertAlmostEqual(self.db.commit_rate(),
+                               3 / db_module.COMMIT_WINDOW)
+        self.assertEqual(self.m.state()["commits_per_sec"],
+                         self.db.commit_rate())
+
+    def test_the_state_has_the_same_keys_without_a_catalog(self):
+        keys = set(self.m.state())
+        with mock.patch.object(self.m, "db", None):
+            self.assertEqual(set(self.m.state()), keys)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -225,7 +225,7 @@ class DownloadCommitTest(TmpTest):
 
         m._stream = fake_stream
         m._download(m.db.get("a"))
-        self.assertIsNone(m._active_item)
+        self.assertNotIn("a", m._active)
         self.assertNotIn("a", m._cancelled)
 
 
@@ -240,12 +240,8 @@ class StreamResumeTest(TmpTest):
         def boom(*a, **k):
             raise AssertionError("must not hit the network for a full .part")
 
-        orig = manager_module.requests.get
-        manager_module.requests.get = boom
-        try:
-            size, total = m._stream("url", dest, "a", "a", 100)
-        finally:
-            manager_module.requests.get = orig
+        m._http.get = boom
+        size, total = m._stream("url", dest, "a", "a", 100)
         self.assertEqual((size, total), (100, 100))
 
     def test_416_restart_from_scratch(self):
@@ -267,12 +263,8 @@ class StreamResumeTest(TmpTest):
             calls.append(kwargs.get("headers") or {})
             return responses.pop(0)
 
-        orig = manager_module.requests.get
-        manager_module.requests.get = fake_get
-        try:
-            size, total = m._stream("url", dest, "a", "a", 0)
-        finally:
-            manager_module.requests.get = orig
+        m._http.get = fake_get
+        size, total = m._stream("url", dest, "a", "a", 0)
         self.assertEqual(size, 100)
         # Second request must be a full (Range-less) restart.
         self.assertEqual(calls[1], {})
@@ -293,12 +285,8 @@ class StreamResumeTest(TmpTest):
             seen.update(kwargs.get("headers") or {})
             return resp
 
-        orig = manager_module.requests.get
-        manager_module.requests.get = fake_get
-        try:
-            size, total = m._stream("url", dest, "a", "a", 100)
-        finally:
-            manager_module.requests.get = orig
+        m._http.get = fake_get
+        size, total = m._stream("url", dest, "a", "a", 100)
         self.assertEqual(seen.get("Range"), "bytes=40-")
         self.assertEqual(size, 100)
         self.assertEqual(total, 100)
@@ -389,14 +377,14 @@ class RelocateTest(TmpTest):
 
     def test_refuse_while_download_active(self):
         m = make_manager(self.tmp, self.addCleanup)
-        m._active_item = "busy"
+        m._active.add("busy")
         ok, msg = m.relocate(os.path.join(self.tmp, "elsewhere"))
         self.assertFalse(ok)
         self.assertIn("in progress", msg)
         self.assertEqual(m.root, self.tmp)  # unchanged
 
     def test_refuse_when_the_worker_will_not_stop(self):
-        """The _active_item check is sampled BEFORE stop(), and the chunk loop
+        """The _active check is sampled BEFORE stop(), and the chunk loop
         only notices _stop between chunks — a stalled connection parks it in a
         socket read for up to the 60s read timeout, well past
         STOP_JOIN_TIMEOUT. stop() used to log a warning and let the move
@@ -1158,6 +1146,69 @@ class BookEstimateTest(TmpTest):
         self.assertFalse(est["audio_only"])
 
 
+class SharedArtTest(TmpTest):
+    """Two episodes of one series fetch its poster together: each finds it
+    missing, each writes it. Neither may leave it half written."""
+
+    class _Resp:
+        def __init__(self, content):
+            self.content = content
+
+        def raise_for_status(self):
+            pass
+
+    class _Jellyfin:
+        def artwork(self, item_id, art, width, include_apikey=True):
+            return "http://example/Items/%s/Images/%s" % (item_id, art)
+
+    def test_a_poster_is_never_seen_half_written(self):
+        from unittest import mock
+        m = SyncManager()
+        m.root = self.tmp
+        client = FakeClient()
+        client.jellyfin = self._Jellyfin()
+        body = b"P" * 4096
+        m._http = mock.Mock()
+        m._http.get.side_effect = lambda url, **kw: self._Resp(body)
+        poster = os.path.join(self.tmp, "srv", "series", "s1", "poster.jpg")
+        # The first writer stops just before its file lands; the second
+        # runs whole while it waits.
+        paused, resume = threading.Event(), threading.Event()
+        real_replace = os.replace
+        seen = []
+
+        def replace(src, dst):
+            if not paused.is_set() and dst == poster:
+                seen.append(os.path.exists(poster))
+                paused.set()
+                resume.wait(5)
+            return real_replace(src, dst)
+
+        with mock.patch.object(manager_module.os, "replace", replace):
+            first = threading.Thread(
+                target=SyncManager._download_series_art,
+                args=(m, client, "srv", "s1"))
+            first.start()
+            self.assertTrue(paused.wait(5), "the poster was written in place")
+            SyncManager._download_series_art(m, client, "srv", "s1")
+            resume.set()
+            first.join(5)
+        self.assertEqual(seen, [False])
+        with open(poster, "rb") as fh:
+            self.assertEqual(fh.read(), body)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(poster))),
+                         ["backdrop.jpg", "poster.jpg"])
+
+    def test_a_failed_write_leaves_no_staging_file(self):
+        from unittest import mock
+        path = os.path.join(self.tmp, "poster.jpg")
+        with mock.patch.object(manager_module.os, "replace",
+                               side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                manager_module._write_image(path, b"P")
+        self.assertEqual(os.listdir(self.tmp), [])
+
+
 def _fake_stream(body, served=None):
     """A ``_stream`` that writes ``body`` and reports ``served`` as the
     response headers.
@@ -0,0 +1,144 @@
+"""Every read the catalog makes is answered from an index.
+
+Runs each SyncDB read against a populated catalog, collects the SQL it
+actually executed, and asks SQLite for the plan of each statement. Every
+step on ``downloads`` must SEARCH it through an index. A scan of the table
+pages through every row's JSON (see SyncDB._INDEXES), and a scan of an
+index still visits every row, so either fails here, naming the statement.
+The only exceptions are the reads in WHOLE_CATALOG, which want every row
+and name the index they may walk to get them.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from jellyfin_mpv_shim.sync.db import (SyncDB, STATUS_COMPLETE, STATUS_ERROR,
+                                       STATUS_PENDING, ORIGIN_USER,
+                                       ORIGIN_AUTO_NEXT_UP)
+
+
+#: The reads that have to visit every row, by the start of their statement:
+#: the index each may walk instead of the table, and why a whole pass is
+#: the read. Walking an index is still a scan of every row, so a statement
+#: is only allowed one here by name; every other read must SEARCH.
+WHOLE_CATALOG = {
+    "SELECT * FROM downloads ORDER BY": (
+        "idx_downloads_order",
+        "list(): every row, in the display order the index is kept in"),
+    "SELECT COALESCE(SUM(downloaded_bytes),0) AS s FROM downloads": (
+        "idx_downloads_origin",
+        "total_size(): a sum over every row, from the narrowest index "
+        "that carries downloaded_bytes"),
+}
+
+
+def _row(n, status, origin):
+    item_id = "item%03d" % n
+    return {
+        "item_id": item_id, "server_id": "S", "server_uuid": "srv%d" % (n % 2),
+        "type": "Episode", "name": item_id, "series_id": "series%d" % (n % 5),
+        "series_name": "Show %d" % (n % 5), "season_id": "season%d" % (n % 7),
+        "parent_index": n % 3, "index_number": n, "media_source_id": "ms",
+        "file_path": "S/%s/media.mkv" % item_id, "ext": "mkv",
+        "size_bytes": 1000, "downloaded_bytes": 1000, "status": status,
+        "runtime_ticks": 1, "item_json": json.dumps({"Overview": "x" * 6000}),
+        "source_json": "{}", "userdata_json": "{}", "added_at": n,
+        "origin": origin, "completed_at": n,
+    }
+
+
+class QueryPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.db = SyncDB(os.path.join(self.tmp, "catalog.db"))
+        self.addCleanup(self.db.close)
+        statuses = (STATUS_COMPLETE, STATUS_PENDING, STATUS_ERROR)
+        origins = (ORIGIN_USER, ORIGIN_AUTO_NEXT_UP)
+        for n in range(60):
+            self.db.upsert(_row(n, statuses[n % 3], origins[n % 2]))
+        self.db.update("item000", content_hash="abc")
+        self.db.upsert_playlist("pl", "S", "srv0", "Mix")
+        self.db.replace_playlist_items("pl", [("item000", 0, True)])
+        self.db.flush()
+
+    def _reads(self):
+        db = self.db
+        db.list()
+        db.list(status=STATUS_COMPLETE)
+        db.list(status=STATUS_PENDING)
+        db.list(series_id="series1")
+        db.list(status=STATUS_COMPLETE, series_id="series1")
+        db.get("item001")
+        db.get_many(["item001", "item002"])
+        db.is_complete("item003")
+        db.downloaded_item_ids()
+        db.downloaded_series_ids()
+        db.downloaded_season_ids()
+        db.held_series("srv0")
+        db.total_size()
+        db.auto_size()
+        db.list_auto()
+        db.list_auto_incomplete()
+        db.watched_targets("series1", "srv0")
+        db.library_id("series1")
+        db.library_id("item001")
+        db.find_content("abc", exclude="item001")
+        db.list_content("abc")
+        db.next_unchecked(10 ** 10)
+        db.checked_at("abc")
+        db.list_playlists()
+        db.playlist_item_rows("pl")
+        db.playlist_owned_ids("pl")
+
+    def test_no_read_scans_the_downloads_table(self):
+        executed = []
+        self.db._conn.set_trace_callback(executed.append)
+        try:
+            self._reads()
+        finally:
+            self.db._conn.set_trace_callback(None)
+        reads = [sql for sql in executed
+                 if sql.lstrip().upper().startswith("SELECT")
+                 and "downloads" in sql]
+        self.assertGreater(len(reads), 20)
+        for sql in reads:
+            plan = [r[3] for r in
+                    self.db._conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            statement = " ".join(sql.split())
+            whole = next((index for start, (index, _why)
+                          in WHOLE_CATALOG.items()
+                          if statement.startswith(start)), None)
+            for step in plan:
+                words = step.split()
+                if len(words) < 2 or words[1] not in ("downloads", "d"):
+                    continue
+                with self.subTest(sql=statement, step=step):
+                    if words[0] == "SEARCH":
+                        self.assertIn("USING", words)
+                        continue
+                    self.assertIsNotNone(
+                        whole, "scans every row: %s\n%s" % (step, sql))
+                    self.assertEqual(words[-1], whole,
+                                     "walks another index than the one "
+                                     "listed: %s" % step)
+
+    def test_the_bare_status_index_is_dropped(self):
+        """Every status lookup it served has a wider index to go to, and
+        an index nothing reads is still one every status change writes."""
+        self.db._conn.execute(
+            "CREATE INDEX idx_downloads_status ON downloads(status)")
+        self.db.close()
+        self.db = SyncDB(os.path.join(self.tmp, "catalog.db"))
+        self.addCleanup(self.db.close)
+        names = {r[0] for r in self.db._conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertNotIn("idx_downloads_status", names)
+        self.assertIn("idx_downloads_queue", names)
+
+
+if __name__ == "__main__":
+    unittest.main()
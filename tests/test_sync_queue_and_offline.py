@@ -3,9 +3,10 @@ import logging
 import os
 import tempfile
 import unittest
+from unittest import mock
 
-from jellyfin_mpv_shim.sync.db import (COLUMNS, SyncDB, STATUS_COMPLETE,
-                                       STATUS_PENDING)
+from jellyfin_mpv_shim.sync.db import (COLUMNS, JOURNAL_KEPT, SyncDB,
+                                       STATUS_COMPLETE, STATUS_PENDING)
 from jellyfin_mpv_shim.mpvtk_browser.repository import OfflineLibrarySource
 
 
@@ -214,6 +215,11 @@ class OfflineResumePositionTest(unittest.TestCase):
 
 
 class OfflineReloadTest(unittest.TestCase):
+    """The writer commits in groups (SyncDB._group), and this reader is
+    another connection, so it sees a write once it is committed. Each test
+    flushes where SyncManager would: before the change push that makes a
+    reader look."""
+
     def setUp(self):
         self.tmp = tempfile.TemporaryDirectory()
         self.root = self.tmp.name
@@ -231,6 +237,7 @@ class OfflineReloadTest(unittest.TestCase):
     def test_reload_picks_up_new_downloads(self):
         writer = SyncDB(self.catalog)
         self._add_complete(writer, "m1", "First")
+        writer.flush()
         source = OfflineLibrarySource(self.catalog)
         self.assertEqual({i["Id"] for i in source._snap.items}, {"m1"})
 
@@ -242,6 +249,107 @@ class OfflineReloadTest(unittest.TestCase):
         titles = {r["title"] for r in source.get_home_rows("offline")}
         self.assertIn("Downloaded Movies", titles)
 
+    def test_reload_reads_only_what_changed(self):
+        writer = SyncDB(self.catalog)
+        self.addCleanup(writer.close)
+        self._add_complete(writer, "m1", "First")
+        self._add_complete(writer, "m2", "Second")
+        writer.flush()
+        source = OfflineLibrarySource(self.catalog)
+        first = {i["Id"]: i for i in source._snap.items}
+        self._add_complete(writer, "m3", "Third")
+        parsed = []
+        real = OfflineLibrarySource._item_from_row
+        writer.flush()
+        with mock.patch.object(OfflineLibrarySource, "_item_from_row",
+                               side_effect=lambda row: parsed.append(
+                                   row["item_id"]) or real(row)):
+            source.reload()
+        self.assertEqual(parsed, ["m3"])
+        items = {i["Id"]: i for i in source._snap.items}
+        self.assertEqual(set(items), {"m1", "m2", "m3"})
+        # Copy-on-write: the untouched DTOs are the old snapshot's own.
+        self.assertIs(items["m1"], first["m1"])
+
+    def test_a_quiet_catalog_keeps_the_snapshot(self):
+        """Progress is an UPDATE several times a second per transfer and
+        none of it is visible offline; it must not cost a rebuild."""
+        writer = SyncDB(self.catalog)
+        self.addCleanup(writer.close)
+        self._add_complete(writer, "m1", "First")
+        writer.upsert(make_row("p1", type="Movie", status=STATUS_PENDING))
+        writer.flush()
+        source = OfflineLibrarySource(self.catalog)
+        snap = source._snap
+        writer.update("p1", downloaded_bytes=1024)
+        writer.flush()
+        source.reload()
+        self.assertIs(source._snap, snap)
+
+    def test_a_deletion_and_a_watched_mark_arrive(self):
+        writer = SyncDB(self.catalog)
+        self.addCleanup(writer.close)
+        self._add_complete(writer, "m1", "First")
+        self._add_complete(writer, "m2", "Second")
+        writer.flush()
+        source = OfflineLibrarySource(self.catalog)
+        writer.delete("m1")
+        writer.set_watched("m2", True)
+        writer.flush()
+        source.reload()
+        (item,) = source._snap.items
+        self.assertEqual(item["Id"], "m2")
+        self.assertTrue(item["UserData"]["Played"])
+        self.assertNotIn("m1", source._snap.rows)
+
+    def test_a_playlist_change_rereads_playlists(self):
+        writer = SyncDB(self.catalog)
+        self.addCleanup(writer.close)
+        self._add_complete(writer, "m1", "First")
+        writer.flush()
+        source = OfflineLibrarySource(self.catalog)
+        self.assertEqual(source._snap.playlists, [])
+        writer.upsert_playlist("pl1", "srv", "uuid", "Mix")
+        writer.replace_playlist_items("pl1", [("m1", 0, False)])
+        writer.flush()
+        source.reload()
+        self.assertEqual([p["Id"] for p in source._snap.playlists], ["pl1"])
+
+    def test_a_trimmed_journal_reads_everything(self):
+        writer = SyncDB(self.catalog)
+        self.addCleanup(writer.close)
+        self._add_complete(writer, "m1", "First")
+        writer.flush()
+        source = OfflineLibrarySource(self.catalog)
+        for n in range(JOURNAL_KEPT + 1024):
+            writer.update("m1", name="n%d" % n)
+        self._add_complete(writer, "m2", "Second")
+        rev, changed, _pl = writer.changes_since(source._snap.rev)
+        self.assertIsNone(changed)
+        writer.flush()
+        source.reload()
+        self.assertEqual({i["Id"] for i in source._snap.items}, {"m1", "m2"})
+
+    def test_a_recreated_catalog_reads_everything(self):
+        """Its revisions start again at 1, below the snapshot's."""
+        writer = SyncDB(self.catalog)
+        for n in range(3):
+            self._add_complete(writer, "m%d" % n, "Old %d" % n)
+        writer.close()
+        source = OfflineLibrarySource(self.catalog)
+        for emptied in (False, True):
+            with self.subTest(emptied=emptied):
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(self.catalog + suffix):
+                        os.remove(self.catalog + suffix)
+                writer = SyncDB(self.catalog)
+                if not emptied:
+                    self._add_complete(writer, "new", "New")
+                writer.close()
+                source.reload()
+                self.assertEqual({i["Id"] for i in source._snap.items},
+                                 set() if emptied else {"new"})
+
     def test_missing_catalog_is_empty_not_crash(self):
         source = OfflineLibrarySource(os.path.join(self.root, "nope.db"))
         self.assertEqual(source._snap.items, [])
@@ -0,0 +1,523 @@
+"""The download scheduler: several transfers at once, capped per server, fair
+between what was asked for and what auto-download queued, under one shared
+bandwidth budget, with progress coalesced on the way out."""
+
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from jellyfin_mpv_shim.sync import manager as manager_module
+from jellyfin_mpv_shim.sync.db import (STATUS_COMPLETE, STATUS_PENDING,
+                                       ORIGIN_AUTO_NEXT_UP)
+from jellyfin_mpv_shim.sync.manager import (_Budget, _Pacer,
+                                            _in_quiet_hours)
+
+from tests.test_sync_manager import (FakeClient, TmpTest, add_row,
+                                     make_manager)
+
+
+class _Limits:
+    def limits(self, total, per_server):
+        for key, value in (("download_concurrency", total),
+                           ("download_per_server", per_server)):
+            patch = mock.patch.object(manager_module.settings, key, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+
+class NextRunnableTest(TmpTest, _Limits):
+    def setUp(self):
+        super().setUp()
+        self.limits(3, 2)
+        self.m = make_manager(self.tmp, self.addCleanup,
+                              clients={"a": FakeClient(), "b": FakeClient()})
+
+    def test_a_running_row_is_not_started_twice(self):
+        add_row(self.m, "x", server_uuid="a")
+        add_row(self.m, "y", server_uuid="a")
+        running = [self.m.db.get("x")]
+        self.assertEqual(self.m._next_runnable(running)["item_id"], "y")
+
+    def test_a_server_at_its_cap_is_skipped(self):
+        for item_id in ("x", "y", "z"):
+            add_row(self.m, item_id, server_uuid="a")
+        add_row(self.m, "w", server_uuid="b")
+        running = [self.m.db.get("x"), self.m.db.get("y")]
+        self.assertEqual(self.m._next_runnable(running)["item_id"], "w")
+
+    def test_a_server_backing_off_is_skipped(self):
+        add_row(self.m, "x", server_uuid="a")
+        add_row(self.m, "y", server_uuid="b")
+        self.m._backoff["a"] = (time.monotonic() + 60, 1)
+        self.assertEqual(self.m._next_runnable()["item_id"], "y")
+        self.m._backoff["a"] = (time.monotonic() - 1, 1)
+        self.assertEqual(self.m._next_runnable()["item_id"], "x")
+
+    def test_a_hand_queued_row_does_not_wait_behind_an_auto_batch(self):
+        for i in range(5):
+            add_row(self.m, "auto%d" % i, server_uuid="a",
+                    origin=ORIGIN_AUTO_NEXT_UP)
+        add_row(self.m, "mine", server_uuid="b")
+        running = [self.m.db.get("auto0")]
+        self.assertEqual(self.m._next_runnable(running)["item_id"], "mine")
+
+    def test_the_classes_take_turns(self):
+        for i in range(3):
+            add_row(self.m, "auto%d" % i, server_uuid="a",
+                    origin=ORIGIN_AUTO_NEXT_UP)
+            add_row(self.m, "user%d" % i, server_uuid="b")
+        # Nothing running and no history: enqueue order decides.
+        self.assertEqual(self.m._next_runnable()["item_id"], "auto0")
+        self.m._last_class = "auto"
+        self.assertEqual(self.m._next_runnable()["item_id"], "user0")
+        self.m._last_class = "user"
+        self.assertEqual(self.m._next_runnable()["item_id"], "auto0")
+
+
+class ConcurrencyTest(TmpTest, _Limits):
+    def _worker(self, m, until, timeout=5.0):
+        m._stop = False
+        t = threading.Thread(target=m._run, daemon=True)
+        t.start()
+        deadline = time.monotonic() + timeout
+        while not until() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        m._stop = True
+        m._wake.set()
+        t.join(5)
+        self.assertFalse(t.is_alive(), "worker did not stop")
+
+    def _gated(self, m):
+        """A _download that records who is in flight and parks until
+        released."""
+        state = {"now": 0, "peak": 0, "done": []}
+        release = threading.Event()
+        self.addCleanup(release.set)
+        guard = threading.Lock()
+
+        def fake_download(row, stopping=None):
+            with guard:
+                state["now"] += 1
+                state["peak"] = max(state["peak"], state["now"])
+            release.wait(5)
+            with guard:
+                state["now"] -= 1
+                state["done"].append(row["item_id"])
+            m.db.update(row["item_id"], status=STATUS_COMPLETE)
+
+        m._download = fake_download
+        return state, release
+
+    def test_a_season_downloads_several_at_once(self):
+        self.limits(3, 2)
+        m = make_manager(self.tmp, self.addCleanup)
+        for i in range(6):
+            add_row(m, "e%d" % i)
+        state, release = self._gated(m)
+        threading.Timer(0.3, release.set).start()
+        self._worker(m, lambda: len(state["done"]) == 6)
+        self.assertEqual(sorted(state["done"]), ["e%d" % i for i in range(6)])
+        # Every row is on one server, so its cap is the limit, not the total.
+        self.assertEqual(state["peak"], 2)
+
+    def test_the_total_caps_across_servers(self):
+        self.limits(3, 2)
+        clients = {"a": FakeClient(), "b": FakeClient()}
+        m = make_manager(self.tmp, self.addCleanup, clients=clients)
+        for i in range(4):
+            add_row(m, "a%d" % i, server_uuid="a")
+            add_row(m, "b%d" % i, server_uuid="b")
+        state, release = self._gated(m)
+        threading.Timer(0.3, release.set).start()
+        self._worker(m, lambda: len(state["done"]) == 8)
+        self.assertEqual(state["peak"], 3)
+
+    def test_one_at_a_time_is_still_one_at_a_time(self):
+        self.limits(1, 1)
+        m = make_manager(self.tmp, self.addCleanup)
+        for i in range(3):
+            add_row(m, "e%d" % i)
+        state, release = self._gated(m)
+        release.set()
+        self._worker(m, lambda: len(state["done"]) == 3)
+        self.assertEqual(state["peak"], 1)
+
+    def test_a_failed_transfer_backs_off_its_server_only(self):
+        self.limits(2, 1)
+        clients = {"bad": FakeClient(), "good": FakeClient()}
+        m = make_manager(self.tmp, self.addCleanup, clients=clients)
+        add_row(m, "x", server_uuid="bad")
+        add_row(m, "y", server_uuid="good")
+        add_row(m, "z", server_uuid="good")
+        done = []
+
+        def fake_download(row, stopping=None):
+            if row["server_uuid"] == "bad":
+                raise manager_module.requests.ConnectionError("reset")
+            done.append(row["item_id"])
+            m.db.update(row["item_id"], status=STATUS_COMPLETE)
+
+        m._download = fake_download
+        self._worker(m, lambda: len(done) == 2)
+        self.assertEqual(done, ["y", "z"])
+        self.assertIn("bad", m._backoff)
+        self.assertNotIn("good", m._backoff)
+        self.assertEqual(m.db.get("x")["status"], STATUS_PENDING)
+
+    def test_stop_waits_for_every_transfer(self):
+        """stop() returning True is relocate's licence to move the files,
+        so the worker must not exit with a transfer still writing."""
+        self.limits(2, 2)
+        m = make_manager(self.tmp, self.addCleanup)
+        add_row(m, "x")
+        add_row(m, "y")
+        started, finished = [], []
+
+        def fake_download(row, stopping=None):
+            started.append(row["item_id"])
+            while not stopping():
+                time.sleep(0.005)
+            time.sleep(0.05)            # the last chunk, being written
+            finished.append(row["item_id"])
+
+        m._download = fake_download
+        m._stop = False
+        m._worker = threading.Thread(target=m._run, daemon=True)
+        m._worker.start()
+        deadline = time.monotonic() + 5
+        while len(started) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(m.stop())
+        self.assertEqual(sorted(finished), ["x", "y"])
+
+
+class BudgetTest(unittest.TestCase):
+    def test_unlimited_never_waits(self):
+        budget = _Budget(lambda: 0)
+        self.assertEqual(budget.take(1 << 30), 0.0)
+
+    def test_the_debt_is_shared(self):
+        """Two transfers charging one bucket each wait for both."""
+        budget = _Budget(lambda: 1000)
+        with mock.patch.object(manager_module.time, "monotonic",
+                               return_value=100.0):
+            budget._stamp = 100.0
+            first = budget.take(1000)
+            second = budget.take(1000)
+        self.assertAlmostEqual(first, 1.0)
+        self.assertAlmostEqual(second, 2.0)
+
+    def test_idle_time_banks_at_most_a_second(self):
+        budget = _Budget(lambda: 1000)
+        now = [0.0]
+        with mock.patch.object(manager_module.time, "monotonic",
+                               side_effect=lambda: now[0]):
+            budget._stamp = 0.0
+            now[0] = 3600.0
+            self.assertEqual(budget.take(1000), 0.0)
+            self.assertAlmostEqual(budget.take(1000), 1.0)
+
+    def test_a_throttled_transfer_still_stops(self):
+        m = manager_module.SyncManager()
+        m._budget = _Budget(lambda: 1)
+        stop = threading.Event()
+        threading.Timer(0.1, stop.set).start()
+        began = time.monotonic()
+        with self.assertRaises(manager_module._Stopped):
+            m._throttle(1 << 20, "x", stop.is_set)
+        self.assertLess(time.monotonic() - began, 2)
+
+
+class PacerTest(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch.object(manager_module.settings,
+                                  "download_adaptive", True)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.ahead = [None]
+        self.pacer = _Pacer(lambda: self.ahead[0])
+
+    def _look(self, seen):
+        self.pacer._adjust(seen)
+        return self.pacer.limit
+
+    def test_nothing_streaming_is_no_limit(self):
+        self.assertIsNone(self._look(1 << 20))
+        self.assertEqual(self.pacer.cap(0), 0)
+        self.assertEqual(self.pacer.cap(5000), 5000)
+
+    def test_a_starving_stream_halves_what_the_downloads_got(self):
+        self.ahead[0] = 2.0
+        self.assertEqual(self._look(8 << 20), 4 << 20)
+        self.assertEqual(self._look(4 << 20), 2 << 20)
+        # Under a configured cap the lower of the two applies.
+        self.assertEqual(self.pacer.cap(1 << 20), 1 << 20)
+        self.assertEqual(self.pacer.cap(0), 2 << 20)
+
+    def test_it_never_stops_them(self):
+        self.ahead[0] = 0.0
+        for _ in range(40):
+            self._look(1 << 20)
+        self.assertEqual(self.pacer.limit, manager_module.ADAPT_FLOOR)
+
+    def test_a_recovering_stream_lets_them_back_up(self):
+        self.ahead[0] = 2.0
+        self._look(8 << 20)
+        self.ahead[0] = 20.0               # between the marks: hold
+        self.assertEqual(self._look(4 << 20), 4 << 20)
+        self.ahead[0] = 60.0
+        self.assertEqual(self._look(4 << 20), 5 << 20)
+        # A limit twice what they get is not binding any more.
+        self.assertIsNone(self._look(2 << 20))
+
+    def test_the_setting_turns_it_off(self):
+        self.ahead[0] = 0.0
+        with mock.patch.object(manager_module.settings,
+                               "download_adaptive", False):
+            self.assertIsNone(self._look(1 << 20))
+
+    def test_a_failing_player_is_no_limit(self):
+        def broken():
+            raise RuntimeError("mpv went away")
+
+        pacer = _Pacer(broken)
+        pacer._adjust(1 << 20)
+        self.assertIsNone(pacer.limit)
+
+    def test_the_budget_reads_it(self):
+        m = manager_module.SyncManager()
+        m.stream_health = lambda: 0.0
+        m._pacer._adjust(1 << 20)
+        with mock.patch.object(manager_module.settings,
+                               "download_max_kbps", 0):
+            self.assertGreater(m._budget.take(4 << 20), 0)
+
+
+class QuietHoursTest(TmpTest, _Limits):
+    def test_windows(self):
+        self.assertTrue(_in_quiet_hours("09:00-17:00", 9 * 60))
+        self.assertFalse(_in_quiet_hours("09:00-17:00", 17 * 60))
+        self.assertTrue(_in_quiet_hours("23:00-07:00", 2 * 60))
+        self.assertTrue(_in_quiet_hours("23:00-07:00", 23 * 60 + 30))
+        self.assertFalse(_in_quiet_hours("23:00-07:00", 12 * 60))
+        self.assertTrue(_in_quiet_hours("1:00-2:00, 12:00-13:00", 12 * 60))
+        self.assertFalse(_in_quiet_hours("08:00-08:00", 8 * 60))
+
+    def test_a_typo_is_ignored_not_guessed(self):
+        with self.assertLogs("sync.manager", "WARNING"):
+            self.assertFalse(_in_quiet_hours("25:00-26:00, nonsense", 60))
+
+    def test_the_setting_is_parsed_once_per_value(self):
+        """Asked on every chunk; parsed when the setting changes."""
+        with mock.patch.object(manager_module, "_quiet_windows",
+                               wraps=manager_module._quiet_windows) as parse:
+            for _chunk in range(50):
+                _in_quiet_hours("03:17-03:18", 60)
+            self.assertEqual(parse.call_count, 1)
+            self.assertTrue(_in_quiet_hours("00:30-01:30", 60))
+            self.assertEqual(parse.call_count, 2)
+
+    def _quiet(self, on):
+        patch = mock.patch.object(manager_module, "_quiet_now",
+                                  lambda: on)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_nothing_starts_during_them(self):
+        self.limits(2, 2)
+        self._quiet(True)
+        m = make_manager(self.tmp, self.addCleanup)
+        add_row(m, "x")
+        started = []
+        m._download = lambda row, stopping=None: started.append(row)
+        m.auto = mock.Mock()
+        m._stop = False
+        t = threading.Thread(target=m._run, daemon=True)
+        t.start()
+        time.sleep(0.2)
+        m._stop = True
+        m._wake.set()
+        t.join(5)
+        self.assertEqual(started, [])
+        m.auto.tick.assert_not_called()
+
+    def test_a_running_transfer_is_held_and_kept(self):
+        m = make_manager(self.tmp, self.addCleanup)
+        add_row(m, "x", size_bytes=4)
+        self._quiet(True)
+        with self.assertRaises(manager_module._Held):
+            m._throttle(1, "x", lambda: False)
+        parts = []
+
+        def held_stream(url, dest, item_id, name, expected, stopping=None,
+                        headers=None, on_headers=None):
+            parts.append(dest + ".part")
+            with open(parts[0], "wb") as fh:
+                fh.write(b"da")
+            m._throttle(2, item_id, stopping)
+
+        m._stream = held_stream
+        m._download(m.db.get("x"))
+        self.assertEqual(m.db.get("x")["status"], STATUS_PENDING)
+        self.assertTrue(os.path.exists(parts[0]), "the .part was dropped")
+
+
+class ProgressTest(unittest.TestCase):
+    def test_pushes_are_coalesced_to_the_latest_per_item(self):
+        m = manager_module.SyncManager()
+        pushed = []
+        m.on_progress = lambda *a: pushed.append(a)
+        now = [10.0]
+        with mock.patch.object(manager_module.time, "monotonic",
+                               side_effect=lambda: now[0]):
+            m._push_progress("a", "A", 1, 10)     # first: goes out
+            m._push_progress("a", "A", 2, 10)
+            m._push_progress("b", "B", 5, 50)
+            m._push_progress("a", "A", 3, 10)
+            self.assertEqual(pushed, [("a", "A", 1, 10)])
+            now[0] += manager_module.PROGRESS_INTERVAL
+            m._push_progress("b", "B", 6, 50)
+        self.assertEqual(pushed[1:], [("a", "A", 3, 10), ("b", "B", 6, 50)])
+
+
+
+class SessionTest(unittest.TestCase):
+    def test_one_pooled_session_per_origin(self):
+        http = manager_module._Sessions()
+        self.addCleanup(http.close)
+        a = http._session("https://srv:8920/Items/1/Download")
+        self.assertIs(a, http._session("https://srv:8920/Items/2/Images"))
+        self.assertIsNot(a, http._session("http://srv:8920/Items/1"))
+        self.assertIsNot(a, http._session("https://cdn.example/sub.srt"))
+        adapter = a.get_adapter("https://srv:8920/")
+        self.assertFalse(adapter._pool_block)
+        self.assertGreaterEqual(adapter._pool_maxsize,
+                                manager_module.SIDE_WORKERS + 1)
+
+    def test_close_starts_a_fresh_pool(self):
+        http = manager_module._Sessions()
+        before = http._session("https://srv/")
+        http.close()
+        self.assertIsNot(before, http._session("https://srv/"))
+        http.close()
+
+
+class SideAssetTest(TmpTest):
+    def test_side_assets_fetch_while_the_media_streams(self):
+        m = make_manager(self.tmp, self.addCleanup)
+        add_row(m, "a", size_bytes=4)
+        art_started = threading.Event()
+        art_done = []
+
+        def artwork(client, item, item_dir):
+            art_started.set()
+            time.sleep(0.05)
+            art_done.append(item["Id"])
+
+        def fake_stream(url, dest, item_id, name, expected, stopping=None,
+                        headers=None, on_headers=None):
+            # The poster is fetched before the first byte arrives here,
+            # not after the last one.
+            self.assertTrue(art_started.wait(5))
+            with open(dest + ".part", "wb") as fh:
+                fh.write(b"data")
+            return 4, 4
+
+        m._download_artwork = artwork
+        m._stream = fake_stream
+        m._download(m.db.get("a"))
+        # ...and the item is not complete until the side fetches are.
+        self.assertEqual(art_done, ["a"])
+        self.assertEqual(m.db.get("a")["status"], STATUS_COMPLETE)
+
+    def test_a_failed_side_fetch_does_not_fail_the_download(self):
+        m = make_manager(self.tmp, self.addCleanup)
+        add_row(m, "a", size_bytes=4)
+
+        def artwork(*a, **k):
+            raise OSError("disk hiccup")
+
+        def fake_stream(url, dest, item_id, name, expected, stopping=None,
+                        headers=None, on_headers=None):
+            with open(dest + ".part", "wb") as fh:
+                fh.write(b"data")
+            return 4, 4
+
+        m._download_artwork = artwork
+        m._stream = fake_stream
+        m._download(m.db.get("a"))
+        self.assertEqual(m.db.get("a")["status"], STATUS_COMPLETE)
+
+
+class _PlaystateApi:
+    """A server for the playstate replay: userdata in bulk through /Items,
+    per item through the legacy read, and every write recorded."""
+
+    def __init__(self, userdata, bulk=True):
+        self.userdata = userdata
+        self.bulk = bulk
+        self.reads = []
+        self.written = []
+
+    def items(self, params=None):
+        if not self.bulk:
+            raise RuntimeError("no bulk read here")
+        ids = params["Ids"].split(",")
+        self.reads.append(("bulk", ids))
+        return {"Items": [{"Id": i, "UserData": self.userdata[i]}
+                          for i in ids if i in self.userdata]}
+
+    def get_userdata_for_item(self, item_id):
+        self.reads.append(("one", item_id))
+        return self.userdata.get(item_id, {})
+
+    def update_userdata_for_item(self, item_id, update):
+        self.written.append((item_id, update))
+
+
+class PlaystateReplayTest(TmpTest):
+    def setUp(self):
+        super().setUp()
+        self.api = _PlaystateApi({"a": {"PlaybackPositionTicks": 50},
+                                  "b": {"Played": True},
+                                  "c": {"PlaybackPositionTicks": 0}})
+        client = FakeClient()
+        client.jellyfin = self.api
+        self.m = make_manager(self.tmp, self.addCleanup,
+                              clients={"uuid": client})
+        for item_id in ("a", "b", "c"):
+            self.m.db.upsert_playstate("uuid", item_id, position_ticks=100,
+                                       played=item_id == "b")
+
+    def test_one_read_answers_every_pending_item(self):
+        self.m._sync_playstate()
+        self.assertEqual(self.api.reads, [("bulk", ["a", "b", "c"])])
+        self.assertEqual(sorted(self.api.written), [
+            ("a", {"PlaybackPositionTicks": 100}),
+            ("b", {"PlaybackPositionTicks": 100}),
+            ("c", {"PlaybackPositionTicks": 100})])
+        self.assertEqual(self.m.db.list_playstate(), [])
+
+    def test_reads_are_batched(self):
+        with mock.patch.object(manager_module, "PLAYSTATE_BATCH", 2):
+            self.m._sync_playstate()
+        self.assertEqual([r[1] for r in self.api.reads],
+                         [["a", "b"], ["c"]])
+
+    def test_what_the_bulk_read_misses_is_asked_for_alone(self):
+        self.api.bulk = False
+        self.m._sync_playstate()
+        self.assertEqual(sorted(self.api.reads),
+                         [("one", "a"), ("one", "b"), ("one", "c")])
+        self.assertEqual(self.m.db.list_playstate(), [])
+
+    def test_an_unreachable_server_keeps_its_rows(self):
+        self.m.get_client = lambda uuid: None
+        self.m._sync_playstate()
+        self.assertEqual(len(self.m.db.list_playstate()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
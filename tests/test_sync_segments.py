@@ -0,0 +1,235 @@
+"""Segmented downloads: one large file fetched as several byte ranges into a
+preallocated .part, resumable from its segment map, and handed back to the
+single stream whenever the server will not serve the ranges as asked."""
+
+import json
+import os
+import re
+import threading
+import unittest
+from unittest import mock
+
+from jellyfin_mpv_shim.sync import manager as manager_module
+from jellyfin_mpv_shim.sync.manager import SEGMENTS_SUFFIX, _segment_plan
+
+from tests.test_sync_manager import FakeResp, TmpTest, make_manager
+
+BODY = bytes(range(256)) * 40          # 10240 bytes
+
+
+class _Crash(BaseException):
+    """The process dying: nothing after it runs, no handler catches it."""
+
+
+class _Server:
+    """requests.get over BODY, honouring Range unless told otherwise."""
+
+    def __init__(self, body=BODY, ranges=True, total=None, cut=None):
+        self.body = body
+        self.ranges = ranges
+        self.total = total if total is not None else len(body)
+        #: A range answered with only this many bytes, then a clean close.
+        self.cut = cut
+        self.asked = []
+        self.guard = threading.Lock()
+
+    def get(self, url, stream=True, headers=None, verify=True, timeout=None):
+        want = (headers or {}).get("Range")
+        with self.guard:
+            self.asked.append(want)
+        if not want or not self.ranges:
+            return FakeResp(200, {"Content-Length": str(len(self.body))},
+                            self.body)
+        first, last = re.match(r"bytes=(\d+)-(\d*)", want).groups()
+        first = int(first)
+        last = int(last) if last else len(self.body) - 1
+        part = self.body[first:last + 1]
+        headers = {"Content-Length": str(len(part)),
+                   "Content-Range": "bytes %d-%d/%d" % (first, last,
+                                                        self.total)}
+        if self.cut is not None:
+            part = part[:self.cut]
+        return FakeResp(206, headers, part)
+
+
+class SegmentedTest(TmpTest):
+    def setUp(self):
+        super().setUp()
+        for key, value in (("download_segments", 4),
+                           ("download_segment_min_mb", 0)):
+            patch = mock.patch.object(manager_module.settings, key, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+        chunk = mock.patch.object(manager_module, "CHUNK", 512)
+        chunk.start()
+        self.addCleanup(chunk.stop)
+        self.m = make_manager(self.tmp, self.addCleanup)
+        self.dest = os.path.join(self.tmp, "media.mkv")
+        self.part = self.dest + ".part"
+
+    def _stream(self, server, expected=len(BODY), stopping=None):
+        with mock.patch.object(self.m._http, "get", server.get):
+            return self.m._stream("http://example/d", self.dest, "a", "A",
+                                  expected, stopping=stopping)
+
+    def test_the_ranges_assemble_the_file(self):
+        server = _Server()
+        self.assertEqual(self._stream(server), (len(BODY), len(BODY)))
+        with open(self.part, "rb") as fh:
+            self.assertEqual(fh.read(), BODY)
+        self.assertEqual(len(server.asked), 4)
+        self.assertFalse(os.path.exists(self.part + SEGMENTS_SUFFIX))
+
+    def test_a_resume_asks_only_for_what_is_missing(self):
+        plan = _segment_plan(len(BODY), 2)
+        plan[0][2] = 1000
+        with open(self.part, "wb") as fh:
+            fh.truncate(len(BODY))
+            fh.write(BODY[:1000])
+        with open(self.part + SEGMENTS_SUFFIX, "w") as fh:
+            json.dump({"size": len(BODY), "segments": plan}, fh)
+        server = _Server()
+        self._stream(server)
+        self.assertEqual(sorted(server.asked),
+                         ["bytes=1000-5119", "bytes=5120-10239"])
+        with open(self.part, "rb") as fh:
+            self.assertEqual(fh.read(), BODY)
+
+    def test_a_server_that_ignores_range_gets_one_stream(self):
+        server = _Server(ranges=False)
+        self.assertEqual(self._stream(server), (len(BODY), len(BODY)))
+        with open(self.part, "rb") as fh:
+            self.assertEqual(fh.read(), BODY)
+        self.assertIsNone(server.asked[-1])
+        self.assertFalse(os.path.exists(self.part + SEGMENTS_SUFFIX))
+
+    def test_a_file_of_another_size_gets_one_stream(self):
+        """The server's copy changed under the plan: nothing the ranges
+        wrote can be trusted, so the single stream starts from zero."""
+        server = _Server(total=len(BODY) + 1)
+        self._stream(server)
+        self.assertIsNone(server.asked[-1])
+        with open(self.part, "rb") as fh:
+            self.assertEqual(fh.read(), BODY)
+
+    def test_a_short_range_is_a_short_read_and_keeps_its_map(self):
+        server = _Server(cut=100)
+        downloaded, total = self._stream(server)
+        self.assertEqual((downloaded, total), (400, len(BODY)))
+        with open(self.part + SEGMENTS_SUFFIX) as fh:
+            saved = json.load(fh)
+        self.assertEqual([seg[2] for seg in saved["segments"]],
+                         [100, 100, 100, 100])
+        # And the next pass carries on from the map, not from the .part's
+        # length -- which is the full size, and would read as complete.
+        server = _Server()
+        self.assertEqual(self._stream(server), (len(BODY), len(BODY)))
+        self.assertTrue(all(r.split("-")[0] != "bytes=0"
+                            for r in server.asked))
+        with open(self.part, "rb") as fh:
+            self.assertEqual(fh.read(), BODY)
+
+    def test_stop_keeps_the_map(self):
+        calls = []
+
+        def stopping():
+            calls.append(1)
+            return len(calls) > 6
+
+        with self.assertRaises(manager_module._Stopped):
+            self._stream(_Server(), stopping=stopping)
+        self.assertTrue(os.path.exists(self.part + SEGMENTS_SUFFIX))
+
+    def test_a_crash_before_the_map_lands_leaves_no_full_size_part(self):
+        """A preallocated .part without its map reads as a finished single
+        stream, and a file of zeros would be promoted as the download."""
+        save = self.m._save_segments
+        for crash_after_saving in (False, True):
+            with self.subTest(crash_after_saving=crash_after_saving):
+                def crash(segmap, size, plan):
+                    if crash_after_saving:
+                        save(segmap, size, plan)
+                    raise _Crash()
+
+                with mock.patch.object(self.m, "_save_segments", crash):
+                    with self.assertRaises(_Crash):
+                        self._stream(_Server())
+                self.assertEqual(self._stream(_Server()),
+                                 (len(BODY), len(BODY)))
+                with open(self.part, "rb") as fh:
+                    self.assertEqual(fh.read(), BODY)
+                os.remove(self.part)
+
+    def test_a_crash_while_abandoning_leaves_no_full_size_part(self):
+        real = os.remove
+        removed = []
+
+        def remove(path):
+            if removed:
+                raise _Crash()
+            removed.append(path)
+            real(path)
+
+        with mock.patch("os.remove", remove):
+            with self.assertRaises(_Crash):
+                self._stream(_Server(total=len(BODY) + 1))
+        self.assertEqual(removed, [self.part])
+        self.assertEqual(self._stream(_Server()), (len(BODY), len(BODY)))
+        with open(self.part, "rb") as fh:
+            self.assertEqual(fh.read(), BODY)
+
+    def test_a_map_is_only_written_after_what_it_claims(self):
+        """A power cut must not leave a map ahead of its data: the .part is
+        synced before a map that marks bytes done, and the map before it is
+        renamed into place."""
+        synced, maps = [], []
+        real_fsync, real_replace = os.fsync, os.replace
+
+        def fsync(fd):
+            synced.append(os.fstat(fd).st_ino)
+            real_fsync(fd)
+
+        def replace(src, dst):
+            if dst.endswith(SEGMENTS_SUFFIX):
+                with open(src) as fh:
+                    done = any(seg[2] for seg in json.load(fh)["segments"])
+                maps.append((done, os.stat(src).st_ino, list(synced)))
+                del synced[:]
+            real_replace(src, dst)
+
+        with mock.patch.object(manager_module.os, "fsync", fsync), \
+                mock.patch.object(manager_module.os, "replace", replace):
+            self._stream(_Server(cut=100))
+        part = os.stat(self.part).st_ino
+        self.assertTrue(any(done for done, _ino, _synced in maps))
+        for done, staging, before in maps:
+            self.assertIn(staging, before)
+            if done:
+                self.assertIn(part, before)
+
+    def test_what_is_not_split(self):
+        wants = self.m._wants_segments
+        self.assertTrue(wants(self.part, len(BODY)))
+        self.assertFalse(wants(self.part, 0), "an unknown size")
+        with open(self.part, "wb") as fh:
+            fh.write(b"x")
+        self.assertFalse(wants(self.part, len(BODY)),
+                         "a single stream already under way")
+        os.remove(self.part)
+        with mock.patch.object(manager_module.settings,
+                               "download_segment_min_mb", 1):
+            self.assertFalse(wants(self.part, len(BODY)), "a small file")
+
+
+class PlanTest(unittest.TestCase):
+    def test_the_plan_covers_every_byte_once(self):
+        for size, count in ((10, 3), (10, 1), (3, 8), (1 << 20, 7)):
+            plan = _segment_plan(size, count)
+            self.assertEqual(plan[0][0], 0)
+            self.assertEqual(plan[-1][1], size - 1)
+            for before, after in zip(plan, plan[1:]):
+                self.assertEqual(before[1] + 1, after[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,220 @@
+"""The content store: every download's sha256 taken as it streams, one copy
+on disk for the same bytes under two item ids, and a background check that
+each file still matches what was downloaded."""
+
+import hashlib
+import os
+import sqlite3
+import time
+import unittest
+from unittest import mock
+
+from jellyfin_mpv_shim.sync import manager as manager_module
+from jellyfin_mpv_shim.sync.db import (SyncDB, STATUS_COMPLETE,
+                                       STATUS_PENDING)
+
+from tests.test_sync_manager import (FakeResp, TmpTest, _fake_stream,
+                                     add_row, make_manager)
+
+BODY = b"episode" * 1000
+
+
+def _sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class StreamedDigestTest(TmpTest):
+    def setUp(self):
+        super().setUp()
+        self.m = make_manager(self.tmp, self.addCleanup)
+        self.dest = os.path.join(self.tmp, "media.mkv")
+
+    def test_the_stream_hashes_what_it_writes(self):
+        self.m._http.get = lambda url, **k: FakeResp(
+            200, {"Content-Length": str(len(BODY))}, BODY)
+        self.m._stream("url", self.dest, "a", "A", len(BODY))
+        self.assertEqual(self.m._digests["a"],
+                         (self.dest + ".part", len(BODY), _sha(BODY)))
+
+    def test_a_resume_hashes_the_whole_file(self):
+        with open(self.dest + ".part", "wb") as fh:
+            fh.write(BODY[:100])
+        self.m._http.get = lambda url, **k: FakeResp(
+            206, {"Content-Length": str(len(BODY) - 100)}, BODY[100:])
+        self.m._stream("url", self.dest, "a", "A", len(BODY))
+        self.assertEqual(self.m._digests["a"][2], _sha(BODY))
+
+    def test_without_a_streamed_digest_the_file_is_read_back(self):
+        tmp = self.dest + ".part"
+        with open(tmp, "wb") as fh:
+            fh.write(BODY)
+        self.assertEqual(self.m._content_digest("a", tmp, len(BODY)),
+                         _sha(BODY))
+        # A digest of fewer bytes than were promoted is not the file's.
+        self.m._digests["a"] = (tmp, 10, "stale")
+        self.assertEqual(self.m._content_digest("a", tmp, len(BODY)),
+                         _sha(BODY))
+
+
+class DedupTest(TmpTest):
+    def setUp(self):
+        super().setUp()
+        self.m = make_manager(self.tmp, self.addCleanup)
+
+    def _fetch(self, item_id, body=BODY, server_id="srv"):
+        add_row(self.m, item_id, server_id=server_id, size_bytes=len(body))
+        self.m._stream = _fake_stream(body)
+        self.m._download(self.m.db.get(item_id))
+        row = self.m.db.get(item_id)
+        self.assertEqual(row["status"], STATUS_COMPLETE)
+        return row, os.path.join(self.tmp, row["file_path"])
+
+    def test_the_hash_is_recorded_at_the_commit_point(self):
+        row, _path = self._fetch("a")
+        self.assertEqual(row["content_hash"], _sha(BODY))
+
+    def test_the_same_bytes_are_stored_once(self):
+        _a, first = self._fetch("a")
+        _b, second = self._fetch("b", server_id="other")
+        self.assertEqual(os.stat(first).st_ino, os.stat(second).st_ino)
+        self.assertFalse(os.path.exists(second + ".part"))
+        self.assertFalse(os.path.exists(second + ".link"))
+
+    def test_deleting_one_keeps_the_other(self):
+        _a, first = self._fetch("a")
+        _b, second = self._fetch("b")
+        self.m.delete_item("a")
+        self.assertFalse(os.path.exists(first))
+        with open(second, "rb") as fh:
+            self.assertEqual(fh.read(), BODY)
+
+    def test_other_bytes_are_not_linked(self):
+        _a, first = self._fetch("a")
+        _b, second = self._fetch("b", body=BODY + b"!")
+        self.assertNotEqual(os.stat(first).st_ino, os.stat(second).st_ino)
+
+    def test_no_hardlinks_keeps_a_copy(self):
+        self._fetch("a")
+        with mock.patch.object(manager_module.os, "link",
+                               side_effect=OSError("not supported")):
+            _b, second = self._fetch("b")
+        with open(second, "rb") as fh:
+            self.assertEqual(fh.read(), BODY)
+        self.assertEqual(os.stat(second).st_nlink, 1)
+
+    def _checked_long_ago(self, item_id):
+        self.m.db._conn.execute(
+            "UPDATE downloads SET completed_at=1 WHERE item_id=?", (item_id,))
+        self.m.db._conn.commit()
+
+    def test_a_twin_past_its_check_is_not_linked_or_read(self):
+        """It may have rotted since; reading it back to find out would be a
+        second, unpaced read of the whole file. The verifier's job."""
+        _a, first = self._fetch("a")
+        self._checked_long_ago("a")
+        with mock.patch.object(manager_module.settings,
+                               "download_verify_days", 30), \
+                mock.patch.object(manager_module, "_hash_file",
+                                  wraps=manager_module._hash_file) as read:
+            _b, second = self._fetch("b")
+        self.assertNotIn(first, [c.args[0] for c in read.call_args_list])
+        self.assertNotEqual(os.stat(first).st_ino, os.stat(second).st_ino)
+        self.assertEqual(self.m.db.get("a")["status"], STATUS_COMPLETE)
+
+    def test_a_twin_the_verifier_checked_lately_is_linked(self):
+        _a, first = self._fetch("a")
+        self._checked_long_ago("a")
+        self.m.db.mark_checked(_sha(BODY))
+        with mock.patch.object(manager_module.settings,
+                               "download_verify_days", 30):
+            _b, second = self._fetch("b")
+        self.assertEqual(os.stat(first).st_ino, os.stat(second).st_ino)
+
+    def test_without_the_verifier_a_twin_is_trusted(self):
+        _a, first = self._fetch("a")
+        self._checked_long_ago("a")
+        with mock.patch.object(manager_module.settings,
+                               "download_verify_days", 0):
+            _b, second = self._fetch("b")
+        self.assertEqual(os.stat(first).st_ino, os.stat(second).st_ino)
+
+
+class VerifyTest(TmpTest):
+    def setUp(self):
+        super().setUp()
+        patch = mock.patch.object(manager_module.settings,
+                                  "download_verify_days", 30)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.m = make_manager(self.tmp, self.addCleanup)
+        self.m._stream = _fake_stream(BODY)
+        for item_id in ("a", "b"):
+            add_row(self.m, item_id, size_bytes=len(BODY))
+            self.m._download(self.m.db.get(item_id))
+        self.path = os.path.join(self.tmp, self.m.db.get("a")["file_path"])
+        # Landed long ago, so both are due.
+        self.m.db._conn.execute("UPDATE downloads SET completed_at=1")
+        self.m.db._conn.commit()
+
+    def test_a_good_file_is_stamped_once_for_both_rows(self):
+        self.assertEqual(self.m._verify_next(), 0)
+        self.assertIsNone(self.m.db.next_unchecked(time.time() - 86400))
+        for item_id in ("a", "b"):
+            self.assertEqual(self.m.db.get(item_id)["status"], STATUS_COMPLETE)
+
+    def test_a_changed_file_is_downloaded_again(self):
+        with open(self.path, "r+b") as fh:
+            fh.write(b"X")
+        self.m._verify_next()
+        for item_id in ("a", "b"):
+            row = self.m.db.get(item_id)
+            self.assertEqual(row["status"], STATUS_PENDING)
+            self.assertIsNone(row["content_hash"])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_an_unreadable_file_is_left_alone(self):
+        os.remove(self.path)
+        os.remove(os.path.join(self.tmp, self.m.db.get("b")["file_path"]))
+        self.assertEqual(self.m._verify_next(), manager_module.VERIFY_IDLE)
+        self.assertEqual(self.m.db.get("a")["status"], STATUS_COMPLETE)
+
+    def test_playback_holds_the_check_off(self):
+        self.m.is_busy = lambda: True
+        self.assertEqual(self.m._verify_next(),
+                         manager_module.VERIFY_BUSY_WAIT)
+
+    def test_a_check_under_way_gives_way(self):
+        self.assertEqual(self.m._verify_next(stopping=lambda: True),
+                         manager_module.VERIFY_BUSY_WAIT)
+        self.assertIsNotNone(self.m.db.next_unchecked(time.time()))
+
+    def test_zero_days_never_checks(self):
+        with mock.patch.object(manager_module.settings,
+                               "download_verify_days", 0):
+            self.assertEqual(self.m._verify_next(),
+                             manager_module.VERIFY_IDLE)
+
+
+class MigrationTest(TmpTest):
+    def test_an_older_catalog_gains_the_column_and_its_index(self):
+        path = os.path.join(self.tmp, "catalog.db")
+        SyncDB(path).close()
+        conn = sqlite3.connect(path)
+        cols = [r[1] for r in conn.execute("PRAGMA table_info(downloads)")
+                if r[1] != "content_hash"]
+        conn.execute("CREATE TABLE older AS SELECT %s FROM downloads"
+                     % ",".join(cols))
+        conn.execute("DROP TABLE downloads")
+        conn.execute("ALTER TABLE older RENAME TO downloads")
+        conn.commit()
+        conn.close()
+        db = SyncDB(path)
+        self.addCleanup(db.close)
+        have = {r[1] for r in db._conn.execute("PRAGMA table_info(downloads)")}
+        self.assertIn("content_hash", have)
+        indexes = {r[1] for r in db._conn.execute("PRAGMA index_list(downloads)")}
+        self.assertIn("idx_downloads_content", indexes)
+
+
+if __name__ == "__main__":
+    unittest.main()
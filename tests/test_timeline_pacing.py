@@ -0,0 +1,85 @@
+"""Progress reports to the server: at once on an edge, and further apart the
+longer playback stays steady, up to a ceiling.
+
+Driven through ReportPacer with a hand-advanced clock, so each case is a
+sequence of ticks rather than a wait.
+"""
+
+import sys
+import unittest
+
+sys.argv = [sys.argv[0]]      # importing timeline reaches args.get_args()
+
+from jellyfin_mpv_shim.timeline import (REPORT_BASE,  # noqa: E402
+                                        ReportPacer)
+
+PLAYING = ("item", False, 1, -1)
+PAUSED = ("item", True, 1, -1)
+
+
+class PacerTest(unittest.TestCase):
+    def setUp(self):
+        self.pacer = ReportPacer()
+        self.now = 0.0
+        self.position = 0.0
+
+    def run_for(self, seconds, state=PLAYING, ceiling=60):
+        """Tick every REPORT_BASE for ``seconds``; the times reports went."""
+        sent = []
+        end = self.now + seconds
+        while self.now < end:
+            self.now += REPORT_BASE
+            if state[1] is False:
+                self.position += REPORT_BASE
+            if self.pacer.tick(self.now, False, state, self.position, 1.0,
+                               ceiling):
+                sent.append(self.now)
+        return sent
+
+    def test_steady_playback_backs_off_to_the_ceiling(self):
+        sent = self.run_for(300)
+        gaps = [b - a for a, b in zip(sent, sent[1:])]
+        self.assertEqual(gaps[:4], [5, 10, 20, 40])
+        self.assertTrue(all(g == 60 for g in gaps[4:]), gaps)
+        # Severalfold fewer than one a tick.
+        self.assertLess(len(sent), 300 / REPORT_BASE / 4)
+
+    def test_an_edge_reports_at_once_and_restarts_the_back_off(self):
+        self.run_for(120)
+        self.now += 1
+        self.assertTrue(self.pacer.tick(self.now, True, PLAYING,
+                                        self.position, 1.0, 60))
+        self.assertEqual(self.pacer.interval, REPORT_BASE)
+
+    def test_a_pause_is_an_edge_without_being_announced(self):
+        self.run_for(120)
+        self.assertEqual(self.run_for(REPORT_BASE, PAUSED), [self.now])
+
+    def test_a_seek_is_an_edge_without_being_announced(self):
+        self.run_for(120)
+        self.position += 300
+        self.assertEqual(self.run_for(REPORT_BASE), [self.now])
+
+    def test_speed_is_not_a_seek(self):
+        self.run_for(20)
+        sent = []
+        for _ in range(20):
+            self.now += REPORT_BASE
+            self.position += 2 * REPORT_BASE
+            if self.pacer.tick(self.now, False, PLAYING, self.position, 2.0,
+                               60):
+                sent.append(self.now)
+        self.assertLess(len(sent), 5)
+
+    def test_a_base_ceiling_reports_every_tick(self):
+        sent = self.run_for(60, ceiling=REPORT_BASE)
+        self.assertEqual(len(sent), 60 / REPORT_BASE)
+
+    def test_an_unknown_state_always_reports(self):
+        self.run_for(60)
+        self.now += REPORT_BASE
+        self.assertTrue(self.pacer.tick(self.now, False, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -295,5 +295,88 @@ class PictureViewHandoffTest(unittest.TestCase):
         self.assertFalse(pm._player.keepaspect)
 
 
+class _PlaylistPlayer:
+    """Fake mpv with a playlist: records commands, answers ``playlist``
+    the way mpv does (one dict per entry, ``current`` on the one shown)."""
+
+    def __init__(self):
+        self.commands = []
+        self.playlist = []
+
+    def command(self, *args):
+        self.commands.append(args)
+        if args[0] == "loadfile":
+            if args[2] == "replace":
+                self.playlist = [{"filename": args[1], "current": True}]
+            else:
+                self.playlist.append({"filename": args[1]})
+        elif args[0] == "playlist-clear":
+            self.playlist = [e for e in self.playlist if e.get("current")]
+        elif args[0] == "playlist-next":
+            n = [e.get("current") for e in self.playlist].index(True)
+            self.playlist[n] = {"filename": self.playlist[n]["filename"]}
+            self.playlist[n + 1] = dict(self.playlist[n + 1], current=True)
+
+
+class PictureWarmNextTest(unittest.TestCase):
+    """The comic reader's next page, queued in mpv's playlist."""
+
+    def setUp(self):
+        from jellyfin_mpv_shim.conf import settings
+
+        saved = settings.comic_preload_next
+        settings.comic_preload_next = True
+        self.addCleanup(setattr, settings, "comic_preload_next", saved)
+
+    def _pm(self):
+        pm = PlayerManager.__new__(PlayerManager)
+        pm._player = _PlaylistPlayer()
+        pm._mpv_alive = True
+        pm._video = None
+        pm._showing_browse_bg = False
+        pm._suspend_shaders_for_still = lambda: None
+        return pm
+
+    def test_a_preloaded_page_is_moved_onto_not_loaded(self):
+        pm = self._pm()
+        pm.show_picture("/tmp/p1.jpg")
+        pm.preload_picture("/tmp/p2.jpg")
+        self.assertTrue(pm._player.prefetch_playlist)
+        pm.show_picture("/tmp/p2.jpg")
+        self.assertEqual(pm._player.commands[-1], ("playlist-next",))
+        pm.preload_picture("/tmp/p3.jpg")
+        self.assertEqual([e["filename"] for e in pm._player.playlist],
+                         ["/tmp/p2.jpg", "/tmp/p3.jpg"],
+                         "the playlist grew past one slot")
+
+    def test_any_other_page_is_loaded_as_before(self):
+        pm = self._pm()
+        pm.show_picture("/tmp/p1.jpg")
+        pm.preload_picture("/tmp/p2.jpg")
+        pm.show_picture("/tmp/p9.jpg")
+        self.assertEqual(pm._player.commands[-1],
+                         ("loadfile", "/tmp/p9.jpg", "replace"))
+
+    def test_a_playlist_replaced_since_the_preload_is_not_trusted(self):
+        """Playback in between replaces mpv's playlist; a remembered
+        preload would playlist-next onto nothing."""
+        pm = self._pm()
+        pm.show_picture("/tmp/p1.jpg")
+        pm.preload_picture("/tmp/p2.jpg")
+        pm._player.playlist = [{"filename": "film.mkv", "current": True}]
+        pm.show_picture("/tmp/p2.jpg")
+        self.assertEqual(pm._player.commands[-1],
+                         ("loadfile", "/tmp/p2.jpg", "replace"))
+
+    def test_nothing_is_queued_behind_playback_or_an_empty_window(self):
+        pm = self._pm()
+        pm._showing_browse_bg = True
+        self.assertFalse(pm.preload_picture("/tmp/p2.jpg"))
+        pm._showing_browse_bg = False
+        pm._video = object()
+        self.assertFalse(pm.preload_picture("/tmp/p2.jpg"))
+        self.assertEqual(pm._player.commands, [])
+
+
 if __name__ == "__main__":
     unittest.main()
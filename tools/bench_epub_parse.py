@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Measure what parsing a book's chapters costs, stylesheet included.
+
+``content.parse_spine_item`` is the work behind every chapter the reader
+opens for the first time (the book cache, ``docs/readers.md`` §4.10, saves
+it on every open after that), and on a book converted by Calibre it used to
+be dominated by the stylesheet: hundreds of classes, every element classed,
+and the same sheet re-parsed for each chapter. This parses every chapter of
+a small corpus the way the reader does — one CSS cache per book — and
+reports per book:
+
+* **ms per chapter**, the best of ``--repeat`` runs, which is what a
+  first page turn into a new chapter waits on before layout starts;
+* **rules**, so a slow book can be told apart from a big stylesheet;
+* **distinct elements**, what :meth:`Stylesheet.matched` remembered: a
+  number near the element count means the memory is not helping that book.
+
+The corpus is ``tests/_epub_fixtures.corpus`` — a plain book, a Calibre
+conversion and one whose chapters carry their own ``<style>`` — written to
+a temporary directory. Pass epub paths to measure real books instead.
+
+Usage:
+    tools/bench_epub_parse.py
+    tools/bench_epub_parse.py --repeat 10
+    tools/bench_epub_parse.py ~/Books/*.epub
+    tools/bench_epub_parse.py --profile ~/Books/slow.epub
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Time parsing every chapter of some epubs.")
+    parser.add_argument("books", nargs="*",
+                        help="epub files (default: the fixture corpus)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="runs per book; the best is reported")
+    parser.add_argument("--profile", action="store_true",
+                        help="print a cProfile of one run per book")
+    return parser.parse_args(argv)
+
+
+def parse_book(path):
+    """Parse every spine item of ``path`` as the reader would. Returns
+    ``(seconds, chapters, css_cache)``."""
+    from jellyfin_mpv_shim.epub import archive, content
+
+    package = archive.open_epub(path)
+    css_cache = {}
+    started = time.perf_counter()
+    for index in range(len(package.spine)):
+        content.parse_spine_item(package, index, css_cache)
+    return time.perf_counter() - started, len(package.spine), css_cache
+
+
+def describe(path, repeat):
+    best = None
+    for _run in range(max(1, repeat)):
+        seconds, chapters, css_cache = parse_book(path)
+        best = seconds if best is None else min(best, seconds)
+    sheets = [v for k, v in css_cache.items() if isinstance(k, tuple)]
+    rules = max((len(sheet) for sheet in sheets), default=0)
+    seen = sum(len(sheet._memo) for sheet in sheets)
+    return ("%-28s %3d chapters  %7.2f ms/chapter  %5d rules  "
+            "%5d distinct elements"
+            % (os.path.basename(path)[:28], chapters,
+               1000.0 * best / max(1, chapters), rules, seen))
+
+
+def profile(path):
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.runcall(parse_book, path)
+    pstats.Stats(profiler).sort_stats("tottime").print_stats(15)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    with tempfile.TemporaryDirectory(prefix="bench-epub-") as scratch:
+        books = args.books
+        if not books:
+            from tests._epub_fixtures import corpus
+
+            books = corpus(scratch)
+        for path in books:
+            print(describe(path, args.repeat), flush=True)
+            if args.profile:
+                profile(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
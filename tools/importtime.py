@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""Measure what importing the app costs before its first window.
+
+Nothing is on screen until ``mpv_shim.main`` has imported the player, the
+clients, the sync manager and the browser shell, and on the slow ARM boxes
+the shim is deployed to that import is a visible part of the launch. This
+runs the imports ``main`` makes, in ``main``'s order, in a fresh interpreter
+under ``python -X importtime`` and reports:
+
+* **ms per startup import**, everything each one pulled in that an earlier
+  one had not — the best of ``--repeat`` runs, since a cold page cache (or
+  a stale ``.pyc``, recompiled on the first run) is not the import's cost;
+* **shim modules loaded** by each, which is the number
+  ``tests/test_import_budget.py`` budgets: milliseconds belong to the
+  machine, the modules a step loads belong to the code;
+* **the modules with the most self time**, which is where to look when a
+  step got slower.
+
+An import that fails here (no libmpv, say) is reported and skipped; what it
+loaded before failing still counts against the step. ``--log`` reads a log
+captured from a real launch instead::
+
+    python -X importtime -m jellyfin_mpv_shim 2> startup.log
+
+Usage:
+    tools/importtime.py
+    tools/importtime.py --repeat 5 --top 25
+    tools/importtime.py --log startup.log
+"""
+
+import argparse
+import ast
+import collections
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#: The imports ``mpv_shim.main`` makes before the first window, in order —
+#: ``ui.login_servers`` opening the browser shell is that window. Kept in
+#: step with ``main`` by hand; a step missing here is simply unmeasured.
+STARTUP = (
+    "jellyfin_mpv_shim.mpv_shim",
+    "jellyfin_mpv_shim.trickplay",
+    "jellyfin_mpv_shim.win_fribidi",
+    "jellyfin_mpv_shim.exit_watchdog",
+    "jellyfin_mpv_shim.single_instance",
+    "jellyfin_mpv_shim.mpvtk.rawimage",
+    "PIL",
+    "jellyfin_mpv_shim.mpvtk_browser.ui",
+    "jellyfin_mpv_shim.player",
+    "jellyfin_mpv_shim.clients",
+    "jellyfin_mpv_shim.action_thread",
+    "jellyfin_mpv_shim.event_handler",
+    "jellyfin_mpv_shim.timeline",
+    "jellyfin_mpv_shim.sync.manager",
+    "jellyfin_mpv_shim.sync.offline_media",
+    "jellyfin_mpv_shim.media",
+    "jellyfin_mpv_shim.mpvtk_browser.app",
+)
+
+#: Written to stderr after each step, between the importtime lines.
+MARK = "importtime-mark:"
+
+#: One ``-X importtime`` line. ``depth`` is the nesting of the import that
+#: made it: 0 for what the program imported itself.
+Record = collections.namedtuple("Record", "self_us cumulative_us depth name")
+
+#: One startup step: what it cost, what it loaded and whether it failed.
+Step = collections.namedtuple("Step", "name cumulative_us records new error")
+
+_CHILD = """\
+import importlib, sys
+steps = []
+for name in %r:
+    before = set(sys.modules)
+    try:
+        importlib.import_module(name)
+        error = None
+    except BaseException as exc:
+        error = "%%s: %%s" %% (type(exc).__name__, exc)
+    steps.append((name, sorted(set(sys.modules) - before), error))
+    sys.stderr.write("%s %%s\\n" %% name)
+    sys.stderr.flush()
+print(repr(steps))
+"""
+
+
+def parse(text):
+    """The :class:`Record` for every ``import time:`` line in ``text``.
+
+    Records come in the order the interpreter wrote them, which is a
+    package's children before the package. Other lines are skipped, so a
+    whole launch's stderr can be handed over as it is.
+    """
+    records = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue                        # the header
+        name = fields[2][1:]
+        stripped = name.lstrip(" ")
+        records.append(Record(int(fields[0]), int(fields[1]),
+                              (len(name) - len(stripped)) // 2, stripped))
+    return records
+
+
+def top_level(records):
+    """The depth-0 records: what the program itself imported."""
+    return [r for r in records if r.depth == 0]
+
+
+def split_steps(text):
+    """``{step: [records]}`` for a child's stderr, cut at the marks."""
+    out, pending = {}, []
+    for line in text.splitlines():
+        if line.startswith(MARK):
+            out[line[len(MARK):].strip()] = parse("\n".join(pending))
+            pending = []
+        else:
+            pending.append(line)
+    return out
+
+
+def run_startup(names=STARTUP, python=sys.executable):
+    """Import ``names`` in a fresh interpreter; a :class:`Step` for each."""
+    # Bytecode is written even where the caller's environment says not
+    # to: an installed app has its .pyc files, and a stale one makes the
+    # step it belongs to measure the compiler.
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    child = subprocess.run(
+        [python, "-X", "importtime", "-c", _CHILD % (tuple(names), MARK)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    timed = split_steps(child.stderr)
+    steps = []
+    for name, new, error in ast.literal_eval(child.stdout.strip()
+                                             .splitlines()[-1]):
+        records = timed.get(name, [])
+        steps.append(Step(name, sum(r.cumulative_us
+                                    for r in top_level(records)),
+                          records, new, error))
+    return steps
+
+
+def shim_modules(modules):
+    return [m for m in modules
+            if m == "jellyfin_mpv_shim" or m.startswith("jellyfin_mpv_shim.")]
+
+
+def best_of(repeat, names=STARTUP):
+    """:func:`run_startup` ``repeat`` times, keeping each step's fastest."""
+    best = None
+    for _run in range(max(1, repeat)):
+        steps = run_startup(names)
+        if best is None:
+            best = steps
+        else:
+            best = [a if a.cumulative_us <= b.cumulative_us else b
+                    for a, b in zip(best, steps)]
+    return best
+
+
+def report_steps(steps, top):
+    total = sum(s.cumulative_us for s in steps)
+    for step in steps:
+        print("%-40s %8.1f ms  %3d shim modules%s"
+              % (step.name, step.cumulative_us / 1000.0,
+                 len(shim_modules(step.new)),
+                 "  (failed: %s)" % step.error if step.error else ""))
+    print("%-40s %8.1f ms" % ("total", total / 1000.0))
+    report_self([r for s in steps for r in s.records], top)
+
+
+def report_self(records, top):
+    print("\nmost self time:")
+    for record in sorted(records, key=lambda r: -r.self_us)[:top]:
+        print("  %8.1f ms  %s" % (record.self_us / 1000.0, record.name))
+
+
+def report_log(path, top):
+    with open(path, encoding="utf-8", errors="replace") as fh:
+        records = parse(fh.read())
+    for record in sorted(top_level(records),
+                         key=lambda r: -r.cumulative_us)[:top]:
+        print("%-40s %8.1f ms" % (record.name, record.cumulative_us / 1000.0))
+    report_self(records, top)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Time the imports the app makes before its first window.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs; each step's best is reported")
+    parser.add_argument("--top", type=int, default=15,
+                        help="how many modules to list by self time")
+    parser.add_argument("--log", help="parse this -X importtime log instead")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.log:
+        report_log(args.log, args.top)
+    else:
+        report_steps(best_of(args.repeat), args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())